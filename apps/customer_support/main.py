@@ -1,11 +1,156 @@
-from fastapi import FastAPI
+import asyncio
+import json
+import time
+from contextlib import aclosing, asynccontextmanager
+from datetime import datetime
+from typing import Any
+
+from fastapi import (
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTasks
+from starlette.types import Receive, Scope, Send
+
+from packages.caching.conversation_state import ConversationStateCache
+from packages.caching.redis_client import get_redis
+from packages.caching.response_cache import ResponseCache
+from packages.caching.semantic_cache import create_semantic_cache
+from packages.caching.single_flight import SingleFlight
+from packages.core.analytics import AnalyticsRepository, Window
+from packages.core.chat import ChatPipeline, ChatRequest, ChatTurn
+from packages.core.config import get_settings
+from packages.core.connections import (
+    ConnectionRegistry,
+    SessionConnection,
+    frames_counter,
+)
+from packages.core.context import ContextBuilder, LLMSummarizer, parse_budgets
+from packages.core.database import dispose_engine, get_replica_router, pool_status
+from packages.core.dependencies import (
+    get_read_db,
+    get_tenant_id,
+    get_user_role,
+    lookup_tenant,
+)
+from packages.core.enums import (
+    ChannelType,
+    ConversationStatus,
+    ConversationType,
+    MessageType,
+    RollupGranularity,
+    SearchMode,
+    UserRole,
+)
+from packages.core.metrics import metrics
+from packages.core.persistence import (
+    InvalidStatusTransition,
+    SqlTurnStore,
+    change_status,
+)
+from packages.core.providers import create_provider
+from packages.core.router import DEFAULT_TIERS, SmartRouter, parse_tiers
+from packages.core.search import FuzzySearchUnavailable, MessageSearch, SearchQuery
+from packages.core.streaming import (
+    NDJSON_MEDIA_TYPE,
+    STREAMING_HEADERS,
+    encode_ndjson,
+    encode_sse,
+    pick_media_type,
+)
+from packages.core.tenants import get_tenant_resolver, listen_dsn
+from packages.core.write_behind import WriteBehindBuffer
+from packages.data.export import ExportFormatUnavailable, ExportRequest, export_stream
+from packages.observability.logs import configure_logging
+from packages.observability.middleware import ObservabilityMiddleware
+from packages.observability.profiling import RequestProfiler
+from packages.observability.tracing import configure_tracing
+from packages.security.admission import AdmissionController, AdmissionSlot
+from packages.security.rate_limit import Limit, RateLimiter, Throttled
+
+settings = get_settings()
+
+# Logs and traces are configured before anything else logs or opens spans
+configure_logging(settings.log_level)
+if settings.enable_opentelemetry:
+    configure_tracing(
+        settings.otel_service_name,
+        exporter=settings.otel_traces_exporter,
+        sample_ratio=settings.otel_sample_ratio,
+        endpoint=settings.otel_exporter_otlp_endpoint,
+    )
+
+# Chat history writes are batched per tenant - see packages/core/write_behind.py
+history_buffer = (
+    WriteBehindBuffer(
+        max_batch=settings.write_behind_max_batch,
+        max_delay=settings.write_behind_max_delay,
+        max_pending=settings.write_behind_max_pending,
+    )
+    if settings.database_url_app and settings.enable_write_behind else None
+)
+
+# Open chat WebSockets of this worker; with Redis, pushes reach the session on every worker
+connections = ConnectionRegistry(redis=get_redis(), heartbeat_interval=settings.ws_heartbeat_interval)
+
+# Live conversations' state for context building - Redis only: a per-worker copy alone
+# would miss the turns other workers save
+conversation_state = (
+    ConversationStateCache(
+        get_redis(),
+        ttl=settings.conversation_state_ttl,
+        max_messages=settings.conversation_state_messages,
+        max_local_bytes=settings.conversation_state_max_bytes,
+    )
+    if settings.database_url_app and settings.enable_conversation_state_cache and get_redis() is not None
+    else None
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup/shutdown hooks - cache invalidation, replica lag checks, then flush history and close pooled DB connections"""
+    tenant_resolver = get_tenant_resolver()
+    tenant_listener = (
+        asyncio.create_task(tenant_resolver.listen(listen_dsn(settings.database_url_app or "")))
+        if tenant_resolver is not None else None
+    )
+    # Replicas serve reads only once a check finds them caught up
+    replica_router = get_replica_router() if settings.database_url_app else None
+    replica_monitor = asyncio.create_task(replica_router.run()) if replica_router is not None else None
+    connections_task = asyncio.create_task(connections.run())
+    state_task = asyncio.create_task(conversation_state.run()) if conversation_state is not None else None
+    yield
+    connections_task.cancel()
+    if state_task is not None:
+        state_task.cancel()
+    if tenant_listener is not None:
+        tenant_listener.cancel()
+    if replica_monitor is not None:
+        replica_monitor.cancel()
+    if history_buffer is not None:
+        await history_buffer.close()
+    # Pooled provider: close its keep-alive connections to the upstreams
+    aclose = getattr(provider, "aclose", None)
+    if aclose is not None:
+        await aclose()
+    await dispose_engine()
 
 # Create FastAPI app
 app = FastAPI(
     title="Clever+ - AI Agent Platform - Customer Support",
     description="Customer support AI agent with escalation capabilities",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Setup CORS
@@ -17,6 +162,99 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Added last = outermost: spans and timings cover CORS and every handler
+app.add_middleware(
+    ObservabilityMiddleware,
+    log_sample_rate=settings.log_sample_rate,
+    slow_request_seconds=settings.slow_request_seconds,
+    profiler=RequestProfiler(settings.profile_token, settings.profile_dir) if settings.profile_token else None,
+)
+
+# Chat pipeline - LLM_PROVIDER=fake runs fully offline
+# Without DATABASE_URL_APP turns are streamed but not persisted (local experiments)
+provider = create_provider(settings.llm_provider, settings.max_tokens, settings)
+turn_store = (
+    SqlTurnStore(history_buffer, durable=settings.write_behind_durable, state_cache=conversation_state)
+    if settings.database_url_app else None
+)
+chat_pipeline = ChatPipeline(
+    provider=provider,
+    default_model=settings.default_model,
+    store=turn_store,
+    # Repeated FAQ questions are answered from cache - the provider sees each one once per TTL
+    response_cache=ResponseCache(
+        redis=get_redis(),
+        max_local_bytes=settings.response_cache_max_bytes,
+        default_ttl=settings.cache_ttl_seconds,
+    ),
+    # Near-duplicate questions ("reset password" / "how to reset my password?") share an answer
+    semantic_cache=create_semantic_cache(settings),
+    # Cheapest adequate model per request, falling back to the next tier on provider errors
+    router=(
+        SmartRouter(parse_tiers(settings.router_tiers) or DEFAULT_TIERS)
+        if settings.enable_smart_router else None
+    ),
+    first_token_timeout=settings.router_first_token_timeout,
+    # A burst of identical questions costs one provider call, streamed to every asker
+    single_flight=(
+        SingleFlight(
+            redis=get_redis() if settings.single_flight_redis else None,
+            wait_timeout=settings.single_flight_wait_timeout,
+        )
+        if settings.enable_single_flight else None
+    ),
+    # Prompt size stays bounded however long the thread gets - needs the history in the database
+    context=(
+        ContextBuilder(
+            default_budget=settings.context_max_tokens,
+            budgets=parse_budgets(settings.context_budgets),
+            summarizer=(
+                LLMSummarizer(provider, settings.summary_model or settings.default_model)
+                if settings.enable_context_summary else None
+            ),
+            state_cache=conversation_state,
+        )
+        if settings.database_url_app else None
+    ),
+)
+
+# Noisy neighbours: request and token limits per tenant and role, shared through Redis when configured
+rate_limiter = (
+    RateLimiter(
+        requests=Limit.per_minute(settings.rate_limit_requests_per_minute, settings.rate_limit_burst),
+        tokens=Limit.per_minute(settings.rate_limit_tokens_per_minute, settings.rate_limit_tokens_per_minute),
+        redis=get_redis(),
+    )
+    if settings.enable_rate_limiting else None
+)
+
+# Stable tail latency: developer/tester traffic waits while this worker is over its p95 target
+admission = (
+    AdmissionController(
+        target_p95=settings.admission_target_p95,
+        max_queue=settings.admission_max_queue,
+        queue_timeout=settings.admission_queue_timeout,
+    )
+    if settings.enable_admission_control else None
+)
+
+@app.exception_handler(Throttled)
+async def throttled_handler(request: Request, error: Throttled):
+    """429 (rate limit) / 503 (overload) with the Retry-After the limiter computed"""
+    return JSONResponse(
+        status_code=error.status_code,
+        content={"detail": str(error)},
+        headers={"Retry-After": error.retry_after_header},
+    )
+
+async def rate_limit(
+    tenant_id: int = Depends(get_tenant_id),
+    role: UserRole = Depends(get_user_role),
+) -> None:
+    """Request-count limit of every /api/v1 endpoint"""
+    if rate_limiter is not None:
+        await rate_limiter.check_request(tenant_id, role)
+
 @app.get("/")
 async def root():
     """Main API page"""
@@ -36,14 +274,424 @@ async def health_check():
         "version": "0.1.0"
     }
 
-@app.get("/api/v1/chat")
-async def chat_endpoint():
-    """Base endpoint for chat (empty)"""
+@app.get("/metrics")
+async def metrics_endpoint():
+    """In-process metrics of this worker (time-to-first-token, stream duration, DB pool, ...)"""
+    replica_router = get_replica_router() if settings.database_url_app else None
+    replicas = replica_router.status() if replica_router is not None else {}
+    state = conversation_state.stats() if conversation_state is not None else {}
+    return {**metrics.snapshot(), "db_pool": pool_status(), "db_replicas": replicas, "conversation_state": state}
+
+def request_deadline(x_request_timeout: float | None = Header(default=None, gt=0)) -> float:
+    """
+    Deadline of a chat turn, fixed when the request arrives: CHAT_DEADLINE_SECONDS,
+    or less if the caller's X-Request-Timeout (seconds) says so. Time spent in the
+    admission queue counts against it; the provider calls get what is left.
+    """
+    budget = settings.chat_deadline if x_request_timeout is None else min(x_request_timeout, settings.chat_deadline)
+    return time.monotonic() + budget
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    Streaming response that frees its admission slot however the response ends
+
+    The guard around the events releases it when the stream ends, but a client
+    gone before the body is read leaves the guard unstarted - its finally never runs.
+    """
+
+    def __init__(self, content: Any, slot: AdmissionSlot | None, **kwargs: Any) -> None:
+        super().__init__(content, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.slot is not None:
+                self.slot.release()
+
+@app.post("/api/v1/chat", dependencies=[Depends(rate_limit)])
+async def chat_endpoint(
+    body: ChatRequest,
+    request: Request,
+    format: str | None = None,
+    tenant_id: int = Depends(get_tenant_id),
+    role: UserRole = Depends(get_user_role),
+    deadline: float = Depends(request_deadline),
+):
+    """
+    Stream the assistant reply token by token
+
+    SSE by default; NDJSON with ?format=ndjson or Accept: application/x-ndjson.
+    The Message rows are saved in a background task after the stream closes.
+    429/503 with Retry-After when the tenant is over budget or the worker is overloaded.
+    A reply still running at the deadline ends with an error event.
+    """
+    if rate_limiter is not None:
+        await rate_limiter.check_tokens(tenant_id, role)
+    slot = await admission.admit(role) if admission is not None else None
+    try:
+        turn = chat_pipeline.start(tenant_id, body, deadline)
+    except BaseException:
+        if slot is not None:
+            slot.release()
+        raise
+    events = chat_pipeline.stream(turn)
+    if slot is not None:
+        events = slot.guard(events)
+    media_type = pick_media_type(request.headers.get("accept"), format)
+    encode = encode_ndjson if media_type == NDJSON_MEDIA_TYPE else encode_sse
+    background = BackgroundTasks()
+    if rate_limiter is not None:
+        background.add_task(charge_tokens, turn, role)
+    background.add_task(chat_pipeline.persist, turn)
+    return AdmittedStreamingResponse(
+        encode(events),
+        slot=slot,
+        media_type=media_type,
+        headers=STREAMING_HEADERS,
+        background=background,
+    )
+
+async def charge_tokens(turn: ChatTurn, role: UserRole) -> None:
+    """Bill what the reply actually used against the tenant's token budget (cached replies are free)"""
+    if turn.tokens_used:
+        await rate_limiter.charge_tokens(turn.tenant_id, role, turn.tokens_used)
+
+@app.websocket("/api/v1/chat/ws")
+async def chat_websocket(
+    websocket: WebSocket,
+    session_id: str = Query(min_length=1, max_length=255),
+    tenant: str | None = None,
+    channel: ChannelType = ChannelType.WEB,
+    conversation_type: ConversationType = ConversationType.SUPPORT,
+    user_id: int | None = None,
+    x_tenant_id: str | None = Header(default=None),
+    role: UserRole = Depends(get_user_role),
+):
+    """
+    One socket per widget session, carrying all of its turns
+
+    Browsers can't set headers on a WebSocket, so the tenant may also come as ?tenant=.
+    Client frames:
+        {"type": "message", "message": "...", "id": "optional correlation id"}
+        {"type": "ping"}
+    Server frames:
+        token / done / error events exactly as POST /api/v1/chat streams them
+        {"type": "typing"} when a reply starts, {"type": "pong"}
+        {"type": "heartbeat"} on sockets idle for WS_HEARTBEAT_INTERVAL
+        {"type": "human_agent", ...} pushed via POST /api/v1/sessions/{session_id}/messages
+    Turns run one after another in arrival order; frames of a turn echo its "id".
+    At most WS_MAX_PENDING_TURNS turns wait or run per socket - further messages
+    get an error frame and are dropped.
+    """
+    resolved = await lookup_tenant(x_tenant_id or tenant or str(settings.default_tenant_id))
+    if resolved is None or not resolved.is_active:
+        await websocket.close(code=1008, reason="Unknown tenant" if resolved is None else "Tenant is inactive")
+        return
+    await websocket.accept()
+    connection = SessionConnection(websocket, resolved.id, session_id)
+    connections.register(connection)
+    last_turn: asyncio.Task | None = None
+    pending: set[asyncio.Task] = set()
+    try:
+        while True:
+            try:
+                frame = json.loads(await websocket.receive_text())
+                kind = frame["type"]
+            except (ValueError, TypeError, KeyError):
+                await connection.send({"type": "error", "message": "Frames are JSON objects with a \"type\""})
+                continue
+            frames_counter.inc(direction="in", type=kind if kind in ("message", "ping") else "unknown")
+            if kind == "ping":
+                await connection.send({"type": "pong"})
+            elif kind == "message":
+                if len(pending) >= settings.ws_max_pending_turns:
+                    await connection.send({
+                        "type": "error",
+                        "message": f"Too many turns in progress (at most {settings.ws_max_pending_turns})",
+                        "id": frame.get("id"),
+                    })
+                    continue
+                try:
+                    request = ChatRequest(
+                        message=frame.get("message", ""),
+                        session_id=session_id,
+                        user_id=user_id,
+                        conversation_type=conversation_type,
+                        channel=channel,
+                        model=frame.get("model"),
+                    )
+                except ValidationError as error:
+                    await connection.send({"type": "error", "message": str(error), "id": frame.get("id")})
+                    continue
+                last_turn = asyncio.create_task(
+                    websocket_turn(connection, role, request, frame.get("id"), previous=last_turn)
+                )
+                pending.add(last_turn)
+                last_turn.add_done_callback(pending.discard)
+            else:
+                await connection.send({"type": "error", "message": f"Unknown frame type '{kind}'"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        connections.unregister(connection)
+        if last_turn is not None:
+            # A running turn stops at its next send; it still gets billed (and persisted if it completed)
+            await asyncio.gather(last_turn, return_exceptions=True)
+
+async def websocket_turn(
+    connection: SessionConnection,
+    role: UserRole,
+    request: ChatRequest,
+    frame_id: str | None,
+    previous: asyncio.Task | None,
+) -> None:
+    """One turn on a chat socket - the same limits, pipeline and bookkeeping as POST /api/v1/chat"""
+    if previous is not None:
+        await asyncio.gather(previous, return_exceptions=True)
+    deadline = time.monotonic() + settings.chat_deadline
+    try:
+        if rate_limiter is not None:
+            await rate_limiter.check_request(connection.tenant_id, role)
+            await rate_limiter.check_tokens(connection.tenant_id, role)
+        slot = await admission.admit(role) if admission is not None else None
+    except Throttled as error:
+        await connection.send({"type": "error", "message": str(error), "retry_after": error.retry_after, "id": frame_id})
+        return
+    turn = None
+    try:
+        turn = chat_pipeline.start(connection.tenant_id, request, deadline)
+        events = chat_pipeline.stream(turn)
+        if slot is not None:
+            events = slot.guard(events)
+        await connection.send({"type": "typing", "id": frame_id})
+        async with aclosing(events):
+            async for event in events:
+                await connection.send({**event, "id": frame_id})
+    finally:
+        # Also when the client was gone before the typing frame: the guard never started
+        if slot is not None:
+            slot.release()
+        if turn is not None:
+            if rate_limiter is not None:
+                await charge_tokens(turn, role)
+            await chat_pipeline.persist(turn)
+
+class AgentMessage(BaseModel):
+    """Body of POST /api/v1/sessions/{session_id}/messages"""
+    message: str = Field(min_length=1, max_length=8000)
+    agent_name: str | None = Field(default=None, max_length=100)
+
+AGENT_ROLES = {UserRole.SUPPORT_AGENT, UserRole.SUPPORT_MANAGER, UserRole.ADMIN, UserRole.SUPER_ADMIN}
+
+@app.post("/api/v1/sessions/{session_id}/messages", dependencies=[Depends(rate_limit)])
+async def push_agent_message(
+    session_id: str,
+    body: AgentMessage,
+    tenant_id: int = Depends(get_tenant_id),
+    role: UserRole = Depends(get_user_role),
+):
+    """
+    Human agent escalation: push a message to the session's open chat sockets on every worker
+
+    The message is saved to the session's open conversation first (404 if there
+    is none), so it is part of the history whether or not a socket is open.
+    local_connections counts this worker's sockets only; with Redis the other
+    workers deliver to theirs.
+    """
+    if role not in AGENT_ROLES:
+        raise HTTPException(status_code=403, detail="Only support agents can message a session")
+    conversation_id = None
+    if turn_store is not None:
+        conversation_id = await turn_store.save_agent_message(
+            tenant_id, session_id, body.message, settings.default_model
+        )
+        if conversation_id is None:
+            raise HTTPException(status_code=404, detail="No open conversation for this session")
+    frame = {"type": "human_agent", "text": body.message, "agent": body.agent_name}
+    delivered = await connections.push(tenant_id, session_id, frame)
     return {
-        "message": "Chat endpoint - coming soon",
-        "status": "not_implemented"
+        "session_id": session_id,
+        "conversation_id": conversation_id,
+        "local_connections": delivered,
+        "fanout": connections.redis is not None,
     }
 
+class StatusChange(BaseModel):
+    """Body of POST /api/v1/conversations/{conversation_id}/status"""
+    status: ConversationStatus
+
+@app.post("/api/v1/conversations/{conversation_id}/status", dependencies=[Depends(rate_limit)])
+async def change_conversation_status(
+    conversation_id: int,
+    body: StatusChange,
+    tenant_id: int = Depends(get_tenant_id),
+    role: UserRole = Depends(get_user_role),
+):
+    """
+    Move a conversation through its workflow: escalate, put on hold, close, reopen
+
+    Allowed moves are listed in enums.STATUS_TRANSITIONS (409 otherwise); archiving
+    is done by python -m packages.data.archive.
+    """
+    if role not in AGENT_ROLES:
+        raise HTTPException(status_code=403, detail="Only support agents can change a conversation's status")
+    try:
+        previous = await change_status(
+            tenant_id, conversation_id, body.status, state_cache=conversation_state, turn_store=turn_store
+        )
+    except InvalidStatusTransition as error:
+        raise HTTPException(status_code=409, detail=str(error)) from error
+    if previous is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {"conversation_id": conversation_id, "status": body.status, "previous_status": previous}
+
+# Analytics dashboard - reads the precomputed rollups (python -m packages.data.rollups refresh),
+# never the raw messages/conversations tables
+
+def analytics_window(
+    granularity: RollupGranularity = RollupGranularity.DAY,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> Window:
+    """Query parameters shared by the analytics endpoints"""
+    try:
+        return Window.resolve(granularity, since, until)
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error)) from error
+
+async def analytics_response(analytics: AnalyticsRepository, window: Window, items: list[dict]) -> dict:
+    return {
+        "granularity": window.granularity,
+        "since": window.since,
+        "until": window.until,
+        "computed_through": await analytics.computed_through(),
+        "items": items,
+    }
+
+@app.get("/api/v1/analytics/tokens", dependencies=[Depends(rate_limit)])
+async def analytics_tokens(
+    window: Window = Depends(analytics_window),
+    tenant_id: int = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Tokens used per AI model and time bucket"""
+    analytics = AnalyticsRepository(db)
+    return await analytics_response(analytics, window, await analytics.tokens_by_model(tenant_id, window))
+
+@app.get("/api/v1/analytics/messages", dependencies=[Depends(rate_limit)])
+async def analytics_messages(
+    window: Window = Depends(analytics_window),
+    tenant_id: int = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Message counts per message type and time bucket"""
+    analytics = AnalyticsRepository(db)
+    return await analytics_response(analytics, window, await analytics.messages_by_type(tenant_id, window))
+
+@app.get("/api/v1/analytics/feedback", dependencies=[Depends(rate_limit)])
+async def analytics_feedback(
+    window: Window = Depends(analytics_window),
+    tenant_id: int = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Thumbs up/down ratios of assistant replies per time bucket"""
+    analytics = AnalyticsRepository(db)
+    return await analytics_response(analytics, window, await analytics.feedback(tenant_id, window))
+
+@app.get("/api/v1/analytics/channels", dependencies=[Depends(rate_limit)])
+async def analytics_channels(
+    window: Window = Depends(analytics_window),
+    tenant_id: int = Depends(get_tenant_id),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Resolution time percentiles and satisfaction per channel over the window"""
+    analytics = AnalyticsRepository(db)
+    return await analytics_response(analytics, window, await analytics.channel_outcomes(tenant_id, window))
+
+# Message search for support agents - GIN-indexed full text (and trigram) over messages.content
+
+def search_query(
+    q: str,
+    mode: SearchMode = SearchMode.TEXT,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    conversation_id: int | None = None,
+    message_type: MessageType | None = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> SearchQuery:
+    """Query parameters of the search endpoint"""
+    try:
+        return SearchQuery.resolve(q, mode, since, until, conversation_id, message_type, limit, offset)
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error)) from error
+
+@app.get("/api/v1/search/messages", dependencies=[Depends(rate_limit)])
+async def search_messages(
+    query: SearchQuery = Depends(search_query),
+    tenant_id: int = Depends(get_tenant_id),
+    role: UserRole = Depends(get_user_role),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Ranked, paginated search over the tenant's messages, with highlighted fragments
+
+    q uses web search syntax in text mode: words, "exact phrase", -excluded, or.
+    The default window is the last year; highlight is HTML-escaped with <mark> around matches.
+    """
+    if role not in AGENT_ROLES:
+        raise HTTPException(status_code=403, detail="Only support agents can search messages")
+    try:
+        return await MessageSearch(db).search(tenant_id, query)
+    except FuzzySearchUnavailable as error:
+        raise HTTPException(status_code=501, detail=str(error)) from error
+
+# Data exports: managers and admins of the tenant
+EXPORT_ROLES = {UserRole.SUPPORT_MANAGER, UserRole.ADMIN, UserRole.SUPER_ADMIN}
+
+def export_request(
+    table: str,
+    format: str = "ndjson",
+    compression: str = "gzip",
+    since: datetime | None = None,
+    until: datetime | None = None,
+    cursor: str | None = None,
+) -> ExportRequest:
+    """Path and query parameters of the export endpoint"""
+    try:
+        return ExportRequest.resolve(table, format, compression, since, until, cursor)
+    except ExportFormatUnavailable as error:
+        raise HTTPException(status_code=501, detail=str(error)) from error
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error)) from error
+
+@app.get("/api/v1/exports/{table}", dependencies=[Depends(rate_limit)])
+async def export_table(
+    export: ExportRequest = Depends(export_request),
+    tenant_id: int = Depends(get_tenant_id),
+    role: UserRole = Depends(get_user_role),
+):
+    """
+    Download the tenant's conversations or messages as NDJSON, CSV or Parquet
+
+    Streamed and compressed on the fly (gzip by default), ordered by (created_at, id).
+    After a broken download, pass cursor=<created_at>,<id> of the last complete row
+    (and the same until) to get the remaining rows as a new file.
+    """
+    if role not in EXPORT_ROLES:
+        raise HTTPException(status_code=403, detail="Only managers and admins can export data")
+    return StreamingResponse(
+        export_stream(tenant_id, export),
+        media_type=export.media_type,
+        headers={
+            **STREAMING_HEADERS,
+            "Content-Disposition": f'attachment; filename="{export.filename}"',
+            "X-Export-Until": export.until.isoformat(),
+        },
+    )
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
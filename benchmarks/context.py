@@ -0,0 +1,89 @@
+# benchmarks/context.py
+# Prompt size versus thread length: full history vs. the context builder's window
+# Runs the same selection as packages/core/context.py on synthetic threads, no database
+#
+# Usage:
+#   python -m benchmarks.context --lengths 10,50,100,250,500 --budget 4000 --output context.json
+#
+# Messages get seeded log-normal lengths (short user questions, longer replies), so
+# runs with the same parameters produce the same numbers. Once a thread outgrows the
+# budget, the window is preceded by a rolling summary of --summary-tokens.
+
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any
+
+import click
+
+from packages.core.context import HistoryMessage, select_window
+from packages.core.tokens import count_tokens, message_tokens
+
+from .results import emit
+
+WORDS = ("account", "password", "reset", "billing", "invoice", "plan", "error", "login", "email", "refund",
+         "the", "my", "is", "not", "working", "since", "yesterday", "please", "help", "thanks")
+
+
+def thread(length: int, rng: random.Random, model: str) -> list[HistoryMessage]:
+    """Alternating user/assistant messages, oldest first"""
+    start = datetime(2026, 1, 1)
+    messages = []
+    for index in range(length):
+        role = "user" if index % 2 == 0 else "assistant"
+        words = max(3, int(rng.lognormvariate(2.5 if role == "user" else 4.0, 0.6)))
+        content = " ".join(rng.choice(WORDS) for _ in range(words))
+        tokens = message_tokens(count_tokens(content, model))
+        messages.append(HistoryMessage(index + 1, start + timedelta(seconds=index), role, content, tokens))
+    return messages
+
+
+def measure(length: int, budget: int, summary_tokens: int, model: str, seed: int) -> dict[str, Any]:
+    rng = random.Random(seed + length)
+    history = thread(length, rng, model)
+    current = message_tokens(count_tokens("How do I reset my password?", model))
+    full = sum(m.tokens for m in history) + current
+
+    started = time.perf_counter()
+    kept, used, overflow = select_window(reversed(history), budget - current)
+    if overflow is not None:
+        # The summary takes its share first, as ContextBuilder.build does
+        kept, used, overflow = select_window(reversed(history), budget - current - summary_tokens)
+    select_seconds = time.perf_counter() - started
+    compacted = used + current + (summary_tokens if overflow is not None else 0)
+    return {
+        "name": f"thread_{length}",
+        "messages": length,
+        "full_prompt_tokens": full,
+        "compacted_prompt_tokens": compacted,
+        "history_messages_sent": len(kept),
+        "summarized": overflow is not None,
+        "reduction_percent": round((1 - compacted / full) * 100, 1),
+        "select_ms": round(select_seconds * 1000, 3),
+    }
+
+
+@click.command()
+@click.option("--lengths", default="2,10,25,50,100,250,500", show_default=True, help="Comma-separated thread lengths")
+@click.option("--budget", default=4000, show_default=True, help="Prompt token budget (CONTEXT_MAX_TOKENS)")
+@click.option("--summary-tokens", default=300, show_default=True, help="Size of the rolling summary once used")
+@click.option("--model", default="gpt-4o-mini", show_default=True, help="Tokenizer model")
+@click.option("--seed", default=42, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write JSON results here")
+def main(lengths: str, budget: int, summary_tokens: int, model: str, seed: int, output: str | None) -> None:
+    """Prompt tokens per turn as threads grow, with and without context compaction"""
+    results = []
+    for length in (int(value) for value in lengths.split(",") if value.strip()):
+        result = measure(length, budget, summary_tokens, model, seed)
+        click.echo(
+            f"{length:>5} messages  full={result['full_prompt_tokens']:>7,} tokens  "
+            f"compacted={result['compacted_prompt_tokens']:>6,} tokens  sent={result['history_messages_sent']}",
+            err=True,
+        )
+        results.append(result)
+    parameters = {"lengths": lengths, "budget": budget, "summary_tokens": summary_tokens, "model": model, "seed": seed}
+    emit({"benchmark": "context", "parameters": parameters, "threads": results}, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# benchmarks/db_load.py
+# Load test for the async DB layer: N concurrent chat requests through the
+# customer-support app (in-process ASGI, fake LLM provider, real Postgres)
+#
+# Usage (needs DATABASE_URL_APP and an existing tenant):
+#   python -m benchmarks.db_load --concurrency 500 --requests 5000 --tenant-id 1
+#   python -m benchmarks.db_load --no-write-behind        # one transaction per turn, for comparison
+#
+# Reports request latency percentiles plus the pool metrics from packages/core/database.py:
+# pool wait time, checkouts and per-statement latency
+
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+import click
+
+from .results import emit
+
+
+async def run(concurrency: int, requests: int, tenant_id: int, turns_per_session: int) -> dict[str, object]:
+    import httpx
+
+    from apps.customer_support.main import app, chat_pipeline, history_buffer
+    from packages.core.database import dispose_engine, pool_status
+    from packages.core.metrics import metrics
+    from packages.core.providers import FakeProvider
+
+    # Zero-delay provider and no caches: the database is the only thing under test
+    chat_pipeline.provider = FakeProvider()
+    chat_pipeline.response_cache = None
+    chat_pipeline.semantic_cache = None
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+    peak_checked_out = 0
+    run_id = uuid.uuid4().hex[:8]
+    sessions = max(1, requests // turns_per_session)
+
+    async def one_request(client: httpx.AsyncClient, index: int) -> None:
+        nonlocal errors, peak_checked_out
+        async with semaphore:
+            body = {"message": f"load test question {index}", "session_id": f"load-{run_id}-{index % sessions}"}
+            started = time.perf_counter()
+            try:
+                # ASGITransport returns after the app finishes, i.e. including the background persist
+                response = await client.post("/api/v1/chat?format=ndjson", json=body, headers={"x-tenant-id": str(tenant_id)})
+                response.raise_for_status()
+                if '"type":"error"' in response.text:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+            peak_checked_out = max(peak_checked_out, pool_status().get("checked_out", 0))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request(client, i) for i in range(requests)))
+        # ASGITransport skips the lifespan, so flush buffered history here - it counts towards the run
+        if history_buffer is not None:
+            await history_buffer.drain()
+        elapsed = time.perf_counter() - started
+    await dispose_engine()
+
+    q = statistics.quantiles(latencies, n=100)
+    snapshot = metrics.snapshot()
+    return {
+        "benchmark": "db_load",
+        "concurrency": concurrency,
+        "requests": requests,
+        "write_behind": history_buffer is not None,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "latency_ms": {"p50": round(q[49] * 1000, 2), "p95": round(q[94] * 1000, 2), "p99": round(q[98] * 1000, 2)},
+        "peak_checked_out": peak_checked_out,
+        "db_pool_wait_seconds": snapshot["db_pool_wait_seconds"]["series"],
+        "db_pool_checkouts_total": snapshot["db_pool_checkouts_total"]["series"],
+        "db_query_seconds": snapshot["db_query_seconds"]["series"],
+        "write_behind_flush_seconds": snapshot["write_behind_flush_seconds"]["series"],
+        "write_behind_batch_rows": snapshot["write_behind_batch_rows"]["series"],
+    }
+
+
+@click.command()
+@click.option("--concurrency", default=500, show_default=True, help="Requests in flight at once")
+@click.option("--requests", "total", default=5000, show_default=True, help="Total chat requests")
+@click.option("--tenant-id", default=1, show_default=True, help="Existing tenant to write into")
+@click.option("--turns-per-session", default=10, show_default=True, help="Chat turns sharing one conversation")
+@click.option("--write-behind/--no-write-behind", default=True, show_default=True, help="Batch history writes")
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write JSON results here")
+def main(
+    concurrency: int, total: int, tenant_id: int, turns_per_session: int, write_behind: bool, output: str | None
+) -> None:
+    """Concurrent chat turns against the pooled, tenant-scoped async engine"""
+    if not os.getenv("DATABASE_URL_APP"):
+        raise click.UsageError("DATABASE_URL_APP is not set")
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["ENABLE_SEMANTIC_CACHE"] = "false"
+    os.environ["ENABLE_WRITE_BEHIND"] = str(write_behind).lower()
+    report = asyncio.run(run(concurrency, total, tenant_id, turns_per_session))
+    parameters = {"concurrency": concurrency, "requests": total, "tenant_id": tenant_id,
+                  "turns_per_session": turns_per_session, "write_behind": write_behind}
+    emit({**report, "parameters": parameters}, output)
+
+
+if __name__ == "__main__":
+    main()
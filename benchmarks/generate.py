@@ -0,0 +1,334 @@
+# benchmarks/generate.py
+# Seeded synthetic multi-tenant dataset, bulk-loaded with COPY
+#
+# Usage (admin connection - COPY into RLS tables is refused for the app user):
+#   python -m benchmarks.generate load --tenants 50 --conversations 200000 --seed 42
+#   python -m benchmarks.generate drop
+#
+# Shape of the data (same seed + parameters = same data on every machine, only the ids differ):
+# - Tenant sizes follow a Zipf distribution: a few large customers, a long tail of small ones
+# - Thread lengths are log-normal: most chats are a few turns, some run to hundreds of messages
+# - Timestamps spread over --days before --until, with a daytime peak
+#
+# Why COPY?
+# - One streamed statement per table chunk instead of millions of INSERTs:
+#   server-side parsing and WAL are the limit, not round trips
+
+import csv
+import io
+import json
+import math
+import os
+import random
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+import click
+from sqlalchemy import create_engine, text
+
+from packages.core.enums import (
+    ChannelType,
+    ConversationStatus,
+    ConversationType,
+    MessageType,
+    UserFeedback,
+    UserRole,
+)
+from packages.core.models import Base, CodedEnum
+from packages.data.partitions import add_months, create_partition, month_start
+
+from .results import emit
+
+SLUG_PREFIX = "bench-gen"
+
+# (value, weight) - rough production mix
+CHANNELS = ((ChannelType.WEB, 50), (ChannelType.MOBILE_APP, 20), (ChannelType.EMAIL, 15),
+            (ChannelType.WHATSAPP, 10), (ChannelType.TELEGRAM, 5))
+CONVERSATION_TYPES = ((ConversationType.SUPPORT, 55), (ConversationType.BILLING, 15), (ConversationType.TECHNICAL, 15),
+                      (ConversationType.SALES, 10), (ConversationType.GENERAL, 5))
+STATUSES = ((ConversationStatus.CLOSED, 60), (ConversationStatus.ACTIVE, 20), (ConversationStatus.PENDING, 12),
+            (ConversationStatus.ESCALATED, 8))
+MODELS = (("gpt-4o-mini", 70), ("claude-3-haiku-20240307", 20), ("gpt-4o", 10))
+WORDS = ("account password order invoice refund plan upgrade login error payment shipping address "
+         "subscription cancel update export report access token limit support please thanks help").split()
+
+COLUMNS = {
+    "tenants": ("id", "name", "slug", "is_active", "created_at"),
+    "users": ("id", "tenant_id", "email", "username", "full_name", "is_active", "role", "created_at"),
+    "conversations": ("id", "tenant_id", "user_id", "session_id", "title", "conversation_type", "channel", "status",
+                      "resolution_time_minutes", "satisfaction_score", "created_at", "updated_at", "closed_at"),
+    "messages": ("id", "tenant_id", "conversation_id", "user_id", "content", "message_type", "ai_model",
+                 "tokens_used", "user_feedback", "created_at"),
+}
+
+
+@dataclass
+class Spec:
+    tenants: int
+    users: int
+    conversations: int
+    mean_messages: float
+    days: int
+    until: date
+    seed: int
+    zipf: float = 1.1
+
+
+@dataclass
+class IdRange:
+    """Block of ids reserved from a table's sequence"""
+    first: int
+    count: int
+    used: int = field(default=0)
+
+    def next(self) -> int:
+        if self.used >= self.count:
+            raise RuntimeError("Reserved id range exhausted")
+        self.used += 1
+        return self.first + self.used - 1
+
+
+def _pick(rng: random.Random, weighted: tuple[tuple[object, int], ...]) -> object:
+    values, weights = zip(*weighted, strict=True)
+    return rng.choices(values, weights)[0]
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words)).capitalize() + "."
+
+
+def _timestamp(rng: random.Random, spec: Spec) -> datetime:
+    """Uniform day, daytime-weighted hour"""
+    day = datetime.combine(spec.until, datetime.min.time()) - timedelta(days=rng.randrange(spec.days) + 1)
+    hour = min(23, max(0, int(rng.gauss(14, 4))))
+    return day + timedelta(hours=hour, seconds=rng.randrange(3600))
+
+
+def _thread_length(rng: random.Random, mean: float) -> int:
+    """Log-normal with the requested mean, at least one exchange"""
+    sigma = 1.0
+    mu = math.log(mean) - sigma ** 2 / 2
+    return max(2, int(rng.lognormvariate(mu, sigma)))
+
+
+class Generator:
+    """
+    Produces rows table by table from one seeded RNG
+
+    Tenant weights and id blocks are fixed up front, so each table is a single
+    pass with no lookups back into the database.
+    """
+
+    def __init__(self, spec: Spec, ids: dict[str, IdRange]) -> None:
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        self.ids = ids
+        self.tenant_ids = [ids["tenants"].first + i for i in range(spec.tenants)]
+        self.weights = [1 / (rank + 1) ** spec.zipf for rank in range(spec.tenants)]
+        self.users_by_tenant: dict[int, list[int]] = {tenant_id: [] for tenant_id in self.tenant_ids}
+        self.conversations: list[tuple[int, int, int | None, datetime, int]] = []
+
+    def tenants(self) -> Iterator[tuple[object, ...]]:
+        for index, tenant_id in enumerate(self.tenant_ids):
+            slug = f"{SLUG_PREFIX}-{self.spec.seed}-{index:04d}"
+            yield tenant_id, f"Benchmark tenant {index}", slug, True, self.spec.until - timedelta(days=self.spec.days + 30)
+
+    def users(self) -> Iterator[tuple[object, ...]]:
+        tenants = self.rng.choices(self.tenant_ids, self.weights, k=self.spec.users)
+        for tenant_id in tenants:
+            user_id = self.ids["users"].next()
+            self.users_by_tenant[tenant_id].append(user_id)
+            role = UserRole.SUPPORT_AGENT if self.rng.random() < 0.02 else UserRole.USER
+            yield (user_id, tenant_id, f"user{user_id}@bench.example", f"user{user_id}", f"Bench User {user_id}",
+                   True, role, self.spec.until - timedelta(days=self.spec.days + 10))
+
+    def conversations_rows(self) -> Iterator[tuple[object, ...]]:
+        tenants = self.rng.choices(self.tenant_ids, self.weights, k=self.spec.conversations)
+        for tenant_id in tenants:
+            rng = self.rng
+            conversation_id = self.ids["conversations"].next()
+            users = self.users_by_tenant[tenant_id]
+            user_id = rng.choice(users) if users and rng.random() < 0.7 else None   # 30% anonymous widget chats
+            created_at = _timestamp(rng, self.spec)
+            length = _thread_length(rng, self.spec.mean_messages)
+            updated_at = created_at + timedelta(seconds=45 * length)
+            status = _pick(rng, STATUSES)
+            closed_at = resolution = satisfaction = None
+            if status == ConversationStatus.CLOSED:
+                closed_at = updated_at + timedelta(minutes=rng.expovariate(1 / 30))
+                resolution = int((closed_at - created_at).total_seconds() // 60)
+                satisfaction = rng.choices((1, 2, 3, 4, 5), (5, 5, 15, 35, 40))[0] if rng.random() < 0.4 else None
+            self.conversations.append((conversation_id, tenant_id, user_id, created_at, length))
+            yield (conversation_id, tenant_id, user_id, f"bench-{conversation_id}", _sentence(rng, 4)[:200],
+                   _pick(rng, CONVERSATION_TYPES), _pick(rng, CHANNELS), status, resolution, satisfaction,
+                   created_at, updated_at, closed_at)
+
+    def messages(self) -> Iterator[tuple[object, ...]]:
+        rng = self.rng
+        for conversation_id, tenant_id, user_id, created_at, length in self.conversations:
+            for position in range(length):
+                moment = created_at + timedelta(seconds=45 * position + rng.randrange(30))
+                if position % 2 == 0:
+                    yield (self.ids["messages"].next(), tenant_id, conversation_id, user_id,
+                           _sentence(rng, rng.randint(4, 25)), MessageType.USER, None, None, None, moment)
+                else:
+                    roll = rng.random()
+                    feedback = UserFeedback.THUMBS_UP if roll < 0.08 else UserFeedback.THUMBS_DOWN if roll < 0.10 else None
+                    yield (self.ids["messages"].next(), tenant_id, conversation_id, None,
+                           _sentence(rng, rng.randint(15, 80)), MessageType.ASSISTANT, _pick(rng, MODELS),
+                           rng.randint(80, 1200), feedback, moment)
+
+
+def _copy(raw_connection: object, table: str, rows: Iterator[tuple[object, ...]], chunk: int) -> int:
+    """COPY rows in CSV chunks; returns the row count"""
+    # Database column names come from the models: with ENUM_STORAGE=smallint the enum
+    # columns are <name>_code and take the codes instead of the labels
+    model_columns = [Base.metadata.tables[table].c[key] for key in COLUMNS[table]]
+    columns = ", ".join(column.name for column in model_columns)
+    encoders = [column.type if isinstance(column.type, CodedEnum) else None for column in model_columns]
+    statement = f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)"
+    cursor = raw_connection.cursor()  # type: ignore[attr-defined]
+    total = 0
+    while True:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        count = 0
+        for row in rows:
+            # Enum members are str subclasses: write their value, and NULL as an empty unquoted field
+            writer.writerow([
+                "" if value is None else encoder.process_bind_param(value, None) if encoder else getattr(value, "value", value)
+                for encoder, value in zip(encoders, row, strict=True)
+            ])
+            count += 1
+            if count >= chunk:
+                break
+        if not count:
+            return total
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+        total += count
+
+
+def _reserve(connection: object, table: str, count: int) -> IdRange:
+    """Advance the table's id sequence by count in one statement and hand out the block"""
+    sequence = connection.scalar(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": table})  # type: ignore[attr-defined]
+    last = connection.scalar(  # type: ignore[attr-defined]
+        text("SELECT setval(CAST(:s AS regclass), nextval(CAST(:s AS regclass)) + :n - 1)"), {"s": sequence, "n": count}
+    )
+    return IdRange(last - count + 1, count)
+
+
+def _sync_url() -> str:
+    url = os.getenv("DATABASE_URL_SYNC") or os.getenv("DATABASE_URL", "").replace("postgresql+asyncpg://", "postgresql://")
+    if not url:
+        raise click.UsageError("DATABASE_URL_SYNC is not set")
+    return url
+
+
+def load(spec: Spec, chunk: int) -> dict[str, object]:
+    engine = create_engine(_sync_url())
+    with engine.begin() as connection:
+        exists = connection.scalar(text("SELECT count(*) FROM tenants WHERE slug LIKE :p"),
+                                   {"p": f"{SLUG_PREFIX}-{spec.seed}-%"})
+        if exists:
+            raise click.UsageError(f"Seed {spec.seed} is already loaded - run `drop` first")
+        ids = {
+            "tenants": _reserve(connection, "tenants", spec.tenants),
+            "users": _reserve(connection, "users", spec.users),
+            "conversations": _reserve(connection, "conversations", spec.conversations),
+        }
+        # Messages get their block once the thread lengths are known
+        # Monthly partitions for the whole range - long threads may run into the month after --until
+        month = month_start(spec.until - timedelta(days=spec.days + 1))
+        while month <= add_months(month_start(spec.until), 1):
+            create_partition(connection, "messages", month)
+            month = add_months(month, 1)
+
+    generator = Generator(spec, ids)
+    counts: dict[str, int] = {}
+    timings: dict[str, float] = {}
+    raw = engine.raw_connection()
+    try:
+        for table, rows in (("tenants", generator.tenants()), ("users", generator.users()),
+                            ("conversations", generator.conversations_rows())):
+            started = time.perf_counter()
+            counts[table] = _copy(raw, table, rows, chunk)
+            timings[table] = time.perf_counter() - started
+        raw.commit()
+
+        total_messages = sum(length for *_, length in generator.conversations)
+        with engine.begin() as connection:
+            ids["messages"] = _reserve(connection, "messages", total_messages)
+        started = time.perf_counter()
+        counts["messages"] = _copy(raw, "messages", generator.messages(), chunk)
+        timings["messages"] = time.perf_counter() - started
+        raw.commit()
+    finally:
+        raw.close()
+
+    with engine.connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT")
+        for table in COLUMNS:
+            connection.execute(text(f"ANALYZE {table}"))
+    return {
+        "rows": counts,
+        "copy_seconds": {table: round(seconds, 2) for table, seconds in timings.items()},
+        "rows_per_second": round(sum(counts.values()) / sum(timings.values())),
+        "largest_tenant_share": round(max(generator.weights) / sum(generator.weights), 3),
+    }
+
+
+@click.group()
+def main() -> None:
+    """Synthetic multi-tenant data for benchmarks"""
+
+
+@main.command("load")
+@click.option("--tenants", default=50, show_default=True)
+@click.option("--users", default=20_000, show_default=True)
+@click.option("--conversations", default=100_000, show_default=True)
+@click.option("--mean-messages", default=12.0, show_default=True, help="Mean thread length (log-normal)")
+@click.option("--days", default=180, show_default=True, help="History length")
+@click.option("--until", type=click.DateTime(["%Y-%m-%d"]), default="2026-01-01", show_default=True,
+              help="End of the history - fixed by default so runs are comparable")
+@click.option("--seed", default=42, show_default=True)
+@click.option("--chunk", default=50_000, show_default=True, help="Rows per COPY statement")
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write JSON results here")
+def load_command(
+    tenants: int, users: int, conversations: int, mean_messages: float, days: int, until: datetime,
+    seed: int, chunk: int, output: str | None,
+) -> None:
+    """Generate and COPY a dataset (tenants, users, conversations, messages)"""
+    spec = Spec(tenants, users, conversations, mean_messages, days, until.date(), seed)
+    started = time.perf_counter()
+    report = load(spec, chunk)
+    parameters = {key: str(value) if isinstance(value, date) else value for key, value in spec.__dict__.items()}
+    emit({"benchmark": "generate", "parameters": parameters, **report,
+          "total_seconds": round(time.perf_counter() - started, 1)}, output)
+
+
+@main.command()
+@click.option("--seed", type=int, default=None, help="Only the dataset of this seed (default: all)")
+def drop(seed: int | None) -> None:
+    """Delete generated tenants and everything that belongs to them"""
+    pattern = f"{SLUG_PREFIX}-{seed}-%" if seed is not None else f"{SLUG_PREFIX}-%"
+    with create_engine(_sync_url()).begin() as connection:
+        tenant_ids = list(connection.scalars(text("SELECT id FROM tenants WHERE slug LIKE :p"), {"p": pattern}))
+        if not tenant_ids:
+            click.echo("Nothing to drop")
+            return
+        deleted = {}
+        # Children first - there are no ON DELETE CASCADE foreign keys
+        for table in ("message_rollups", "conversation_rollups", "archive_batches",
+                      "messages", "conversations", "users", "tenants"):
+            column = "id" if table == "tenants" else "tenant_id"
+            deleted[table] = connection.execute(
+                text(f"DELETE FROM {table} WHERE {column} = ANY(:ids)"), {"ids": tenant_ids}
+            ).rowcount
+    click.echo(json.dumps(deleted))
+
+
+if __name__ == "__main__":
+    main()
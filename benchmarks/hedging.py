@@ -0,0 +1,196 @@
+# benchmarks/hedging.py
+# Tail latency of the pooled provider during provider brown-outs, hedging off vs on:
+# two mock upstreams (benchmarks/mock_provider.py) run in-process, the primary with
+# injected stalls or errors, the backup healthy
+#
+# Usage:
+#   python -m benchmarks.hedging --requests 2000 --concurrency 20 --output hedging.json
+#   python -m benchmarks.hedging --profiles brownout --slow-rate 0.1 --slow-delay 5
+#
+# Profiles (primary upstream):
+#   brownout - slow_rate of the requests stall slow_delay seconds before their first token
+#   errors   - error_rate of the requests fail with 503 (retried on the backup)
+#   outage   - every request fails; the circuit breaker takes the primary out of rotation
+#
+# With error_rate above the retry budget (LLM_RETRY_BUDGET, 10% by default) some
+# failures reach the caller - that is the budget keeping retries from doubling load.
+#
+# The hedge delay comes from the primary's own p95, so the first MIN_HEDGE_SAMPLES
+# requests of a run hedge after --hedge-max-delay; --warmup requests are untimed.
+
+import asyncio
+import statistics
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from typing import Any
+
+import click
+
+from packages.core.provider_client import (
+    PooledProvider,
+    RetryBudget,
+    Upstream,
+    attempts_counter,
+)
+
+from .mock_provider import Faults, MockProvider
+from .results import emit
+
+PROFILES = ("brownout", "errors", "outage")
+
+
+def _quantiles_ms(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    q = statistics.quantiles(ordered, n=100) if len(ordered) > 1 else ordered * 99
+    return {"p50": round(q[49] * 1000, 3), "p95": round(q[94] * 1000, 3), "p99": round(q[98] * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3)}
+
+
+@asynccontextmanager
+async def serve(provider: MockProvider) -> AsyncIterator[str]:
+    """Run a mock upstream on a free port for the duration of the block; yields its base URL"""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(provider.app(), host="127.0.0.1", port=0, log_level="warning", lifespan="off"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{server.servers[0].sockets[0].getsockname()[1]}/v1"
+    finally:
+        server.should_exit = True
+        await task
+
+
+async def drive(provider: PooledProvider, requests: int, concurrency: int, timeout: float) -> dict[str, Any]:
+    """Closed loop of streamed completions: time to first chunk and to the last one"""
+    first_chunk: list[float] = []
+    total: list[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal errors, next_index
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            messages = [{"role": "user", "content": f"Where is my order {index}?"}]
+            started = time.perf_counter()
+            seen = False
+            try:
+                async for chunk in provider.stream("gpt-4o-mini", messages, deadline=time.monotonic() + timeout):
+                    if chunk.text and not seen:
+                        first_chunk.append(time.perf_counter() - started)
+                        seen = True
+                total.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"requests": requests, "errors": errors, "first_token_ms": _quantiles_ms(first_chunk), "total_ms": _quantiles_ms(total)}
+
+
+async def run_profile(
+    profile: str, hedge: bool, faults: Faults, requests: int, warmup: int, concurrency: int,
+    hedge_max_delay: float, timeout: float, seed: int,
+) -> dict[str, Any]:
+    primary_faults = {
+        "brownout": replace(faults, error_rate=0.0),
+        "errors": replace(faults, slow_rate=0.0),
+        "outage": replace(faults, slow_rate=0.0, error_rate=1.0),
+    }[profile]
+    backup_faults = Faults(first_token_delay=faults.first_token_delay)
+    primary, backup = MockProvider(primary_faults, seed), MockProvider(backup_faults, seed + 1)
+    # Names are unique per run: the p95 that drives hedging must not carry over between runs
+    mode = "hedged" if hedge else "single"
+    names = (f"{profile}-{mode}-primary", f"{profile}-{mode}-backup")
+    async with serve(primary) as primary_url, serve(backup) as backup_url:
+        provider = PooledProvider(
+            [Upstream(names[0], primary_url), Upstream(names[1], backup_url)],
+            hedge=hedge,
+            hedge_max_delay=hedge_max_delay,
+            retry_budget=RetryBudget(),
+        )
+        try:
+            if warmup:
+                await drive(provider, warmup, concurrency, timeout)
+            before = {key: attempts_counter.value(**dict(key)) for key in _attempt_keys(names)}
+            result = await drive(provider, requests, concurrency, timeout)
+            attempts = {
+                "_".join(value for _, value in key): int(attempts_counter.value(**dict(key)) - before[key])
+                for key in _attempt_keys(names)
+            }
+        finally:
+            await provider.aclose()
+    return {
+        "name": f"{profile}_{mode}",
+        **result,
+        "attempts": {key: count for key, count in attempts.items() if count},
+        "primary": primary.counters,
+        "backup": backup.counters,
+    }
+
+
+def _attempt_keys(names: tuple[str, ...]) -> list[tuple[tuple[str, str], ...]]:
+    return [
+        (("upstream", name), ("kind", kind), ("outcome", outcome))
+        for name in names for kind in ("primary", "hedge", "retry") for outcome in ("won", "lost", "failed")
+    ]
+
+
+async def run(profiles: list[str], faults: Faults, **options: Any) -> list[dict[str, Any]]:
+    results = []
+    for profile in profiles:
+        for hedge in (False, True):
+            result = await run_profile(profile, hedge, faults, **options)
+            first, total = result["first_token_ms"], result["total_ms"]
+            click.echo(
+                f"{result['name']:<18} first token p50={first.get('p50')}ms p99={first.get('p99')}ms  "
+                f"total p99={total.get('p99')}ms errors={result['errors']} attempts={result['attempts']}",
+                err=True,
+            )
+            results.append(result)
+    return results
+
+
+@click.command()
+@click.option("--profiles", default=",".join(PROFILES), show_default=True, help=f"Comma-separated: {', '.join(PROFILES)}")
+@click.option("--requests", default=1000, show_default=True, help="Timed requests per run")
+@click.option("--warmup", default=100, show_default=True, help="Untimed requests before each run (fills the p95 window)")
+@click.option("--concurrency", default=20, show_default=True, help="Requests in flight at once")
+@click.option("--first-token-delay", default=0.05, show_default=True, help="Both upstreams, seconds")
+@click.option("--slow-rate", default=0.05, show_default=True, help="brownout: share of stalled primary requests")
+@click.option("--slow-delay", default=2.0, show_default=True, help="brownout: seconds a stall adds")
+@click.option("--error-rate", default=0.2, show_default=True, help="errors: share of failing primary requests")
+@click.option("--hedge-max-delay", default=1.0, show_default=True, help="Hedge delay until the p95 is known")
+@click.option("--timeout", default=30.0, show_default=True, help="Deadline per request, seconds")
+@click.option("--seed", default=42, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write JSON results here")
+def main(
+    profiles: str, requests: int, warmup: int, concurrency: int, first_token_delay: float, slow_rate: float,
+    slow_delay: float, error_rate: float, hedge_max_delay: float, timeout: float, seed: int, output: str | None,
+) -> None:
+    """First-token and total latency percentiles of the pooled provider, hedging off vs on"""
+    selected = [name.strip() for name in profiles.split(",") if name.strip()]
+    unknown = set(selected) - set(PROFILES)
+    if unknown:
+        raise click.UsageError(f"Unknown profiles: {', '.join(sorted(unknown))}")
+    faults = Faults(first_token_delay=first_token_delay, slow_rate=slow_rate, slow_delay=slow_delay, error_rate=error_rate)
+    results = asyncio.run(run(
+        selected, faults, requests=requests, warmup=warmup, concurrency=concurrency,
+        hedge_max_delay=hedge_max_delay, timeout=timeout, seed=seed,
+    ))
+    parameters = {
+        "profiles": selected, "requests": requests, "warmup": warmup, "concurrency": concurrency,
+        "first_token_delay": first_token_delay, "slow_rate": slow_rate, "slow_delay": slow_delay,
+        "error_rate": error_rate, "hedge_max_delay": hedge_max_delay, "timeout": timeout, "seed": seed,
+    }
+    emit({"benchmark": "hedging", "parameters": parameters, "scenarios": results}, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# benchmarks/history.py
+# Conversation history reads: lazy-load style (N+1, full histories) vs. HistoryRepository
+# (keyset pages, one LATERAL query, row-tuple mode) on a large seeded messages table
+#
+# Usage (DATABASE_URL must be able to INSERT - seeding bypasses the app user on purpose):
+#   python -m benchmarks.history seed --conversations 100000 --messages-per-conversation 100   # 10M messages
+#   python -m benchmarks.history run --repeat 50 --output history.json
+#
+# Seeding runs entirely server-side (INSERT ... SELECT generate_series), so 10M rows
+# take minutes, not the hours a Python insert loop would need.
+
+import asyncio
+import os
+import random
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import click
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from packages.core.history import HistoryRepository
+from packages.core.models import Conversation, Message, Tenant
+
+from .results import emit
+
+BENCH_TENANT_SLUG = "bench-history"
+
+SEED_CONVERSATIONS_SQL = text("""
+    INSERT INTO conversations (tenant_id, session_id, title, conversation_type, channel, status, created_at, updated_at)
+    SELECT :tenant_id, 'bench-' || g, 'Benchmark conversation ' || g,
+           (ARRAY['support','billing','technical','sales','general'])[1 + g % 5],
+           (ARRAY['web','mobile_app','email','telegram','whatsapp'])[1 + g % 5],
+           (ARRAY['active','pending','closed'])[1 + g % 3],
+           TIMESTAMP '2025-01-01' + g * INTERVAL '1 minute',
+           TIMESTAMP '2025-01-01' + g * INTERVAL '1 minute'
+    FROM generate_series(1, :conversations) AS g
+""")
+
+# One chunk of conversations per statement keeps each transaction (and its WAL) bounded
+SEED_MESSAGES_SQL = text("""
+    INSERT INTO messages (tenant_id, conversation_id, content, message_type, ai_model, tokens_used, created_at)
+    SELECT c.tenant_id, c.id,
+           'Benchmark message ' || m || ' in conversation ' || c.id || ': ' || repeat('lorem ipsum ', 1 + m % 20),
+           CASE WHEN m % 2 = 1 THEN 'user' ELSE 'assistant' END,
+           CASE WHEN m % 2 = 0 THEN 'gpt-4o-mini' END,
+           CASE WHEN m % 2 = 0 THEN 50 + m % 300 END,
+           c.created_at + m * INTERVAL '30 seconds'
+    FROM conversations AS c
+    CROSS JOIN generate_series(1, :per_conversation) AS m
+    WHERE c.tenant_id = :tenant_id AND c.id BETWEEN :first_id AND :last_id
+""")
+
+
+def _async_url() -> str:
+    url = os.getenv("DATABASE_URL", "")
+    if not url:
+        raise click.UsageError("DATABASE_URL is not set")
+    return url
+
+
+async def seed(conversations: int, per_conversation: int, chunk: int) -> dict[str, object]:
+    engine = create_async_engine(_async_url())
+    started = time.perf_counter()
+    async with engine.begin() as connection:
+        tenant_id = await connection.scalar(select(Tenant.id).where(Tenant.slug == BENCH_TENANT_SLUG))
+        if tenant_id is not None:
+            raise click.UsageError(f"Tenant '{BENCH_TENANT_SLUG}' already exists - benchmark data is seeded")
+        tenant_id = await connection.scalar(
+            Tenant.__table__.insert()
+            .values(name="History benchmark", slug=BENCH_TENANT_SLUG, is_active=True, created_at=func.now())
+            .returning(Tenant.id)
+        )
+        await connection.execute(SEED_CONVERSATIONS_SQL, {"tenant_id": tenant_id, "conversations": conversations})
+        first_id, last_id = (await connection.execute(
+            select(func.min(Conversation.id), func.max(Conversation.id)).where(Conversation.tenant_id == tenant_id)
+        )).one()
+
+    for start in range(first_id, last_id + 1, chunk):
+        async with engine.begin() as connection:
+            await connection.execute(SEED_MESSAGES_SQL, {
+                "tenant_id": tenant_id, "per_conversation": per_conversation,
+                "first_id": start, "last_id": min(start + chunk - 1, last_id),
+            })
+        click.echo(f"  conversations {start}..{min(start + chunk - 1, last_id)} seeded", err=True)
+
+    async with engine.begin() as connection:
+        await connection.execute(text("ANALYZE conversations"))
+        await connection.execute(text("ANALYZE messages"))
+    await engine.dispose()
+    return {
+        "tenant_id": tenant_id,
+        "conversations": conversations,
+        "messages": conversations * per_conversation,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+
+
+# --- Baselines: what the lazy="select" relationships used to do ---
+
+async def naive_conversation_list(session: AsyncSession, tenant_id: int, limit: int) -> list[Any]:
+    """Page of conversations, then each one's full ordered history to find its latest message (N+1)"""
+    conversations = (await session.scalars(
+        select(Conversation).where(Conversation.tenant_id == tenant_id)
+        .order_by(Conversation.created_at.desc()).limit(limit)
+    )).all()
+    result = []
+    for conversation in conversations:
+        messages = (await session.scalars(
+            select(Message).where(Message.conversation_id == conversation.id).order_by(Message.created_at)
+        )).all()
+        result.append((conversation, messages[-1] if messages else None))
+    return result
+
+
+async def naive_last_messages(session: AsyncSession, conversation_id: int, limit: int) -> list[Any]:
+    """conversation.messages[-limit:] - the whole history is loaded to show its tail"""
+    messages = (await session.scalars(
+        select(Message).where(Message.conversation_id == conversation_id).order_by(Message.created_at)
+    )).all()
+    return list(messages[-limit:])
+
+
+async def measure(
+    factory: async_sessionmaker[AsyncSession],
+    repeat: int,
+    call: Callable[[AsyncSession], Awaitable[Any]],
+) -> dict[str, float]:
+    """Fresh session per call (no identity-map reuse), latency percentiles in ms"""
+    timings = []
+    for _ in range(repeat):
+        async with factory() as session:
+            started = time.perf_counter()
+            await call(session)
+            timings.append((time.perf_counter() - started) * 1000)
+    q = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+    return {"p50": round(q[49], 3), "p95": round(q[94], 3), "mean": round(statistics.fmean(timings), 3)}
+
+
+async def run(repeat: int, page_size: int, list_size: int, seed_value: int) -> dict[str, object]:
+    engine = create_async_engine(_async_url())
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with factory() as session:
+        tenant_id = await session.scalar(select(Tenant.id).where(Tenant.slug == BENCH_TENANT_SLUG))
+        if tenant_id is None:
+            raise click.UsageError("No benchmark data - run `python -m benchmarks.history seed` first")
+        conversation_ids = (await session.scalars(
+            select(Conversation.id).where(Conversation.tenant_id == tenant_id).limit(10_000)
+        )).all()
+        total_messages = await session.scalar(select(func.count()).select_from(Message).where(Message.tenant_id == tenant_id))
+
+    rng = random.Random(seed_value)
+
+    def repo(session: AsyncSession) -> HistoryRepository:
+        return HistoryRepository(session)
+
+    results = {
+        "last_messages": {
+            "naive_full_history": await measure(factory, repeat, lambda s: naive_last_messages(s, rng.choice(conversation_ids), page_size)),
+            "keyset_orm": await measure(factory, repeat, lambda s: repo(s).last_messages(rng.choice(conversation_ids), page_size)),
+            "keyset_rows": await measure(factory, repeat, lambda s: repo(s).last_messages(rng.choice(conversation_ids), page_size, rows=True)),
+        },
+        "conversation_list": {
+            "naive_n_plus_1": await measure(factory, repeat, lambda s: naive_conversation_list(s, tenant_id, list_size)),
+            "lateral_orm": await measure(factory, repeat, lambda s: repo(s).conversations_with_latest_message(tenant_id, list_size)),
+            "lateral_rows": await measure(factory, repeat, lambda s: repo(s).conversations_with_latest_message(tenant_id, list_size, rows=True)),
+        },
+    }
+
+    # Deep pagination: walking back 10 pages costs the same per page with a keyset cursor
+    async def walk_pages(session: AsyncSession) -> None:
+        history, cursor = repo(session), None
+        for _ in range(10):
+            page = await history.conversations_with_latest_message(tenant_id, list_size, before=cursor, rows=True)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+
+    results["conversation_list"]["lateral_rows_10_pages"] = await measure(factory, max(1, repeat // 5), walk_pages)
+    await engine.dispose()
+    return {
+        "benchmark": "history",
+        "messages_in_tenant": total_messages,
+        "page_size": page_size,
+        "list_size": list_size,
+        "repeat": repeat,
+        "latency_ms": results,
+    }
+
+
+@click.group()
+def main() -> None:
+    """History read benchmark: N+1/full loads vs. keyset + LATERAL queries"""
+
+
+@main.command("seed")
+@click.option("--conversations", default=100_000, show_default=True)
+@click.option("--messages-per-conversation", "per_conversation", default=100, show_default=True)
+@click.option("--chunk", default=5_000, show_default=True, help="Conversations per INSERT statement")
+def seed_command(conversations: int, per_conversation: int, chunk: int) -> None:
+    """Seed a dedicated benchmark tenant (default 10M messages)"""
+    emit({"benchmark": "history_seed", **asyncio.run(seed(conversations, per_conversation, chunk))}, None)
+
+
+@main.command("run")
+@click.option("--repeat", default=50, show_default=True, help="Calls per variant")
+@click.option("--page-size", default=50, show_default=True, help="Messages per history page")
+@click.option("--list-size", default=20, show_default=True, help="Conversations per list page")
+@click.option("--seed", "seed_value", default=0, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write JSON results here")
+def run_command(repeat: int, page_size: int, list_size: int, seed_value: int, output: str | None) -> None:
+    """Latency of each read strategy against the seeded tenant"""
+    emit(asyncio.run(run(repeat, page_size, list_size, seed_value)), output)
+
+
+if __name__ == "__main__":
+    main()
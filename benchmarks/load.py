@@ -0,0 +1,175 @@
+# benchmarks/load.py
+# In-process load driver for the customer-support app: every endpoint scenario is
+# driven through httpx.ASGITransport, so the numbers measure the app, not a network
+#
+# Usage:
+#   python -m benchmarks.load --scenarios health,chat --requests 5000 --concurrency 100 --output load.json
+#   python -m benchmarks.load --scenarios analytics_tokens,analytics_channels --tenant-id 2   # needs DATABASE_URL_APP
+#
+# The LLM provider is always the offline FakeProvider; --provider-delay adds a
+# simulated first-token latency. Chat prompts come from a seeded pool, so the
+# cache hit pattern is the same in every run with the same parameters.
+
+import asyncio
+import os
+import random
+import statistics
+import time
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+import click
+
+from .results import emit
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    method: str
+    path: str
+    needs_database: bool = False
+    body: Callable[[random.Random, int], dict[str, Any]] | None = None
+
+
+def _chat_body(prompts: list[str], run_id: str) -> Callable[[random.Random, int], dict[str, Any]]:
+    def body(rng: random.Random, index: int) -> dict[str, Any]:
+        # Ten turns per session, like a short support chat
+        return {"message": rng.choice(prompts), "session_id": f"load-{run_id}-{index // 10}"}
+    return body
+
+
+def scenarios(distinct_prompts: int, seed: int) -> dict[str, Scenario]:
+    prompt_rng = random.Random(seed)
+    topics = ("reset my password", "change my plan", "cancel the order", "update billing", "export my data")
+    prompts = [f"How do I {prompt_rng.choice(topics)}? (case {i})" for i in range(distinct_prompts)]
+    run_id = uuid.uuid4().hex[:8]
+    return {scenario.name: scenario for scenario in (
+        Scenario("root", "GET", "/"),
+        Scenario("health", "GET", "/health"),
+        Scenario("metrics", "GET", "/metrics"),
+        Scenario("chat", "POST", "/api/v1/chat?format=ndjson", body=_chat_body(prompts, run_id)),
+        Scenario("analytics_tokens", "GET", "/api/v1/analytics/tokens?granularity=day", needs_database=True),
+        Scenario("analytics_feedback", "GET", "/api/v1/analytics/feedback?granularity=day", needs_database=True),
+        Scenario("analytics_channels", "GET", "/api/v1/analytics/channels?granularity=day", needs_database=True),
+    )}
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict[str, Any]:
+    ordered = sorted(latencies)
+    q = statistics.quantiles(ordered, n=100) if len(ordered) > 1 else ordered * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(q[49] * 1000, 3),
+            "p95": round(q[94] * 1000, 3),
+            "p99": round(q[98] * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3),
+        },
+    }
+
+
+async def drive(client: Any, scenario: Scenario, requests: int, concurrency: int, tenant_id: int, seed: int) -> dict[str, Any]:
+    """Closed loop: `concurrency` workers send back-to-back requests until `requests` are done"""
+    rng = random.Random(seed)
+    bodies = [scenario.body(rng, i) if scenario.body else None for i in range(requests)]
+    headers = {"x-tenant-id": str(tenant_id)}
+    latencies: list[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal errors, next_index
+        while next_index < requests:
+            body = bodies[next_index]
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, scenario.path, json=body, headers=headers)
+                # Streamed chat errors arrive as an event inside a 200 response
+                if response.status_code >= 400 or '"type":"error"' in response.text:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"name": scenario.name, **summarize(latencies, errors, time.perf_counter() - started)}
+
+
+async def run(
+    names: list[str], requests: int, concurrency: int, warmup: int, tenant_id: int,
+    distinct_prompts: int, provider_delay: float, seed: int,
+) -> list[dict[str, Any]]:
+    import httpx
+
+    from apps.customer_support.main import app, chat_pipeline, history_buffer
+    from packages.core.database import dispose_engine
+    from packages.core.providers import FakeProvider
+
+    chat_pipeline.provider = FakeProvider(first_token_delay=provider_delay)
+    available = scenarios(distinct_prompts, seed)
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=60) as client:
+        for name in names:
+            scenario = available[name]
+            if scenario.needs_database and not os.getenv("DATABASE_URL_APP"):
+                click.echo(f"{name}: skipped, DATABASE_URL_APP is not set", err=True)
+                continue
+            if warmup:
+                # Imports, pool connections, prepared statements and caches settle before timing
+                await drive(client, scenario, warmup, min(concurrency, warmup), tenant_id, seed + 1)
+            result = await drive(client, scenario, requests, concurrency, tenant_id, seed)
+            if history_buffer is not None:
+                await history_buffer.drain()
+            latency = result["latency_ms"]
+            click.echo(
+                f"{name:<20} {result['throughput_rps']:>9,.1f} rps  p50={latency['p50']}ms "
+                f"p95={latency['p95']}ms p99={latency['p99']}ms errors={result['errors']}",
+                err=True,
+            )
+            results.append(result)
+    await dispose_engine()
+    return results
+
+
+@click.command()
+@click.option("--scenarios", "names", default="health,chat", show_default=True,
+              help="Comma-separated: root, health, metrics, chat, analytics_tokens, analytics_feedback, analytics_channels")
+@click.option("--requests", default=2000, show_default=True, help="Timed requests per scenario")
+@click.option("--concurrency", default=50, show_default=True, help="Requests in flight at once")
+@click.option("--warmup", default=200, show_default=True, help="Untimed requests before each scenario")
+@click.option("--tenant-id", default=1, show_default=True, help="X-Tenant-ID of every request")
+@click.option("--distinct-prompts", default=500, show_default=True, help="Size of the chat prompt pool")
+@click.option("--provider-delay", default=0.0, show_default=True, help="Simulated first-token latency (seconds)")
+@click.option("--seed", default=42, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write JSON results here")
+def main(
+    names: str, requests: int, concurrency: int, warmup: int, tenant_id: int,
+    distinct_prompts: int, provider_delay: float, seed: int, output: str | None,
+) -> None:
+    """Throughput and latency percentiles of the customer-support endpoints"""
+    os.environ["LLM_PROVIDER"] = "fake"
+    # Every request comes from one tenant - measure the app, not the per-tenant rate limit
+    os.environ.setdefault("ENABLE_RATE_LIMITING", "false")
+    selected = [name.strip() for name in names.split(",") if name.strip()]
+    unknown = set(selected) - set(scenarios(1, seed))
+    if unknown:
+        raise click.UsageError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    results = asyncio.run(run(selected, requests, concurrency, warmup, tenant_id, distinct_prompts, provider_delay, seed))
+    parameters = {
+        "scenarios": selected, "requests": requests, "concurrency": concurrency, "warmup": warmup,
+        "tenant_id": tenant_id, "distinct_prompts": distinct_prompts, "provider_delay": provider_delay, "seed": seed,
+        "database": bool(os.getenv("DATABASE_URL_APP")),
+    }
+    emit({"benchmark": "load", "parameters": parameters, "scenarios": results}, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# benchmarks/micro.py
+# Micro-benchmarks for the model and enum layers - the per-row/per-request Python work
+# that sits under every chat turn and history page, measured without a database
+#
+# Usage:
+#   python -m benchmarks.micro --output micro.json
+#   python -m benchmarks.micro --filter enum --repeat 9
+#
+# Each case reports the best (ns_per_op) and median ns/op over --repeat timing rounds;
+# the minimum is the least noisy number to compare between commits.
+
+import json
+import statistics
+import timeit
+from collections.abc import Callable
+from datetime import datetime
+
+import click
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql
+
+from packages.core.chat import ChatRequest, ChatTurn
+from packages.core.enums import (
+    ChannelType,
+    ConversationStatus,
+    MessageType,
+    UserFeedback,
+    get_enum_values,
+)
+from packages.core.history import MESSAGE_COLUMNS, Cursor
+from packages.core.models import Conversation, Message, utc_now
+from packages.core.persistence import message_rows
+
+from .results import emit
+
+DIALECT = postgresql.dialect()
+
+
+def _turn() -> ChatTurn:
+    turn = ChatTurn(
+        tenant_id=1,
+        request=ChatRequest(message="How do I reset my password?", session_id="micro"),
+        model="gpt-4o-mini",
+    )
+    turn.parts = ["You can ", "reset it ", "from the login page."]
+    turn.prompt_tokens, turn.completion_tokens = 40, 12
+    turn.conversation_id = 42
+    return turn
+
+
+def _message_kwargs(index: int) -> dict[str, object]:
+    return {
+        "tenant_id": 1,
+        "conversation_id": 42,
+        "content": f"message {index}",
+        "message_type": MessageType.ASSISTANT,
+        "ai_model": "gpt-4o-mini",
+        "tokens_used": 52,
+        "created_at": datetime(2026, 1, 1),
+    }
+
+
+def cases() -> dict[str, Callable[[], object]]:
+    """name -> zero-argument callable; setup happens here, outside the timed call"""
+    turn = _turn()
+    rows = [_message_kwargs(i) for i in range(500)]
+    cursor = Cursor(datetime(2026, 1, 1, 12, 30), 123456)
+    token = cursor.encode()
+    page_query = (
+        select(*MESSAGE_COLUMNS)
+        .where(Message.conversation_id == 42)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(51)
+    )
+    return {
+        # Enum layer - value lookups happen for every row read back from the database
+        "enum.lookup_by_value": lambda: MessageType("assistant"),
+        "enum.compare_to_str": lambda: ConversationStatus.CLOSED == "closed",
+        "enum.member_in_tuple": lambda: UserFeedback.THUMBS_UP in (UserFeedback.THUMBS_UP, UserFeedback.THUMBS_DOWN),
+        "enum.values_list": lambda: get_enum_values(ChannelType),
+        "enum.json_dumps": lambda: json.dumps({"channel": ChannelType.WEB, "status": ConversationStatus.ACTIVE}),
+        # Model layer - object construction and statement building without I/O
+        "model.message_construct": lambda: Message(**_message_kwargs(0)),
+        "model.conversation_construct": lambda: Conversation(
+            tenant_id=1, session_id="micro", channel=ChannelType.WEB, created_at=utc_now(), updated_at=utc_now()
+        ),
+        "model.message_rows": lambda: message_rows(turn),
+        "model.utc_now": utc_now,
+        "model.cursor_encode": cursor.encode,
+        "model.cursor_decode": lambda: Cursor.decode(token),
+        # Statement building and compilation - the multi-row VALUES insert is not cacheable
+        "sql.insert_500_rows_compile": lambda: insert(Message.__table__).values(rows).compile(dialect=DIALECT),
+        "sql.history_page_compile": lambda: page_query.compile(dialect=DIALECT),
+        "sql.history_page_build": lambda: (
+            select(*MESSAGE_COLUMNS)
+            .where(Message.conversation_id == 42)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(51)
+        ),
+    }
+
+
+def measure(function: Callable[[], object], repeat: int) -> dict[str, float]:
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()                  # Loops per round so one round takes >= 0.2s
+    rounds = [elapsed / number * 1e9 for elapsed in timer.repeat(repeat=repeat, number=number)]
+    return {"ns_per_op": round(min(rounds), 1), "median": round(statistics.median(rounds), 1), "loops": number}
+
+
+@click.command()
+@click.option("--repeat", default=5, show_default=True, help="Timing rounds per case")
+@click.option("--filter", "name_filter", default="", help="Only cases whose name contains this")
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write JSON results here")
+def main(repeat: int, name_filter: str, output: str | None) -> None:
+    """Time the enum and model layers (no database needed)"""
+    results = []
+    for name, function in cases().items():
+        if name_filter not in name:
+            continue
+        result = {"name": name, **measure(function, repeat)}
+        click.echo(f"{name:<32} {result['ns_per_op']:>12,.1f} ns/op", err=True)
+        results.append(result)
+    emit({"benchmark": "micro", "parameters": {"repeat": repeat, "filter": name_filter}, "cases": results}, output)
+
+
+if __name__ == "__main__":
+    main()
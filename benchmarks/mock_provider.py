@@ -0,0 +1,138 @@
+# benchmarks/mock_provider.py
+# OpenAI-compatible mock LLM provider with injectable latency and errors - tests the
+# pooled provider's hedging, retries and circuit breakers offline, no API keys
+#
+# Usage:
+#   python -m benchmarks.mock_provider --port 9001 --slow-rate 0.05 --slow-delay 3 &
+#   python -m benchmarks.mock_provider --port 9002 &
+#   LLM_PROVIDER=pooled LLM_UPSTREAMS="primary:*:http://127.0.0.1:9001/v1;backup:*:http://127.0.0.1:9002/v1" \
+#       uvicorn apps.customer_support.main:app --port 8000
+#
+#   curl -X POST 127.0.0.1:9001/faults -d '{"error_rate": 0.5}'   # brown-out while traffic runs
+#   curl 127.0.0.1:9001/faults                                      # current faults + counters
+#
+# Faults apply per request: error_rate answers error_status before any chunk,
+# slow_rate adds slow_delay before the first chunk (a stalled provider), and every
+# request waits first_token_delay (+/- jitter) for it. Streams cut off by the client
+# (a lost hedge) are counted as cancelled.
+
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Any
+
+import click
+from starlette.applications import Starlette
+from starlette.requests import ClientDisconnect, Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+
+@dataclass(frozen=True)
+class Faults:
+    """Latency and error profile of a mock provider"""
+    first_token_delay: float = 0.05
+    jitter: float = 0.2                  # Share of first_token_delay, uniform +/-
+    token_delay: float = 0.005
+    tokens: int = 20
+    slow_rate: float = 0.0
+    slow_delay: float = 2.0
+    error_rate: float = 0.0
+    error_status: int = 503
+
+
+class MockProvider:
+    """Request handlers plus the counters /faults reports"""
+
+    def __init__(self, faults: Faults, seed: int | None = None) -> None:
+        self.faults = faults
+        self.random = random.Random(seed)
+        self.counters = {"requests": 0, "errors": 0, "slow": 0, "completed": 0, "cancelled": 0}
+
+    async def completions(self, request: Request) -> Response:
+        self.counters["requests"] += 1
+        try:
+            body = await request.json()
+        except ClientDisconnect:
+            self.counters["cancelled"] += 1
+            return Response(status_code=499)
+        faults = self.faults
+        if self.random.random() < faults.error_rate:
+            self.counters["errors"] += 1
+            return JSONResponse(
+                {"error": {"message": "Injected failure", "type": "server_error"}}, status_code=faults.error_status
+            )
+        delay = faults.first_token_delay * (1 + self.random.uniform(-faults.jitter, faults.jitter))
+        if self.random.random() < faults.slow_rate:
+            self.counters["slow"] += 1
+            delay += faults.slow_delay
+        return StreamingResponse(self._events(body, faults, delay), media_type="text/event-stream")
+
+    async def _events(self, body: dict[str, Any], faults: Faults, delay: float):
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        def event(payload: dict[str, Any]) -> str:
+            base = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": body.get("model")}
+            return f"data: {json.dumps({**base, **payload})}\n\n"
+
+        try:
+            await asyncio.sleep(delay)
+            for index in range(faults.tokens):
+                if index and faults.token_delay:
+                    await asyncio.sleep(faults.token_delay)
+                yield event({"choices": [{"index": 0, "delta": {"content": f"word{index} "}, "finish_reason": None}]})
+            prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": faults.tokens, "total_tokens": prompt_tokens + faults.tokens}
+            yield event({"choices": [], "usage": usage})
+            yield "data: [DONE]\n\n"
+            self.counters["completed"] += 1
+        except asyncio.CancelledError:
+            self.counters["cancelled"] += 1
+            raise
+
+    async def get_faults(self, request: Request) -> Response:
+        return JSONResponse({"faults": asdict(self.faults), "counters": self.counters})
+
+    async def set_faults(self, request: Request) -> Response:
+        """Change the profile at runtime; unknown keys are a 422"""
+        changes = await request.json()
+        known = {f.name for f in fields(Faults)}
+        unknown = set(changes) - known
+        if unknown:
+            return JSONResponse({"detail": f"Unknown faults: {', '.join(sorted(unknown))}"}, status_code=422)
+        self.faults = replace(self.faults, **changes)
+        return JSONResponse({"faults": asdict(self.faults)})
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/v1/chat/completions", self.completions, methods=["POST"]),
+            Route("/faults", self.get_faults, methods=["GET"]),
+            Route("/faults", self.set_faults, methods=["POST"]),
+        ])
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=9001, show_default=True)
+@click.option("--first-token-delay", default=0.05, show_default=True, help="Seconds before the first chunk")
+@click.option("--jitter", default=0.2, show_default=True, help="Share of --first-token-delay, uniform +/-")
+@click.option("--token-delay", default=0.005, show_default=True, help="Seconds between chunks")
+@click.option("--tokens", default=20, show_default=True, help="Chunks per completion")
+@click.option("--slow-rate", default=0.0, show_default=True, help="Share of requests that stall before the first chunk")
+@click.option("--slow-delay", default=2.0, show_default=True, help="Seconds a stalled request adds")
+@click.option("--error-rate", default=0.0, show_default=True, help="Share of requests answered with --error-status")
+@click.option("--error-status", default=503, show_default=True)
+@click.option("--seed", type=int, default=None, help="Random seed for reproducible fault sequences")
+def main(host: str, port: int, seed: int | None, **faults: Any) -> None:
+    """Serve an OpenAI-compatible streaming /v1/chat/completions with injected latency and errors"""
+    import uvicorn
+
+    uvicorn.run(MockProvider(Faults(**faults), seed).app(), host=host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# benchmarks/results.py
+# Common JSON envelope for benchmark reports and a regression check between two of them
+#
+# Usage:
+#   python -m benchmarks.micro --output main.json            # on the base commit
+#   python -m benchmarks.micro --output branch.json          # on the change
+#   python -m benchmarks.results compare main.json branch.json --threshold 10
+#
+# Every report carries the commit, machine and parameters it was produced with,
+# so two files tell whether their numbers are comparable at all.
+
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from typing import Any
+
+import click
+
+# Metric names are matched by suffix/segment to decide which direction is better
+LOWER_IS_BETTER = ("_ms", "_ns", "_seconds", "seconds", "p50", "p95", "p99", "mean", "ns_per_op", "errors")
+HIGHER_IS_BETTER = ("_rps", "rps", "throughput", "ops_per_second", "rows_per_second", "recall")
+
+
+def environment() -> dict[str, Any]:
+    """Where and on what code a report was produced"""
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "created_at": datetime.now(UTC).isoformat(timespec="seconds"),
+    }
+
+
+def emit(report: dict[str, Any], output: str | None) -> None:
+    """Print a report (with its environment) and optionally write it to a file"""
+    text = json.dumps({**report, "environment": environment()}, indent=2, default=str)
+    if output:
+        with open(output, "w") as file:
+            file.write(text)
+    click.echo(text)
+
+
+def _git(*args: str) -> str | None:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(value: Any, prefix: str = "") -> Iterator[tuple[str, float]]:
+    """Numeric leaves as dotted paths; list items are keyed by their "name" field or index"""
+    if isinstance(value, bool):
+        return
+    if isinstance(value, (int, float)):
+        yield prefix, float(value)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if key != "environment":
+                yield from flatten(item, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            key = item.get("name", index) if isinstance(item, dict) else index
+            yield from flatten(item, f"{prefix}[{key}]")
+
+
+def direction(path: str) -> int:
+    """-1 = lower is better, +1 = higher is better, 0 = informational"""
+    leaf = path.rsplit(".", 1)[-1]
+    if leaf.endswith(HIGHER_IS_BETTER):
+        return 1
+    if leaf.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(baseline: dict[str, Any], current: dict[str, Any], threshold: float) -> list[dict[str, Any]]:
+    """Changed metrics present in both reports, flagged against threshold percent, biggest change first"""
+    before = dict(flatten(baseline))
+    changes = []
+    for path, value in flatten(current):
+        better = direction(path)
+        old = before.get(path)
+        if not better or old is None or old == value:
+            continue
+        # From zero (e.g. errors 0 -> 3) any change is significant
+        change = (value - old) / abs(old) * 100 if old else math.copysign(math.inf, value)
+        changes.append({
+            "metric": path,
+            "baseline": old,
+            "current": value,
+            "change_percent": round(change, 1),
+            "regression": change * better < -threshold,
+            "improvement": change * better > threshold,
+        })
+    return sorted(changes, key=lambda c: -abs(c["change_percent"]))
+
+
+@click.group()
+def main() -> None:
+    """Benchmark report tools"""
+
+
+@main.command("compare")
+@click.argument("baseline", type=click.File())
+@click.argument("current", type=click.File())
+@click.option("--threshold", default=10.0, show_default=True, help="Percent change treated as significant")
+def compare_command(baseline: Any, current: Any, threshold: float) -> None:
+    """Exit with status 1 if CURRENT regressed against BASELINE"""
+    old, new = json.load(baseline), json.load(current)
+    old_env, new_env = old.get("environment", {}), new.get("environment", {})
+    if (old_env.get("platform"), old_env.get("cpus")) != (new_env.get("platform"), new_env.get("cpus")):
+        click.echo("WARNING: reports come from different machines - differences may not be the code", err=True)
+    if old.get("parameters") != new.get("parameters"):
+        click.echo("WARNING: reports were run with different parameters", err=True)
+
+    changes = compare(old, new, threshold)
+    regressions = [c for c in changes if c["regression"]]
+    for change in changes:
+        if change["regression"] or change["improvement"]:
+            marker = "REGRESSION " if change["regression"] else "improvement"
+            click.echo(
+                f"{marker} {change['metric']}: {change['baseline']:g} -> {change['current']:g} "
+                f"({change['change_percent']:+.1f}%)"
+            )
+    click.echo(f"{len(changes)} metrics compared, {len(regressions)} regressions above {threshold:g}%")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
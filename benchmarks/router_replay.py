@@ -0,0 +1,176 @@
+# benchmarks/router_replay.py
+# Replays stored chat turns through the Smart Router and compares latency/spend
+# against sending everything to the strongest model (the no-router baseline)
+#
+# Usage:
+#   python -m benchmarks.router_replay --limit 50000            # from DATABASE_URL_SYNC
+#   python -m benchmarks.router_replay --synthetic 20000        # offline, generated turns
+#
+# Message rows store tokens but not latency, so latency is modelled per model:
+# time-to-first-token + completion_tokens * per-token time (MODEL_LATENCY below).
+# Adjust the profile to your own /metrics numbers for a realistic comparison.
+
+import os
+import random
+import statistics
+import time
+from dataclasses import dataclass
+
+import click
+
+from packages.core.enums import ChannelType, ConversationType, MessageType
+from packages.core.router import (
+    DEFAULT_TIERS,
+    SmartRouter,
+    cost_usd,
+    estimate_tokens,
+    parse_tiers,
+)
+
+from .results import emit
+
+# (time to first token in seconds, seconds per output token)
+MODEL_LATENCY: dict[str, tuple[float, float]] = {
+    "gpt-4o-mini": (0.35, 0.010),
+    "claude-3-haiku-20240307": (0.40, 0.008),
+    "gpt-4o": (0.60, 0.020),
+    "gpt-3.5-turbo": (0.30, 0.010),
+    "claude-3-5-sonnet-20241022": (0.90, 0.018),
+}
+
+
+@dataclass(frozen=True)
+class ReplayTurn:
+    """A user message with its context and the size of the answer it got"""
+    content: str
+    conversation_type: str
+    channel: str
+    prompt_tokens: int
+    completion_tokens: int
+
+
+def load_turns(url: str, limit: int) -> list[ReplayTurn]:
+    """(user message, next assistant message) pairs from the messages table"""
+    from sqlalchemy import create_engine, func, select
+
+    from packages.core.models import Conversation, Message
+
+    ordered = (Message.created_at, Message.id)
+    pairs = (
+        select(
+            Message.message_type,
+            Message.tokens_used,
+            Message.conversation_id,
+            func.lag(Message.content).over(partition_by=Message.conversation_id, order_by=ordered).label("prev_content"),
+            func.lag(Message.message_type).over(partition_by=Message.conversation_id, order_by=ordered).label("prev_type"),
+        )
+        .subquery()
+    )
+    query = (
+        select(pairs.c.prev_content, pairs.c.tokens_used, Conversation.conversation_type, Conversation.channel)
+        .join(Conversation, Conversation.id == pairs.c.conversation_id)
+        .where(pairs.c.message_type == MessageType.ASSISTANT)
+        .where(pairs.c.prev_type == MessageType.USER)
+        .where(pairs.c.tokens_used.is_not(None))
+        .limit(limit)
+    )
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        rows = connection.execute(query).all()
+    turns = []
+    for content, tokens_used, conversation_type, channel in rows:
+        prompt_tokens = estimate_tokens(content)
+        turns.append(ReplayTurn(content, conversation_type, channel, prompt_tokens, max(1, tokens_used - prompt_tokens)))
+    return turns
+
+
+SYNTHETIC_MESSAGES = [
+    ("hi", ConversationType.GENERAL, 20),
+    ("What are your opening hours?", ConversationType.SUPPORT, 40),
+    ("How do I reset my password?", ConversationType.SUPPORT, 80),
+    ("Where can I find my invoice for last month?", ConversationType.BILLING, 90),
+    ("thanks, bye", ConversationType.GENERAL, 15),
+    ("Your API returns a 500 error when I call the webhook endpoint, here is the traceback", ConversationType.TECHNICAL, 400),
+    ("Can you explain the difference between the Pro and Enterprise plans for compliance?", ConversationType.SALES, 300),
+    ("I was charged twice, I want a refund and an explanation why this happened", ConversationType.BILLING, 250),
+]
+
+
+def synthetic_turns(count: int, seed: int) -> list[ReplayTurn]:
+    """FAQ-heavy mix: most traffic is short questions, a long tail is real diagnosis work"""
+    rng = random.Random(seed)
+    weights = [12, 20, 20, 10, 8, 5, 3, 4]
+    channels = [ChannelType.WEB] * 6 + [ChannelType.MOBILE_APP, ChannelType.EMAIL]
+    turns = []
+    for _ in range(count):
+        content, conversation_type, answer_tokens = rng.choices(SYNTHETIC_MESSAGES, weights)[0]
+        turns.append(ReplayTurn(
+            content, conversation_type, rng.choice(channels),
+            estimate_tokens(content) + 200,                  # + system prompt / context
+            int(answer_tokens * rng.uniform(0.6, 1.4)),
+        ))
+    return turns
+
+
+def latency(model: str, completion_tokens: int) -> float:
+    ttft, per_token = MODEL_LATENCY.get(model, (0.5, 0.015))
+    return ttft + completion_tokens * per_token
+
+
+def replay(turns: list[ReplayTurn], router: SmartRouter) -> dict[str, object]:
+    strongest = router.tiers[-1].models[0]
+    baseline_latency, routed_latency, overhead = [], [], []
+    baseline_cost = routed_cost = 0.0
+    tiers: dict[str, int] = {}
+
+    for turn in turns:
+        started = time.perf_counter_ns()
+        decision = router.route(turn.content, turn.conversation_type, turn.channel)
+        overhead.append((time.perf_counter_ns() - started) / 1000)
+        tiers[decision.tier] = tiers.get(decision.tier, 0) + 1
+
+        baseline_latency.append(latency(strongest, turn.completion_tokens))
+        routed_latency.append(latency(decision.model, turn.completion_tokens))
+        baseline_cost += cost_usd(strongest, turn.prompt_tokens, turn.completion_tokens)
+        routed_cost += cost_usd(decision.model, turn.prompt_tokens, turn.completion_tokens)
+
+    def percentiles(values: list[float]) -> dict[str, float]:
+        q = statistics.quantiles(values, n=100)
+        return {"p50": round(q[49], 4), "p95": round(q[94], 4), "p99": round(q[98], 4)}
+
+    return {
+        "turns": len(turns),
+        "baseline_model": strongest,
+        "tier_distribution": tiers,
+        "latency_seconds": {"baseline": percentiles(baseline_latency), "routed": percentiles(routed_latency)},
+        "cost_usd": {"baseline": round(baseline_cost, 4), "routed": round(routed_cost, 4),
+                     "saving_pct": round(100 * (1 - routed_cost / baseline_cost), 2) if baseline_cost else 0.0},
+        "router_overhead_us": percentiles(overhead),
+    }
+
+
+@click.command()
+@click.option("--limit", default=50_000, show_default=True, help="Stored turns to replay")
+@click.option("--synthetic", default=0, help="Replay N generated turns instead of the database")
+@click.option("--tiers", default="", help="ROUTER_TIERS spec to evaluate (default: built-in tiers)")
+@click.option("--seed", default=0, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write JSON results here")
+def main(limit: int, synthetic: int, tiers: str, seed: int, output: str | None) -> None:
+    """Router replay: p50/p95 latency and spend, routed vs. strongest-model baseline"""
+    if synthetic:
+        turns = synthetic_turns(synthetic, seed)
+    else:
+        url = os.getenv("DATABASE_URL_SYNC")
+        if not url:
+            raise click.UsageError("DATABASE_URL_SYNC is not set - use --synthetic N for an offline run")
+        turns = load_turns(url, limit)
+    if len(turns) < 2:
+        raise click.UsageError("Need at least 2 turns to replay")
+
+    parameters = {"limit": limit, "synthetic": synthetic, "tiers": tiers, "seed": seed}
+    emit({"benchmark": "router_replay", "parameters": parameters,
+          **replay(turns, SmartRouter(parse_tiers(tiers) or DEFAULT_TIERS))}, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# benchmarks/semantic_index.py
+# Recall vs. latency of the semantic cache index as it grows (10k -> 1M vectors)
+# Brute force is the exact baseline; IVF is measured against it at several nprobe values
+#
+# Usage:
+#   python -m benchmarks.semantic_index --sizes 10000,100000,1000000 --output bench_output.json
+
+import asyncio
+import time
+
+import click
+import numpy as np
+
+from packages.caching.vector_index import NumpyIndex
+from packages.core.embeddings import normalize_rows
+
+from .results import emit
+
+PARTITION = "1:support:bench"
+
+
+def make_dataset(size: int, dim: int, queries: int, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Clustered unit vectors, like embeddings of support questions:
+    many paraphrases around a smaller set of topics. Queries are noisy copies
+    of stored vectors - the near-duplicate case the cache exists for.
+    """
+    # Noise is scaled by 1/sqrt(dim) so its total length doesn't grow with the dimension
+    topics = normalize_rows(rng.standard_normal((max(10, size // 100), dim)))
+    spread = 0.8 / np.sqrt(dim)
+    data = normalize_rows(topics[rng.integers(0, len(topics), size)] + spread * rng.standard_normal((size, dim)))
+    picks = rng.integers(0, size, queries)
+    probes = normalize_rows(data[picks] + 0.3 * spread * rng.standard_normal((queries, dim)))
+    return data.astype(np.float32), probes.astype(np.float32)
+
+
+async def build_index(data: np.ndarray, ivf_threshold: int, nprobe: int) -> tuple[NumpyIndex, float]:
+    index = NumpyIndex(data.shape[1], ivf_threshold=ivf_threshold, nprobe=nprobe)
+    started = time.perf_counter()
+    # Batched inserts, the same way SemanticCache flushes its insert queue
+    for start in range(0, len(data), 10_000):
+        block = data[start:start + 10_000]
+        await index.upsert(
+            [PARTITION] * len(block), [str(start + i) for i in range(len(block))], block, [{}] * len(block)
+        )
+    return index, time.perf_counter() - started
+
+
+async def measure(index: NumpyIndex, probes: np.ndarray, batch: int) -> tuple[list[str], list[float]]:
+    """Top-1 ids and per-query latency (seconds) for the given batch size"""
+    found: list[str] = []
+    latencies: list[float] = []
+    for start in range(0, len(probes), batch):
+        block = probes[start:start + batch]
+        started = time.perf_counter()
+        hits = await index.search([PARTITION] * len(block), block, limit=1)
+        elapsed = time.perf_counter() - started
+        latencies.extend([elapsed / len(block)] * len(block))
+        found.extend(h[0].id if h else "" for h in hits)
+    return found, latencies
+
+
+def summarize(latencies: list[float]) -> dict[str, float]:
+    ordered = np.sort(np.asarray(latencies)) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ordered, 50)), 4),
+        "p95_ms": round(float(np.percentile(ordered, 95)), 4),
+        "p99_ms": round(float(np.percentile(ordered, 99)), 4),
+    }
+
+
+async def run(sizes: list[int], dim: int, queries: int, batch: int, nprobes: list[int], seed: int) -> list[dict[str, object]]:
+    results: list[dict[str, object]] = []
+    for size in sizes:
+        rng = np.random.default_rng(seed)
+        data, probes = make_dataset(size, dim, queries, rng)
+
+        exact, build_seconds = await build_index(data, ivf_threshold=size + 1, nprobe=1)
+        truth, latencies = await measure(exact, probes, batch)
+        results.append({"size": size, "method": "brute_force", "recall_at_1": 1.0,
+                        "build_s": round(build_seconds, 3), **summarize(latencies)})
+        click.echo(f"{size:>9} brute_force        recall=1.000 {summarize(latencies)}")
+        del exact
+
+        ivf, build_seconds = await build_index(data, ivf_threshold=0, nprobe=nprobes[0])
+        for nprobe in nprobes:
+            ivf.nprobe = nprobe
+            found, latencies = await measure(ivf, probes, batch)
+            recall = float(np.mean([a == b for a, b in zip(found, truth, strict=True)]))
+            results.append({"size": size, "method": f"ivf_nprobe_{nprobe}", "recall_at_1": round(recall, 4),
+                            "build_s": round(build_seconds, 3), **summarize(latencies)})
+            click.echo(f"{size:>9} ivf nprobe={nprobe:<4}  recall={recall:.3f} {summarize(latencies)}")
+        del ivf
+    return results
+
+
+@click.command()
+@click.option("--sizes", default="10000,100000,1000000", help="Comma-separated index sizes")
+@click.option("--dim", default=128, show_default=True, help="Vector dimension")
+@click.option("--queries", default=500, show_default=True, help="Queries per size")
+@click.option("--batch", default=32, show_default=True, help="Queries per search call")
+@click.option("--nprobes", default="1,4,8,16,32", help="IVF lists scanned per query")
+@click.option("--seed", default=0, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write JSON results here")
+def main(sizes: str, dim: int, queries: int, batch: int, nprobes: str, seed: int, output: str | None) -> None:
+    """Recall@1 and per-query latency of NumpyIndex: brute force vs. IVF"""
+    results = asyncio.run(run(
+        [int(s) for s in sizes.split(",")], dim, queries, batch, [int(n) for n in nprobes.split(",")], seed
+    ))
+    parameters = {"sizes": sizes, "dim": dim, "queries": queries, "batch": batch, "nprobes": nprobes, "seed": seed}
+    emit({"benchmark": "semantic_index", "parameters": parameters,
+          "dim": dim, "queries": queries, "batch": batch, "results": results}, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# benchmarks/websocket.py
+# Idle WebSocket capacity of one node: open N chat sockets against a running server,
+# hold them open, then time a few turns on a probe socket while the rest stay idle
+#
+# Usage:
+#   LLM_PROVIDER=fake uvicorn apps.customer_support.main:app --port 8000 \
+#       --ws websockets-sansio --ws-max-size 65536 --ws-ping-interval 0 &
+#   python -m benchmarks.websocket --connections 50000 --hold 120 --server-pid $! \
+#       --source-addresses 127.0.0.1,127.0.0.2,127.0.0.3 --output ws.json
+#
+# Both sides need `ulimit -n` above --connections. One source address has ~28k
+# ephemeral ports (net.ipv4.ip_local_port_range), so 50k sockets to one server port
+# need two or more loopback source addresses. Run the driver on other cores (or
+# another machine) than the server - handshakes are CPU-bound on both ends.
+#
+# Server memory is dominated by the protocol implementation: an idle socket costs
+# ~70 KB with --ws websockets-sansio and ~135 KB with the default --ws websockets
+# (the app's own share is ~10 KB). --ws-max-size caps what one client can make the
+# server buffer; chat messages are at most 8000 characters anyway.
+
+import asyncio
+import itertools
+import json
+import statistics
+import time
+import uuid
+from typing import Any
+
+import click
+from websockets.asyncio.client import connect
+
+from .results import emit
+
+
+def _rss_bytes(pid: int | None) -> int | None:
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def _quantiles_ms(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    q = statistics.quantiles(ordered, n=100) if len(ordered) > 1 else ordered * 99
+    return {"p50": round(q[49] * 1000, 3), "p95": round(q[94] * 1000, 3), "p99": round(q[98] * 1000, 3)}
+
+
+class IdleSocket:
+    """One held connection; counts the heartbeats the server sends while idle"""
+
+    def __init__(self) -> None:
+        self.heartbeats = 0
+        self.open = False
+
+    async def hold(self, url: str, local_address: str | None, stop: asyncio.Event, connect_times: list[float]) -> None:
+        started = time.perf_counter()
+        kwargs = {"local_addr": (local_address, 0)} if local_address else {}
+        async with connect(url, ping_interval=None, open_timeout=60, max_queue=4, **kwargs) as websocket:
+            connect_times.append(time.perf_counter() - started)
+            self.open = True
+            receiver = asyncio.create_task(self._receive(websocket))
+            await stop.wait()
+            receiver.cancel()
+            self.open = not receiver.done() or receiver.cancelled()
+
+    async def _receive(self, websocket: Any) -> None:
+        async for raw in websocket:
+            if json.loads(raw).get("type") == "heartbeat":
+                self.heartbeats += 1
+
+
+async def probe(url: str, turns: int) -> dict[str, Any]:
+    """Sequential turns on one socket: time to first token and to the done frame"""
+    first_token: list[float] = []
+    total: list[float] = []
+    async with connect(url, ping_interval=None) as websocket:
+        for index in range(turns):
+            started = time.perf_counter()
+            await websocket.send(json.dumps({"type": "message", "message": f"Probe question {index}", "id": str(index)}))
+            seen_token = False
+            while True:
+                frame = json.loads(await websocket.recv())
+                if frame["type"] == "token" and not seen_token:
+                    first_token.append(time.perf_counter() - started)
+                    seen_token = True
+                elif frame["type"] in ("done", "error"):
+                    total.append(time.perf_counter() - started)
+                    break
+    return {"turns": len(total), "first_token_ms": _quantiles_ms(first_token), "turn_ms": _quantiles_ms(total)}
+
+
+async def run(
+    url: str, connections: int, ramp: int, hold: float, probes: int, source_addresses: list[str], server_pid: int | None
+) -> dict[str, Any]:
+    run_id = uuid.uuid4().hex[:8]
+    rss_before = _rss_bytes(server_pid)
+    stop = asyncio.Event()
+    sockets = [IdleSocket() for _ in range(connections)]
+    connect_times: list[float] = []
+    addresses = itertools.cycle(source_addresses or [None])
+    tasks = []
+    started = time.perf_counter()
+    for index, socket in enumerate(sockets):
+        # Ten sockets per session, like tabs and devices of one user
+        session_url = f"{url}?session_id=idle-{run_id}-{index // 10}"
+        tasks.append(asyncio.create_task(socket.hold(session_url, next(addresses), stop, connect_times)))
+        if (index + 1) % ramp == 0:
+            await asyncio.sleep(0.1)             # Accept queue and SYN backlog stay below their limits
+    while len(connect_times) + sum(task.done() for task in tasks) < connections:
+        await asyncio.sleep(0.1)
+    connected_seconds = time.perf_counter() - started
+    connected = len(connect_times)
+    click.echo(f"{connected:,}/{connections:,} sockets open after {connected_seconds:.1f}s, holding {hold:.0f}s", err=True)
+
+    await asyncio.sleep(hold)
+    rss_held = _rss_bytes(server_pid)
+    probe_result = await probe(f"{url}?session_id=probe-{run_id}", probes) if probes else None
+    still_open = sum(socket.open for socket in sockets)
+    stop.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    failures = sum(isinstance(result, BaseException) for result in results)
+    per_socket = (rss_held - rss_before) / connected if rss_held and rss_before and connected else None
+    return {
+        "name": "idle_sockets",
+        "connections": connections,
+        "connected": connected,
+        "connect_failures": failures,
+        "still_open_after_hold": still_open,
+        "connect_seconds": round(connected_seconds, 2),
+        "connect_ms": _quantiles_ms(connect_times),
+        "heartbeats_received": sum(socket.heartbeats for socket in sockets),
+        "server_rss_bytes": rss_held,
+        "server_bytes_per_socket": round(per_socket) if per_socket is not None else None,
+        "probe": probe_result,
+    }
+
+
+@click.command()
+@click.option("--url", default="ws://127.0.0.1:8000/api/v1/chat/ws", show_default=True)
+@click.option("--connections", default=1000, show_default=True, help="Idle sockets to open and hold")
+@click.option("--ramp", default=200, show_default=True, help="Sockets opened per 100 ms")
+@click.option("--hold", default=60.0, show_default=True, help="Seconds to hold them (> WS_HEARTBEAT_INTERVAL to see heartbeats)")
+@click.option("--probes", default=20, show_default=True, help="Turns timed on a separate socket while the rest are idle")
+@click.option("--source-addresses", default="", help="Comma-separated local IPs to spread sockets over (ephemeral ports)")
+@click.option("--server-pid", type=int, default=None, help="Server process, to report its memory per socket")
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write JSON results here")
+def main(
+    url: str, connections: int, ramp: int, hold: float, probes: int, source_addresses: str, server_pid: int | None,
+    output: str | None,
+) -> None:
+    """Hold many idle chat WebSockets on one node and check it still answers"""
+    addresses = [address.strip() for address in source_addresses.split(",") if address.strip()]
+    result = asyncio.run(run(url, connections, ramp, hold, probes, addresses, server_pid))
+    parameters = {"url": url, "connections": connections, "ramp": ramp, "hold": hold, "probes": probes}
+    emit({"benchmark": "websocket", "parameters": parameters, "results": [result]}, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Partition messages by month
+
+Revision ID: dc732550bac6
+Revises: 8f6376e35fbf
+Create Date: 2026-10-18 12:00:00.000000
+
+Turns `messages` into a table partitioned BY RANGE (created_at), one partition
+per month, plus a DEFAULT partition as a safety net for out-of-range rows.
+
+- The primary key becomes (id, created_at): Postgres requires the partition key
+  in every unique constraint. ids still come from the same sequence.
+- Indexes are declared once on the parent and cascade to every partition.
+- RLS flags, policies and table grants are copied from the old table; each
+  partition gets RLS enabled (no policies = no direct access for the app user).
+- Existing rows are copied month by month. On a large table run this in a
+  maintenance window: the copy holds an ACCESS EXCLUSIVE lock on the old table.
+
+Partitions for future months are created by `python -m packages.data.partitions maintain`.
+"""
+
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "dc732550bac6"
+down_revision: Union[str, Sequence[str], None] = "8f6376e35fbf"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Months of empty partitions created ahead of today (maintenance keeps this topped up)
+MONTHS_AHEAD = 3
+
+# (name, columns) - identical to the indexes of migration 8f6376e35fbf
+MESSAGE_INDEXES = (
+    ("ix_messages_ai_model", ["ai_model"]),
+    ("ix_messages_conversation_created", ["conversation_id", "created_at"]),
+    ("ix_messages_conversation_id", ["conversation_id"]),
+    ("ix_messages_id", ["id"]),
+    ("ix_messages_tenant_conversation", ["tenant_id", "conversation_id"]),
+    ("ix_messages_tenant_id", ["tenant_id"]),
+    ("ix_messages_tenant_user", ["tenant_id", "user_id"]),
+    ("ix_messages_type", ["message_type"]),
+)
+
+MESSAGE_COLUMNS = (
+    "id, tenant_id, conversation_id, user_id, content, message_type, "
+    "ai_model, tokens_used, user_feedback, created_at"
+)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _copy_security(source: str, target: str) -> bool:
+    """Copy RLS flags, policies and grants from source to target; returns whether RLS is on"""
+    bind = op.get_bind()
+    enabled, forced = bind.execute(sa.text(
+        "SELECT relrowsecurity, relforcerowsecurity FROM pg_class WHERE oid = to_regclass(:t)"
+    ), {"t": source}).one()
+    if enabled:
+        op.execute(f"ALTER TABLE {target} ENABLE ROW LEVEL SECURITY")
+    if forced:
+        op.execute(f"ALTER TABLE {target} FORCE ROW LEVEL SECURITY")
+
+    policies = bind.execute(sa.text(
+        "SELECT policyname, permissive, roles, cmd, qual, with_check "
+        "FROM pg_policies WHERE schemaname = 'public' AND tablename = :t"
+    ), {"t": source}).all()
+    for name, permissive, roles, cmd, qual, with_check in policies:
+        statement = f'CREATE POLICY "{name}" ON {target} AS {permissive} FOR {cmd} TO {", ".join(roles)}'
+        if qual:
+            statement += f" USING ({qual})"
+        if with_check:
+            statement += f" WITH CHECK ({with_check})"
+        op.execute(statement)
+
+    grants = bind.execute(sa.text(
+        "SELECT grantee, privilege_type FROM information_schema.role_table_grants "
+        "WHERE table_schema = 'public' AND table_name = :t AND grantee <> current_user"
+    ), {"t": source}).all()
+    for grantee, privilege in grants:
+        op.execute(f'GRANT {privilege} ON {target} TO "{grantee}"')
+    return bool(enabled)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+
+    # Old table steps aside; its index names are freed for the new parent
+    op.execute("ALTER TABLE messages RENAME TO messages_unpartitioned")
+    op.execute("ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_pkey TO messages_unpartitioned_pkey")
+    for name, _ in MESSAGE_INDEXES:
+        op.drop_index(name, table_name="messages_unpartitioned")
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY NONE")
+
+    op.execute("""
+        CREATE TABLE messages (
+            id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+            tenant_id INTEGER NOT NULL REFERENCES tenants (id),
+            conversation_id INTEGER NOT NULL REFERENCES conversations (id),
+            user_id INTEGER REFERENCES users (id),
+            content TEXT NOT NULL,
+            message_type VARCHAR(15) NOT NULL,
+            ai_model VARCHAR(50),
+            tokens_used INTEGER,
+            user_feedback VARCHAR(15),
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            CONSTRAINT messages_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    for name, columns in MESSAGE_INDEXES:
+        op.create_index(name, "messages", columns, unique=False)
+    rls_enabled = _copy_security("messages_unpartitioned", "messages")
+
+    # Monthly partitions from the oldest stored message through MONTHS_AHEAD months from now
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM messages_unpartitioned")).scalar()
+    current = date.today().replace(day=1)
+    month = date(oldest.year, oldest.month, 1) if oldest else current
+    last = _add_months(current, MONTHS_AHEAD)
+    partitions = []
+    while month <= last:
+        name = f"messages_p{month:%Y_%m}"
+        op.execute(
+            f"CREATE TABLE {name} PARTITION OF messages "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+        )
+        partitions.append(name)
+        month = _add_months(month, 1)
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+    partitions.append("messages_default")
+    if rls_enabled:
+        for name in partitions:
+            op.execute(f"ALTER TABLE {name} ENABLE ROW LEVEL SECURITY")
+
+    op.execute(f"INSERT INTO messages ({MESSAGE_COLUMNS}) SELECT {MESSAGE_COLUMNS} FROM messages_unpartitioned")
+    op.execute("DROP TABLE messages_unpartitioned")
+    op.execute("ANALYZE messages")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE messages RENAME TO messages_partitioned")
+    op.execute("ALTER TABLE messages_partitioned RENAME CONSTRAINT messages_pkey TO messages_partitioned_pkey")
+    for name, _ in MESSAGE_INDEXES:
+        op.drop_index(name, table_name="messages_partitioned")
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY NONE")
+
+    op.execute("""
+        CREATE TABLE messages (
+            id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+            tenant_id INTEGER NOT NULL REFERENCES tenants (id),
+            conversation_id INTEGER NOT NULL REFERENCES conversations (id),
+            user_id INTEGER REFERENCES users (id),
+            content TEXT NOT NULL,
+            message_type VARCHAR(15) NOT NULL,
+            ai_model VARCHAR(50),
+            tokens_used INTEGER,
+            user_feedback VARCHAR(15),
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            CONSTRAINT messages_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    _copy_security("messages_partitioned", "messages")
+    # Detached partitions (retired by maintenance) are not part of the parent anymore and stay as they are
+    op.execute(f"INSERT INTO messages ({MESSAGE_COLUMNS}) SELECT {MESSAGE_COLUMNS} FROM messages_partitioned")
+    for name, columns in MESSAGE_INDEXES:
+        op.create_index(name, "messages", columns, unique=False)
+    op.execute("DROP TABLE messages_partitioned")
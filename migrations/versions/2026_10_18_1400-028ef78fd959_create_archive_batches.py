@@ -0,0 +1,55 @@
+"""Create archive_batches checkpoint table
+
+Revision ID: 028ef78fd959
+Revises: dc732550bac6
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "028ef78fd959"
+down_revision: Union[str, Sequence[str], None] = "dc732550bac6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "archive_batches",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("tenant_id", sa.Integer(), nullable=False),
+        sa.Column("state", sa.String(length=10), nullable=False),
+        sa.Column("object_key", sa.String(length=500), nullable=False),
+        sa.Column("archive_format", sa.String(length=10), nullable=False),
+        sa.Column("conversation_ids", postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column("idle_before", sa.DateTime(), nullable=False),
+        sa.Column("message_count", sa.Integer(), nullable=False),
+        sa.Column("bytes_written", sa.BigInteger(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["tenant_id"],
+            ["tenants.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_archive_batches_tenant_state",
+        "archive_batches",
+        ["tenant_id", "state"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_archive_batches_tenant_state", table_name="archive_batches")
+    op.drop_table("archive_batches")
@@ -0,0 +1,108 @@
+"""Create analytics rollup tables
+
+Revision ID: 5b1e7c9d3a42
+Revises: 028ef78fd959
+Create Date: 2026-10-18 16:00:00.000000
+
+Hourly/daily aggregates for the analytics dashboard, filled incrementally by
+`python -m packages.data.rollups refresh`. The rollup tables are tenant data:
+when `messages` has row-level security, they get RLS and the same policies.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5b1e7c9d3a42"
+down_revision: Union[str, Sequence[str], None] = "028ef78fd959"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ROLLUP_TABLES = ("message_rollups", "conversation_rollups")
+
+
+def _copy_policies(source: str, target: str) -> None:
+    """Enable RLS on target with the policies of source, if source has RLS"""
+    bind = op.get_bind()
+    enabled = bind.execute(sa.text(
+        "SELECT relrowsecurity FROM pg_class WHERE oid = to_regclass(:t)"
+    ), {"t": source}).scalar()
+    if not enabled:
+        return
+    op.execute(f"ALTER TABLE {target} ENABLE ROW LEVEL SECURITY")
+    policies = bind.execute(sa.text(
+        "SELECT policyname, permissive, roles, cmd, qual, with_check "
+        "FROM pg_policies WHERE schemaname = 'public' AND tablename = :t"
+    ), {"t": source}).all()
+    for name, permissive, roles, cmd, qual, with_check in policies:
+        statement = f'CREATE POLICY "{name}" ON {target} AS {permissive} FOR {cmd} TO {", ".join(roles)}'
+        if qual:
+            statement += f" USING ({qual})"
+        if with_check:
+            statement += f" WITH CHECK ({with_check})"
+        op.execute(statement)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "message_rollups",
+        sa.Column("tenant_id", sa.Integer(), nullable=False),
+        sa.Column("granularity", sa.String(length=5), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(), nullable=False),
+        sa.Column("ai_model", sa.String(length=50), nullable=False),
+        sa.Column("message_type", sa.String(length=15), nullable=False),
+        sa.Column("user_feedback", sa.String(length=15), nullable=False),
+        sa.Column("message_count", sa.Integer(), nullable=False),
+        sa.Column("tokens_used", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["tenant_id"],
+            ["tenants.id"],
+        ),
+        sa.PrimaryKeyConstraint(
+            "tenant_id", "granularity", "bucket_start", "ai_model", "message_type", "user_feedback",
+            name="message_rollups_pkey",
+        ),
+    )
+    op.create_table(
+        "conversation_rollups",
+        sa.Column("tenant_id", sa.Integer(), nullable=False),
+        sa.Column("granularity", sa.String(length=5), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(), nullable=False),
+        sa.Column("channel", sa.String(length=15), nullable=False),
+        sa.Column("closed_count", sa.Integer(), nullable=False),
+        sa.Column("resolution_count", sa.Integer(), nullable=False),
+        sa.Column("resolution_minutes_sum", sa.BigInteger(), nullable=False),
+        sa.Column("resolution_histogram", postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column("satisfaction_count", sa.Integer(), nullable=False),
+        sa.Column("satisfaction_sum", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["tenant_id"],
+            ["tenants.id"],
+        ),
+        sa.PrimaryKeyConstraint(
+            "tenant_id", "granularity", "bucket_start", "channel", name="conversation_rollups_pkey"
+        ),
+    )
+    op.create_table(
+        "rollup_watermarks",
+        sa.Column("name", sa.String(length=50), nullable=False),
+        sa.Column("high_water", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.create_index("ix_conversations_closed_at", "conversations", ["closed_at"], unique=False)
+    for table in ROLLUP_TABLES:
+        _copy_policies("messages", table)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_conversations_closed_at", table_name="conversations")
+    op.drop_table("rollup_watermarks")
+    op.drop_table("conversation_rollups")
+    op.drop_table("message_rollups")
@@ -0,0 +1,39 @@
+"""Add message token counts and conversation rolling summaries
+
+Revision ID: 7c2d4e8f1a93
+Revises: 5b1e7c9d3a42
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7c2d4e8f1a93"
+down_revision: Union[str, Sequence[str], None] = "5b1e7c9d3a42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable without a default: a catalog-only change, no rewrite of the
+    # messages partitions; existing rows are counted lazily by the context builder
+    op.add_column("messages", sa.Column("token_count", sa.Integer(), nullable=True))
+    op.add_column("conversations", sa.Column("summary", sa.Text(), nullable=True))
+    op.add_column("conversations", sa.Column("summary_token_count", sa.Integer(), nullable=True))
+    op.add_column("conversations", sa.Column("summarized_through_at", sa.DateTime(), nullable=True))
+    op.add_column("conversations", sa.Column("summarized_through_id", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("conversations", "summarized_through_id")
+    op.drop_column("conversations", "summarized_through_at")
+    op.drop_column("conversations", "summary_token_count")
+    op.drop_column("conversations", "summary")
+    op.drop_column("messages", "token_count")
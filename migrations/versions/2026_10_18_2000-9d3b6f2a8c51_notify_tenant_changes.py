@@ -0,0 +1,58 @@
+"""Notify listeners when tenants change
+
+Revision ID: 9d3b6f2a8c51
+Revises: 7c2d4e8f1a93
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9d3b6f2a8c51"
+down_revision: Union[str, Sequence[str], None] = "7c2d4e8f1a93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Workers cache tenants in process (packages/core/tenants.py) and LISTEN on
+    # tenant_changed. NOTIFY is delivered at commit, so a rolled-back change never
+    # evicts anything. Both slugs go out on UPDATE: the old one must stop resolving,
+    # the new one may be cached as unknown. INSERT clears such negative entries too.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_tenant_changed() RETURNS trigger AS $$
+        DECLARE
+            payload json;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                payload := json_build_object('id', NEW.id, 'slugs', json_build_array(NEW.slug));
+            ELSIF TG_OP = 'DELETE' THEN
+                payload := json_build_object('id', OLD.id, 'slugs', json_build_array(OLD.slug));
+            ELSE
+                payload := json_build_object('id', NEW.id, 'slugs', json_build_array(OLD.slug, NEW.slug));
+            END IF;
+            PERFORM pg_notify('tenant_changed', payload::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER tenants_notify_changed
+        AFTER INSERT OR UPDATE OR DELETE ON tenants
+        FOR EACH ROW EXECUTE FUNCTION notify_tenant_changed()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS tenants_notify_changed ON tenants")
+    op.execute("DROP FUNCTION IF EXISTS notify_tenant_changed()")
@@ -0,0 +1,61 @@
+"""Add full-text and trigram search over message content
+
+Revision ID: 3e8a1f5c7b20
+Revises: 9d3b6f2a8c51
+Create Date: 2026-10-18 22:00:00.000000
+
+- messages.content_tsv: STORED generated tsvector (english config), kept
+  current by Postgres on every insert/update - no trigger, no app code
+- ix_messages_content_tsv: GIN over it, declared on the partitioned parent
+  so every monthly partition (and future ones) gets its own
+- ix_messages_content_trgm: GIN trigram index for fuzzy matches, only where
+  the pg_trgm extension is available (contrib is missing on minimal builds)
+- ix_messages_tenant_created: search ranks only the newest matches; for a term
+  found in most messages, walking this index newest-first finds them without
+  reading every match from the GIN index
+
+Adding a stored generated column rewrites every partition under an ACCESS
+EXCLUSIVE lock, and the GIN builds read all of them: run in a maintenance
+window on a large table. maintenance_work_mem speeds up the GIN builds.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3e8a1f5c7b20"
+down_revision: Union[str, Sequence[str], None] = "9d3b6f2a8c51"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _trigram_available() -> bool:
+    return bool(op.get_bind().scalar(sa.text(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+    )))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("SET LOCAL maintenance_work_mem = '512MB'")
+    op.execute(
+        "ALTER TABLE messages ADD COLUMN content_tsv tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('english'::regconfig, content)) STORED"
+    )
+    op.execute("CREATE INDEX ix_messages_content_tsv ON messages USING gin (content_tsv)")
+    op.create_index("ix_messages_tenant_created", "messages", ["tenant_id", "created_at"])
+    if _trigram_available():
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX ix_messages_content_trgm ON messages USING gin (content gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The extension stays - other objects may depend on it by now
+    op.execute("DROP INDEX IF EXISTS ix_messages_content_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_messages_content_tsv")
+    op.drop_index("ix_messages_tenant_created", table_name="messages")
+    op.execute("ALTER TABLE messages DROP COLUMN IF EXISTS content_tsv")
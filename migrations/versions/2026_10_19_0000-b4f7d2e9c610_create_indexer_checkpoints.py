@@ -0,0 +1,38 @@
+"""Create indexer checkpoints
+
+Revision ID: b4f7d2e9c610
+Revises: 3e8a1f5c7b20
+Create Date: 2026-10-19 00:00:00.000000
+
+Resume points of `python -m packages.data.indexer`, which embeds new messages
+into the vector store. Operational table, not tenant data: no RLS.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b4f7d2e9c610"
+down_revision: Union[str, Sequence[str], None] = "3e8a1f5c7b20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "indexer_checkpoints",
+        sa.Column("name", sa.String(length=50), nullable=False),
+        sa.Column("last_message_id", sa.BigInteger(), nullable=False),
+        sa.Column("indexed_messages", sa.BigInteger(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("indexer_checkpoints")
@@ -0,0 +1,56 @@
+"""Add smallint code columns for enum fields (ENUM_STORAGE=smallint)
+
+Revision ID: c7e2a9d4f318
+Revises: b4f7d2e9c610
+Create Date: 2026-10-19 02:00:00.000000
+
+NO-OP UNLESS ENUM_STORAGE=smallint: with the default string storage, upgrade
+changes nothing but the revision is still recorded as applied. String storage
+needs no schema change; to switch such a database later, run
+`python -m packages.data.enum_storage expand` (the same steps) - upgrading
+again won't, this revision is already stamped. Downgrade likewise skips
+tables that were never expanded.
+
+Online, see packages/data/enum_storage.py:
+- <name>_code smallint next to users.role, conversations.conversation_type /
+  channel / status, messages.message_type / user_feedback, kept in sync with
+  the string column by a trigger while apps on either storage mode write
+- existing rows backfilled in id-range batches of their own transactions,
+  indexes built CONCURRENTLY, NOT NULL via a validated CHECK
+- runs outside the migration transaction (autocommit block); if interrupted,
+  rerun `enum_storage expand` and `alembic stamp` this revision
+
+The string columns stay until `python -m packages.data.enum_storage contract`.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c7e2a9d4f318"
+down_revision: Union[str, Sequence[str], None] = "b4f7d2e9c610"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    from packages.core.config import get_settings
+
+    # String storage: nothing to add (see the module docstring before switching later)
+    if get_settings().enum_storage != "smallint":
+        return
+    from packages.data.enum_storage import expand
+
+    with op.get_context().autocommit_block():
+        expand(op.get_bind())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    from packages.data.enum_storage import drop
+
+    with op.get_context().autocommit_block():
+        drop(op.get_bind())
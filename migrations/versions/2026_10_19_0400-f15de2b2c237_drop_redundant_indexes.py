@@ -0,0 +1,64 @@
+"""Drop redundant indexes, index conversation sessions
+
+Revision ID: f15de2b2c237
+Revises: c7e2a9d4f318
+Create Date: 2026-10-19 04:00:00.000000
+
+Generated by `python -m packages.data.index_audit generate`:
+- drop ix_conversations_id (id): covered by conversations_pkey
+- drop ix_conversations_tenant_id (tenant_id): covered by ix_conversations_tenant_user
+- drop ix_messages_conversation_id (conversation_id): covered by ix_messages_conversation_created
+- drop ix_messages_id (id): covered by messages_pkey
+- drop ix_messages_tenant_id (tenant_id): covered by ix_messages_tenant_user
+- drop ix_tenants_id (id): covered by tenants_pkey
+- drop ix_users_id (id): covered by users_pkey
+- drop ix_users_tenant_id (tenant_id): covered by ix_users_tenant_role
+- create ix_conversations_tenant_session: 20 workload calls scanned conversations sequentially
+
+Built and dropped CONCURRENTLY outside the migration transaction
+(packages/data/online_ddl.py): writes continue throughout, and a rerun after an
+interruption finishes what is left.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+from packages.data.online_ddl import create_index_online, drop_index_online
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f15de2b2c237"
+down_revision: Union[str, Sequence[str], None] = "c7e2a9d4f318"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        drop_index_online(connection, "ix_conversations_id")
+        drop_index_online(connection, "ix_conversations_tenant_id")
+        drop_index_online(connection, "ix_messages_conversation_id")
+        drop_index_online(connection, "ix_messages_id")
+        drop_index_online(connection, "ix_messages_tenant_id")
+        drop_index_online(connection, "ix_tenants_id")
+        drop_index_online(connection, "ix_users_id")
+        drop_index_online(connection, "ix_users_tenant_id")
+        create_index_online(connection, "ix_conversations_tenant_session", "conversations", ["tenant_id", "session_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        drop_index_online(connection, "ix_conversations_tenant_session")
+        create_index_online(connection, "ix_users_tenant_id", "users", ["tenant_id"])
+        create_index_online(connection, "ix_users_id", "users", ["id"])
+        create_index_online(connection, "ix_tenants_id", "tenants", ["id"])
+        create_index_online(connection, "ix_messages_tenant_id", "messages", ["tenant_id"])
+        create_index_online(connection, "ix_messages_id", "messages", ["id"])
+        create_index_online(connection, "ix_messages_conversation_id", "messages", ["conversation_id"])
+        create_index_online(connection, "ix_conversations_tenant_id", "conversations", ["tenant_id"])
+        create_index_online(connection, "ix_conversations_id", "conversations", ["id"])
@@ -0,0 +1,404 @@
+# packages/caching/conversation_state.py
+# Hot state of live conversations: the Conversation header and its newest messages,
+# so a chat turn builds its context without reading Postgres
+# Two tiers like the response cache: per-worker byte-bounded LRU -> shared Redis, keyed per tenant
+#
+# Why write-through instead of read-through with a TTL?
+# - Conversation state only changes through our own writes (SqlTurnStore, the summary
+#   update in ContextBuilder.compact, status changes), so every write updates the cache
+#   right away and a cached state is never stale - the TTL only frees idle conversations
+#
+# Why msgpack?
+# - A state is read and rewritten on every turn; msgpack with enum codes and integer
+#   timestamps is about half the size of the JSON and several times faster to decode
+#
+# Why pub/sub for the local tier?
+# - Another worker may take the next turn of the session and rewrite the state in Redis.
+#   Every write publishes the key; the other workers drop their local copy. Without a
+#   working subscription the local tier is bypassed - Redis alone is always current
+#
+# Why WATCH/MULTI for updates?
+# - Two turns of a session can finish at the same time on different workers; a plain
+#   GET, modify, SET lets the second write drop the first one's messages. Updates are
+#   optimistic transactions instead, and one that loses the race evicts the state
+#
+# Only ACTIVE/PENDING conversations are cached: a status change to anything else
+# evicts the state, and a conversation archived by packages.data.archive has been
+# idle far longer than the TTL.
+
+import asyncio
+import logging
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any
+
+import msgpack
+from redis.exceptions import WatchError
+
+from packages.core.enums import (
+    ENUM_CODES,
+    ChannelType,
+    ConversationStatus,
+    ConversationType,
+    MessageType,
+)
+from packages.core.metrics import metrics
+
+from .lru import ByteLRUCache
+
+logger = logging.getLogger(__name__)
+
+LIVE_STATUSES = frozenset({ConversationStatus.ACTIVE, ConversationStatus.PENDING})
+INVALIDATION_CHANNEL = "cs:invalidate"
+FORMAT_VERSION = 1
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_MEMBERS = {enum_class: {code: member for member, code in codes.items()} for enum_class, codes in ENUM_CODES.items()}
+
+lookups_counter = metrics.counter("conversation_state_lookups_total", "Conversation state lookups by tier and result")
+evictions_counter = metrics.counter("conversation_state_evictions_total", "Conversation states dropped by reason")
+
+
+@dataclass(frozen=True)
+class CachedMessage:
+    """A context message as ContextBuilder reads it; id is None until a write-behind flush assigns one"""
+    id: int | None
+    created_at: datetime
+    message_type: MessageType
+    content: str
+    token_count: int | None
+
+
+@dataclass
+class ConversationState:
+    """
+    Conversation header plus the messages newer than its rolling summary, oldest first
+
+    truncated: older messages past the summary exist in Postgres but not here -
+    a context that needs more than `messages` has to read them from the database
+    """
+    tenant_id: int
+    session_id: str
+    id: int
+    status: ConversationStatus
+    conversation_type: ConversationType
+    channel: ChannelType
+    created_at: datetime
+    summary: str | None = None
+    summary_token_count: int | None = None
+    summarized_through_at: datetime | None = None
+    summarized_through_id: int | None = None
+    messages: list[CachedMessage] = field(default_factory=list)
+    truncated: bool = False
+
+
+def state_key(tenant_id: int, session_id: str) -> str:
+    """Key layout: cs:{tenant_id}:{session_id} - the tenant is part of every key"""
+    return f"cs:{tenant_id}:{session_id}"
+
+
+def encode_state(state: ConversationState) -> bytes:
+    return msgpack.packb([
+        FORMAT_VERSION,
+        state.tenant_id,
+        state.session_id,
+        state.id,
+        _code(ConversationStatus, state.status),
+        _code(ConversationType, state.conversation_type),
+        _code(ChannelType, state.channel),
+        _micros(state.created_at),
+        state.summary,
+        state.summary_token_count,
+        _micros(state.summarized_through_at),
+        state.summarized_through_id,
+        state.truncated,
+        [
+            [m.id, _micros(m.created_at), _code(MessageType, m.message_type), m.content, m.token_count]
+            for m in state.messages
+        ],
+    ])
+
+
+def decode_state(payload: bytes) -> ConversationState | None:
+    """None for a payload written by another format version"""
+    data = msgpack.unpackb(payload)
+    if data[0] != FORMAT_VERSION:
+        return None
+    (_, tenant_id, session_id, conversation_id, status, conversation_type, channel, created_at,
+     summary, summary_token_count, through_at, through_id, truncated, messages) = data
+    return ConversationState(
+        tenant_id=tenant_id,
+        session_id=session_id,
+        id=conversation_id,
+        status=_member(ConversationStatus, status),
+        conversation_type=_member(ConversationType, conversation_type),
+        channel=_member(ChannelType, channel),
+        created_at=_datetime(created_at),
+        summary=summary,
+        summary_token_count=summary_token_count,
+        summarized_through_at=_datetime(through_at),
+        summarized_through_id=through_id,
+        truncated=truncated,
+        messages=[
+            CachedMessage(m[0], _datetime(m[1]), _member(MessageType, m[2]), m[3], m[4]) for m in messages
+        ],
+    )
+
+
+class ConversationStateCache:
+    """
+    Write-through cache of ConversationState per (tenant_id, session_id)
+
+    Usage:
+        state = await cache.get(tenant_id, session_id)             # ContextBuilder.build
+        await cache.put(state)                                     # after a database read
+        await cache.append(tenant_id, session_id, conversation_id, messages)   # SqlTurnStore
+        await cache.set_status(tenant_id, session_id, conversation_id, status)
+        asyncio.create_task(cache.run())                           # local-tier invalidation
+
+    At most max_messages newest messages are kept per conversation. A write that
+    fails in Redis deletes the key instead, so readers fall back to Postgres
+    rather than to an outdated state; Redis errors on reads are treated as misses.
+
+    append/summarized/set_status read and rewrite the state in one WATCH/MULTI
+    transaction (redis.asyncio pipeline API). If another writer changes the key
+    in between, the transaction is aborted and the state evicted, not retried.
+    """
+
+    def __init__(
+        self,
+        redis: Any,
+        ttl: int = 1800,
+        max_messages: int = 50,
+        max_local_bytes: int = 32 * 1024 * 1024,
+        local_ttl: float = 300.0,
+        channel: str = INVALIDATION_CHANNEL,
+    ) -> None:
+        self.redis = redis
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.local: ByteLRUCache[bytes] = ByteLRUCache(max_local_bytes)
+        self.local_ttl = min(local_ttl, ttl)
+        self.channel = channel
+        self.worker_id = uuid.uuid4().hex
+        self._listening = False
+
+    async def get(self, tenant_id: int, session_id: str) -> ConversationState | None:
+        key = state_key(tenant_id, session_id)
+        tier = "local"
+        payload = self.local.get(key) if self._listening else None
+        if payload is None:
+            tier = "redis"
+            try:
+                payload = await self.redis.get(key)
+            except Exception:
+                logger.warning("Conversation state: Redis get failed", exc_info=True)
+                payload = None
+            if payload is None:
+                lookups_counter.inc(tier="all", result="miss")
+                return None
+            self._set_local(key, payload)
+
+        state = _decode(key, payload, tenant_id, session_id)
+        lookups_counter.inc(tier=tier, result="invalid" if state is None else "hit")
+        return state
+
+    async def put(self, state: ConversationState) -> None:
+        """Store the state (newest max_messages messages) - or evict it once the conversation isn't live"""
+        if ConversationStatus(state.status) not in LIVE_STATUSES:
+            await self.evict(state.tenant_id, state.session_id, reason="status")
+            return
+        key = state_key(state.tenant_id, state.session_id)
+        payload = encode_state(self._bounded(state))
+        try:
+            await self.redis.set(key, payload, ex=self.ttl)
+        except Exception:
+            logger.warning("Conversation state: Redis set failed, evicting %s", key, exc_info=True)
+            await self.evict(state.tenant_id, state.session_id, reason="error")
+            return
+        self._set_local(key, payload)
+        await self._publish(key)
+
+    async def append(
+        self, tenant_id: int, session_id: str, conversation_id: int, messages: list[CachedMessage]
+    ) -> None:
+        """Add a saved turn's messages to the cached state, if the conversation is cached"""
+
+        def change(state: ConversationState) -> bool:
+            if state.messages and messages and state.messages[-1].created_at > messages[0].created_at:
+                return False         # Turns of the session that overlapped - rebuild from Postgres
+            state.messages.extend(messages)
+            return True
+
+        # The session moved on to another conversation: the cached one is outdated
+        await self._update(tenant_id, session_id, conversation_id, change, evict_other=True)
+
+    async def summarized(
+        self,
+        tenant_id: int,
+        session_id: str,
+        conversation_id: int,
+        summary: str,
+        summary_token_count: int,
+        through_at: datetime,
+        through_id: int,
+    ) -> None:
+        """Move the cached state past a new rolling summary: messages it covers are dropped"""
+
+        def change(state: ConversationState) -> bool:
+            state.summary = summary
+            state.summary_token_count = summary_token_count
+            state.summarized_through_at = through_at
+            state.summarized_through_id = through_id
+            state.messages = [
+                m for m in state.messages
+                if m.created_at > through_at or (m.created_at == through_at and (m.id is None or m.id > through_id))
+            ]
+            return True
+
+        await self._update(tenant_id, session_id, conversation_id, change)
+
+    async def set_status(
+        self, tenant_id: int, session_id: str, conversation_id: int, status: ConversationStatus
+    ) -> None:
+        def change(state: ConversationState) -> bool:
+            state.status = status
+            return True
+
+        await self._update(tenant_id, session_id, conversation_id, change)
+
+    async def evict(self, tenant_id: int, session_id: str, reason: str = "explicit") -> None:
+        key = state_key(tenant_id, session_id)
+        self.local.delete(key)
+        try:
+            await self.redis.delete(key)
+        except Exception:
+            # The state goes stale until its TTL runs out - nothing better left to do
+            logger.error("Conversation state: Redis delete of %s failed", key, exc_info=True)
+        evictions_counter.inc(reason=reason)
+        await self._publish(key)
+
+    async def run(self, retry_delay: float = 5.0) -> None:
+        """Drop local copies of states other workers wrote - until cancelled"""
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                self._listening = True
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    worker, _, key = message["data"].decode().partition(" ")
+                    if worker != self.worker_id:
+                        self.local.delete(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Conversation state: Redis subscription lost, resubscribing", exc_info=True)
+            finally:
+                # Invalidations may be missed until the subscription is back
+                self._listening = False
+                self.local.clear()
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(retry_delay)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "listening": self._listening,
+            "local_entries": len(self.local),
+            "local_bytes": self.local.current_bytes,
+            "local_evictions": self.local.evictions,
+        }
+
+    async def _update(
+        self,
+        tenant_id: int,
+        session_id: str,
+        conversation_id: int,
+        change: Callable[[ConversationState], bool],
+        evict_other: bool = False,
+    ) -> None:
+        """
+        Apply change to the cached state of conversation_id in one WATCH/MULTI transaction
+
+        change edits the state in place and returns False if it can't be applied.
+        A state of another conversation is left alone, or evicted with evict_other.
+        Reads Redis, not the local tier - a local copy may trail another worker's write.
+        """
+        key = state_key(tenant_id, session_id)
+        reason = None
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(key)
+                payload = await pipe.get(key)
+                state = _decode(key, payload, tenant_id, session_id) if payload is not None else None
+                if state is None or (state.id != conversation_id and not evict_other):
+                    return
+                if state.id != conversation_id or not change(state):
+                    reason = "conflict"
+                elif ConversationStatus(state.status) not in LIVE_STATUSES:
+                    reason = "status"
+                else:
+                    payload = encode_state(self._bounded(state))
+                    pipe.multi()
+                    pipe.set(key, payload, ex=self.ttl)
+                    await pipe.execute()
+        except WatchError:
+            reason = "conflict"      # Another writer got there first
+        except Exception:
+            logger.warning("Conversation state: Redis update failed, evicting %s", key, exc_info=True)
+            reason = "error"
+        if reason is not None:
+            await self.evict(tenant_id, session_id, reason=reason)
+            return
+        self._set_local(key, payload)
+        await self._publish(key)
+
+    def _bounded(self, state: ConversationState) -> ConversationState:
+        """The state with at most max_messages newest messages"""
+        if len(state.messages) > self.max_messages:
+            return replace(state, messages=state.messages[-self.max_messages:], truncated=True)
+        return state
+
+    def _set_local(self, key: str, payload: bytes) -> None:
+        if self._listening:
+            self.local.set(key, payload, self.local_ttl)
+
+    async def _publish(self, key: str) -> None:
+        try:
+            await self.redis.publish(self.channel, f"{self.worker_id} {key}")
+        except Exception:
+            logger.warning("Conversation state: Redis publish failed", exc_info=True)
+
+
+def _decode(key: str, payload: bytes, tenant_id: int, session_id: str) -> ConversationState | None:
+    """The stored state, None if it has another format version or belongs to another session"""
+    state = decode_state(payload)
+    if state is not None and (state.tenant_id != tenant_id or state.session_id != session_id):
+        logger.error("Conversation state: %s holds another session's state, ignoring it", key)
+        return None
+    return state
+
+
+def _code(enum_class: type[Enum], value: Any) -> int:
+    return ENUM_CODES[enum_class][enum_class(value)]
+
+
+def _member(enum_class: type[Enum], code: int) -> Any:
+    return _MEMBERS[enum_class][code]
+
+
+def _micros(value: datetime | None) -> int | None:
+    """Naive UTC datetime (models.utc_now) as microseconds since the epoch"""
+    return None if value is None else (value - _EPOCH) // _MICROSECOND
+
+
+def _datetime(value: int | None) -> datetime | None:
+    return None if value is None else _EPOCH + value * _MICROSECOND
@@ -0,0 +1,75 @@
+# packages/caching/lru.py
+# In-process LRU cache bounded by total bytes, with per-entry expiry
+# The L1 "hot" tier in front of Redis - a dict lookup instead of a network round trip
+
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Generic, TypeVar
+
+V = TypeVar("V")
+
+
+class ByteLRUCache(Generic[V]):
+    """
+    Least-recently-used cache that evicts by memory size, not entry count
+
+    Why bytes instead of entries?
+    - LLM replies vary from 20 bytes to 20 KB, so an entry limit says
+      nothing about real memory use per worker
+    - A byte budget makes the worst case predictable: max_bytes per process
+
+    Expired entries are dropped lazily when they are read or pushed out.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        sizeof: Callable[[V], int] = len,  # type: ignore[assignment]
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.clock = clock
+        self._entries: OrderedDict[str, tuple[V, float, int]] = OrderedDict()
+        self.current_bytes = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at, _ = entry
+        if expires_at <= self.clock():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: V, ttl: float) -> None:
+        size = len(key) + self.sizeof(value)
+        if size > self.max_bytes or ttl <= 0:
+            return                        # Never let one huge entry flush the whole cache
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, self.clock() + ttl, size)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self.current_bytes -= size
@@ -0,0 +1,190 @@
+# packages/caching/redis_client.py
+# Shared Redis client for all caching layers + an in-memory stand-in
+# The stand-in implements only the commands our caches use, so benchmarks
+# and local runs work without a Redis server
+
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from functools import lru_cache
+from typing import Any
+
+from redis.exceptions import WatchError
+
+from packages.core.config import get_settings
+
+
+@lru_cache(maxsize=1)
+def get_redis() -> Any | None:
+    """
+    Process-wide async Redis client, or None when REDIS_URL is not set
+
+    Callers treat None as "no shared tier" and keep working with their
+    in-process state only.
+    """
+    url = get_settings().redis_url
+    if not url:
+        return None
+    import redis.asyncio as redis
+
+    # Raw bytes in and out - each cache chooses its own encoding
+    return redis.Redis.from_url(url, decode_responses=False)
+
+
+class InMemoryRedis:
+    """
+    Minimal async Redis stand-in (get/set/delete with expiry, publish/subscribe,
+    WATCH/MULTI transactions)
+
+    Behaves like redis.asyncio.Redis for the subset of commands used here,
+    including returning bytes from get() and in pub/sub messages.
+    """
+
+    def __init__(self) -> None:
+        self._data: dict[str, tuple[bytes, float | None]] = {}
+        self._subscribers: dict[str, list[asyncio.Queue[dict[str, Any]]]] = {}
+        self._revisions: dict[str, int] = {}    # Bumped on every change of a key (WATCH)
+
+    def _alive(self, key: str) -> tuple[bytes, float | None] | None:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            self._touch(key)
+            return None
+        return entry
+
+    def _touch(self, key: str) -> None:
+        self._revisions[key] = self._revisions.get(key, 0) + 1
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._alive(key)
+        return entry[0] if entry else None
+
+    async def set(
+        self, key: str, value: bytes | str, ex: int | None = None, nx: bool = False
+    ) -> bool | None:
+        if nx and self._alive(key) is not None:
+            return None
+        data = value.encode() if isinstance(value, str) else value
+        self._data[key] = (data, time.monotonic() + ex if ex else None)
+        self._touch(key)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        removed = 0
+        for key in keys:
+            if self._data.pop(key, None) is not None:
+                self._touch(key)
+                removed += 1
+        return removed
+
+    async def ttl(self, key: str) -> int:
+        entry = self._alive(key)
+        if entry is None:
+            return -2
+        if entry[1] is None:
+            return -1
+        return max(0, int(entry[1] - time.monotonic()))
+
+    async def publish(self, channel: str, message: bytes | str) -> int:
+        data = message.encode() if isinstance(message, str) else message
+        subscribers = self._subscribers.get(channel, [])
+        for queue in subscribers:
+            queue.put_nowait({"type": "message", "channel": channel.encode(), "data": data})
+        return len(subscribers)
+
+    def pubsub(self) -> "InMemoryPubSub":
+        return InMemoryPubSub(self)
+
+    def pipeline(self, transaction: bool = True) -> "InMemoryPipeline":
+        return InMemoryPipeline(self)
+
+
+class InMemoryPipeline:
+    """
+    redis.asyncio Pipeline stand-in for optimistic transactions
+
+    Usage (as with redis.asyncio):
+        async with redis.pipeline() as pipe:
+            await pipe.watch(key)
+            value = await pipe.get(key)          # Immediate while watching
+            pipe.multi()
+            pipe.set(key, new_value, ex=60)      # Queued
+            await pipe.execute()                 # WatchError if key changed since watch()
+    """
+
+    def __init__(self, redis: InMemoryRedis) -> None:
+        self._redis = redis
+        self._watched: dict[str, int] = {}
+        self._queued: list[tuple[str, tuple[Any, ...], dict[str, Any]]] = []
+        self._immediate = False
+
+    async def __aenter__(self) -> "InMemoryPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.reset()
+
+    async def watch(self, *keys: str) -> None:
+        for key in keys:
+            self._redis._alive(key)          # An expiry before WATCH isn't a change after it
+            self._watched[key] = self._redis._revisions.get(key, 0)
+        self._immediate = True
+
+    def multi(self) -> None:
+        self._immediate = False
+
+    def get(self, key: str) -> Any:
+        return self._command("get", key)
+
+    def set(self, key: str, value: bytes | str, ex: int | None = None, nx: bool = False) -> Any:
+        return self._command("set", key, value, ex=ex, nx=nx)
+
+    def delete(self, *keys: str) -> Any:
+        return self._command("delete", *keys)
+
+    async def execute(self) -> list[Any]:
+        try:
+            for key, revision in self._watched.items():
+                self._redis._alive(key)
+                if self._redis._revisions.get(key, 0) != revision:
+                    raise WatchError(f"Watched variable changed: {key}")
+            return [await getattr(self._redis, name)(*args, **kwargs) for name, args, kwargs in self._queued]
+        finally:
+            await self.reset()
+
+    async def reset(self) -> None:
+        self._watched.clear()
+        self._queued.clear()
+        self._immediate = False
+
+    def _command(self, name: str, *args: Any, **kwargs: Any) -> Any:
+        # Like redis-py: a coroutine while watching, else queued and the pipeline returned
+        if self._immediate:
+            return getattr(self._redis, name)(*args, **kwargs)
+        self._queued.append((name, args, kwargs))
+        return self
+
+
+class InMemoryPubSub:
+    """redis.asyncio PubSub stand-in: subscribe, listen, aclose"""
+
+    def __init__(self, redis: InMemoryRedis) -> None:
+        self._redis = redis
+        self._queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        self._channels: list[str] = []
+
+    async def subscribe(self, *channels: str) -> None:
+        for channel in channels:
+            self._redis._subscribers.setdefault(channel, []).append(self._queue)
+            self._channels.append(channel)
+            self._queue.put_nowait({"type": "subscribe", "channel": channel.encode(), "data": len(self._channels)})
+
+    async def listen(self) -> AsyncIterator[dict[str, Any]]:
+        while True:
+            yield await self._queue.get()
+
+    async def aclose(self) -> None:
+        for channel in self._channels:
+            self._redis._subscribers[channel].remove(self._queue)
+        self._channels.clear()
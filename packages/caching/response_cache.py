@@ -0,0 +1,165 @@
+# packages/caching/response_cache.py
+# L1 response cache (exact match) - see docs/core-technologies/caching-strategy.md
+# Two tiers: per-worker byte-bounded LRU -> shared Redis, keyed per tenant
+
+import hashlib
+import json
+import logging
+import re
+import unicodedata
+from typing import Any
+
+from packages.core.enums import ConversationType
+from packages.core.metrics import metrics
+
+from .lru import ByteLRUCache
+
+logger = logging.getLogger(__name__)
+
+# Cache lifetime per business purpose (seconds)
+# FAQ-style support answers are stable for hours; billing answers go stale fast;
+# feedback conversations are personal, so they are never cached (TTL 0)
+DEFAULT_TTLS: dict[ConversationType, int] = {
+    ConversationType.SUPPORT: 6 * 3600,
+    ConversationType.TECHNICAL: 12 * 3600,
+    ConversationType.GENERAL: 24 * 3600,
+    ConversationType.SALES: 6 * 3600,
+    ConversationType.BILLING: 1 * 3600,
+    ConversationType.FEEDBACK: 0,
+}
+
+lookups_counter = metrics.counter("response_cache_lookups_total", "L1 lookups by tier and result")
+evictions_counter = metrics.counter("response_cache_evictions_total", "L1 local LRU evictions")
+
+_WHITESPACE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " \t\n.!?,;:"
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Canonical form of a prompt for exact-match lookups
+
+    "  How do I RESET my password?? " and "how do i reset my password"
+    are the same FAQ question and must map to the same key.
+    """
+    text = unicodedata.normalize("NFKC", prompt).casefold()
+    text = _WHITESPACE.sub(" ", text)
+    return text.strip(_EDGE_PUNCTUATION)
+
+
+def build_cache_key(
+    tenant_id: int, conversation_type: ConversationType | str, model: str, prompt: str
+) -> str:
+    """
+    Key layout: l1:{tenant_id}:{conversation_type}:{model}:{sha256(normalized prompt)}
+
+    tenant_id comes first and is part of every key, so one tenant's entries
+    can never be read by another tenant (and can be scanned/deleted per tenant).
+    """
+    digest = hashlib.sha256(normalize_prompt(prompt).encode()).hexdigest()[:32]
+    return f"l1:{tenant_id}:{ConversationType(conversation_type).value}:{model}:{digest}"
+
+
+class ResponseCache:
+    """
+    Exact-match cache of assistant replies
+
+    Lookup order: local LRU (microseconds) -> Redis (one round trip) -> miss.
+    A Redis hit is copied into the local LRU, so a hot FAQ answer is served
+    from process memory after the first request on each worker.
+
+    Redis errors are logged and treated as misses - the cache must never
+    turn a Redis outage into a chat outage.
+    """
+
+    def __init__(
+        self,
+        redis: Any | None = None,
+        max_local_bytes: int = 64 * 1024 * 1024,
+        ttls: dict[ConversationType, int] | None = None,
+        default_ttl: int = 3600,
+    ) -> None:
+        self.redis = redis
+        self.local: ByteLRUCache[bytes] = ByteLRUCache(max_local_bytes)
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+
+    def ttl_for(self, conversation_type: ConversationType | str) -> int:
+        return self.ttls.get(ConversationType(conversation_type), self.default_ttl)
+
+    async def get(
+        self, tenant_id: int, conversation_type: ConversationType | str, model: str, prompt: str
+    ) -> str | None:
+        """Cached reply for this tenant/type/model/prompt, or None"""
+        if self.ttl_for(conversation_type) <= 0:
+            return None
+        key = build_cache_key(tenant_id, conversation_type, model, prompt)
+
+        payload = self.local.get(key)
+        if payload is not None:
+            lookups_counter.inc(tier="local", result="hit")
+            return self._decode(payload, tenant_id)
+
+        if self.redis is not None:
+            try:
+                payload = await self.redis.get(key)
+            except Exception:
+                logger.warning("Response cache: Redis get failed", exc_info=True)
+                payload = None
+            if payload is not None:
+                lookups_counter.inc(tier="redis", result="hit")
+                self._set_local(key, payload, self.ttl_for(conversation_type))
+                return self._decode(payload, tenant_id)
+
+        self.misses += 1
+        lookups_counter.inc(tier="all", result="miss")
+        return None
+
+    async def put(
+        self,
+        tenant_id: int,
+        conversation_type: ConversationType | str,
+        model: str,
+        prompt: str,
+        reply: str,
+    ) -> None:
+        ttl = self.ttl_for(conversation_type)
+        if ttl <= 0 or not reply:
+            return
+        key = build_cache_key(tenant_id, conversation_type, model, prompt)
+        # Tenant id travels inside the value too: a second, independent isolation check
+        payload = json.dumps({"tenant_id": tenant_id, "reply": reply}).encode()
+        self._set_local(key, payload, ttl)
+        if self.redis is not None:
+            try:
+                await self.redis.set(key, payload, ex=ttl)
+            except Exception:
+                logger.warning("Response cache: Redis set failed", exc_info=True)
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.local.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "local_entries": len(self.local),
+            "local_bytes": self.local.current_bytes,
+        }
+
+    def _set_local(self, key: str, payload: bytes, ttl: int) -> None:
+        before = self.local.evictions
+        self.local.set(key, payload, ttl)
+        if self.local.evictions > before:
+            evictions_counter.inc(self.local.evictions - before)
+
+    def _decode(self, payload: bytes, tenant_id: int) -> str | None:
+        data = json.loads(payload)
+        if data.get("tenant_id") != tenant_id:
+            logger.error("Response cache: tenant mismatch for tenant %s, ignoring entry", tenant_id)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data["reply"]
@@ -0,0 +1,232 @@
+# packages/caching/semantic_cache.py
+# L2 semantic cache (similar prompts) - see docs/core-technologies/caching-strategy.md
+# "How can I reset my password?" and "how to reset password" share one cached answer
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any, Generic, TypeVar
+
+from packages.core.config import Settings
+from packages.core.embeddings import Embedder, create_embedder
+from packages.core.enums import ConversationType
+from packages.core.metrics import metrics
+
+from .response_cache import DEFAULT_TTLS, normalize_prompt
+from .vector_index import NumpyIndex, QdrantIndex, VectorIndex
+
+logger = logging.getLogger(__name__)
+
+lookups_counter = metrics.counter("semantic_cache_lookups_total", "L2 lookups by result")
+batch_histogram = metrics.histogram(
+    "semantic_cache_batch_size", "Items per embedding/index batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class _MicroBatcher(Generic[T, R]):
+    """
+    Collects concurrent submit() calls into one batch call
+
+    A batch is flushed when it reaches max_batch items or max_delay seconds
+    after its first item, whichever comes first. Under load this turns N
+    embedding/index round trips into one; at low traffic it adds at most
+    max_delay to a lookup.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[list[T]], Awaitable[list[R]]],
+        max_batch: int,
+        max_delay: float,
+    ) -> None:
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: list[tuple[T, asyncio.Future[R]]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._inflight: set[asyncio.Task[None]] = set()
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[R] = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    async def drain(self) -> None:
+        """Flush everything queued and wait for in-flight batches (shutdown, tests)"""
+        self._flush()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, batch: list[tuple[T, asyncio.Future[R]]]) -> None:
+        batch_histogram.observe(len(batch))
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for (_, future), result in zip(batch, results, strict=True):
+            if not future.done():
+                future.set_result(result)
+
+
+def partition_for(tenant_id: int, conversation_type: ConversationType | str, model: str) -> str:
+    """Index partition: tenant first, so a tenant's vectors are never searched by another"""
+    return f"{tenant_id}:{ConversationType(conversation_type).value}:{model}"
+
+
+class SemanticCache:
+    """
+    Reply cache keyed by prompt meaning instead of exact text
+
+    Lookups and inserts are micro-batched: concurrent requests share one
+    embedding call and one index search. A hit needs cosine similarity
+    >= threshold (0.85 per the caching strategy doc) inside the caller's
+    tenant/type/model partition, and an unexpired entry.
+    """
+
+    def __init__(
+        self,
+        index: VectorIndex,
+        embedder: Embedder,
+        threshold: float = 0.85,
+        ttls: dict[ConversationType, int] | None = None,
+        max_batch: int = 64,
+        max_delay: float = 0.002,
+    ) -> None:
+        self.index = index
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.hits = 0
+        self.misses = 0
+        self._lookups: _MicroBatcher[tuple[str, str], str | None] = _MicroBatcher(
+            self._lookup_batch, max_batch, max_delay
+        )
+        self._inserts: _MicroBatcher[tuple[str, str, dict[str, Any]], None] = _MicroBatcher(
+            self._insert_batch, max_batch, max_delay
+        )
+
+    async def get(
+        self, tenant_id: int, conversation_type: ConversationType | str, model: str, prompt: str
+    ) -> str | None:
+        if self.ttls.get(ConversationType(conversation_type), 0) <= 0:
+            return None
+        try:
+            reply = await self._lookups.submit(
+                (partition_for(tenant_id, conversation_type, model), normalize_prompt(prompt))
+            )
+        except Exception:
+            logger.warning("Semantic cache: lookup failed", exc_info=True)
+            reply = None
+        if reply is None:
+            self.misses += 1
+            lookups_counter.inc(result="miss")
+        else:
+            self.hits += 1
+            lookups_counter.inc(result="hit")
+        return reply
+
+    async def put(
+        self,
+        tenant_id: int,
+        conversation_type: ConversationType | str,
+        model: str,
+        prompt: str,
+        reply: str,
+    ) -> None:
+        ttl = self.ttls.get(ConversationType(conversation_type), 0)
+        if ttl <= 0 or not reply:
+            return
+        payload = {"reply": reply, "expires_at": time.time() + ttl}
+        try:
+            await self._inserts.submit(
+                (partition_for(tenant_id, conversation_type, model), normalize_prompt(prompt), payload)
+            )
+        except Exception:
+            logger.warning("Semantic cache: insert failed", exc_info=True)
+
+    async def drain(self) -> None:
+        await self._lookups.drain()
+        await self._inserts.drain()
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    async def _lookup_batch(self, items: list[tuple[str, str]]) -> list[str | None]:
+        vectors = await self.embedder.embed([prompt for _, prompt in items])
+        results = await self.index.search(
+            [partition for partition, _ in items], vectors, limit=1, min_score=self.threshold
+        )
+        now = time.time()
+        replies: list[str | None] = []
+        for hits in results:
+            if hits and hits[0].payload.get("expires_at", 0) > now:
+                replies.append(hits[0].payload["reply"])
+            else:
+                replies.append(None)
+        return replies
+
+    async def _insert_batch(self, items: list[tuple[str, str, dict[str, Any]]]) -> list[None]:
+        vectors = await self.embedder.embed([prompt for _, prompt, _ in items])
+        await self.index.upsert(
+            [partition for partition, _, _ in items],
+            # Same normalized prompt -> same id, so re-caching overwrites instead of duplicating
+            [hashlib.sha256(prompt.encode()).hexdigest()[:32] for _, prompt, _ in items],
+            vectors,
+            [payload for _, _, payload in items],
+        )
+        return [None] * len(items)
+
+
+def create_semantic_cache(settings: Settings) -> SemanticCache | None:
+    """Semantic cache configured from settings, None when ENABLE_SEMANTIC_CACHE=false"""
+    if not settings.enable_semantic_cache:
+        return None
+    index: VectorIndex
+    if settings.semantic_cache_backend == "qdrant":
+        index = QdrantIndex.from_url(
+            settings.qdrant_url,
+            settings.qdrant_api_key,
+            f"{settings.qdrant_collection_name}_semantic_cache",
+            settings.embedding_dim,
+        )
+    else:
+        index = NumpyIndex(
+            settings.embedding_dim, max_vectors=settings.semantic_cache_max_entries, expiry_key="expires_at"
+        )
+    # The offline provider gets the offline embedder too - no API keys anywhere
+    model = "hashing" if settings.llm_provider == "fake" else settings.embedding_model
+    return SemanticCache(
+        index,
+        create_embedder(model, settings.embedding_dim),
+        threshold=settings.semantic_cache_threshold,
+    )
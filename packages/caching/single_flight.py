@@ -0,0 +1,358 @@
+# packages/caching/single_flight.py
+# Single-flight coalescing of identical in-flight LLM calls
+# N concurrent requests for the same (tenant, model, prompt) -> one upstream stream,
+# fanned out chunk by chunk to every waiter; optionally across workers via Redis
+#
+# Why not just the response cache?
+# - The cache only helps once a reply is finished; a burst of identical questions
+#   (a status-page incident, a marketing email) arrives before the first one completes
+# - Without coalescing, every request in the burst pays for its own completion
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from collections.abc import AsyncIterator, Callable, Sequence
+from typing import Any
+
+from packages.core.metrics import metrics
+from packages.core.providers import ProviderChunk
+
+from .response_cache import normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+# Leader's upstream stream; it reports the model that actually answered (fallbacks)
+Upstream = Callable[[Callable[[str], None]], AsyncIterator[ProviderChunk]]
+
+requests_counter = metrics.counter(
+    "single_flight_requests_total", "Coalescable chat requests by role (leader/follower) and scope (local/redis)"
+)
+upstream_counter = metrics.counter("single_flight_upstream_calls_total", "Upstream LLM calls made by flight leaders")
+collapse_gauge = metrics.gauge(
+    "single_flight_collapse_ratio", "Requests per upstream call in this worker (1.0 = nothing coalesced)"
+)
+waiters_histogram = metrics.histogram(
+    "single_flight_waiters", "Requests served by one flight in this worker",
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+
+
+def build_flight_key(tenant_id: int, model: str, messages: Sequence[dict[str, str]]) -> str:
+    """
+    Key layout: flight:{tenant_id}:{model}:{sha256(normalized messages)}
+
+    Same normalization as the L1 cache - requests that would share a cache
+    entry once finished also share the call while it is running.
+    """
+    canonical = json.dumps([[m["role"], normalize_prompt(m["content"])] for m in messages])
+    digest = hashlib.sha256(canonical.encode()).hexdigest()[:32]
+    return f"flight:{tenant_id}:{model}:{digest}"
+
+
+class Flight:
+    """
+    One upstream call and everything it has produced so far
+
+    Chunks are kept for the lifetime of the flight, so a request that joins
+    late first replays what was already streamed and then follows live.
+    """
+
+    def __init__(self, key: str, model: str) -> None:
+        self.key = key
+        self.id = uuid.uuid4().hex           # Names the flight's Redis list and channel
+        self.model = model
+        self.chunks: list[ProviderChunk] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.remote = False                  # Served by a leader in another worker
+        self.requests = 0                    # Requests that joined (metrics)
+        self.listeners = 0                   # Requests still reading
+        self.changed = asyncio.Condition()
+        self.task: asyncio.Task | None = None
+
+    async def publish(self, chunk: ProviderChunk) -> None:
+        async with self.changed:
+            self.chunks.append(chunk)
+            self.changed.notify_all()
+
+    async def finish(self, error: BaseException | None = None) -> None:
+        async with self.changed:
+            self.done = True
+            self.error = error
+            self.changed.notify_all()
+
+    async def follow(self) -> AsyncIterator[ProviderChunk]:
+        index = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda seen=index: seen < len(self.chunks) or self.done)
+                pending = self.chunks[index:]
+                finished, error = self.done, self.error
+            index += len(pending)
+            for chunk in pending:
+                yield chunk
+            if finished and index == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class Subscription:
+    """A request's view of a flight: leader or follower, chunks from the start"""
+
+    def __init__(self, flight: Flight, leader: bool, on_close: Callable[[Flight], None]) -> None:
+        self.flight = flight
+        self.leader = leader
+        self._on_close = on_close
+
+    @property
+    def model(self) -> str:
+        return self.flight.model
+
+    @property
+    def remote(self) -> bool:
+        return self.flight.remote
+
+    async def __aiter__(self) -> AsyncIterator[ProviderChunk]:
+        try:
+            async for chunk in self.flight.follow():
+                yield chunk
+        finally:
+            self._on_close(self.flight)
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent upstream calls
+
+    In-process: the first request for a key starts the upstream call in its
+    own task; later requests for the same key attach to it. The task is not
+    tied to any one client, so the leader disconnecting doesn't cut off the
+    followers - it is cancelled only when every request has gone away.
+
+    With a Redis client (redis.asyncio API incl. pub/sub) flights are also
+    shared between workers: one worker wins a SET NX lock and publishes its
+    chunks to a list + channel, the others replay the list and follow the
+    channel instead of calling the provider. The lock holds the leader's flight
+    id and the list and channel are named after it, so a later flight for the
+    same key never replays an earlier one's events. A remote leader that goes silent
+    for wait_timeout is given up on and the worker makes its own call. Redis
+    errors degrade to in-process coalescing - never to a failed chat.
+    """
+
+    def __init__(self, redis: Any | None = None, wait_timeout: float = 30.0, lock_ttl: float = 120.0) -> None:
+        self.redis = redis
+        self.wait_timeout = wait_timeout
+        self.lock_ttl = lock_ttl
+        self._flights: dict[str, Flight] = {}
+        self._requests = 0
+        self._upstream_calls = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def key(self, tenant_id: int, model: str, messages: Sequence[dict[str, str]]) -> str:
+        return build_flight_key(tenant_id, model, messages)
+
+    def join(self, key: str, model: str, upstream: Upstream) -> Subscription:
+        """Attach to the running flight for key, or start one with upstream"""
+        flight = self._flights.get(key)
+        leader = flight is None
+        if flight is None:
+            flight = self._flights[key] = Flight(key, model)
+            flight.task = asyncio.create_task(self._run(flight, upstream))
+        else:
+            requests_counter.inc(role="follower", scope="local")
+        flight.requests += 1
+        flight.listeners += 1
+        self._requests += 1
+        self._update_ratio()
+        return Subscription(flight, leader, self._leave)
+
+    def _leave(self, flight: Flight) -> None:
+        flight.listeners -= 1
+        if flight.listeners == 0 and not flight.done and flight.task is not None:
+            # Nobody is reading any more - stop paying for the completion
+            flight.task.cancel()
+
+    def _update_ratio(self) -> None:
+        if self._upstream_calls:
+            collapse_gauge.set(self._requests / self._upstream_calls)
+
+    def _count_upstream(self) -> None:
+        self._upstream_calls += 1
+        upstream_counter.inc()
+        self._update_ratio()
+
+    async def _run(self, flight: Flight, upstream: Upstream) -> None:
+        """Produce the flight's chunks - from the provider or from another worker's leader"""
+        error: BaseException | None = None
+        try:
+            leader_id = flight.id if self.redis is None else await self._acquire(flight)
+            if self.redis is None or leader_id != flight.id:
+                if self.redis is not None:
+                    flight.remote = True
+                    if await self._follow_remote(flight, leader_id):
+                        return
+                    # Remote leader vanished before sending anything - answer ourselves
+                    flight.remote = False
+                requests_counter.inc(role="leader", scope="local")
+                await self._call_upstream(flight, upstream, publish=False)
+            else:
+                requests_counter.inc(role="leader", scope="redis" if self.redis is not None else "local")
+                await self._call_upstream(flight, upstream, publish=True)
+        except asyncio.CancelledError as cancelled:
+            error = cancelled
+            raise
+        except Exception as failure:
+            error = failure
+        finally:
+            self._flights.pop(flight.key, None)
+            waiters_histogram.observe(flight.requests)
+            await flight.finish(error)
+
+    async def _call_upstream(self, flight: Flight, upstream: Upstream, publish: bool) -> None:
+        self._count_upstream()
+        locked, seq = publish, 0
+
+        def on_model(model: str) -> None:
+            flight.model = model
+
+        try:
+            async for chunk in upstream(on_model):
+                await flight.publish(chunk)
+                if publish:
+                    publish = await self._publish(flight, seq, chunk=chunk)
+                    seq += 1
+            if publish:
+                await self._publish(flight, seq, end=True)
+        except Exception as error:
+            if publish:
+                await self._publish(flight, seq, error=error)
+            raise
+        finally:
+            if locked:
+                await self._release(flight)
+
+    # -- Redis: leader side ------------------------------------------------
+
+    @staticmethod
+    def _names(key: str, flight_id: str) -> tuple[str, str, str]:
+        """Lock, chunk list and channel of a flight"""
+        return f"{key}:leader", f"{key}:{flight_id}:chunks", f"{key}:{flight_id}:events"
+
+    async def _acquire(self, flight: Flight) -> str:
+        """
+        Id of the flight leading the key: flight.id if this worker won the lock
+        (also when Redis is unreachable), else the remote leader's
+        """
+        lock, _, _ = self._names(flight.key, flight.id)
+        try:
+            for _ in range(3):
+                if await self.redis.set(lock, flight.id, nx=True, px=int(self.lock_ttl * 1000)):
+                    return flight.id
+                leader_id = await self.redis.get(lock)
+                if leader_id is not None:
+                    return leader_id.decode() if isinstance(leader_id, bytes) else leader_id
+                # The leader finished between SET and GET - try to take over its lock
+        except Exception:
+            logger.warning("Single-flight: Redis lock failed, coalescing in-process only", exc_info=True)
+        return flight.id
+
+    async def _release(self, flight: Flight) -> None:
+        lock, _, _ = self._names(flight.key, flight.id)
+        try:
+            await self.redis.delete(lock)
+        except Exception:
+            logger.warning("Single-flight: Redis unlock failed", exc_info=True)
+
+    async def _publish(
+        self, flight: Flight, seq: int, chunk: ProviderChunk | None = None,
+        error: BaseException | None = None, end: bool = False,
+    ) -> bool:
+        """Append an event to the flight's list and announce it; False = stop publishing"""
+        event: dict[str, Any] = {"seq": seq, "model": flight.model}
+        if chunk is not None:
+            event.update(text=chunk.text, prompt_tokens=chunk.prompt_tokens, completion_tokens=chunk.completion_tokens)
+        if error is not None:
+            event["error"] = str(error) or type(error).__name__
+        if end:
+            event["end"] = True
+        _, chunks, channel = self._names(flight.key, flight.id)
+        payload = json.dumps(event)
+        try:
+            # List first: a follower that subscribes late still finds the event when it replays
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.rpush(chunks, payload)
+                pipe.pexpire(chunks, int(self.lock_ttl * 1000))
+                pipe.publish(channel, payload)
+                await pipe.execute()
+            return True
+        except Exception:
+            logger.warning("Single-flight: Redis publish failed, remote followers will fall back", exc_info=True)
+            return False
+
+    # -- Redis: follower side ----------------------------------------------
+
+    async def _follow_remote(self, flight: Flight, leader_id: str) -> bool:
+        """
+        Stream the events of the remote leader's flight leader_id into the local flight
+
+        Returns False if nothing arrived before wait_timeout (or Redis failed
+        first), so the caller can still make its own upstream call.
+        Raises if the leader failed, or went silent after the first chunk -
+        a reply cannot be continued by a different call.
+        """
+        _, chunks, channel = self._names(flight.key, leader_id)
+        seen = -1
+        try:
+            pubsub = self.redis.pubsub()
+            # Subscribe before replaying, so no event falls between the two
+            await pubsub.subscribe(channel)
+        except Exception:
+            logger.warning("Single-flight: Redis subscribe failed", exc_info=True)
+            return False
+        try:
+            backlog = [json.loads(raw) for raw in await self.redis.lrange(chunks, 0, -1)]
+            deadline = time.monotonic() + self.wait_timeout
+            while True:
+                for event in backlog:
+                    if event["seq"] <= seen:
+                        continue
+                    if seen < 0:
+                        requests_counter.inc(role="follower", scope="redis")
+                    seen = event["seq"]
+                    flight.model = event["model"]
+                    if "error" in event:
+                        raise RuntimeError(event["error"])
+                    if event.get("end"):
+                        return True
+                    await flight.publish(ProviderChunk(
+                        text=event["text"],
+                        prompt_tokens=event["prompt_tokens"],
+                        completion_tokens=event["completion_tokens"],
+                    ))
+                    deadline = time.monotonic() + self.wait_timeout
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if seen < 0:
+                        return False
+                    raise TimeoutError(f"Single-flight leader went silent for {self.wait_timeout}s")
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+                backlog = [json.loads(message["data"])] if message is not None else []
+        except (RuntimeError, TimeoutError):
+            raise
+        except Exception:
+            if seen >= 0:
+                raise
+            logger.warning("Single-flight: Redis follow failed", exc_info=True)
+            return False
+        finally:
+            try:
+                await pubsub.unsubscribe(channel)
+                await pubsub.aclose()
+            except Exception:
+                pass
@@ -0,0 +1,449 @@
+# packages/caching/vector_index.py
+# Pluggable nearest-neighbour index for the semantic cache and vector store
+# NumpyIndex: in-process (tests, small tenants); QdrantIndex: the shared Qdrant cluster
+
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any, Protocol
+
+import numpy as np
+
+from packages.core.embeddings import normalize_rows
+from packages.core.metrics import metrics
+
+evictions_counter = metrics.counter("vector_index_evictions_total", "NumpyIndex rows dropped by reason")
+
+
+@dataclass(frozen=True)
+class VectorHit:
+    """One search result: caller's id, cosine similarity and stored payload"""
+    id: str
+    score: float
+    payload: dict[str, Any]
+
+
+class VectorIndex(Protocol):
+    """
+    Batched upsert/search where every row belongs to a partition
+
+    Partitions are opaque strings chosen by the caller (always tenant-scoped,
+    e.g. "42:support:gpt-4o-mini"). A search never returns rows from another
+    partition - this is the tenant isolation boundary of the vector layer.
+    """
+
+    async def upsert(
+        self,
+        partitions: Sequence[str],
+        ids: Sequence[str],
+        vectors: np.ndarray,
+        payloads: Sequence[dict[str, Any]],
+    ) -> None: ...
+
+    async def search(
+        self,
+        partitions: Sequence[str],
+        queries: np.ndarray,
+        limit: int = 1,
+        min_score: float = 0.0,
+    ) -> list[list[VectorHit]]: ...
+
+    async def delete_partition(self, partition: str) -> None: ...
+
+
+class _Partition:
+    """Vectors of one partition in a growable matrix, plus an optional IVF layer"""
+
+    def __init__(self, dim: int) -> None:
+        self.matrix = np.zeros((64, dim), dtype=np.float32)
+        self.size = 0
+        self.ids: list[str] = []
+        self.payloads: list[dict[str, Any]] = []
+        self.rows: dict[str, int] = {}
+        # IVF state: centroids + inverted lists of row numbers, built once the partition is big
+        self.centroids: np.ndarray | None = None
+        self.lists: list[list[int]] = []
+        self.list_arrays: dict[int, np.ndarray] = {}
+        self.trained_at_size = 0
+
+    def add(self, key: str, vector: np.ndarray, payload: dict[str, Any]) -> int | None:
+        """Insert or overwrite; returns the new row number (None when overwriting)"""
+        row = self.rows.get(key)
+        if row is not None:
+            self.matrix[row] = vector
+            self.payloads[row] = payload
+            return None
+        if self.size == len(self.matrix):
+            # Amortized doubling keeps inserts O(1) without reallocating per batch
+            grown = np.zeros((len(self.matrix) * 2, self.matrix.shape[1]), dtype=np.float32)
+            grown[: self.size] = self.matrix[: self.size]
+            self.matrix = grown
+        row = self.size
+        self.matrix[row] = vector
+        self.ids.append(key)
+        self.payloads.append(payload)
+        self.rows[key] = row
+        self.size += 1
+        return row
+
+    def remove(self, rows: set[int]) -> None:
+        """Drop rows and close the gaps - row numbers (and the IVF lists) are renumbered"""
+        keep = np.ones(self.size, dtype=bool)
+        keep[list(rows)] = False
+        kept = np.flatnonzero(keep)
+        renumber = np.cumsum(keep) - 1
+        capacity = len(self.matrix)
+        while capacity > 64 and len(kept) <= capacity // 4:
+            capacity //= 2                      # Give memory back once the partition shrank
+        matrix = np.zeros((capacity, self.matrix.shape[1]), dtype=np.float32)
+        matrix[: len(kept)] = self.matrix[kept]
+        self.matrix = matrix
+        self.ids = [self.ids[row] for row in kept.tolist()]
+        self.payloads = [self.payloads[row] for row in kept.tolist()]
+        self.rows = {key: row for row, key in enumerate(self.ids)}
+        self.size = len(kept)
+        if self.centroids is not None:
+            for c, members in enumerate(self.lists):
+                members_array = np.asarray(members, dtype=np.int64)
+                self.lists[c] = renumber[members_array[keep[members_array]]].tolist()
+            self.list_arrays = {}
+
+
+class NumpyIndex:
+    """
+    In-process index: exact brute force, switching to IVF for large partitions
+
+    Brute force is one (queries x rows) matrix product - exact and fast up to
+    tens of thousands of vectors. Past `ivf_threshold` a partition gets an
+    inverted-file layer: k-means centroids, each row assigned to its nearest
+    centroid, and a query scans only the `nprobe` closest lists.
+    Recall vs. latency of that trade-off is measured by benchmarks/semantic_index.py.
+
+    Bounded when used as a cache (the semantic cache's default backend):
+    - max_vectors caps the rows of all partitions together; past it the least
+      recently upserted or found rows go, down to 90% so eviction runs in batches
+    - expiry_key names a payload field holding an epoch-seconds expiry; expired
+      rows are swept every sweep_interval seconds (and before evicting live ones)
+    Removed rows are compacted out of their partition right away.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        ivf_threshold: int = 50_000,
+        nprobe: int = 8,
+        seed: int = 0,
+        max_vectors: int | None = None,
+        expiry_key: str | None = None,
+        sweep_interval: float = 60.0,
+    ) -> None:
+        self.dim = dim
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.max_vectors = max_vectors
+        self.expiry_key = expiry_key
+        self.sweep_interval = sweep_interval
+        self._rng = np.random.default_rng(seed)
+        self._partitions: dict[str, _Partition] = {}
+        # (partition, id) least recently used first - only kept when max_vectors is set
+        self._recency: OrderedDict[tuple[str, str], None] = OrderedDict()
+        self._swept_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return sum(p.size for p in self._partitions.values())
+
+    async def upsert(
+        self,
+        partitions: Sequence[str],
+        ids: Sequence[str],
+        vectors: np.ndarray,
+        payloads: Sequence[dict[str, Any]],
+    ) -> None:
+        vectors = normalize_rows(vectors)
+        touched: set[str] = set()
+        new_rows: dict[str, list[int]] = {}
+        for name, key, vector, payload in zip(partitions, ids, vectors, payloads, strict=True):
+            partition = self._partitions.get(name)
+            if partition is None:
+                partition = self._partitions[name] = _Partition(self.dim)
+            row = partition.add(key, vector, payload)
+            touched.add(name)
+            if row is not None:
+                new_rows.setdefault(name, []).append(row)
+            self._touch(name, key)
+
+        for name in touched:
+            partition = self._partitions[name]
+            if partition.size >= self.ivf_threshold and partition.size >= 4 * partition.trained_at_size:
+                self._train(partition)          # First build, or the partition grew 4x since
+            elif partition.centroids is not None and name in new_rows:
+                self._assign(partition, new_rows[name])
+        self._evict()
+
+    async def search(
+        self,
+        partitions: Sequence[str],
+        queries: np.ndarray,
+        limit: int = 1,
+        min_score: float = 0.0,
+    ) -> list[list[VectorHit]]:
+        queries = normalize_rows(queries)
+        results: list[list[VectorHit]] = [[] for _ in range(len(queries))]
+
+        # Group rows by partition so each partition is scanned once per batch
+        grouped: dict[str, list[int]] = {}
+        for position, name in enumerate(partitions):
+            grouped.setdefault(name, []).append(position)
+
+        for name, positions in grouped.items():
+            partition = self._partitions.get(name)
+            if partition is None or partition.size == 0:
+                continue
+            block = queries[positions]
+            if partition.centroids is None:
+                scores = block @ partition.matrix[: partition.size].T
+                for position, row_scores in zip(positions, scores, strict=True):
+                    results[position] = self._top(partition, row_scores, None, limit, min_score)
+            else:
+                for position, query in zip(positions, block, strict=True):
+                    candidates = self._candidates(partition, query)
+                    row_scores = partition.matrix[candidates] @ query
+                    results[position] = self._top(partition, row_scores, candidates, limit, min_score)
+            for position in positions:
+                for hit in results[position]:
+                    self._touch(name, hit.id)
+        return results
+
+    async def delete_partition(self, partition: str) -> None:
+        if self._partitions.pop(partition, None) is not None and self.max_vectors is not None:
+            for entry in [entry for entry in self._recency if entry[0] == partition]:
+                del self._recency[entry]
+
+    def _touch(self, partition: str, key: str) -> None:
+        if self.max_vectors is not None:
+            self._recency[(partition, key)] = None
+            self._recency.move_to_end((partition, key))
+
+    def _evict(self) -> None:
+        """Sweep expired rows when due, then drop least recently used ones while over max_vectors"""
+        over = self.max_vectors is not None and len(self._recency) > self.max_vectors
+        doomed: dict[str, set[int]] = {}
+        if self.expiry_key is not None and (over or time.monotonic() - self._swept_at >= self.sweep_interval):
+            self._swept_at = time.monotonic()
+            now = time.time()
+            for name, partition in self._partitions.items():
+                expired = {
+                    row for row, payload in enumerate(partition.payloads)
+                    if payload.get(self.expiry_key, now + 1) <= now
+                }
+                if expired:
+                    doomed[name] = expired
+            if doomed:
+                evictions_counter.inc(sum(map(len, doomed.values())), reason="expired")
+        if over:
+            remaining = len(self._recency) - sum(map(len, doomed.values()))
+            target = int(self.max_vectors * 0.9)        # type: ignore[operator]
+            evicted = 0
+            for name, key in self._recency:
+                if remaining <= target:
+                    break
+                row = self._partitions[name].rows[key]
+                rows = doomed.setdefault(name, set())
+                if row not in rows:
+                    rows.add(row)
+                    remaining -= 1
+                    evicted += 1
+            if evicted:
+                evictions_counter.inc(evicted, reason="capacity")
+
+        for name, rows in doomed.items():
+            partition = self._partitions[name]
+            if self.max_vectors is not None:
+                for row in rows:
+                    self._recency.pop((name, partition.ids[row]), None)
+            partition.remove(rows)
+            if partition.size == 0:
+                del self._partitions[name]
+
+    def _top(
+        self,
+        partition: _Partition,
+        scores: np.ndarray,
+        rows: np.ndarray | None,
+        limit: int,
+        min_score: float,
+    ) -> list[VectorHit]:
+        if len(scores) == 0:
+            return []
+        k = min(limit, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        hits = []
+        for index in best:
+            score = float(scores[index])
+            if score < min_score:
+                break
+            row = int(rows[index]) if rows is not None else int(index)
+            hits.append(VectorHit(partition.ids[row], score, partition.payloads[row]))
+        return hits
+
+    def _train(self, partition: _Partition, iterations: int = 8) -> None:
+        """Spherical k-means on a sample, then assign every row to a list"""
+        size = partition.size
+        nlist = max(16, int(np.sqrt(size)))
+        sample_size = min(size, nlist * 64)
+        sample = partition.matrix[self._rng.choice(size, sample_size, replace=False)]
+        centroids = sample[self._rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = normalize_rows(centroids)
+
+        partition.centroids = centroids
+        partition.lists = [[] for _ in range(nlist)]
+        partition.list_arrays = {}
+        partition.trained_at_size = size
+        self._assign(partition, range(size))
+
+    def _assign(self, partition: _Partition, rows: Sequence[int] | range) -> None:
+        assert partition.centroids is not None
+        rows = np.asarray(rows, dtype=np.int64)
+        # Chunked so assigning a million rows never builds a giant temporary matrix
+        for start in range(0, len(rows), 65_536):
+            chunk = rows[start:start + 65_536]
+            nearest = np.argmax(partition.matrix[chunk] @ partition.centroids.T, axis=1)
+            for row, c in zip(chunk.tolist(), nearest.tolist(), strict=True):
+                partition.lists[c].append(row)
+                partition.list_arrays.pop(c, None)
+
+    def _candidates(self, partition: _Partition, query: np.ndarray) -> np.ndarray:
+        assert partition.centroids is not None
+        centroid_scores = partition.centroids @ query
+        nprobe = min(self.nprobe, len(centroid_scores))
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        arrays = []
+        for c in probes.tolist():
+            array = partition.list_arrays.get(c)
+            if array is None:
+                array = partition.list_arrays[c] = np.asarray(partition.lists[c], dtype=np.int64)
+            arrays.append(array)
+        return np.concatenate(arrays) if arrays else np.empty(0, dtype=np.int64)
+
+
+class QdrantIndex:
+    """
+    Qdrant-backed index: one collection, partitions stored as a tenant payload key
+
+    Why one collection instead of one per tenant?
+    - Qdrant's recommended multitenancy layout: a keyword payload index with
+      is_tenant=True groups each tenant's vectors together on disk
+    - Thousands of small tenants don't mean thousands of collections
+    """
+
+    _NAMESPACE = uuid.UUID("6f1c2a4e-3b7d-4c55-9a0e-2f8d1b9c7e31")
+
+    def __init__(self, client: Any, collection: str, dim: int) -> None:
+        self.client = client
+        self.collection = collection
+        self.dim = dim
+        self._ready = False
+
+    @classmethod
+    def from_url(cls, url: str, api_key: str | None, collection: str, dim: int) -> "QdrantIndex":
+        from qdrant_client import AsyncQdrantClient
+
+        return cls(AsyncQdrantClient(url=url, api_key=api_key), collection, dim)
+
+    async def ensure_collection(self) -> None:
+        if self._ready:
+            return
+        from qdrant_client import models
+
+        if not await self.client.collection_exists(self.collection):
+            await self.client.create_collection(
+                self.collection,
+                vectors_config=models.VectorParams(size=self.dim, distance=models.Distance.COSINE),
+            )
+            await self.client.create_payload_index(
+                self.collection,
+                field_name="partition",
+                field_schema=models.KeywordIndexParams(type="keyword", is_tenant=True),
+            )
+        self._ready = True
+
+    def _point_id(self, partition: str, key: str) -> str:
+        # Qdrant ids must be integers or UUIDs - derive a stable UUID per (partition, key)
+        return str(uuid.uuid5(self._NAMESPACE, f"{partition}\x00{key}"))
+
+    async def upsert(
+        self,
+        partitions: Sequence[str],
+        ids: Sequence[str],
+        vectors: np.ndarray,
+        payloads: Sequence[dict[str, Any]],
+    ) -> None:
+        from qdrant_client import models
+
+        await self.ensure_collection()
+        points = [
+            models.PointStruct(
+                id=self._point_id(partition, key),
+                vector=vector.tolist(),
+                payload={**payload, "partition": partition, "key": key},
+            )
+            for partition, key, vector, payload in zip(
+                partitions, ids, normalize_rows(vectors), payloads, strict=True
+            )
+        ]
+        if points:
+            # wait=False: the write is acknowledged once queued, indexing happens in the background
+            await self.client.upsert(self.collection, points=points, wait=False)
+
+    async def search(
+        self,
+        partitions: Sequence[str],
+        queries: np.ndarray,
+        limit: int = 1,
+        min_score: float = 0.0,
+    ) -> list[list[VectorHit]]:
+        from qdrant_client import models
+
+        await self.ensure_collection()
+        requests = [
+            models.QueryRequest(
+                query=query.tolist(),
+                filter=models.Filter(
+                    must=[models.FieldCondition(key="partition", match=models.MatchValue(value=partition))]
+                ),
+                limit=limit,
+                score_threshold=min_score,
+                with_payload=True,
+            )
+            for partition, query in zip(partitions, normalize_rows(queries), strict=True)
+        ]
+        if not requests:
+            return []
+        # One round trip for the whole batch instead of one per query
+        responses = await self.client.query_batch_points(self.collection, requests=requests)
+        return [
+            [VectorHit(str(point.payload["key"]), float(point.score), dict(point.payload)) for point in response.points]
+            for response in responses
+        ]
+
+    async def delete_partition(self, partition: str) -> None:
+        from qdrant_client import models
+
+        await self.ensure_collection()
+        await self.client.delete(
+            self.collection,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(
+                    must=[models.FieldCondition(key="partition", match=models.MatchValue(value=partition))]
+                )
+            ),
+        )
@@ -0,0 +1,233 @@
+# packages/core/analytics.py
+# Dashboard reads from the precomputed rollup tables (filled by packages/data/rollups.py)
+# A query touches (buckets in the window x keys) rows - independent of how much raw history exists
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .enums import MessageType, RollupGranularity, UserFeedback
+from .models import (
+    ConversationRollup,
+    MessageRollup,
+    RollupWatermark,
+    naive_utc,
+    utc_now,
+)
+
+# Upper bounds (minutes) of the resolution time histogram; one extra slot counts everything longer
+RESOLUTION_BUCKETS_MINUTES = (5, 15, 30, 60, 120, 240, 480, 1440, 2880, 10080)
+
+# Largest window a dashboard may request, in buckets: 31 days hourly, ~2 years daily
+MAX_BUCKETS = 744
+
+_BUCKET_SIZE = {RollupGranularity.HOUR: timedelta(hours=1), RollupGranularity.DAY: timedelta(days=1)}
+_DEFAULT_WINDOW = {RollupGranularity.HOUR: timedelta(hours=48), RollupGranularity.DAY: timedelta(days=30)}
+
+
+def histogram_percentile(counts: list[int], q: float) -> float | None:
+    """
+    Estimate the q-th percentile (0..100) from RESOLUTION_BUCKETS_MINUTES counts
+
+    Linear interpolation inside the bucket holding the target rank; values in
+    the overflow slot are reported as the last bound (a lower bound, not exact).
+    """
+    total = sum(counts)
+    if total == 0:
+        return None
+    target = total * q / 100
+    seen = 0
+    for index, count in enumerate(counts):
+        if count and seen + count >= target:
+            if index >= len(RESOLUTION_BUCKETS_MINUTES):
+                return float(RESOLUTION_BUCKETS_MINUTES[-1])
+            lower = RESOLUTION_BUCKETS_MINUTES[index - 1] if index else 0
+            upper = RESOLUTION_BUCKETS_MINUTES[index]
+            return lower + (upper - lower) * (target - seen) / count
+        seen += count
+    return float(RESOLUTION_BUCKETS_MINUTES[-1])
+
+
+@dataclass(frozen=True)
+class Window:
+    """Half-open [since, until) range of rollup buckets"""
+    granularity: RollupGranularity
+    since: datetime
+    until: datetime
+
+    @classmethod
+    def resolve(
+        cls,
+        granularity: RollupGranularity,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> "Window":
+        """Fill in defaults (last 48 hours / 30 days) and reject windows above MAX_BUCKETS"""
+        # Naive UTC like the database: aware datetimes (any offset) are converted first,
+        # so since and until are compared and stored on the same clock
+        until = naive_utc(until) if until else utc_now()
+        since = naive_utc(since) if since else until - _DEFAULT_WINDOW[granularity]
+        if since >= until:
+            raise ValueError("since must be before until")
+        if (until - since) / _BUCKET_SIZE[granularity] > MAX_BUCKETS:
+            raise ValueError(f"Window too large: at most {MAX_BUCKETS} {granularity.value} buckets")
+        # since snaps to its bucket so the first bucket is whole
+        since = since.replace(minute=0, second=0, microsecond=0)
+        if granularity == RollupGranularity.DAY:
+            since = since.replace(hour=0)
+        return cls(granularity, since, until)
+
+
+class AnalyticsRepository:
+    """
+    Read API for the analytics dashboard
+
+    Usage:
+        analytics = AnalyticsRepository(session)
+        window = Window.resolve(RollupGranularity.DAY)
+        tokens = await analytics.tokens_by_model(tenant_id, window)
+
+    Every query is a range scan of the rollup primary key
+    (tenant_id, granularity, bucket_start, ...). Numbers lag the raw tables by
+    up to one rollup run - see computed_through().
+    """
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def tokens_by_model(self, tenant_id: int, window: Window) -> list[dict[str, Any]]:
+        """Tokens and assistant messages per bucket and ai_model"""
+        query = (
+            select(
+                MessageRollup.bucket_start,
+                MessageRollup.ai_model,
+                func.sum(MessageRollup.message_count),
+                func.sum(MessageRollup.tokens_used),
+            )
+            .where(*_message_window(tenant_id, window))
+            .where(MessageRollup.ai_model != "")
+            .group_by(MessageRollup.bucket_start, MessageRollup.ai_model)
+            .order_by(MessageRollup.bucket_start, MessageRollup.ai_model)
+        )
+        return [
+            {"bucket": bucket, "ai_model": model, "messages": int(messages), "tokens": int(tokens)}
+            for bucket, model, messages, tokens in await self.session.execute(query)
+        ]
+
+    async def messages_by_type(self, tenant_id: int, window: Window) -> list[dict[str, Any]]:
+        """Message counts per bucket and MessageType"""
+        query = (
+            select(MessageRollup.bucket_start, MessageRollup.message_type, func.sum(MessageRollup.message_count))
+            .where(*_message_window(tenant_id, window))
+            .group_by(MessageRollup.bucket_start, MessageRollup.message_type)
+            .order_by(MessageRollup.bucket_start, MessageRollup.message_type)
+        )
+        return [
+            {"bucket": bucket, "message_type": message_type, "messages": int(messages)}
+            for bucket, message_type, messages in await self.session.execute(query)
+        ]
+
+    async def feedback(self, tenant_id: int, window: Window) -> list[dict[str, Any]]:
+        """
+        Feedback on assistant replies per bucket
+
+        positive_ratio = thumbs_up / rated replies, rated_ratio = rated / all replies
+        """
+        def count_of(feedback: str) -> Any:
+            return func.sum(case((MessageRollup.user_feedback == feedback, MessageRollup.message_count), else_=0))
+
+        query = (
+            select(
+                MessageRollup.bucket_start,
+                func.sum(MessageRollup.message_count),
+                count_of(UserFeedback.THUMBS_UP),
+                count_of(UserFeedback.THUMBS_DOWN),
+            )
+            .where(*_message_window(tenant_id, window))
+            .where(MessageRollup.message_type == MessageType.ASSISTANT)
+            .group_by(MessageRollup.bucket_start)
+            .order_by(MessageRollup.bucket_start)
+        )
+        rows = []
+        for bucket, replies, up, down in await self.session.execute(query):
+            replies, up, down = int(replies), int(up), int(down)
+            rated = up + down
+            rows.append({
+                "bucket": bucket,
+                "replies": replies,
+                "thumbs_up": up,
+                "thumbs_down": down,
+                "positive_ratio": round(up / rated, 4) if rated else None,
+                "rated_ratio": round(rated / replies, 4) if replies else None,
+            })
+        return rows
+
+    async def channel_outcomes(self, tenant_id: int, window: Window) -> list[dict[str, Any]]:
+        """
+        Closed conversations per ChannelType over the whole window: resolution time
+        percentiles (estimated from the merged histograms) and average satisfaction
+        """
+        query = (
+            select(
+                ConversationRollup.channel,
+                ConversationRollup.closed_count,
+                ConversationRollup.resolution_count,
+                ConversationRollup.resolution_minutes_sum,
+                ConversationRollup.resolution_histogram,
+                ConversationRollup.satisfaction_count,
+                ConversationRollup.satisfaction_sum,
+            )
+            .where(ConversationRollup.tenant_id == tenant_id)
+            .where(ConversationRollup.granularity == window.granularity)
+            .where(ConversationRollup.bucket_start >= window.since)
+            .where(ConversationRollup.bucket_start < window.until)
+        )
+        # Histograms are merged here: summing int[] slot by slot in SQL is not worth the unnest
+        merged: dict[str, dict[str, Any]] = {}
+        for channel, closed, resolved, minutes, histogram, rated, score in await self.session.execute(query):
+            totals = merged.setdefault(channel, {
+                "closed": 0, "resolved": 0, "minutes": 0, "rated": 0, "score": 0,
+                "histogram": [0] * (len(RESOLUTION_BUCKETS_MINUTES) + 1),
+            })
+            totals["closed"] += closed
+            totals["resolved"] += resolved
+            totals["minutes"] += minutes
+            totals["rated"] += rated
+            totals["score"] += score
+            for index, count in enumerate(histogram):
+                totals["histogram"][index] += count
+
+        return [
+            {
+                "channel": channel,
+                "closed": totals["closed"],
+                "resolution_minutes_avg": round(totals["minutes"] / totals["resolved"], 1) if totals["resolved"] else None,
+                "resolution_minutes_p50": _round(histogram_percentile(totals["histogram"], 50)),
+                "resolution_minutes_p90": _round(histogram_percentile(totals["histogram"], 90)),
+                "resolution_minutes_p99": _round(histogram_percentile(totals["histogram"], 99)),
+                "satisfaction_avg": round(totals["score"] / totals["rated"], 2) if totals["rated"] else None,
+                "satisfaction_responses": totals["rated"],
+            }
+            for channel, totals in sorted(merged.items())
+        ]
+
+    async def computed_through(self) -> dict[str, datetime]:
+        """Exclusive end of the data each rollup contains"""
+        rows = await self.session.execute(select(RollupWatermark.name, RollupWatermark.high_water))
+        return dict(rows.all())
+
+
+def _message_window(tenant_id: int, window: Window) -> tuple[Any, ...]:
+    return (
+        MessageRollup.tenant_id == tenant_id,
+        MessageRollup.granularity == window.granularity,
+        MessageRollup.bucket_start >= window.since,
+        MessageRollup.bucket_start < window.until,
+    )
+
+
+def _round(value: float | None) -> float | None:
+    return None if value is None else round(value, 1)
@@ -0,0 +1,380 @@
+# packages/core/chat.py
+# Chat pipeline: user message in -> assistant tokens streamed out -> Message rows saved
+# Shared by all apps; transport (SSE, NDJSON) lives in packages/core/streaming.py
+
+import asyncio
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Protocol
+
+from opentelemetry.trace import Status, StatusCode
+from pydantic import BaseModel, Field
+
+from packages.observability.tracing import tracer
+
+from .enums import ChannelType, ConversationType
+from .metrics import metrics
+from .models import utc_now
+from .providers import DeadlineExceeded, LLMProvider, ProviderChunk
+from .router import RouteDecision, SmartRouter, stream_with_fallback
+
+if TYPE_CHECKING:
+    from packages.caching.response_cache import ResponseCache
+    from packages.caching.semantic_cache import SemanticCache
+    from packages.caching.single_flight import SingleFlight
+
+    from .context import ContextBuilder, ContextWindow
+
+# Streamed events are plain dicts so every transport can JSON-encode them directly
+ChatEvent = dict[str, Any]
+
+ttft_histogram = metrics.histogram(
+    "chat_time_to_first_token_seconds", "Time from request start to first assistant token"
+)
+duration_histogram = metrics.histogram(
+    "chat_stream_duration_seconds", "Time from request start to the end of the stream"
+)
+turns_counter = metrics.counter("chat_turns_total", "Chat turns by outcome")
+
+
+class ChatRequest(BaseModel):
+    """
+    Body of POST /api/v1/chat
+
+    conversation_id is optional: turns are grouped by session_id, and the
+    store creates the Conversation on the first turn of a widget session.
+    """
+    message: str = Field(min_length=1, max_length=8000)
+    session_id: str = Field(min_length=1, max_length=255)
+    conversation_id: int | None = None
+    user_id: int | None = None
+    conversation_type: ConversationType = ConversationType.SUPPORT
+    channel: ChannelType = ChannelType.WEB
+    model: str | None = None                 # Override the default model (debugging, A/B tests)
+
+
+@dataclass
+class ChatTurn:
+    """
+    State of one request/response exchange, filled in while the stream runs
+
+    The pipeline keeps appending to `parts`; once `completed` is True the turn
+    holds everything needed for the assistant Message row.
+    """
+    tenant_id: int
+    request: ChatRequest
+    model: str
+    started_at: float = field(default_factory=time.perf_counter)
+    received_at: datetime = field(default_factory=utc_now)   # Wall clock - created_at of the user Message
+    parts: list[str] = field(default_factory=list)
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    time_to_first_token: float | None = None
+    completed: bool = False
+    conversation_id: int | None = None
+    cached: str | None = None                # Cache layer that served the reply ("l1"/"l2"/"coalesced"), None = provider
+    route: RouteDecision | None = None       # Smart Router decision, None when the model was fixed
+    context: "ContextWindow | None" = None   # History/summary selection, None without a ContextBuilder
+    deadline: float | None = None            # time.monotonic() by which the reply must be finished
+
+    @property
+    def content(self) -> str:
+        return "".join(self.parts)
+
+    @property
+    def tokens_used(self) -> int | None:
+        """Total tokens billed for this turn (prompt + completion), as stored in Message.tokens_used"""
+        if self.prompt_tokens is None and self.completion_tokens is None:
+            return None
+        return (self.prompt_tokens or 0) + (self.completion_tokens or 0)
+
+
+class TurnStore(Protocol):
+    """Persistence backend for finished chat turns"""
+
+    async def save_turn(self, turn: ChatTurn) -> None: ...
+
+
+class ChatPipeline:
+    """
+    Runs one chat turn against an LLM provider and streams the result
+
+    Usage in an endpoint:
+        turn = pipeline.start(tenant_id, body)
+        return StreamingResponse(encode_sse(pipeline.stream(turn)),
+                                 background=BackgroundTask(pipeline.persist, turn))
+
+    Why persist in a background task?
+    - Starlette runs it only after the last byte is sent to the client
+    - The database write never sits between the user and the first token
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        default_model: str,
+        store: TurnStore | None = None,
+        response_cache: "ResponseCache | None" = None,
+        semantic_cache: "SemanticCache | None" = None,
+        router: SmartRouter | None = None,
+        first_token_timeout: float = 10.0,
+        single_flight: "SingleFlight | None" = None,
+        context: "ContextBuilder | None" = None,
+    ) -> None:
+        self.provider = provider
+        self.default_model = default_model
+        self.store = store
+        self.response_cache = response_cache
+        self.semantic_cache = semantic_cache
+        self.router = router
+        self.first_token_timeout = first_token_timeout
+        self.single_flight = single_flight
+        self.context = context
+
+    def start(self, tenant_id: int, request: ChatRequest, deadline: float | None = None) -> ChatTurn:
+        """
+        Create the turn and pick its model
+        The route is decided before the cache lookup, because cache keys include the model
+        """
+        route = None
+        if request.model is None and self.router is not None:
+            with tracer.start_as_current_span("chat.route") as span:
+                route = self.router.route(request.message, request.conversation_type, request.channel)
+                span.set_attribute("chat.tier", route.tier)
+        return ChatTurn(
+            tenant_id=tenant_id,
+            request=request,
+            model=request.model or (route.model if route else self.default_model),
+            conversation_id=request.conversation_id,
+            route=route,
+            deadline=deadline,
+        )
+
+    async def build_messages(self, turn: ChatTurn) -> list[dict[str, str]]:
+        """
+        Prompt sent to the provider for this turn
+        With a ContextBuilder: rolling summary + newest history within the model's budget + the message
+        Built once per turn - the cache lookup may already have needed it
+        """
+        if self.context is not None:
+            if turn.context is None:
+                with tracer.start_as_current_span("chat.context") as span:
+                    turn.context = await self.context.build(turn)
+                    span.set_attribute("chat.context_tokens", turn.context.tokens)
+                    span.set_attribute("chat.history_messages", turn.context.history)
+            return turn.context.messages
+        return [{"role": "user", "content": turn.request.message}]
+
+    async def lookup_cache(self, turn: ChatTurn) -> str | None:
+        """
+        Cached reply for this turn, setting turn.cached to the layer that served it
+        L1 (exact match, microseconds) is tried before L2 (embedding + vector search)
+
+        Both are keyed on the message alone, so they serve only turns whose prompt
+        is that message: with history or a summary in the context the same words
+        can mean something else, and the turn goes to the provider. With a
+        ContextBuilder the context is therefore built before the lookup.
+        """
+        with tracer.start_as_current_span("chat.cache_lookup") as span:
+            reply = await self._lookup_cache(turn)
+            span.set_attribute("cache.layer", turn.cached or "miss")
+            return reply
+
+    async def _lookup_cache(self, turn: ChatTurn) -> str | None:
+        if self.response_cache is None and self.semantic_cache is None:
+            return None
+        await self.build_messages(turn)
+        if not _context_free(turn):
+            return None
+        request = turn.request
+        key = (turn.tenant_id, request.conversation_type, turn.model, request.message)
+        if self.response_cache is not None:
+            reply = await self.response_cache.get(*key)
+            if reply is not None:
+                turn.cached = "l1"
+                return reply
+        if self.semantic_cache is not None:
+            reply = await self.semantic_cache.get(*key)
+            if reply is not None:
+                turn.cached = "l2"
+                return reply
+        return None
+
+    async def stream(self, turn: ChatTurn) -> AsyncIterator[ChatEvent]:
+        """Yield token events as the provider produces them, then one "done" event"""
+        span = None
+        try:
+            cached_reply = await self.lookup_cache(turn)
+            if cached_reply is not None:
+                chunks = _replay(cached_reply)
+            elif self.single_flight is not None:
+                chunks = self.coalesce(turn)
+            else:
+                chunks = self.call_provider(
+                    turn, await self.build_messages(turn), on_model=lambda model: setattr(turn, "model", model)
+                )
+            if cached_reply is None and turn.deadline is not None:
+                chunks = _until(chunks, turn.deadline)
+            # Not made current: the generator is suspended at every yield, and a span
+            # attached across yields would leak into whatever the caller runs meanwhile
+            span = tracer.start_span("chat.provider") if cached_reply is None else None
+            async for chunk in chunks:
+                if chunk.text:
+                    if turn.time_to_first_token is None:
+                        turn.time_to_first_token = time.perf_counter() - turn.started_at
+                        ttft_histogram.observe(turn.time_to_first_token, model=turn.model)
+                        if span is not None:
+                            span.add_event("first_token")
+                    turn.parts.append(chunk.text)
+                    yield {"type": "token", "text": chunk.text}
+                if chunk.completion_tokens is not None:
+                    turn.prompt_tokens = chunk.prompt_tokens
+                    turn.completion_tokens = chunk.completion_tokens
+        except Exception as error:
+            # Headers are already sent, so errors travel in-band as a final event
+            turns_counter.inc(model=turn.model, outcome="error")
+            if span is not None:
+                span.record_exception(error)
+                span.set_status(Status(StatusCode.ERROR))
+            yield {"type": "error", "message": str(error) or type(error).__name__}
+            return
+        finally:
+            if span is not None:
+                span.set_attribute("llm.model", turn.model)
+                span.set_attribute("chat.cached", turn.cached or "")
+                if turn.tokens_used is not None:
+                    span.set_attribute("llm.tokens", turn.tokens_used)
+                span.end()
+
+        turn.completed = True
+        duration = time.perf_counter() - turn.started_at
+        duration_histogram.observe(duration, model=turn.model)
+        turns_counter.inc(model=turn.model, outcome="completed")
+        if self.router is not None and turn.route is not None and turn.cached is None:
+            self.router.record(turn.route, turn.model, duration, turn.prompt_tokens, turn.completion_tokens)
+        yield self.done_event(turn, duration)
+
+    def call_provider(
+        self, turn: ChatTurn, messages: list[dict[str, str]], on_model: Callable[[str], None]
+    ) -> AsyncIterator[ProviderChunk]:
+        """Provider stream for the turn's model, or its route's candidates with fallback"""
+        if turn.route is not None:
+            return stream_with_fallback(
+                self.provider, turn.route.candidates, messages, self.first_token_timeout,
+                on_model=on_model, deadline=turn.deadline,
+            )
+        return self.provider.stream(turn.model, messages, deadline=turn.deadline)
+
+    async def coalesce(self, turn: ChatTurn) -> AsyncIterator[ProviderChunk]:
+        """
+        Provider stream shared with identical turns already in flight
+
+        Only the turn that made the call is billed: followers (same worker or,
+        with Redis, another one) get the same chunks with zero token usage and
+        are marked cached="coalesced", so cost and router stats count the call once.
+        """
+        messages = await self.build_messages(turn)
+        flight = self.single_flight.join(
+            self.single_flight.key(turn.tenant_id, turn.model, messages),
+            turn.model,
+            lambda on_model: self.call_provider(turn, messages, on_model),
+        )
+        if not flight.leader:
+            turn.cached = "coalesced"
+        async for chunk in flight:
+            turn.model = flight.model            # The leader may have fallen back to another model
+            if flight.remote:
+                turn.cached = "coalesced"
+            if turn.cached is not None and chunk.completion_tokens is not None:
+                chunk = ProviderChunk(text=chunk.text, prompt_tokens=0, completion_tokens=0)
+            yield chunk
+
+    def done_event(self, turn: ChatTurn, duration: float) -> ChatEvent:
+        ttft = turn.time_to_first_token
+        return {
+            "type": "done",
+            "model": turn.model,
+            "tier": turn.route.tier if turn.route else None,
+            "conversation_id": turn.conversation_id,
+            "tokens_used": turn.tokens_used,
+            "cached": turn.cached,
+            "ttft_ms": round(ttft * 1000, 2) if ttft is not None else None,
+            "duration_ms": round(duration * 1000, 2),
+        }
+
+    async def persist(self, turn: ChatTurn) -> None:
+        """Save the finished turn - skipped for failed or disconnected streams"""
+        if not turn.completed:
+            return
+        with tracer.start_as_current_span("chat.persist"):
+            await self._persist(turn)
+
+    async def _persist(self, turn: ChatTurn) -> None:
+        request = turn.request
+        key = (turn.tenant_id, request.conversation_type, turn.model, request.message, turn.content)
+        cacheable = _context_free(turn)
+        # An L2 hit is also copied into L1, so the exact same wording skips the embedding next time
+        if self.response_cache is not None and cacheable and turn.cached in (None, "l2"):
+            await self.response_cache.put(*key)
+        if self.semantic_cache is not None and cacheable and turn.cached is None:
+            await self.semantic_cache.put(*key)
+        if self.store is not None:
+            await self.store.save_turn(turn)
+        # Off the request path: fold what fell out of the window into the rolling summary
+        if self.context is not None and turn.context is not None:
+            await self.context.compact(turn, turn.context)
+
+
+def _context_free(turn: ChatTurn) -> bool:
+    """The turn's prompt is its message alone - no history, no summary (see lookup_cache)"""
+    return turn.context is None or not (turn.context.history or turn.context.summarized)
+
+
+async def _replay(reply: str) -> AsyncIterator[ProviderChunk]:
+    """Serve a cached reply as one chunk - no provider call, no tokens billed"""
+    yield ProviderChunk(text=reply)
+    yield ProviderChunk(prompt_tokens=0, completion_tokens=0)
+
+
+async def _until(chunks: AsyncIterator[ProviderChunk], deadline: float) -> AsyncIterator[ProviderChunk]:
+    """
+    Provider stream cut off at the turn's deadline
+
+    Providers get the deadline too, but a coalesced follower waits on another
+    turn's call, and a stalled stream only times out per read - this bounds the whole reply.
+    One timer per turn rather than a timeout per chunk: it only cancels while the
+    turn is waiting on the provider, never while the caller is sending a token.
+    """
+    waiting: asyncio.Task | None = None
+    expired = False
+
+    def expire() -> None:
+        nonlocal expired
+        if waiting is not None:
+            expired = True
+            waiting.cancel()
+
+    # call_later, not call_at: the loop's clock isn't time.monotonic() under uvloop
+    timer = asyncio.get_running_loop().call_later(max(0.0, deadline - time.monotonic()), expire)
+    try:
+        async with aclosing(chunks):
+            while True:
+                if time.monotonic() >= deadline:
+                    raise DeadlineExceeded("Deadline exceeded before the reply was finished")
+                waiting = asyncio.current_task()
+                try:
+                    chunk = await anext(chunks)
+                except StopAsyncIteration:
+                    return
+                except asyncio.CancelledError:
+                    if expired and waiting.uncancel() == 0:
+                        raise DeadlineExceeded("Deadline exceeded before the reply was finished") from None
+                    raise
+                finally:
+                    waiting = None
+                yield chunk
+    finally:
+        timer.cancel()
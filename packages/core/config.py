@@ -0,0 +1,234 @@
+# packages/core/config.py
+# Runtime settings for the apps, loaded once from environment variables (.env)
+# Hot paths read attributes from a frozen object instead of calling os.getenv per request
+
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+# Same .env file that migrations/env.py reads - one source of truth for secrets and URLs
+load_dotenv()
+
+ENUM_STORAGE_MODES = ("string", "smallint")
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Read "true"/"false" flags the way .env.example writes them"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Application settings shared by all apps in the monorepo
+
+    Why a frozen dataclass?
+    - Built once at startup, read many times on the hot path
+    - Immutable, so no request can accidentally change global behaviour
+    - Easy to construct by hand in benchmarks and local experiments
+    """
+    # Database - app user is subject to RLS policies (see tools/database/01-init-rls-users.sql)
+    database_url_app: str | None = None
+    default_tenant_id: int = 1
+    db_pool_size: int = 20                   # Persistent connections per worker
+    db_max_overflow: int = 10                # Extra connections allowed during bursts
+    db_pool_timeout: float = 10.0            # Seconds to wait for a free connection
+    db_pool_recycle: int = 1800              # Replace connections older than this (seconds)
+    db_application_name: str = "clever-app"  # Shows up in pg_stat_activity
+    db_workload_log: str = ""                # Record distinct statements here for the index audit, empty = off
+    database_url_replicas: str = ""          # Comma-separated read replica URLs (app user), empty = primary only
+    db_replica_max_lag: float = 2.0          # Seconds behind the primary before a replica leaves rotation
+    db_replica_check_interval: float = 1.0   # Seconds between replica lag checks
+    db_read_your_writes: float = 5.0         # Seconds a tenant's reads stay on the primary after it writes
+    tenant_cache_ttl: float = 60.0           # Seconds a resolved tenant is trusted without a NOTIFY
+    tenant_cache_negative_ttl: float = 5.0   # Seconds an unknown id/slug stays unknown
+    enum_storage: str = "string"             # "string" or "smallint" enum columns - see models.CodedEnum
+
+    # Write-behind chat history - Message rows batched per tenant instead of one commit per turn
+    enable_write_behind: bool = True
+    write_behind_max_batch: int = 500        # Rows that trigger an immediate flush
+    write_behind_max_delay: float = 0.05     # Seconds a row may wait for its batch
+    write_behind_max_pending: int = 10_000   # Buffered rows before callers are throttled
+    write_behind_durable: bool = False       # True = a turn is saved only after its batch commits
+
+    # Redis - optional, apps fall back to in-process state when it's not configured
+    redis_url: str | None = None
+
+    # L1 response cache (exact match)
+    cache_ttl_seconds: int = 3600            # Fallback TTL for types without an explicit one
+    response_cache_max_bytes: int = 64 * 1024 * 1024
+
+    # Hot conversation state (header + newest messages of live chats) - needs Redis
+    enable_conversation_state_cache: bool = True
+    conversation_state_ttl: int = 1800       # Seconds an idle conversation stays cached
+    conversation_state_messages: int = 50    # Newest messages kept per conversation
+    conversation_state_max_bytes: int = 32 * 1024 * 1024  # Per-worker in-process tier
+
+    # L2 semantic cache (similar prompts)
+    enable_semantic_cache: bool = True
+    semantic_cache_threshold: float = 0.85
+    semantic_cache_backend: str = "numpy"    # "numpy" (in-process) or "qdrant"
+    semantic_cache_max_entries: int = 20_000 # Per worker, numpy backend (x embedding_dim x 4 bytes)
+    embedding_model: str = "text-embedding-3-small"  # "hashing" = offline embedder
+    embedding_dim: int = 1536
+
+    # Qdrant vector database
+    qdrant_url: str = "http://localhost:6333"
+    qdrant_api_key: str | None = None
+    qdrant_collection_name: str = "clever_embeddings"
+
+    # LLM providers
+    llm_provider: str = "litellm"              # "litellm" or "pooled" for real providers, "fake" for offline runs
+    default_model: str = "gpt-4o-mini"
+    max_tokens: int = 4096
+    chat_deadline: float = 120.0             # Seconds a chat turn may take end to end (X-Request-Timeout can lower it)
+
+    # Pooled provider client (LLM_PROVIDER=pooled) - see packages/core/provider_client.py
+    llm_upstreams: str = ""                  # "name:model[,model...]:base_url;..." ("*" = any model)
+    llm_pool_connections: int = 100          # Keep-alive connections per upstream
+    llm_keepalive_expiry: float = 60.0
+    enable_hedging: bool = True
+    llm_hedge_percentile: float = 95.0       # Hedge once the first token is slower than this percentile
+    llm_hedge_min_delay: float = 0.05
+    llm_hedge_max_delay: float = 2.0         # Also the delay until an upstream has enough samples
+    llm_retry_budget: float = 0.1            # Hedges + retries as a share of requests
+    llm_breaker_failures: int = 5            # Consecutive failures that open an upstream's breaker
+    llm_breaker_reset: float = 30.0          # Seconds before an open breaker lets a trial request through
+
+    # Smart Router - empty router_tiers means router.DEFAULT_TIERS
+    enable_smart_router: bool = True
+    router_tiers: str = ""
+    router_first_token_timeout: float = 10.0
+
+    # LLM context - newest history that fits the budget, older turns as a rolling summary
+    context_max_tokens: int = 4000           # Prompt budget for models without an entry in context_budgets
+    context_budgets: str = ""                # "model:tokens;..." per-model overrides
+    enable_context_summary: bool = True
+    summary_model: str = ""                  # Model writing the summaries, empty = default_model
+
+    # Rate limiting per (tenant, role) and admission control per worker
+    enable_rate_limiting: bool = True
+    rate_limit_requests_per_minute: int = 60
+    rate_limit_burst: int = 10               # Requests allowed at once on top of the steady rate
+    rate_limit_tokens_per_minute: int = 200_000  # LLM tokens (prompt + completion); burst = one minute
+    enable_admission_control: bool = True
+    admission_target_p95: float = 2.0        # Seconds to first token before low-priority traffic is held back
+    admission_max_queue: int = 100
+    admission_queue_timeout: float = 10.0
+
+    # Single-flight - identical concurrent prompts share one provider call
+    enable_single_flight: bool = True
+    single_flight_redis: bool = False        # Also coalesce across workers (needs REDIS_URL)
+    single_flight_wait_timeout: float = 30.0 # Seconds a remote follower waits on a silent leader
+
+    # WebSocket chat - one socket per widget session
+    ws_heartbeat_interval: float = 25.0      # Idle seconds before a heartbeat frame (below proxy idle timeouts)
+    ws_max_pending_turns: int = 4            # Turns queued or running per socket before messages are rejected
+
+    # Observability - traces, request logs, on-demand profiling
+    enable_opentelemetry: bool = True
+    otel_service_name: str = "ai-agent-platform"
+    otel_traces_exporter: str = "otlp"       # "otlp", "console", "memory" (tests) or "none"
+    otel_exporter_otlp_endpoint: str | None = None
+    otel_sample_ratio: float = 0.1           # Share of traces recorded, decided once per request
+    log_level: str = "INFO"
+    log_sample_rate: float = 0.01            # Share of requests logged; 5xx and slow requests always are
+    slow_request_seconds: float = 2.0
+    profile_token: str = ""                  # X-Profile header value that enables profiling, empty = off
+    profile_dir: str = "profiles"
+
+    def __post_init__(self) -> None:
+        if self.enum_storage not in ENUM_STORAGE_MODES:
+            raise ValueError(f"ENUM_STORAGE must be 'string' or 'smallint', got {self.enum_storage!r}")
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Build settings from environment variables (cached for the process lifetime)"""
+    return Settings(
+        database_url_app=os.getenv("DATABASE_URL_APP") or None,
+        default_tenant_id=int(os.getenv("DEFAULT_TENANT_ID", "1")),
+        db_pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+        db_max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        db_pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        db_pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        db_application_name=os.getenv("DB_APPLICATION_NAME", "clever-app"),
+        db_workload_log=os.getenv("DB_WORKLOAD_LOG", ""),
+        database_url_replicas=os.getenv("DATABASE_URL_REPLICAS", ""),
+        db_replica_max_lag=float(os.getenv("DB_REPLICA_MAX_LAG", "2")),
+        db_replica_check_interval=float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "1")),
+        db_read_your_writes=float(os.getenv("DB_READ_YOUR_WRITES", "5")),
+        tenant_cache_ttl=float(os.getenv("TENANT_CACHE_TTL", "60")),
+        tenant_cache_negative_ttl=float(os.getenv("TENANT_CACHE_NEGATIVE_TTL", "5")),
+        enum_storage=os.getenv("ENUM_STORAGE", "string"),
+        enable_write_behind=_env_bool("ENABLE_WRITE_BEHIND", True),
+        write_behind_max_batch=int(os.getenv("WRITE_BEHIND_MAX_BATCH", "500")),
+        write_behind_max_delay=float(os.getenv("WRITE_BEHIND_MAX_DELAY", "0.05")),
+        write_behind_max_pending=int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000")),
+        write_behind_durable=_env_bool("WRITE_BEHIND_DURABLE", False),
+        redis_url=os.getenv("REDIS_URL") or None,
+        cache_ttl_seconds=int(os.getenv("CACHE_TTL_SECONDS", "3600")),
+        response_cache_max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        enable_conversation_state_cache=_env_bool("ENABLE_CONVERSATION_STATE_CACHE", True),
+        conversation_state_ttl=int(os.getenv("CONVERSATION_STATE_TTL", "1800")),
+        conversation_state_messages=int(os.getenv("CONVERSATION_STATE_MESSAGES", "50")),
+        conversation_state_max_bytes=int(os.getenv("CONVERSATION_STATE_MAX_BYTES", str(32 * 1024 * 1024))),
+        enable_semantic_cache=_env_bool("ENABLE_SEMANTIC_CACHE", True),
+        semantic_cache_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85")),
+        semantic_cache_backend=os.getenv("SEMANTIC_CACHE_BACKEND", "numpy"),
+        semantic_cache_max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "20000")),
+        embedding_model=os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+        embedding_dim=int(os.getenv("EMBEDDING_DIM", "1536")),
+        qdrant_url=os.getenv("QDRANT_URL", "http://localhost:6333"),
+        qdrant_api_key=os.getenv("QDRANT_API_KEY") or None,
+        qdrant_collection_name=os.getenv("QDRANT_COLLECTION_NAME", "clever_embeddings"),
+        llm_provider=os.getenv("LLM_PROVIDER", "litellm"),
+        default_model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        max_tokens=int(os.getenv("OPENAI_MAX_TOKENS", "4096")),
+        chat_deadline=float(os.getenv("CHAT_DEADLINE_SECONDS", "120")),
+        llm_upstreams=os.getenv("LLM_UPSTREAMS", ""),
+        llm_pool_connections=int(os.getenv("LLM_POOL_CONNECTIONS", "100")),
+        llm_keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60")),
+        enable_hedging=_env_bool("ENABLE_HEDGING", True),
+        llm_hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+        llm_hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.05")),
+        llm_hedge_max_delay=float(os.getenv("LLM_HEDGE_MAX_DELAY", "2")),
+        llm_retry_budget=float(os.getenv("LLM_RETRY_BUDGET", "0.1")),
+        llm_breaker_failures=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+        llm_breaker_reset=float(os.getenv("LLM_BREAKER_RESET", "30")),
+        enable_smart_router=_env_bool("ENABLE_SMART_ROUTER", True),
+        router_tiers=os.getenv("ROUTER_TIERS", ""),
+        router_first_token_timeout=float(os.getenv("ROUTER_FIRST_TOKEN_TIMEOUT", "10")),
+        context_max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "4000")),
+        context_budgets=os.getenv("CONTEXT_BUDGETS", ""),
+        enable_context_summary=_env_bool("ENABLE_CONTEXT_SUMMARY", True),
+        summary_model=os.getenv("SUMMARY_MODEL", ""),
+        enable_rate_limiting=_env_bool("ENABLE_RATE_LIMITING", True),
+        rate_limit_requests_per_minute=int(os.getenv("RATE_LIMIT_REQUESTS_PER_MINUTE", "60")),
+        rate_limit_burst=int(os.getenv("RATE_LIMIT_BURST", "10")),
+        rate_limit_tokens_per_minute=int(os.getenv("RATE_LIMIT_TOKENS_PER_MINUTE", "200000")),
+        enable_admission_control=_env_bool("ENABLE_ADMISSION_CONTROL", True),
+        admission_target_p95=float(os.getenv("ADMISSION_TARGET_P95_SECONDS", "2")),
+        admission_max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "100")),
+        admission_queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")),
+        enable_single_flight=_env_bool("ENABLE_SINGLE_FLIGHT", True),
+        single_flight_redis=_env_bool("SINGLE_FLIGHT_REDIS", False),
+        single_flight_wait_timeout=float(os.getenv("SINGLE_FLIGHT_WAIT_TIMEOUT", "30")),
+        ws_heartbeat_interval=float(os.getenv("WS_HEARTBEAT_INTERVAL", "25")),
+        ws_max_pending_turns=int(os.getenv("WS_MAX_PENDING_TURNS", "4")),
+        enable_opentelemetry=_env_bool("ENABLE_OPENTELEMETRY", True),
+        otel_service_name=os.getenv("OTEL_SERVICE_NAME", "ai-agent-platform"),
+        otel_traces_exporter=os.getenv("OTEL_TRACES_EXPORTER", "otlp"),
+        otel_exporter_otlp_endpoint=os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT") or None,
+        otel_sample_ratio=float(os.getenv("OTEL_TRACES_SAMPLER_ARG", "0.1")),
+        log_level=os.getenv("LOG_LEVEL", "INFO"),
+        log_sample_rate=float(os.getenv("LOG_SAMPLE_RATE", "0.01")),
+        slow_request_seconds=float(os.getenv("SLOW_REQUEST_SECONDS", "2")),
+        profile_token=os.getenv("PROFILE_TOKEN", ""),
+        profile_dir=os.getenv("PROFILE_DIR", "profiles"),
+    )
@@ -0,0 +1,172 @@
+# packages/core/connections.py
+# Chat WebSockets per widget session: a per-worker registry, plus Redis fan-out so a
+# frame pushed on any worker reaches the session's sockets on every worker
+#
+# Why a registry?
+# - One session can have several sockets open (two tabs, web + mobile app), and a
+#   server push (a human agent taking over) has to reach all of them
+# - Heartbeats for idle sockets come from one task per worker, not a timer per
+#   socket: 50k idle connections cost 50k small objects, not 50k sleeping tasks
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any
+
+from starlette.websockets import WebSocket
+
+from .metrics import metrics
+from .streaming import dump_event
+
+logger = logging.getLogger(__name__)
+
+Frame = dict[str, Any]
+
+PUSH_CHANNEL = "ws:push"
+
+connections_gauge = metrics.gauge("ws_connections", "Open chat WebSockets in this worker")
+frames_counter = metrics.counter("ws_frames_total", "WebSocket frames by direction (in/out) and type")
+pushes_counter = metrics.counter("ws_pushes_total", "Server pushes by origin (local, redis)")
+
+
+class SessionConnection:
+    """
+    One accepted chat WebSocket
+
+    Sends are serialized: a turn's token frames, a heartbeat and a pushed agent
+    message come from different tasks and must not interleave inside a write.
+    """
+
+    __slots__ = ("websocket", "tenant_id", "session_id", "last_sent", "_lock")
+
+    def __init__(self, websocket: WebSocket, tenant_id: int, session_id: str) -> None:
+        self.websocket = websocket
+        self.tenant_id = tenant_id
+        self.session_id = session_id
+        self.last_sent = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def send(self, frame: Frame) -> None:
+        async with self._lock:
+            await self.websocket.send_text(dump_event(frame))  # type: ignore[arg-type]
+            self.last_sent = time.monotonic()
+        frames_counter.inc(direction="out", type=frame.get("type", "unknown"))
+
+
+class ConnectionRegistry:
+    """
+    Open SessionConnections of this worker, grouped by (tenant_id, session_id)
+
+    Usage:
+        registry.register(connection) ... registry.unregister(connection)
+        await registry.push(tenant_id, session_id, {"type": "human_agent", "text": "..."})
+        asyncio.create_task(registry.run())     # heartbeats + Redis fan-out
+
+    With Redis, push() also publishes the frame on ws:push; every other worker
+    delivers it to its own sockets of that session. Workers skip their own
+    messages - those were delivered locally already.
+    """
+
+    def __init__(
+        self,
+        redis: Any | None = None,
+        heartbeat_interval: float = 25.0,
+        send_timeout: float = 5.0,
+        channel: str = PUSH_CHANNEL,
+    ) -> None:
+        self.redis = redis
+        self.heartbeat_interval = heartbeat_interval
+        self.send_timeout = send_timeout
+        self.channel = channel
+        self.worker_id = uuid.uuid4().hex
+        self._sessions: dict[tuple[int, str], set[SessionConnection]] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def register(self, connection: SessionConnection) -> None:
+        self._sessions.setdefault((connection.tenant_id, connection.session_id), set()).add(connection)
+        self._count += 1
+        connections_gauge.set(self._count)
+
+    def unregister(self, connection: SessionConnection) -> None:
+        key = (connection.tenant_id, connection.session_id)
+        connections = self._sessions.get(key)
+        if connections is None or connection not in connections:
+            return
+        connections.discard(connection)
+        if not connections:
+            del self._sessions[key]
+        self._count -= 1
+        connections_gauge.set(self._count)
+
+    async def push(self, tenant_id: int, session_id: str, frame: Frame) -> int:
+        """Send a frame to every socket of the session; returns how many of this worker's sockets got it"""
+        pushes_counter.inc(origin="local")
+        delivered = await self._deliver(tenant_id, session_id, frame)
+        if self.redis is not None:
+            message = {"worker": self.worker_id, "tenant_id": tenant_id, "session_id": session_id, "frame": frame}
+            try:
+                await self.redis.publish(self.channel, json.dumps(message))
+            except Exception:
+                logger.warning("WebSocket registry: Redis publish failed, pushed locally only", exc_info=True)
+        return delivered
+
+    async def run(self) -> None:
+        """Heartbeats and (with Redis) the fan-out subscription - until cancelled"""
+        tasks = [self._heartbeats()]
+        if self.redis is not None:
+            tasks.append(self._subscribe())
+        await asyncio.gather(*tasks)
+
+    async def _deliver(self, tenant_id: int, session_id: str, frame: Frame) -> int:
+        connections = list(self._sessions.get((tenant_id, session_id), ()))
+        if not connections:
+            return 0
+        results = await asyncio.gather(*(self._send(connection, frame) for connection in connections))
+        return sum(results)
+
+    async def _send(self, connection: SessionConnection, frame: Frame) -> bool:
+        # A stalled client must not hold up the others; its own receive loop notices it is gone
+        try:
+            await asyncio.wait_for(connection.send(frame), self.send_timeout)
+            return True
+        except Exception:
+            return False
+
+    async def _heartbeats(self) -> None:
+        frame = {"type": "heartbeat"}
+        while True:
+            await asyncio.sleep(self.heartbeat_interval / 2)
+            # Only sockets that were quiet for a whole interval - a streaming turn is its own heartbeat
+            cutoff = time.monotonic() - self.heartbeat_interval
+            idle = [c for connections in self._sessions.values() for c in connections if c.last_sent <= cutoff]
+            if idle:
+                await asyncio.gather(*(self._send(connection, frame) for connection in idle))
+
+    async def _subscribe(self, retry_delay: float = 5.0) -> None:
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    push = json.loads(message["data"])
+                    if push["worker"] == self.worker_id:
+                        continue
+                    pushes_counter.inc(origin="redis")
+                    await self._deliver(push["tenant_id"], push["session_id"], push["frame"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("WebSocket registry: Redis subscription lost, resubscribing", exc_info=True)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(retry_delay)
@@ -0,0 +1,493 @@
+# packages/core/context.py
+# LLM context for a chat turn: the newest messages that fit the model's token budget,
+# preceded by a rolling summary of everything older
+#
+# Why not send Conversation.messages?
+# - Prompt tokens (cost) and time-to-first-token grow with every turn of the thread
+# - A 500-message escalated thread would blow past any context window anyway
+#
+# Per-message token counts are stored in Message.token_count when the row is
+# written, so building a context never re-tokenizes history.
+#
+# With a ConversationStateCache a live conversation's header and newest messages
+# come from Redis (or the worker's memory) - an ongoing chat builds its context
+# without a database read.
+
+import logging
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterable
+from contextlib import aclosing
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Protocol
+
+from sqlalchemy import select, update
+
+from packages.caching.conversation_state import (
+    LIVE_STATUSES,
+    CachedMessage,
+    ConversationState,
+    ConversationStateCache,
+)
+
+from .database import history_session, tenant_session
+from .enums import MessageType
+from .history import Cursor, HistoryRepository
+from .metrics import metrics
+from .models import Conversation, Message
+from .providers import LLMProvider
+from .tokens import count_tokens, message_tokens
+
+if TYPE_CHECKING:
+    from .chat import ChatTurn
+
+logger = logging.getLogger(__name__)
+
+# Prompt role of each stored message type; debug/test messages are never context
+PROMPT_ROLES: dict[str, str] = {
+    MessageType.USER: "user",
+    MessageType.ASSISTANT: "assistant",
+    MessageType.HUMAN_AGENT: "assistant",
+    MessageType.SYSTEM: "system",
+}
+
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 131072)
+prompt_tokens_histogram = metrics.histogram(
+    "context_prompt_tokens", "Estimated prompt tokens sent per chat turn", buckets=TOKEN_BUCKETS
+)
+history_histogram = metrics.histogram(
+    "context_history_messages", "History messages included per chat turn", buckets=(0, 2, 5, 10, 20, 50, 100, 200)
+)
+summaries_counter = metrics.counter("context_summaries_total", "Rolling summary updates by result")
+
+
+def parse_budgets(spec: str) -> dict[str, int]:
+    """
+    Parse the CONTEXT_BUDGETS setting: "model:max_prompt_tokens" separated by ";"
+
+    Example:
+        "gpt-4o-mini:4000;gpt-4o:8000;claude-3-haiku-20240307:6000"
+    """
+    budgets = {}
+    for part in filter(None, (p.strip() for p in spec.split(";"))):
+        model, tokens = part.rsplit(":", 1)     # Model names may contain ":" (ollama/llama3:8b)
+        budgets[model.strip()] = int(tokens)
+    return budgets
+
+
+@dataclass(frozen=True)
+class HistoryMessage:
+    id: int | None                           # None for a cached message not flushed yet (write-behind)
+    created_at: datetime
+    role: str
+    content: str
+    tokens: int                              # Prompt cost incl. per-message overhead
+
+
+@dataclass
+class ContextWindow:
+    """
+    What build() decided for one turn
+
+    overflow: newest history message that did not fit - it and everything
+    older still outside the summary is what compact() folds in next
+    """
+    messages: list[dict[str, str]]
+    tokens: int
+    message_tokens: int                      # Content tokens of the new user message (-> Message.token_count)
+    conversation_id: int | None = None
+    history: int = 0
+    overflow: Cursor | None = None
+    summarized: bool = False
+
+
+@dataclass
+class _Selection:
+    conversation_id: int
+    prompt: list[dict[str, str]]             # The summary message, if any
+    tokens: int                              # Summary + kept history
+    kept: list[HistoryMessage]
+    overflow: HistoryMessage | None
+    summarized: bool
+    state: ConversationState | None = None   # Read from the database, to be cached
+
+
+def select_window(
+    newest_first: Iterable[HistoryMessage], budget: int
+) -> tuple[list[HistoryMessage], int, HistoryMessage | None]:
+    """
+    Newest messages whose total cost fits budget, returned oldest-first
+
+    Stops at the first message that doesn't fit (returned as overflow) -
+    skipping it to squeeze in an older, shorter one would leave a hole in the dialogue.
+    """
+    kept: list[HistoryMessage] = []
+    used = 0
+    for message in newest_first:
+        if used + message.tokens > budget:
+            kept.reverse()
+            return kept, used, message
+        kept.append(message)
+        used += message.tokens
+    kept.reverse()
+    return kept, used, None
+
+
+class Summarizer(Protocol):
+    """Folds older dialogue into the running summary"""
+
+    async def summarize(self, summary: str | None, messages: list[dict[str, str]]) -> str: ...
+
+
+class LLMSummarizer:
+    """Rolling summary written by a (cheap) model through the regular provider interface"""
+
+    PROMPT = (
+        "You maintain the running summary of a customer support conversation. "
+        "Update the summary with the new messages below. Keep facts the agent needs later: "
+        "the customer's problem, account details they gave, what was tried, what was promised. "
+        "Write at most {max_words} words, plain text, no preamble."
+    )
+
+    def __init__(self, provider: LLMProvider, model: str, max_words: int = 200) -> None:
+        self.provider = provider
+        self.model = model
+        self.max_words = max_words
+
+    async def summarize(self, summary: str | None, messages: list[dict[str, str]]) -> str:
+        dialogue = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = [
+            {"role": "system", "content": self.PROMPT.format(max_words=self.max_words)},
+            {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{dialogue}"},
+        ]
+        parts = [chunk.text async for chunk in self.provider.stream(self.model, prompt)]
+        return "".join(parts).strip()
+
+
+class ContextBuilder:
+    """
+    Builds the prompt of a turn within a per-model token budget
+
+    Usage (ChatPipeline does this):
+        window = await builder.build(turn)        # before the provider call
+        await builder.compact(turn, window)       # after the turn is saved
+
+    build() reads history newest-first one page at a time and stops as soon as
+    the budget is full, so its cost is bounded by the budget, not by the thread
+    length. Only messages newer than the summary are read - older ones are
+    represented by Conversation.summary.
+
+    compact() keeps the summary up to date incrementally: each call folds at
+    most summary_batch_tokens of the messages that fell out of the window into
+    it. The summary update is a compare-and-set on summarized_through_id, so two
+    workers compacting the same conversation can't overwrite each other.
+
+    Rows written before Message.token_count existed are counted once per
+    worker and kept in a bounded side cache.
+
+    With a state_cache, build() reads the conversation from the cache first and
+    only goes to the database on a miss, or when the cached messages run out
+    before the budget is full while older ones exist. What it reads from the
+    database is cached for the next turn (live conversations only).
+    """
+
+    def __init__(
+        self,
+        default_budget: int,
+        budgets: dict[str, int] | None = None,
+        summarizer: Summarizer | None = None,
+        summary_batch_tokens: int = 4000,
+        page_size: int = 50,
+        max_cached_counts: int = 100_000,
+        state_cache: ConversationStateCache | None = None,
+    ) -> None:
+        self.default_budget = default_budget
+        self.budgets = budgets or {}
+        self.summarizer = summarizer
+        self.summary_batch_tokens = summary_batch_tokens
+        self.page_size = page_size
+        self.max_cached_counts = max_cached_counts
+        self.state_cache = state_cache
+        self._counts: OrderedDict[int, int] = OrderedDict()
+
+    def budget(self, model: str) -> int:
+        return self.budgets.get(model, self.default_budget)
+
+    async def build(self, turn: "ChatTurn") -> ContextWindow:
+        """Prompt messages for the turn; sets turn.conversation_id when the session already has one"""
+        request = turn.request
+        new_tokens = count_tokens(request.message, turn.model)
+        current = {"role": "user", "content": request.message}
+        budget = self.budget(turn.model) - message_tokens(new_tokens)
+
+        selection = await self._select_cached(turn, budget)
+        if selection is None:
+            async with tenant_session(turn.tenant_id) as session:
+                selection = await self._select(session, turn, budget)
+            if selection is not None and selection.state is not None:
+                await self.state_cache.put(selection.state)  # type: ignore[union-attr]
+        if selection is None:
+            window = ContextWindow([current], message_tokens(new_tokens), new_tokens)
+            self._observe(window)
+            return window
+        turn.conversation_id = selection.conversation_id
+
+        overflow = selection.overflow
+        prompt = selection.prompt
+        prompt.extend({"role": m.role, "content": m.content} for m in selection.kept)
+        prompt.append(current)
+        window = ContextWindow(
+            messages=prompt,
+            tokens=selection.tokens + message_tokens(new_tokens),
+            message_tokens=new_tokens,
+            conversation_id=selection.conversation_id,
+            history=len(selection.kept),
+            overflow=Cursor(overflow.created_at, overflow.id) if overflow else None,  # type: ignore[arg-type]
+            summarized=selection.summarized,
+        )
+        self._observe(window)
+        return window
+
+    async def compact(self, turn: "ChatTurn", window: ContextWindow) -> None:
+        """Fold (part of) the messages that no longer fit into the rolling summary"""
+        if self.summarizer is None or window.overflow is None or window.conversation_id is None:
+            return
+        async with tenant_session(turn.tenant_id) as session:
+            conversation = await session.get(Conversation, window.conversation_id)
+            if conversation is None:
+                return
+            since = _summary_cursor(conversation)
+            batch: list[HistoryMessage] = []
+            used = 0
+            async for message in self._oldest_first(session, conversation, since, window.overflow, turn.model):
+                if batch and used + message.tokens > self.summary_batch_tokens:
+                    break
+                batch.append(message)
+                used += message.tokens
+            previous, previous_through = conversation.summary, conversation.summarized_through_id
+        if not batch:
+            return
+
+        try:
+            summary = await self.summarizer.summarize(
+                previous, [{"role": m.role, "content": m.content} for m in batch]
+            )
+        except Exception:
+            # The next turn's overflow triggers another attempt - the prompt stays bounded meanwhile
+            logger.warning("Context: summary of conversation %s failed", window.conversation_id, exc_info=True)
+            summaries_counter.inc(result="error")
+            return
+
+        last = batch[-1]
+        async with history_session(turn.tenant_id) as session:
+            summary_token_count = count_tokens(summary, turn.model)
+            result = await session.execute(
+                update(Conversation)
+                .where(Conversation.id == window.conversation_id)
+                .where(Conversation.summarized_through_id.is_not_distinct_from(previous_through))
+                .values(
+                    summary=summary,
+                    summary_token_count=summary_token_count,
+                    summarized_through_at=last.created_at,
+                    summarized_through_id=last.id,
+                )
+            )
+        summaries_counter.inc(result="updated" if result.rowcount else "conflict")
+        if result.rowcount and self.state_cache is not None:
+            await self.state_cache.summarized(
+                turn.tenant_id,
+                turn.request.session_id,
+                window.conversation_id,
+                summary,
+                summary_token_count,
+                last.created_at,
+                last.id,  # type: ignore[arg-type]
+            )
+
+    async def _select_cached(self, turn: "ChatTurn", budget: int) -> _Selection | None:
+        """The window from the cached state; None when the cache can't answer alone"""
+        if self.state_cache is None:
+            return None
+        state = await self.state_cache.get(turn.tenant_id, turn.request.session_id)
+        if state is None or (turn.conversation_id is not None and state.id != turn.conversation_id):
+            return None
+        prompt, summary_tokens = self._summary_prompt(state, turn.model, budget)
+        newest_first = (
+            message for row in reversed(state.messages) if (message := self._message(row, turn.model)) is not None
+        )
+        kept, used, overflow = select_window(newest_first, budget - summary_tokens)
+        if overflow is None and state.truncated:
+            return None                      # Room for messages that only the database has
+        return _Selection(state.id, prompt, summary_tokens + used, kept, overflow, bool(state.summary))
+
+    async def _select(self, session: Any, turn: "ChatTurn", budget: int) -> _Selection | None:
+        """The window from the database; None for a session without a conversation yet"""
+        conversation = await self._conversation(session, turn)
+        if conversation is None:
+            return None
+        prompt, summary_tokens = self._summary_prompt(conversation, turn.model, budget)
+        since = _summary_cursor(conversation)
+        limit = budget - summary_tokens
+        rows: list[Any] = []
+        async with aclosing(self._history(session, conversation, since, turn.model, rows)) as newest_first:
+            candidates = [message async for message in _until_over(newest_first, limit)]
+        kept, used, overflow = select_window(candidates, limit)
+
+        state = None
+        if (
+            self.state_cache is not None
+            and conversation.status in LIVE_STATUSES
+            and conversation.session_id == turn.request.session_id
+        ):
+            state = ConversationState(
+                tenant_id=turn.tenant_id,
+                session_id=conversation.session_id,
+                id=conversation.id,
+                status=conversation.status,
+                conversation_type=conversation.conversation_type,
+                channel=conversation.channel,
+                created_at=conversation.created_at,
+                summary=conversation.summary,
+                summary_token_count=conversation.summary_token_count,
+                summarized_through_at=conversation.summarized_through_at,
+                summarized_through_id=conversation.summarized_through_id,
+                messages=[
+                    CachedMessage(row.id, row.created_at, row.message_type, row.content, row.token_count)
+                    for row in reversed(rows)
+                ],
+                # Stopped at the budget: older messages past the summary weren't read
+                truncated=overflow is not None,
+            )
+        summarized = bool(conversation.summary)
+        return _Selection(conversation.id, prompt, summary_tokens + used, kept, overflow, summarized, state)
+
+    def _summary_prompt(self, conversation: Any, model: str, budget: int) -> tuple[list[dict[str, str]], int]:
+        # The new message alone can use up the budget: no room left for a summary then
+        limit = budget // 2
+        if not conversation.summary or limit <= 0:
+            return [], 0
+        summary, tokens = self._fit_summary(conversation, model, limit)
+        return [{"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}], tokens
+
+    async def _conversation(self, session: Any, turn: "ChatTurn") -> Any:
+        columns = (
+            Conversation.id,
+            Conversation.session_id,
+            Conversation.status,
+            Conversation.conversation_type,
+            Conversation.channel,
+            Conversation.created_at,
+            Conversation.summary,
+            Conversation.summary_token_count,
+            Conversation.summarized_through_at,
+            Conversation.summarized_through_id,
+        )
+        query = select(*columns).where(Conversation.tenant_id == turn.tenant_id)
+        if turn.conversation_id is not None:
+            query = query.where(Conversation.id == turn.conversation_id)
+        else:
+            # Like SqlTurnStore: a closed or archived conversation isn't resumed by session_id
+            query = query.where(Conversation.session_id == turn.request.session_id)
+            query = query.where(Conversation.status.in_(LIVE_STATUSES))
+        return (await session.execute(query.order_by(Conversation.id.desc()).limit(1))).first()
+
+    def _fit_summary(self, conversation: Any, model: str, limit: int) -> tuple[str, int]:
+        """The summary and its cost - cut down if it outgrew half the budget"""
+        summary = conversation.summary
+        tokens = conversation.summary_token_count or count_tokens(summary, model)
+        if tokens > limit:
+            summary = summary[: len(summary) * limit // tokens]
+            tokens = limit
+        return summary, message_tokens(tokens)
+
+    async def _history(
+        self, session: Any, conversation: Any, since: Cursor | None, model: str, rows: list[Any] | None = None
+    ) -> AsyncIterator[HistoryMessage]:
+        """Context messages newer than the summary, newest first, one page per query; their rows go to `rows`"""
+        history = HistoryRepository(session)
+        before = None
+        while True:
+            page = await history.last_messages(
+                conversation.id,
+                limit=self.page_size,
+                before=before,
+                rows=True,
+                # Never before the summary (or the conversation) - also prunes old partitions
+                since=since.created_at if since else conversation.created_at,
+            )
+            for row in reversed(page.items):
+                if since is not None and (row.created_at, row.id) <= (since.created_at, since.id):
+                    return
+                message = self._message(row, model)
+                if message is not None:
+                    if rows is not None:
+                        rows.append(row)
+                    yield message
+            if page.next_cursor is None:
+                return
+            before = page.next_cursor
+
+    async def _oldest_first(
+        self, session: Any, conversation: Any, since: Cursor | None, through: Cursor, model: str
+    ) -> AsyncIterator[HistoryMessage]:
+        """Context messages after the summary up to and including `through`, oldest first"""
+        query = (
+            select(Message.id, Message.created_at, Message.message_type, Message.content, Message.token_count)
+            .where(Message.conversation_id == conversation.id)
+            .where(Message.created_at >= (since.created_at if since else conversation.created_at))
+            .where(Message.created_at <= through.created_at)
+            .order_by(Message.created_at, Message.id)
+        )
+        for row in (await session.execute(query.limit(self.page_size * 4))).all():
+            if since is not None and (row.created_at, row.id) <= (since.created_at, since.id):
+                continue
+            if _after(row, through):
+                return
+            message = self._message(row, model)
+            if message is not None:
+                yield message
+
+    def _message(self, row: Any, model: str) -> HistoryMessage | None:
+        role = PROMPT_ROLES.get(row.message_type)
+        if role is None:
+            return None
+        tokens = row.token_count
+        if tokens is None and row.id is None:
+            tokens = count_tokens(row.content, model)
+        elif tokens is None:
+            tokens = self._counts.get(row.id)
+            if tokens is None:
+                tokens = self._counts[row.id] = count_tokens(row.content, model)
+                if len(self._counts) > self.max_cached_counts:
+                    self._counts.popitem(last=False)
+            else:
+                self._counts.move_to_end(row.id)
+        return HistoryMessage(row.id, row.created_at, role, row.content, message_tokens(tokens))
+
+    @staticmethod
+    def _observe(window: ContextWindow) -> None:
+        prompt_tokens_histogram.observe(window.tokens)
+        history_histogram.observe(window.history)
+
+
+def _summary_cursor(conversation: Any) -> Cursor | None:
+    if conversation.summarized_through_id is None:
+        return None
+    return Cursor(conversation.summarized_through_at, conversation.summarized_through_id)
+
+
+def _after(row: Any, cursor: Cursor) -> bool:
+    """row is newer than cursor; a cursor without an id (cached, not flushed yet) covers its whole timestamp"""
+    if cursor.id is None:
+        return row.created_at > cursor.created_at
+    return (row.created_at, row.id) > (cursor.created_at, cursor.id)
+
+
+async def _until_over(messages: AsyncIterator[HistoryMessage], budget: int) -> AsyncIterator[HistoryMessage]:
+    """Pass messages through until one would exceed budget (inclusive) - stops the page reads"""
+    used = 0
+    async for message in messages:
+        yield message
+        used += message.tokens
+        if used > budget:
+            return
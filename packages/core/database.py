@@ -0,0 +1,501 @@
+# packages/core/database.py
+# Async database access for the FastAPI apps (asyncpg driver)
+# Every session is bound to one tenant so RLS policies filter rows automatically
+
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Callable
+from contextlib import AbstractAsyncContextManager, AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import event, make_url, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from packages.caching.redis_client import get_redis
+from packages.observability.tracing import tracer
+
+from .config import Settings, get_settings
+from .metrics import metrics
+
+# set_config(..., is_local => true) is the function form of SET LOCAL:
+# the value lives only until COMMIT/ROLLBACK, and unlike SET LOCAL it accepts bind parameters
+#
+# Why transaction-local instead of a session-level SET?
+# - The setting disappears with the transaction, so a pooled connection never
+#   carries tenant A's context into tenant B's request
+# - No RESET round trip when the connection goes back to the pool
+SET_TENANT_SQL = text("SELECT set_config('app.current_tenant', :tenant_id, true)")
+# Read sessions are read-only wherever they run - a write slipped into a read path
+# fails in development too, not only once replicas are configured. Same round trip.
+SET_TENANT_READ_ONLY_SQL = text(
+    "SELECT set_config('app.current_tenant', :tenant_id, true), set_config('transaction_read_only', 'on', true)"
+)
+# Statements that make a tenant's reads stick to the primary for a while (read-your-writes)
+WRITE_KINDS = frozenset({"INSERT", "UPDATE", "DELETE", "MERGE", "COPY"})
+
+logger = logging.getLogger(__name__)
+
+pool_wait_histogram = metrics.histogram(
+    "db_pool_wait_seconds", "Time a request waited for a pooled connection"
+)
+checkouts_counter = metrics.counter("db_pool_checkouts_total", "Connections handed out by the pool")
+connections_gauge = metrics.gauge("db_pool_connections", "Pool connections by state")
+query_histogram = metrics.histogram("db_query_seconds", "Statement latency by statement kind")
+routes_counter = metrics.counter("db_routes_total", "Tenant sessions by target (primary or replica) and reason")
+replica_lag_gauge = metrics.gauge("db_replica_lag_seconds", "Upper bound of each replica's replay lag")
+replica_rotation_gauge = metrics.gauge("db_replica_in_rotation", "1 while a replica serves reads, 0 while it's out")
+replica_checks_counter = metrics.counter("db_replica_checks_total", "Replica lag checks by result")
+pin_errors_counter = metrics.counter("db_pin_errors_total", "Failed Redis reads/writes of read-your-writes pins")
+
+_engine: AsyncEngine | None = None
+_session_factory: async_sessionmaker[AsyncSession] | None = None
+_workload: "WorkloadRecorder | None" = None
+_router: "ReplicaRouter | None" = None
+
+
+class WorkloadRecorder:
+    """
+    Distinct statements with call counts and time spent - the recorded workload that
+    `python -m packages.data.index_audit report --workload` plans against
+
+    Statements are SQLAlchemy's parameterized SQL ($1, $2, ...), so repeated queries
+    group without normalizing literals. Bounded: once max_statements are known, new
+    ones are only counted. The file is rewritten with the totals every flush_interval
+    seconds and on shutdown; "{pid}" in the path gives each worker its own file.
+    """
+
+    def __init__(self, path: str, max_statements: int = 2000, flush_interval: float = 60.0) -> None:
+        self.path = path.replace("{pid}", str(os.getpid()))
+        self.max_statements = max_statements
+        self.flush_interval = flush_interval
+        self.statements: dict[str, list[float]] = {}     # SQL -> [calls, seconds]
+        self.dropped = 0
+        self._flushed = time.monotonic()
+
+    def record(self, statement: str, seconds: float) -> None:
+        entry = self.statements.get(statement)
+        if entry is None:
+            if len(self.statements) >= self.max_statements:
+                self.dropped += 1
+                return
+            entry = self.statements[statement] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        if time.monotonic() - self._flushed > self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        self._flushed = time.monotonic()
+        partial = self.path + ".partial"
+        with open(partial, "w", encoding="utf-8") as file:
+            for statement, (calls, seconds) in self.statements.items():
+                file.write(json.dumps({"sql": statement, "calls": int(calls), "total_seconds": round(seconds, 6)}) + "\n")
+        os.replace(partial, self.path)
+
+
+def create_engine_from_settings(url: str, settings: Settings) -> AsyncEngine:
+    """
+    Pooled async engine for one database URL
+
+    Pool tuning:
+    - pool_size + max_overflow: connections per worker; keep
+      workers * (pool_size + max_overflow) below Postgres max_connections
+    - pool_timeout: fail fast instead of queueing forever when the DB is saturated
+    - pool_recycle: replace connections before load balancers/pgbouncer drop them
+    - no pre-ping: it costs a round trip on every checkout; recycle covers stale connections
+    """
+    global _workload
+    engine = create_async_engine(
+        url,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=False,
+        connect_args={
+            # asyncpg caches prepared statements per connection - repeated ORM queries skip parsing
+            "prepared_statement_cache_size": 500,
+            "server_settings": {
+                "application_name": settings.db_application_name,
+                # Short OLTP queries never benefit from JIT, but can pay its compile time
+                "jit": "off",
+            },
+        },
+    )
+    if settings.db_workload_log and _workload is None:
+        _workload = WorkloadRecorder(settings.db_workload_log)
+    instrument_engine(engine, _workload if settings.db_workload_log else None)
+    return engine
+
+
+def instrument_engine(engine: AsyncEngine, workload: WorkloadRecorder | None = None) -> None:
+    """Attach pool and per-query metrics to an engine (sync events, no extra awaits)"""
+    sync_engine = engine.sync_engine
+    pool_name = sync_engine.url.host or "default"
+
+    @event.listens_for(sync_engine.pool, "checkout")
+    def on_checkout(*_: Any) -> None:
+        checkouts_counter.inc(pool=pool_name)
+        connections_gauge.inc(pool=pool_name, state="checked_out")
+
+    @event.listens_for(sync_engine.pool, "checkin")
+    def on_checkin(*_: Any) -> None:
+        connections_gauge.dec(pool=pool_name, state="checked_out")
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_execute(conn: Any, cursor: Any, statement: str, *_: Any) -> None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_execute(conn: Any, cursor: Any, statement: str, *_: Any) -> None:
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        # Label by statement kind only - raw SQL as a label would explode cardinality
+        kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        query_histogram.observe(elapsed, kind=kind)
+        if kind in WRITE_KINDS:
+            conn.info["wrote"] = True
+        if workload is not None:
+            workload.record(statement, elapsed)
+
+
+def get_engine() -> AsyncEngine:
+    """Process-wide engine for the RLS-restricted app user (DATABASE_URL_APP)"""
+    global _engine
+    if _engine is None:
+        settings = get_settings()
+        if not settings.database_url_app:
+            raise ValueError("DATABASE_URL_APP environment variable is not set!")
+        _engine = create_engine_from_settings(settings.database_url_app, settings)
+    return _engine
+
+
+def get_session_factory() -> async_sessionmaker[AsyncSession]:
+    global _session_factory
+    if _session_factory is None:
+        # expire_on_commit=False: objects stay readable after commit without a reload query
+        _session_factory = async_sessionmaker(get_engine(), expire_on_commit=False)
+    return _session_factory
+
+
+# --- Read replicas ---
+
+# Both positions as bytes since 0/0. NULL on a server that isn't a standby: a
+# "replica" pointing at the primary itself (development) counts as caught up.
+PRIMARY_LSN_SQL = text("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), '0/0')")
+REPLAYED_LSN_SQL = text("SELECT pg_wal_lsn_diff(pg_last_wal_replay_lsn(), '0/0')")
+
+
+@dataclass
+class Replica:
+    """One streaming replica: its own pool, and whether it serves reads right now"""
+    name: str
+    engine: AsyncEngine
+    session_factory: async_sessionmaker[AsyncSession]
+    in_rotation: bool = False      # Out until the first check finds it caught up
+    lag: float | None = None       # Seconds, None while unreachable or unchecked
+
+
+class ReplicaRouter:
+    """
+    Sends read-only tenant sessions to replicas that keep up, everything else to the primary
+
+    A read stays on the primary when:
+    - the tenant wrote through any worker within the read-your-writes window
+      (never shorter than max_lag - a replica in rotation may be that far behind)
+    - no replica is in rotation: all lagging, unreachable, or not checked yet
+
+    Why measure lag against the primary's WAL position instead of replay timestamps?
+    - now() - pg_last_xact_replay_timestamp() grows on an idle primary, and reads 0
+      on a replica whose WAL receiver has stalled. Every check samples the primary's
+      position; a replica that replayed up to a sample taken at t is at most now - t
+      behind, whatever the write rate
+    - A replica leaves rotation above max_lag and rejoins below half of it, so one
+      hovering at the limit doesn't flap
+
+    Pins are shared through Redis: a write pins the tenant in this worker and sets
+    ryw:{tenant_id} with the window as TTL, and a read finding no local pin looks
+    the key up - one round trip, only while a replica is in rotation. If Redis
+    fails the read goes to the primary. Without Redis (no REDIS_URL) pins are
+    per worker, enough for a single-process deployment. Chat history writes don't
+    pin, see history_session.
+    """
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replicas: list[Replica],
+        max_lag: float = 2.0,
+        read_your_writes: float = 5.0,
+        check_interval: float = 1.0,
+        max_pinned: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+        redis: Any | None = None,
+    ) -> None:
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.pin_seconds = max(read_your_writes, max_lag)
+        self.check_interval = check_interval
+        self.max_pinned = max_pinned
+        self.clock = clock
+        self.redis = redis
+        self._pinned: OrderedDict[int, float] = OrderedDict()      # tenant -> primary-only until
+        # (time, primary WAL position) - enough history to tell "2 * max_lag behind" from "max_lag behind"
+        self._samples: deque[tuple[float, int]] = deque(maxlen=int(2 * max_lag / check_interval) + 2)
+        self._next = 0
+        for replica in replicas:
+            replica_rotation_gauge.set(0, replica=replica.name)
+
+    async def pin(self, tenant_id: int) -> None:
+        """Keep the tenant's reads on the primary, on every worker, until its write has reached every replica"""
+        self._pinned[tenant_id] = self.clock() + self.pin_seconds
+        self._pinned.move_to_end(tenant_id)
+        if len(self._pinned) > self.max_pinned:
+            self._pinned.popitem(last=False)
+        if self.redis is None:
+            return
+        try:
+            # Whole seconds, rounded up: a pin may last a little longer, never shorter
+            await self.redis.set(pin_key(tenant_id), b"1", ex=math.ceil(self.pin_seconds))
+        except Exception:
+            pin_errors_counter.inc(op="set")
+            logger.warning("Replica router: Redis pin of tenant %s failed", tenant_id, exc_info=True)
+
+    async def route(self, tenant_id: int) -> Replica | None:
+        """Replica for a read-only session, None = primary"""
+        until = self._pinned.get(tenant_id)
+        if until is not None:
+            if until > self.clock():
+                routes_counter.inc(target="primary", reason="read_your_writes")
+                return None
+            del self._pinned[tenant_id]
+        candidates = [replica for replica in self.replicas if replica.in_rotation]
+        if not candidates:
+            routes_counter.inc(target="primary", reason="no_replica")
+            return None
+        if self.redis is not None:
+            try:
+                pinned = await self.redis.get(pin_key(tenant_id))
+            except Exception:
+                # Can't tell whether another worker just wrote: the primary is always current
+                pin_errors_counter.inc(op="get")
+                routes_counter.inc(target="primary", reason="pin_unknown")
+                return None
+            if pinned is not None:
+                routes_counter.inc(target="primary", reason="read_your_writes")
+                return None
+        self._next += 1
+        replica = candidates[self._next % len(candidates)]
+        routes_counter.inc(target=replica.name, reason="read")
+        return replica
+
+    def take_out(self, replica: Replica, reason: str) -> None:
+        if replica.in_rotation:
+            logger.warning("Replica %s out of rotation: %s", replica.name, reason)
+        replica.in_rotation = False
+        replica_rotation_gauge.set(0, replica=replica.name)
+
+    def _lag(self, replayed: float | None, now: float) -> float:
+        if replayed is None:
+            return 0.0
+        for sampled_at, position in reversed(self._samples):
+            if position <= replayed:
+                return max(now - sampled_at, 0.0)
+        # Behind every sample we kept: at least this far behind
+        return now - self._samples[0][0]
+
+    async def check(self) -> None:
+        """Sample the primary's WAL position, then measure each replica against the samples"""
+        async with self.primary.connect() as connection:
+            position = await connection.scalar(PRIMARY_LSN_SQL)
+        self._samples.append((self.clock(), int(position)))
+        for replica in self.replicas:
+            try:
+                async with asyncio.timeout(self.check_interval), replica.engine.connect() as connection:
+                    replayed = await connection.scalar(REPLAYED_LSN_SQL)
+            except (OSError, DBAPIError, TimeoutError) as error:
+                replica.lag = None
+                replica_checks_counter.inc(replica=replica.name, result="error")
+                self.take_out(replica, f"check failed ({type(error).__name__})")
+                continue
+            replica.lag = self._lag(None if replayed is None else float(replayed), self.clock())
+            replica_lag_gauge.set(replica.lag, replica=replica.name)
+            if replica.lag > self.max_lag:
+                replica_checks_counter.inc(replica=replica.name, result="lagging")
+                self.take_out(replica, f"{replica.lag:.1f}s behind")
+                continue
+            replica_checks_counter.inc(replica=replica.name, result="ok")
+            if not replica.in_rotation and replica.lag <= self.max_lag / 2:
+                logger.info("Replica %s in rotation (%.2fs behind)", replica.name, replica.lag)
+                replica.in_rotation = True
+                replica_rotation_gauge.set(1, replica=replica.name)
+
+    async def run(self) -> None:
+        """Check lag every check_interval until cancelled - run as a background task"""
+        while True:
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Primary unreachable: no new sample, replicas keep their state until it's back
+                logger.warning("Replica lag check failed", exc_info=True)
+            await asyncio.sleep(self.check_interval)
+
+    def status(self) -> dict[str, dict[str, object]]:
+        return {
+            replica.name: {"in_rotation": replica.in_rotation, "lag_seconds": replica.lag}
+            for replica in self.replicas
+        }
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+def pin_key(tenant_id: int) -> str:
+    """Redis key of a tenant's read-your-writes pin: ryw:{tenant_id}, expiring with the window"""
+    return f"ryw:{tenant_id}"
+
+
+def _replica_name(url: str, index: int) -> str:
+    """host:port of a replica URL - metric label and log name - or replicaN for socket URLs"""
+    parsed = make_url(url)
+    if not parsed.host:
+        return f"replica{index}"
+    return f"{parsed.host}:{parsed.port}" if parsed.port else parsed.host
+
+
+def get_replica_router() -> ReplicaRouter | None:
+    """Process-wide router over DATABASE_URL_REPLICAS, None when no replicas are configured"""
+    global _router
+    settings = get_settings()
+    if _router is None and settings.database_url_replicas:
+        replicas = []
+        for index, url in enumerate(u.strip() for u in settings.database_url_replicas.split(",") if u.strip()):
+            engine = create_engine_from_settings(url, settings)
+            replicas.append(Replica(
+                _replica_name(url, index), engine, async_sessionmaker(engine, expire_on_commit=False)
+            ))
+        _router = ReplicaRouter(
+            get_engine(),
+            replicas,
+            max_lag=settings.db_replica_max_lag,
+            read_your_writes=settings.db_read_your_writes,
+            check_interval=settings.db_replica_check_interval,
+            redis=get_redis(),
+        )
+    return _router
+
+
+async def dispose_engine() -> None:
+    """Close pooled connections on shutdown"""
+    global _engine, _session_factory, _router
+    if _router is not None:
+        await _router.dispose()
+    if _engine is not None:
+        await _engine.dispose()
+    if _workload is not None:
+        _workload.flush()
+    _engine = None
+    _session_factory = None
+    _router = None
+
+
+def pool_status() -> dict[str, int]:
+    """Point-in-time pool usage for health checks and dashboards"""
+    if _engine is None:
+        return {}
+    pool: Any = _engine.sync_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+    }
+
+
+@asynccontextmanager
+async def tenant_session(tenant_id: int, read_only: bool = False, pin: bool = True) -> AsyncIterator[AsyncSession]:
+    """
+    Open a transaction scoped to one tenant
+
+    Usage:
+        async with tenant_session(tenant_id) as session:
+            session.add(Message(...))
+        # committed here, app.current_tenant is gone with the transaction
+
+    read_only=True opens a read-only transaction, on a replica when DATABASE_URL_REPLICAS
+    has one in rotation (see ReplicaRouter): for dashboards and search, which can
+    be DB_REPLICA_MAX_LAG seconds behind. A session that writes keeps the tenant's
+    read-only sessions on the primary for DB_READ_YOUR_WRITES seconds, on every
+    worker, unless pin=False (chat history writes: use history_session).
+    """
+    router = get_replica_router()
+    replica = None
+    if router is not None:
+        if read_only:
+            replica = await router.route(tenant_id)
+        else:
+            routes_counter.inc(target="primary", reason="read_write")
+    factory = replica.session_factory if replica is not None else get_session_factory()
+    attributes = {"tenant.id": tenant_id, "db.target": replica.name if replica is not None else "primary"}
+    with tracer.start_as_current_span("db.transaction", attributes=attributes) as span:
+        async with AsyncExitStack() as stack:
+            started = time.perf_counter()
+            try:
+                session = await stack.enter_async_context(_transaction(factory))
+            except (OSError, DBAPIError) as error:
+                if replica is None or router is None:
+                    raise
+                # Replica gone since the last check: nothing ran yet, so the primary can take over
+                router.take_out(replica, f"checkout failed ({type(error).__name__})")
+                routes_counter.inc(target="primary", reason="fallback")
+                span.set_attribute("db.target", "primary")
+                session = await stack.enter_async_context(_transaction(get_session_factory()))
+            pool_wait = time.perf_counter() - started
+            pool_wait_histogram.observe(pool_wait)
+            span.set_attribute("db.pool_wait_ms", round(pool_wait * 1000, 3))
+            await session.execute(
+                SET_TENANT_READ_ONLY_SQL if read_only else SET_TENANT_SQL, {"tenant_id": str(tenant_id)}
+            )
+            connection = await session.connection()
+            connection.info["wrote"] = False
+            yield session
+            wrote = connection.info["wrote"]
+    if wrote and pin and router is not None:
+        await router.pin(tenant_id)
+
+
+def history_session(tenant_id: int) -> AbstractAsyncContextManager[AsyncSession]:
+    """
+    Session for chat history writes - one rule for every one of them: they don't pin
+
+    Turn messages (buffered or not), the conversation a turn opens or touches, agent
+    messages and rolling summaries are read back by the chat path itself, which
+    reads on the primary (context builder, turn store). Replica readers are
+    analytics over rollups and agent search, both fine DB_REPLICA_MAX_LAG behind.
+    Pinning on every turn would keep an active chat tenant off the replicas for good.
+    Other writes (status changes, admin edits) use tenant_session and pin.
+    """
+    return tenant_session(tenant_id, pin=False)
+
+
+@asynccontextmanager
+async def _transaction(factory: async_sessionmaker[AsyncSession]) -> AsyncIterator[AsyncSession]:
+    """Session in a transaction, entered once its connection is checked out"""
+    async with factory() as session, session.begin():
+        await session.connection()            # Checkout happens here - measure the queueing
+        yield session
@@ -0,0 +1,82 @@
+# packages/core/dependencies.py
+# FastAPI dependencies shared by all apps
+# Route handlers declare what they need (tenant, DB session) instead of building it themselves
+
+from collections.abc import AsyncIterator
+
+from fastapi import Depends, Header, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import get_settings
+from .database import tenant_session
+from .enums import UserRole
+from .tenants import TenantContext, get_tenant_resolver
+
+
+async def lookup_tenant(key: str) -> TenantContext | None:
+    """
+    Tenant for an X-Tenant-ID value (id or slug), None when unknown
+
+    Resolution is cached per worker - see packages/core/tenants.py. Without
+    DATABASE_URL_APP there is nothing to check against and a numeric key is
+    taken as is.
+    """
+    resolver = get_tenant_resolver()
+    if resolver is not None:
+        return await resolver.resolve(key)
+    if key.isascii() and key.isdigit():
+        return TenantContext(int(key), key, key, True)
+    return None
+
+
+async def get_tenant(request: Request, x_tenant_id: str | None = Header(default=None)) -> TenantContext:
+    """
+    Tenant of the current request (X-Tenant-ID: id or slug, DEFAULT_TENANT_ID in development)
+
+    Unknown tenants get 404 and deactivated ones 403, before any RLS-scoped
+    query runs.
+    """
+    tenant = await lookup_tenant(x_tenant_id or str(get_settings().default_tenant_id))
+    if tenant is None:
+        raise HTTPException(status_code=404, detail="Unknown tenant")
+    if not tenant.is_active:
+        raise HTTPException(status_code=403, detail="Tenant is inactive")
+    request.state.tenant_id = tenant.id        # Metric/log label for ObservabilityMiddleware
+    return tenant
+
+
+async def get_tenant_id(tenant: TenantContext = Depends(get_tenant)) -> int:
+    """Id of the resolved, active tenant - what RLS sessions and caches are keyed by"""
+    return tenant.id
+
+
+def get_user_role(x_user_role: UserRole | None = Header(default=None)) -> UserRole:
+    """Role of the caller (X-User-Role header set by the gateway, USER when absent) - rate limits and priority"""
+    return x_user_role or UserRole.USER
+
+
+async def get_db(tenant_id: int = Depends(get_tenant_id)) -> AsyncIterator[AsyncSession]:
+    """
+    Tenant-scoped session for one request
+
+    Usage:
+        @app.get("/api/v1/things")
+        async def things(db: AsyncSession = Depends(get_db)): ...
+
+    The transaction commits when the handler returns and rolls back on error;
+    app.current_tenant is set with SET LOCAL semantics for exactly that transaction.
+    """
+    async with tenant_session(tenant_id) as session:
+        yield session
+
+
+async def get_read_db(tenant_id: int = Depends(get_tenant_id)) -> AsyncIterator[AsyncSession]:
+    """
+    Read-only tenant-scoped session for one request - on a replica when one is in rotation
+
+    For handlers that only read and can be DB_REPLICA_MAX_LAG seconds behind
+    (dashboards, search); a tenant that just wrote is served by the primary.
+    See ReplicaRouter in packages/core/database.py.
+    """
+    async with tenant_session(tenant_id, read_only=True) as session:
+        yield session
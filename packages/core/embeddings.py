@@ -0,0 +1,85 @@
+# packages/core/embeddings.py
+# Text embedding backends used by the semantic cache and the vector store
+# All backends embed in batches and return L2-normalized float32 rows (cosine = dot product)
+
+import hashlib
+import re
+from collections.abc import Sequence
+from typing import Protocol
+
+import numpy as np
+
+
+class Embedder(Protocol):
+    """Turns a batch of texts into an (n, dim) matrix of unit vectors"""
+
+    dim: int
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray: ...
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to length 1 so similarity search is a single matrix product"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class LiteLLMEmbedder:
+    """
+    Embeddings from a provider model via LiteLLM (one API call per batch)
+
+    Example:
+        embedder = LiteLLMEmbedder("text-embedding-3-small", dim=1536)
+    """
+
+    def __init__(self, model: str, dim: int) -> None:
+        self.model = model
+        self.dim = dim
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        import litellm
+
+        response = await litellm.aembedding(model=self.model, input=list(texts))
+        return normalize_rows(np.array([item["embedding"] for item in response.data]))
+
+
+class HashingEmbedder:
+    """
+    Offline embedder: hashed word + character-trigram features
+
+    Not a language model - it only knows that texts sharing words and spelling
+    are similar. That is exactly what near-duplicate support questions look like
+    ("reset my password" / "how to reset password?"), which makes it good
+    enough for tests, benchmarks and local development without API keys.
+    """
+
+    _TOKEN = re.compile(r"\w+")
+
+    def __init__(self, dim: int = 256) -> None:
+        self.dim = dim
+
+    def _features(self, text: str) -> list[str]:
+        words = self._TOKEN.findall(text.casefold())
+        grams = [w[i:i + 3] for w in words for i in range(max(1, len(w) - 2))]
+        return words + grams
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vectors[row, bucket] += sign
+        return normalize_rows(vectors)
+
+
+def create_embedder(model: str, dim: int) -> Embedder:
+    """"hashing" gives the offline embedder, anything else is a LiteLLM model name"""
+    if model == "hashing":
+        return HashingEmbedder(dim)
+    return LiteLLMEmbedder(model, dim)
@@ -53,6 +53,8 @@ class ConversationStatus(str, Enum):
     ACTIVE → CLOSED (normal completion)
     ACTIVE → ESCALATED → CLOSED (human intervention needed)
     ACTIVE → ARCHIVED (inactive for long time)
+    ACTIVE ⇄ PENDING (waiting for the user)
+    Allowed moves: STATUS_TRANSITIONS below
     """
     ACTIVE = "active"              # Ongoing conversation, expecting responses
     CLOSED = "closed"              # Resolved and completed  
@@ -60,6 +62,21 @@ class ConversationStatus(str, Enum):
     ARCHIVED = "archived"          # Inactive for 30+ days, moved to archive
     PENDING = "pending"            # Waiting for user response
 
+# Statuses a conversation may move to from each status (POST /api/v1/conversations/{id}/status)
+# ARCHIVED is reached only through packages.data.archive, which also moves the messages
+STATUS_TRANSITIONS: dict[ConversationStatus, frozenset[ConversationStatus]] = {
+    ConversationStatus.ACTIVE: frozenset(
+        {ConversationStatus.PENDING, ConversationStatus.ESCALATED, ConversationStatus.CLOSED}
+    ),
+    ConversationStatus.PENDING: frozenset(
+        {ConversationStatus.ACTIVE, ConversationStatus.ESCALATED, ConversationStatus.CLOSED}
+    ),
+    # Back to ACTIVE: handed back to the bot / reopened
+    ConversationStatus.ESCALATED: frozenset({ConversationStatus.ACTIVE, ConversationStatus.CLOSED}),
+    ConversationStatus.CLOSED: frozenset({ConversationStatus.ACTIVE}),
+    ConversationStatus.ARCHIVED: frozenset(),
+}
+
 class MessageType(str, Enum):
     """
     Who or what sent the message
@@ -128,6 +145,109 @@ class UserFeedback(str, Enum):
     THUMBS_DOWN = "thumbs_down"    # User found the response unhelpful
     # NULL in database = no feedback provided (most common case)
 
+class ArchiveBatchState(str, Enum):
+    """
+    Progress of one archival batch
+    Used in: ArchiveBatch.state
+
+    Workflow (each step is committed, so a crashed run resumes where it stopped):
+    WRITING → WRITTEN → DONE (→ RESTORED if brought back to the live tables)
+    """
+    WRITING = "writing"            # Archive file is being written, may be incomplete
+    WRITTEN = "written"            # File complete, hot rows not yet removed
+    DONE = "done"                  # Conversations archived, their messages deleted
+    RESTORED = "restored"          # Messages copied back from the archive file
+
+class RollupGranularity(str, Enum):
+    """
+    Time bucket size of precomputed analytics
+    Used in: MessageRollup.granularity, ConversationRollup.granularity
+
+    Hourly rollups are computed from the raw tables, daily ones from the hourly rows
+    """
+    HOUR = "hour"                  # Recent activity, intraday charts
+    DAY = "day"                    # Long ranges - a year is 365 rows per key
+
+class SearchMode(str, Enum):
+    """
+    How message search matches the query
+    Used in: GET /api/v1/search/messages?mode=
+    """
+    TEXT = "text"                  # Full-text: stemmed words, "phrases", -exclusions, OR
+    FUZZY = "fuzzy"                # Trigram similarity - survives typos, needs pg_trgm
+
+# Smallint codes for compact enum storage (ENUM_STORAGE=smallint, see models.CodedEnum)
+#
+# Append-only: a code is never renumbered or reused, rows written years ago must
+# still decode. A new member gets the next free number here in the same change
+# that adds it - the check below fails at import otherwise. A removed member
+# keeps its number reserved (leave it commented out).
+#
+# The compact-storage migration writes these into SQL functions
+# (channel_type_code('web') = 1, channel_type_text(1) = 'web'), so a new member
+# also needs `python -m packages.data.enum_storage functions` on compact databases.
+ENUM_CODES: dict[type[Enum], dict[Enum, int]] = {
+    ChannelType: {
+        ChannelType.WEB: 1,
+        ChannelType.TELEGRAM: 2,
+        ChannelType.EMAIL: 3,
+        ChannelType.WHATSAPP: 4,
+        ChannelType.MOBILE_APP: 5,
+    },
+    ConversationType: {
+        ConversationType.SUPPORT: 1,
+        ConversationType.SALES: 2,
+        ConversationType.GENERAL: 3,
+        ConversationType.FEEDBACK: 4,
+        ConversationType.BILLING: 5,
+        ConversationType.TECHNICAL: 6,
+    },
+    ConversationStatus: {
+        ConversationStatus.ACTIVE: 1,
+        ConversationStatus.CLOSED: 2,
+        ConversationStatus.ESCALATED: 3,
+        ConversationStatus.ARCHIVED: 4,
+        ConversationStatus.PENDING: 5,
+    },
+    MessageType: {
+        MessageType.USER: 1,
+        MessageType.ASSISTANT: 2,
+        MessageType.SYSTEM: 3,
+        MessageType.HUMAN_AGENT: 4,
+        MessageType.DEVELOPER: 5,
+        MessageType.TESTER: 6,
+    },
+    UserRole: {
+        UserRole.USER: 1,
+        UserRole.SUPPORT_AGENT: 2,
+        UserRole.SUPPORT_MANAGER: 3,
+        UserRole.SALES_REP: 4,
+        UserRole.SALES_MANAGER: 5,
+        UserRole.SALES_DIRECTOR: 6,
+        UserRole.ADMIN: 7,
+        UserRole.SUPER_ADMIN: 8,
+        UserRole.DEVELOPER: 9,
+        UserRole.TESTER: 10,
+    },
+    UserFeedback: {
+        UserFeedback.THUMBS_UP: 1,
+        UserFeedback.THUMBS_DOWN: 2,
+    },
+}
+
+def _check_enum_codes() -> None:
+    """Every member has a code, and no two members of an enum share one"""
+    for enum_class, codes in ENUM_CODES.items():
+        missing = [member.value for member in enum_class if member not in codes]
+        if missing:
+            raise RuntimeError(f"ENUM_CODES[{enum_class.__name__}] has no code for {', '.join(missing)}")
+        if len(set(codes.values())) != len(codes):
+            raise RuntimeError(f"ENUM_CODES[{enum_class.__name__}] assigns a code twice")
+        if not all(0 < code <= 32767 for code in codes.values()):
+            raise RuntimeError(f"ENUM_CODES[{enum_class.__name__}] codes must fit a smallint")
+
+_check_enum_codes()
+
 # Utility functions for working with enums - following SQLAlchemy best practices
 
 def get_enum_values(enum_class) -> list[str]:
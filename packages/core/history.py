@@ -0,0 +1,194 @@
+# packages/core/history.py
+# Conversation history reads without N+1 queries or full-history loads
+# Keyset pagination on (created_at, id) - every page is one index range scan
+
+import base64
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Generic, TypeVar
+
+from sqlalchemy import and_, or_, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from .models import Conversation, Message
+
+T = TypeVar("T")
+
+# Columns returned in row-tuple mode - everything a chat widget or the LLM context needs
+MESSAGE_COLUMNS = (
+    Message.id,
+    Message.conversation_id,
+    Message.message_type,
+    Message.content,
+    Message.ai_model,
+    Message.tokens_used,
+    Message.token_count,
+    Message.user_feedback,
+    Message.created_at,
+)
+
+
+@dataclass(frozen=True)
+class Cursor:
+    """
+    Position in a (created_at, id) ordered list
+
+    Why not OFFSET?
+    - OFFSET 10000 still reads and throws away 10000 rows
+    - A keyset cursor starts exactly where the last page ended, so page 1000
+      costs the same as page 1 and new rows don't shift pages around
+    """
+    created_at: datetime
+    id: int
+
+    def encode(self) -> str:
+        raw = f"{self.created_at.isoformat()}|{self.id}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "Cursor":
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+            created_at, id_ = raw.rsplit("|", 1)
+            return cls(datetime.fromisoformat(created_at), int(id_))
+        except (ValueError, UnicodeDecodeError) as error:
+            raise ValueError(f"Invalid pagination cursor: {token!r}") from error
+
+
+@dataclass(frozen=True)
+class Page(Generic[T]):
+    """
+    One page of results
+
+    next_cursor points further into the past; None means there is nothing older
+    """
+    items: list[T]
+    next_cursor: Cursor | None
+
+
+class HistoryRepository:
+    """
+    Read API for conversation history - use it instead of Conversation.messages
+
+    Usage:
+        history = HistoryRepository(session)
+        page = await history.last_messages(conversation_id, limit=20)
+        older = await history.last_messages(conversation_id, limit=20, before=page.next_cursor)
+
+    Every method exists in two flavours via `rows=`:
+    - rows=False: ORM Message objects (identity map, change tracking)
+    - rows=True:  plain row tuples - no ORM object construction, several times
+      cheaper per row for read-only paths like rendering or building LLM context
+    """
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def last_messages(
+        self,
+        conversation_id: int,
+        limit: int = 50,
+        before: Cursor | None = None,
+        rows: bool = False,
+        since: datetime | None = None,
+    ) -> Page[Any]:
+        """
+        Newest `limit` messages older than `before`, returned oldest-first
+
+        Served by ix_messages_conversation_created (conversation_id, created_at):
+        the scan starts at the newest entry and stops after limit + 1 rows.
+
+        Pass the conversation's created_at as `since` when it is known: messages
+        can't predate their conversation, and the bound lets Postgres skip every
+        monthly messages partition older than the conversation.
+        """
+        columns: Sequence[Any] = MESSAGE_COLUMNS if rows else (Message,)
+        query = select(*columns).where(Message.conversation_id == conversation_id)
+        if since is not None:
+            query = query.where(Message.created_at >= since)
+        if before is not None:
+            query = query.where(_older_than(Message.created_at, Message.id, before))
+        query = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1)
+
+        result = await self.session.execute(query)
+        fetched = list(result.all() if rows else result.scalars().all())
+        next_cursor = None
+        if len(fetched) > limit:
+            fetched = fetched[:limit]
+            oldest = fetched[-1]
+            next_cursor = Cursor(oldest.created_at, oldest.id)
+        fetched.reverse()                   # Chronological order for display and prompts
+        return Page(fetched, next_cursor)
+
+    async def conversations_with_latest_message(
+        self,
+        tenant_id: int,
+        limit: int = 20,
+        before: Cursor | None = None,
+        status: str | None = None,
+        rows: bool = False,
+    ) -> Page[Any]:
+        """
+        Newest conversations of a tenant, each with its latest message, in ONE query
+
+        The latest message comes from a LATERAL subquery (one index probe on
+        ix_messages_conversation_created per conversation, inside the same
+        statement) instead of one extra query per conversation (N+1) or loading
+        every conversation's full history.
+
+        Items are (Conversation, Message | None) pairs, or flat row tuples with
+        rows=True. Paginated by (created_at, id) through ix_conversations_tenant_created.
+        """
+        latest = (
+            select(Message)
+            .where(Message.conversation_id == Conversation.id)
+            # Runtime partition pruning: only partitions since the conversation started are probed
+            .where(Message.created_at >= Conversation.created_at)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(1)
+            .lateral("latest_message")
+        )
+        if rows:
+            query = select(
+                Conversation.id,
+                Conversation.session_id,
+                Conversation.title,
+                Conversation.status,
+                Conversation.channel,
+                Conversation.conversation_type,
+                Conversation.created_at,
+                latest.c.id.label("last_message_id"),
+                latest.c.message_type.label("last_message_type"),
+                latest.c.content.label("last_message_content"),
+                latest.c.created_at.label("last_message_at"),
+            )
+        else:
+            # The lateral subquery mapped back onto Message: ORM pairs, still one statement
+            query = select(Conversation, aliased(Message, latest))
+        query = query.outerjoin(latest, true()).where(Conversation.tenant_id == tenant_id)
+        if status is not None:
+            query = query.where(Conversation.status == status)
+        if before is not None:
+            query = query.where(_older_than(Conversation.created_at, Conversation.id, before))
+        query = query.order_by(Conversation.created_at.desc(), Conversation.id.desc()).limit(limit + 1)
+
+        fetched: list[Any] = list((await self.session.execute(query)).all())
+        next_cursor = None
+        if len(fetched) > limit:
+            fetched = fetched[:limit]
+            last = fetched[-1]
+            conversation = last if rows else last[0]
+            next_cursor = Cursor(conversation.created_at, conversation.id)
+        if not rows:
+            fetched = [(row[0], row[1]) for row in fetched]
+        return Page(fetched, next_cursor)
+
+
+def _older_than(created_at: Any, id_: Any, cursor: Cursor) -> Any:
+    """(created_at, id) < (cursor.created_at, cursor.id), written so the index range applies"""
+    return or_(
+        created_at < cursor.created_at,
+        and_(created_at == cursor.created_at, id_ < cursor.id),
+    )
@@ -0,0 +1,206 @@
+# packages/core/metrics.py
+# Lightweight in-process metrics: counters, gauges and latency histograms
+# Cheap enough for the hot path (no locks, no I/O) and readable from a /metrics endpoint
+
+import bisect
+import math
+from collections import deque
+
+# Default histogram buckets in seconds - tuned for LLM/DB latencies (1ms .. 60s)
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+class Counter:
+    """
+    Monotonic counter with optional labels
+
+    Labels are passed as keyword arguments and stored as a sorted tuple key,
+    so counter.inc(tenant="1", result="hit") and counter.inc(result="hit", tenant="1")
+    hit the same series.
+    """
+
+    def __init__(self, name: str, description: str = "") -> None:
+        self.name = name
+        self.description = description
+        self._values: dict[tuple[tuple[str, str], ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: object) -> float:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        return self._values.get(key, 0.0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def snapshot(self) -> dict[str, object]:
+        return {
+            "type": "counter",
+            "description": self.description,
+            "series": [
+                {"labels": dict(key), "value": value}
+                for key, value in self._values.items()
+            ],
+        }
+
+
+class Gauge:
+    """Current value that goes up and down (pool connections in use, queue depth...)"""
+
+    def __init__(self, name: str, description: str = "") -> None:
+        self.name = name
+        self.description = description
+        self._values: dict[tuple[tuple[str, str], ...], float] = {}
+
+    def set(self, value: float, **labels: object) -> None:
+        self._values[tuple(sorted((k, str(v)) for k, v in labels.items()))] = value
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: object) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: object) -> float:
+        return self._values.get(tuple(sorted((k, str(v)) for k, v in labels.items())), 0.0)
+
+    def snapshot(self) -> dict[str, object]:
+        return {
+            "type": "gauge",
+            "description": self.description,
+            "series": [{"labels": dict(key), "value": value} for key, value in self._values.items()],
+        }
+
+
+class Histogram:
+    """
+    Latency histogram with fixed buckets plus a sliding window for percentiles
+
+    Why both?
+    - Buckets are cheap, mergeable across workers and never forget (Prometheus-style)
+    - The window (last N observations) answers "what is p95 right now?",
+      which routing, hedging and admission control need at runtime
+    """
+
+    def __init__(
+        self,
+        name: str,
+        description: str = "",
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+        window: int = 2048,
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self._series: dict[tuple[tuple[str, str], ...], _HistogramSeries] = {}
+        self._window = window
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _HistogramSeries(len(self.buckets), self._window)
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.count += 1
+        series.sum += value
+        series.recent.append(value)
+
+    def count(self, **labels: object) -> int:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        series = self._series.get(key)
+        return series.count if series else 0
+
+    def percentile(self, q: float, **labels: object) -> float | None:
+        """Percentile (0..100) over the recent window, None if nothing observed yet"""
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        series = self._series.get(key)
+        if series is None or not series.recent:
+            return None
+        return _percentile(sorted(series.recent), q)
+
+    def snapshot(self) -> dict[str, object]:
+        series_out = []
+        for key, series in self._series.items():
+            ordered = sorted(series.recent)
+            series_out.append({
+                "labels": dict(key),
+                "count": series.count,
+                "sum": series.sum,
+                "buckets": dict(zip([*map(str, self.buckets), "+Inf"], series.counts, strict=True)),
+                "p50": _percentile(ordered, 50),
+                "p95": _percentile(ordered, 95),
+                "p99": _percentile(ordered, 99),
+            })
+        return {"type": "histogram", "description": self.description, "series": series_out}
+
+
+class _HistogramSeries:
+    """Per-label-set state of a Histogram"""
+
+    __slots__ = ("counts", "count", "sum", "recent")
+
+    def __init__(self, bucket_count: int, window: int) -> None:
+        self.counts = [0] * (bucket_count + 1)   # Last slot is the +Inf bucket
+        self.count = 0
+        self.sum = 0.0
+        self.recent: deque[float] = deque(maxlen=window)
+
+
+def _percentile(ordered: list[float], q: float) -> float | None:
+    """Nearest-rank percentile over an already sorted list"""
+    if not ordered:
+        return None
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class MetricsRegistry:
+    """
+    Process-wide collection of named metrics
+
+    counter()/histogram() are get-or-create, so modules can declare their
+    metrics at import time without worrying about registration order.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Gauge | Histogram] = {}
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Counter(name, description)
+        if not isinstance(metric, Counter):
+            raise TypeError(f"Metric '{name}' is already registered as {type(metric).__name__}")
+        return metric
+
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Gauge(name, description)
+        if not isinstance(metric, Gauge):
+            raise TypeError(f"Metric '{name}' is already registered as {type(metric).__name__}")
+        return metric
+
+    def histogram(
+        self, name: str, description: str = "", buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Histogram(name, description, buckets)
+        if not isinstance(metric, Histogram):
+            raise TypeError(f"Metric '{name}' is already registered as {type(metric).__name__}")
+        return metric
+
+    def snapshot(self) -> dict[str, dict[str, object]]:
+        """All metrics as plain dicts - ready to return from a FastAPI endpoint"""
+        return {name: metric.snapshot() for name, metric in sorted(self._metrics.items())}
+
+
+# Global registry used by all packages - one per worker process
+metrics = MetricsRegistry()
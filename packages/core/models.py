@@ -2,20 +2,96 @@
 # Simplified Row Level Security models based on production best practices
 # Following shared-table approach with minimal complexity
 
-from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Index
+from datetime import UTC, datetime
+from enum import Enum
+from typing import Any
+from sqlalchemy import BigInteger, Column, Computed, Integer, SmallInteger, String, DateTime, Text, Boolean, ForeignKey, Index, PrimaryKeyConstraint, case, literal_column, type_coerce
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
+from sqlalchemy.types import TypeDecorator
+
+from .config import get_settings
 
 # Import our centralized enums for consistent field values
-from .enums import ChannelType, ConversationType, ConversationStatus, MessageType, UserRole, UserFeedback
+from .enums import ENUM_CODES, ArchiveBatchState, ChannelType, ConversationType, ConversationStatus, MessageType, UserRole, UserFeedback
 
 # Base class for all database models
 Base = declarative_base()
 
 # Get current UTC timestamp for database records
+# Columns are TIMESTAMP WITHOUT TIME ZONE, so the value is naive UTC:
+# asyncpg rejects tz-aware datetimes for such columns (psycopg2 silently accepted them)
 def utc_now():
-    return datetime.now(timezone.utc)
+    return datetime.now(UTC).replace(tzinfo=None)
+
+# The same naive UTC for a datetime from the outside (query parameters): an aware one is
+# converted from its offset, a naive one is taken as UTC already
+def naive_utc(value: datetime) -> datetime:
+    return value.astimezone(UTC).replace(tzinfo=None) if value.tzinfo else value
+
+# Enum columns as VARCHAR labels ("string") or 2-byte codes ("smallint"), see ENUM_STORAGE in .env.example
+# Why smallint codes?
+# - messages carries message_type on every row: 2 bytes instead of 5-12 plus a varlena
+#   header, in the heap and in every index that includes it
+# - Integer comparisons in filters and GROUP BY instead of collation-aware text ones
+# The mapped models below use the configured mode (validated by Settings); enum_column
+# takes the mode as an argument too, so tests can build columns of either one
+ENUM_STORAGE = get_settings().enum_storage
+
+class CodedEnum(TypeDecorator):
+    """
+    str-Enum stored as its smallint code from enums.ENUM_CODES
+
+    Binds take members or plain strings ("web" == ChannelType.WEB), results come back
+    as the plain strings - exactly what the VARCHAR column returns, so application code
+    (comparisons, f-strings, JSON) can't tell the storage modes apart
+    """
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, enum_class: type[Enum]) -> None:
+        super().__init__()
+        self.enum_class = enum_class
+        self.codes = ENUM_CODES[enum_class]
+        self.labels = {code: member.value for member, code in self.codes.items()}
+
+    def process_bind_param(self, value: Any, dialect: Any) -> int | None:
+        if value is None:
+            return None
+        try:
+            return self.codes[value]
+        except KeyError:
+            raise ValueError(f"{value!r} is not a valid {self.enum_class.__name__}") from None
+
+    def process_result_value(self, value: int | None, dialect: Any) -> str | None:
+        return None if value is None else self.labels[value]
+
+def enum_column(name: str, enum_class: type[Enum], length: int, storage: str | None = None, **kwargs: Any) -> Column:
+    """
+    String(length) column `name`, or with ENUM_STORAGE=smallint the `<name>_code` column
+    the compact-storage migration adds - attribute name, column key and values stay the same
+    storage overrides the configured mode
+    """
+    if (storage or ENUM_STORAGE) == "smallint":
+        return Column(f"{name}_code", CodedEnum(enum_class), key=name, **kwargs)
+    return Column(name, String(length), **kwargs)
+
+def enum_text(column: Any) -> Any:
+    """
+    The column's string value as a SQL expression, in either storage mode
+    For INSERT ... SELECT into String columns (analytics rollups) and text functions like coalesce()
+    """
+    if not isinstance(column.type, CodedEnum):
+        return column
+    code = type_coerce(column, SmallInteger)
+    return type_coerce(
+        case(*(
+            (code == literal_column(str(number)), literal_column(f"'{member.value}'"))
+            for member, number in column.type.codes.items()
+        )),
+        String,
+    )
 
 class Tenant(Base):
     """
@@ -24,14 +100,16 @@ class Tenant(Base):
     """
     __tablename__ = "tenants"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False)
     slug = Column(String(50), unique=True, nullable=False, index=True)
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime, default=utc_now, nullable=False)
     
-    users = relationship("User", back_populates="tenant", lazy="select")
-    conversations = relationship("Conversation", back_populates="tenant", lazy="select")
+    # Collections never lazy-load: a tenant has thousands of rows behind each one.
+    # Query them explicitly (HistoryRepository, select(...).where(...)) or use selectinload()
+    users = relationship("User", back_populates="tenant", lazy="raise_on_sql")
+    conversations = relationship("Conversation", back_populates="tenant", lazy="raise_on_sql")
 
     def __repr__(self) -> str:
         return f"<Tenant(id={self.id}, slug='{self.slug}')>"
@@ -43,8 +121,8 @@ class User(Base):
     """
     __tablename__ = "users"
     
-    id = Column(Integer, primary_key=True, index=True)
-    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False)
     
     email = Column(String(255), nullable=False)
     username = Column(String(100), nullable=False)
@@ -55,14 +133,14 @@ class User(Base):
     # Role-based access control - what can this user do?
     # Using centralized enum ensures consistency and prevents typos
     # See packages/core/enums.py for all available roles and their descriptions
-    role = Column(String(20), default=UserRole.USER, nullable=False)
+    role = enum_column("role", UserRole, 20, default=UserRole.USER, nullable=False)
     
     created_at = Column(DateTime, default=utc_now, nullable=False)
     last_login_at = Column(DateTime, nullable=True)
     
     tenant = relationship("Tenant", back_populates="users")
-    conversations = relationship("Conversation", back_populates="user", lazy="select")
-    messages = relationship("Message", back_populates="user", lazy="select")
+    conversations = relationship("Conversation", back_populates="user", lazy="raise_on_sql")
+    messages = relationship("Message", back_populates="user", lazy="raise_on_sql")
     
     # ADDED: critical index for searching users by role in tenant
     __table_args__ = (
@@ -81,35 +159,45 @@ class Conversation(Base):
     """
     __tablename__ = "conversations"
     
-    id = Column(Integer, primary_key=True, index=True)
-    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     session_id = Column(String(255), nullable=False)
     title = Column(String(200), nullable=True)
     
     # Business context - what type of conversation is this?
     # Using enum ensures consistent categorization across the platform
-    conversation_type = Column(String(15), default=ConversationType.SUPPORT, nullable=False)
+    conversation_type = enum_column("conversation_type", ConversationType, 15, default=ConversationType.SUPPORT, nullable=False)
     
     # Where did this conversation start?
     # See ChannelType enum for all supported communication channels
-    channel = Column(String(15), default=ChannelType.WEB, nullable=False)
+    channel = enum_column("channel", ChannelType, 15, default=ChannelType.WEB, nullable=False)
     
     # Conversation lifecycle management
     # See ConversationStatus enum for workflow details
-    status = Column(String(10), default=ConversationStatus.ACTIVE, nullable=False)
+    status = enum_column("status", ConversationStatus, 10, default=ConversationStatus.ACTIVE, nullable=False)
     
     resolution_time_minutes = Column(Integer, nullable=True)
     satisfaction_score = Column(Integer, nullable=True)
     
+    # Rolling summary of the turns that no longer fit the LLM context window
+    # (packages/core/context.py). It covers every message up to and including
+    # (summarized_through_at, summarized_through_id) - newer ones are sent verbatim
+    summary = Column(Text, nullable=True)
+    summary_token_count = Column(Integer, nullable=True)
+    summarized_through_at = Column(DateTime, nullable=True)
+    summarized_through_id = Column(Integer, nullable=True)
+
     created_at = Column(DateTime, default=utc_now, nullable=False)
     updated_at = Column(DateTime, default=utc_now, onupdate=utc_now, nullable=False)
     closed_at = Column(DateTime, nullable=True)
     
     tenant = relationship("Tenant", back_populates="conversations")
     user = relationship("User", back_populates="conversations")
-    messages = relationship("Message", back_populates="conversation", 
-                          order_by="Message.created_at", lazy="select")
+    # Long support threads make the full history expensive - and touching it per
+    # conversation in a loop is an N+1. Use packages/core/history.py to read pages of it
+    messages = relationship("Message", back_populates="conversation",
+                          order_by="Message.created_at", lazy="raise_on_sql")
     
     # Performance indexes for common business queries
     __table_args__ = (
@@ -122,8 +210,13 @@ class Conversation(Base):
         # "Show me recent conversations for tenant X" (analytics dashboard)
         Index('ix_conversations_tenant_created', 'tenant_id', 'created_at'),
         
+        # Chat turns resume the session's latest conversation
+        Index('ix_conversations_tenant_session', 'tenant_id', 'session_id'),
+
         # Analytics queries for business intelligence
         Index('ix_conversations_channel', 'channel'),
+        # Incremental rollups read conversations closed within a time window
+        Index('ix_conversations_closed_at', 'closed_at'),
         Index('ix_conversations_type', 'conversation_type'),
     )
 
@@ -137,27 +230,38 @@ class Message(Base):
     """
     __tablename__ = "messages"
     
-    id = Column(Integer, primary_key=True, index=True)
-    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
-    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False, index=True)
+    # The table is partitioned by month on created_at (migration dc732550bac6,
+    # packages/data/partitions.py): the database primary key is (id, created_at)
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     content = Column(Text, nullable=False)
     
     # Who/what sent this message?
     # See MessageType enum for all possible message sources
-    message_type = Column(String(15), default=MessageType.USER, nullable=False)
+    message_type = enum_column("message_type", MessageType, 15, default=MessageType.USER, nullable=False)
     
     # AI tracking fields - только для assistant сообщений
     ai_model = Column(String(50), nullable=True)
     tokens_used = Column(Integer, nullable=True)
     
+    # Tokens of `content` as prompt context, counted once when the row is written
+    # (tokens_used is what the turn was billed; NULL here = row predates the column)
+    token_count = Column(Integer, nullable=True)
+
     # User feedback on AI responses - did this answer help?
     # Simple thumbs up/down system for AI improvement
     # See UserFeedback enum for possible values
     # NULL = no feedback given (most common)
-    user_feedback = Column(String(15), nullable=True)
+    user_feedback = enum_column("user_feedback", UserFeedback, 15, nullable=True)
     
     created_at = Column(DateTime, default=utc_now, nullable=False)
+
+    # Full-text search vector of `content`, computed by Postgres on every write
+    # (migration 3e8a1f5c7b20, queried by packages/core/search.py). Deferred: loading
+    # a Message never pulls it, and writers never set it
+    content_tsv = deferred(Column(TSVECTOR, Computed("to_tsvector('english'::regconfig, content)", persisted=True)))
     
     tenant = relationship("Tenant")
     conversation = relationship("Conversation", back_populates="messages")
@@ -177,10 +281,142 @@ class Message(Base):
         Index('ix_messages_tenant_user', 'tenant_id', 'user_id'),
         Index('ix_messages_type', 'message_type'),
         Index('ix_messages_ai_model', 'ai_model'),
+
+        # Message search: GIN over the tsvector; the trigram index for fuzzy search
+        # (ix_messages_content_trgm) exists only where pg_trgm is installed
+        Index('ix_messages_content_tsv', 'content_tsv', postgresql_using='gin'),
+        # Newest-first walk for search terms that match most messages
+        Index('ix_messages_tenant_created', 'tenant_id', 'created_at'),
     )
 
     def __repr__(self) -> str:
         return f"<Message(id={self.id}, tenant_id={self.tenant_id}, type='{self.message_type}')>"
 
+class ArchiveBatch(Base):
+    """
+    Checkpoint of the conversation archiver (packages/data/archive.py)
+    One row per batch of conversations moved out of the live tables
+
+    Operational table: written by the admin connection, never by the chat apps
+    """
+    __tablename__ = "archive_batches"
+
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False)
+    state = Column(String(10), default=ArchiveBatchState.WRITING, nullable=False)
+
+    # Where the archive lives: key relative to the archive store root
+    object_key = Column(String(500), nullable=False)
+    archive_format = Column(String(10), nullable=False)
+    conversation_ids = Column(ARRAY(Integer), nullable=False)
+    # Idle cutoff of the run: a conversation with activity after it is left live
+    idle_before = Column(DateTime, nullable=False)
+    message_count = Column(Integer, default=0, nullable=False)
+    bytes_written = Column(BigInteger, default=0, nullable=False)
+
+    created_at = Column(DateTime, default=utc_now, nullable=False)
+    completed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # "Which batches of tenant X still need work?" - resume and restore lookups
+        Index('ix_archive_batches_tenant_state', 'tenant_id', 'state'),
+    )
+
+    def __repr__(self) -> str:
+        return f"<ArchiveBatch(id={self.id}, tenant_id={self.tenant_id}, state='{self.state}')>"
+
+class MessageRollup(Base):
+    """
+    Precomputed message analytics per tenant and time bucket
+    Maintained by packages/data/rollups.py, read by the analytics dashboard
+
+    One row per (bucket, ai_model, message_type, user_feedback) combination:
+    tokens by model, message counts by type and feedback ratios all come from
+    summing a handful of rows instead of scanning the messages table
+    """
+    __tablename__ = "message_rollups"
+
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False)
+    granularity = Column(String(5), nullable=False)      # See RollupGranularity
+    bucket_start = Column(DateTime, nullable=False)
+
+    # "" instead of NULL: these columns are part of the primary key
+    ai_model = Column(String(50), default="", nullable=False)
+    message_type = Column(String(15), nullable=False)
+    user_feedback = Column(String(15), default="", nullable=False)
+
+    message_count = Column(Integer, default=0, nullable=False)
+    tokens_used = Column(BigInteger, default=0, nullable=False)
+
+    __table_args__ = (
+        # Dashboard reads are one range scan: tenant + granularity + time window
+        PrimaryKeyConstraint(
+            'tenant_id', 'granularity', 'bucket_start', 'ai_model', 'message_type', 'user_feedback',
+            name='message_rollups_pkey',
+        ),
+    )
+
+    def __repr__(self) -> str:
+        return f"<MessageRollup(tenant_id={self.tenant_id}, {self.granularity}={self.bucket_start})>"
+
+class ConversationRollup(Base):
+    """
+    Precomputed outcome analytics of closed conversations per channel
+    Bucketed by closed_at; maintained by packages/data/rollups.py
+
+    Percentiles can't be summed across buckets, so resolution times are kept as
+    a histogram (counts per RESOLUTION_BUCKETS_MINUTES range, last slot = longer)
+    and percentiles are estimated from the merged histogram at read time
+    """
+    __tablename__ = "conversation_rollups"
+
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False)
+    granularity = Column(String(5), nullable=False)      # See RollupGranularity
+    bucket_start = Column(DateTime, nullable=False)
+    channel = Column(String(15), nullable=False)
+
+    closed_count = Column(Integer, default=0, nullable=False)
+    resolution_count = Column(Integer, default=0, nullable=False)
+    resolution_minutes_sum = Column(BigInteger, default=0, nullable=False)
+    resolution_histogram = Column(ARRAY(Integer), nullable=False)
+    satisfaction_count = Column(Integer, default=0, nullable=False)
+    satisfaction_sum = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('tenant_id', 'granularity', 'bucket_start', 'channel', name='conversation_rollups_pkey'),
+    )
+
+    def __repr__(self) -> str:
+        return f"<ConversationRollup(tenant_id={self.tenant_id}, {self.granularity}={self.bucket_start})>"
+
+class RollupWatermark(Base):
+    """
+    How far each rollup has been computed (packages/data/rollups.py)
+    Every run continues from here instead of re-aggregating the whole history
+
+    Operational table: written by the admin connection, never by the chat apps
+    """
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String(50), primary_key=True)
+    # Exclusive end of the last computed hour
+    high_water = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now, nullable=False)
+
+class IndexerCheckpoint(Base):
+    """
+    How far the embedding indexer has read the messages table (packages/data/indexer.py)
+    One row per stream: "messages" (tailing new rows) and "backfill"
+
+    Operational table: written by the admin connection, never by the chat apps
+    """
+    __tablename__ = "indexer_checkpoints"
+
+    name = Column(String(50), primary_key=True)
+    # Highest Message.id whose chunks are in the vector store
+    last_message_id = Column(BigInteger, default=0, nullable=False)
+    indexed_messages = Column(BigInteger, default=0, nullable=False)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now, nullable=False)
+
 # Row Level Security Policies will be added via SQL migrations
 # Each table will get automatic filtering: WHERE tenant_id = current_setting('app.current_tenant')::integer
\ No newline at end of file
@@ -0,0 +1,324 @@
+# packages/core/persistence.py
+# Saves finished chat turns as Conversation/Message rows, and conversation status changes
+# Runs after the response stream is closed, never on the time-to-first-token path
+
+from collections import OrderedDict
+from typing import Any
+
+from sqlalchemy import Integer, cast, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from packages.caching.conversation_state import (
+    LIVE_STATUSES,
+    CachedMessage,
+    ConversationState,
+    ConversationStateCache,
+)
+
+from .chat import ChatTurn
+from .database import history_session, tenant_session
+from .enums import STATUS_TRANSITIONS, ConversationStatus, MessageType
+from .models import Conversation, Message, utc_now
+from .tokens import count_tokens
+from .write_behind import WriteBehindBuffer
+
+# Conversations a human agent can write in - an escalated one is what agents answer
+AGENT_STATUSES = (ConversationStatus.ACTIVE, ConversationStatus.PENDING, ConversationStatus.ESCALATED)
+
+
+class SqlTurnStore:
+    """
+    Writes one chat turn:
+    1. Find the conversation (by id, else by session_id) or create it
+    2. Insert the user message and the assistant message
+    3. Bump Conversation.updated_at so "recent conversations" stays correct
+
+    Without a buffer all three happen in one tenant-scoped transaction per turn.
+    With a WriteBehindBuffer only step 1 touches the database right away (and not
+    at all once the session's conversation is known); the rows of steps 2-3 are
+    batched with other turns of the same tenant. `durable` picks the buffer's
+    durability mode for every turn this store saves.
+
+    Only a live (ACTIVE/PENDING) conversation is resumed by session_id; once the
+    session's conversation is escalated, closed or archived, the next turn starts
+    a new one. Resolved (tenant, session_id) -> conversation_id pairs are
+    remembered for the next turns of the same session, so an ongoing chat skips
+    the lookup. A turn whose context was built (ContextBuilder) trusts that
+    lookup instead - it sees status changes made on other workers and by the
+    archiver - and change_status() drops the pair right away on this worker.
+
+    A conversation_id sent by the client is checked against (tenant, session_id)
+    before any row refers to it - the foreign key alone would accept another
+    tenant's conversation. An id that doesn't belong to the session is ignored
+    and the turn goes to the session's own conversation.
+
+    With a state_cache every saved turn is written through to the cached
+    conversation state (a new conversation starts one), so the next turn's
+    context is built without reading the rows back.
+
+    Every write here is chat history and goes through history_session, so it
+    doesn't pin the tenant's reads to the primary; change_status does.
+    """
+
+    def __init__(
+        self,
+        buffer: WriteBehindBuffer | None = None,
+        durable: bool = False,
+        max_sessions: int = 10_000,
+        state_cache: ConversationStateCache | None = None,
+    ) -> None:
+        self.buffer = buffer
+        self.durable = durable
+        self.max_sessions = max_sessions
+        self.state_cache = state_cache
+        self._sessions: OrderedDict[tuple[int, str], int] = OrderedDict()
+
+    async def save_turn(self, turn: ChatTurn) -> None:
+        session_key = (turn.tenant_id, turn.request.session_id)
+        known = self._sessions.get(session_key)
+        if turn.context is not None and turn.conversation_id is None:
+            # The context builder found no live conversation for the session: one we
+            # remember has been closed or archived since
+            self.forget(*session_key)
+            known = None
+        unverified = turn.conversation_id is not None and turn.conversation_id != known
+        if turn.conversation_id is None:
+            turn.conversation_id = known
+        if self.buffer is None:
+            async with history_session(turn.tenant_id) as session:
+                if unverified:
+                    await self._verify_conversation(session, turn)
+                created = turn.conversation_id is None and await self._resolve_conversation(session, turn)
+                rows = message_rows(turn)
+                await session.execute(insert(Message), rows)
+                if not created:
+                    await session.execute(
+                        update(Conversation)
+                        .where(Conversation.id == turn.conversation_id)
+                        .values(updated_at=utc_now())
+                    )
+            self._remember(session_key, turn.conversation_id)
+            await self._write_through(turn, rows, created)
+            return
+
+        created = False
+        if unverified or turn.conversation_id is None:
+            async with history_session(turn.tenant_id) as session:
+                if unverified:
+                    await self._verify_conversation(session, turn)
+                created = turn.conversation_id is None and await self._resolve_conversation(session, turn)
+        self._remember(session_key, turn.conversation_id)
+        # A conversation created just now already carries a fresh updated_at
+        touch = None if created else (turn.conversation_id, utc_now())
+        rows = message_rows(turn)
+        await self.buffer.enqueue(turn.tenant_id, rows, touch=touch, durable=self.durable)
+        await self._write_through(turn, rows, created)
+
+    async def _write_through(self, turn: ChatTurn, rows: list[dict[str, Any]], created: bool) -> None:
+        if self.state_cache is None:
+            return
+        request = turn.request
+        # Inserted without RETURNING (or not flushed yet): the ids stay unknown
+        messages = [
+            CachedMessage(None, row["created_at"], row["message_type"], row["content"], row["token_count"])
+            for row in rows
+        ]
+        if created:
+            await self.state_cache.put(ConversationState(
+                tenant_id=turn.tenant_id,
+                session_id=request.session_id,
+                id=turn.conversation_id,  # type: ignore[arg-type]
+                status=ConversationStatus.ACTIVE,
+                conversation_type=request.conversation_type,
+                channel=request.channel,
+                created_at=turn.received_at,
+                messages=messages,
+            ))
+        else:
+            await self.state_cache.append(
+                turn.tenant_id, request.session_id, turn.conversation_id, messages  # type: ignore[arg-type]
+            )
+
+    async def save_agent_message(self, tenant_id: int, session_id: str, content: str, model: str) -> int | None:
+        """
+        Store a human agent's message in the session's open conversation, before it is pushed
+
+        Returns the conversation id; None if the session has no open conversation.
+        Buffered writes are durable whatever the store's mode - the agent is told
+        the message went out only once it is saved. A cached state of the
+        conversation gets the message too, so the next AI turn sees it.
+        """
+        now = utc_now()
+        async with history_session(tenant_id) as session:
+            conversation_id = await session.scalar(
+                select(Conversation.id)
+                .where(Conversation.tenant_id == tenant_id)
+                .where(Conversation.session_id == session_id)
+                .where(Conversation.status.in_(AGENT_STATUSES))
+                .order_by(Conversation.id.desc())
+                .limit(1)
+            )
+            if conversation_id is None:
+                return None
+            row = {
+                "tenant_id": tenant_id,
+                "conversation_id": conversation_id,
+                "user_id": None,
+                "content": content,
+                "message_type": MessageType.HUMAN_AGENT,
+                "ai_model": None,
+                "tokens_used": None,
+                "token_count": count_tokens(content, model),
+                "created_at": now,
+            }
+            if self.buffer is None:
+                await session.execute(insert(Message), [row])
+                await session.execute(
+                    update(Conversation).where(Conversation.id == conversation_id).values(updated_at=now)
+                )
+        if self.buffer is not None:
+            await self.buffer.enqueue(tenant_id, [row], touch=(conversation_id, now), durable=True)
+        if self.state_cache is not None:
+            message = CachedMessage(None, now, MessageType.HUMAN_AGENT, content, row["token_count"])
+            await self.state_cache.append(tenant_id, session_id, conversation_id, [message])
+        return conversation_id
+
+    def forget(self, tenant_id: int, session_id: str) -> None:
+        """Drop the remembered conversation of a session - the next turn looks it up again"""
+        self._sessions.pop((tenant_id, session_id), None)
+
+    def _remember(self, session_key: tuple[int, str], conversation_id: int | None) -> None:
+        if conversation_id is None:
+            return
+        self._sessions[session_key] = conversation_id
+        self._sessions.move_to_end(session_key)
+        if len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    async def _verify_conversation(self, session: AsyncSession, turn: ChatTurn) -> None:
+        """Clear turn.conversation_id unless it is a conversation of the turn's tenant and session"""
+        turn.conversation_id = await session.scalar(
+            select(Conversation.id)
+            .where(Conversation.id == turn.conversation_id)
+            .where(Conversation.tenant_id == turn.tenant_id)
+            .where(Conversation.session_id == turn.request.session_id)
+        )
+
+    async def _resolve_conversation(self, session: AsyncSession, turn: ChatTurn) -> bool:
+        """Set turn.conversation_id from the session's live conversation, creating one if needed"""
+        request = turn.request
+        turn.conversation_id = await session.scalar(
+            select(Conversation.id)
+            .where(Conversation.tenant_id == turn.tenant_id)
+            .where(Conversation.session_id == request.session_id)
+            .where(Conversation.status.in_(LIVE_STATUSES))
+            .order_by(Conversation.id.desc())
+            .limit(1)
+        )
+        if turn.conversation_id is not None:
+            return False
+        conversation = Conversation(
+            tenant_id=turn.tenant_id,
+            user_id=request.user_id,
+            session_id=request.session_id,
+            conversation_type=request.conversation_type,
+            channel=request.channel,
+            # The conversation starts with its first message - history queries rely on
+            # no message predating its conversation (see HistoryRepository)
+            created_at=turn.received_at,
+            updated_at=turn.received_at,
+        )
+        session.add(conversation)
+        await session.flush()        # Populates conversation.id for the messages
+        turn.conversation_id = conversation.id
+        return True
+
+
+def message_rows(turn: ChatTurn) -> list[dict[str, Any]]:
+    """
+    The user and assistant Message rows of a finished turn, as insert parameters
+
+    Timestamps are taken here rather than at flush time, so buffered rows keep
+    the order and time they really happened in. token_count is stored so the
+    context builder never tokenizes these messages again.
+    """
+    request = turn.request
+    message_tokens = turn.context.message_tokens if turn.context else count_tokens(request.message, turn.model)
+    return [
+        {
+            "tenant_id": turn.tenant_id,
+            "conversation_id": turn.conversation_id,
+            "user_id": request.user_id,
+            "content": request.message,
+            "message_type": MessageType.USER,
+            "ai_model": None,
+            "tokens_used": None,
+            "token_count": message_tokens,
+            "created_at": turn.received_at,
+        },
+        {
+            "tenant_id": turn.tenant_id,
+            "conversation_id": turn.conversation_id,
+            "user_id": None,
+            "content": turn.content,
+            "message_type": MessageType.ASSISTANT,
+            "ai_model": turn.model,
+            "tokens_used": turn.tokens_used,
+            "token_count": count_tokens(turn.content, turn.model),
+            "created_at": utc_now(),
+        },
+    ]
+
+
+class InvalidStatusTransition(ValueError):
+    """The conversation's current status doesn't allow the requested one (see STATUS_TRANSITIONS)"""
+
+
+async def change_status(
+    tenant_id: int,
+    conversation_id: int,
+    status: ConversationStatus,
+    state_cache: ConversationStateCache | None = None,
+    turn_store: SqlTurnStore | None = None,
+) -> ConversationStatus | None:
+    """
+    Move a conversation to `status`; returns the status it had, None if it doesn't exist
+
+    The row is locked while its status is checked: two agents changing the same
+    conversation at once are applied one after the other, the second one checked
+    against the status the first one left. Closing stamps
+    closed_at and resolution_time_minutes. The cached conversation state follows
+    (evicted once the conversation is no longer ACTIVE/PENDING), and so does the
+    session's conversation remembered by turn_store.
+    """
+    sources = [previous for previous, targets in STATUS_TRANSITIONS.items() if status in targets]
+    now = utc_now()
+    values: dict[str, Any] = {"status": status, "updated_at": now}
+    if status == ConversationStatus.CLOSED:
+        values["closed_at"] = now
+        values["resolution_time_minutes"] = cast(func.extract("epoch", now - Conversation.created_at) / 60, Integer)
+    elif status == ConversationStatus.ACTIVE:
+        values["closed_at"] = None           # Reopened
+        values["resolution_time_minutes"] = None
+
+    async with tenant_session(tenant_id) as session:
+        previous = await session.scalar(
+            select(Conversation.status).where(Conversation.id == conversation_id).with_for_update()
+        )
+        if previous is None:
+            return None
+        if previous not in sources:
+            raise InvalidStatusTransition(
+                f"Conversation {conversation_id} can't move from {ConversationStatus(previous).value} to {status.value}"
+            )
+        session_id = await session.scalar(
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(**values)
+            .returning(Conversation.session_id)
+        )
+    if state_cache is not None:
+        await state_cache.set_status(tenant_id, session_id, conversation_id, status)
+    if turn_store is not None and status not in LIVE_STATUSES:
+        turn_store.forget(tenant_id, session_id)
+    return ConversationStatus(previous)
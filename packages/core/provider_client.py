@@ -0,0 +1,443 @@
+# packages/core/provider_client.py
+# Pooled provider client (LLM_PROVIDER=pooled): OpenAI-compatible chat streaming over
+# keep-alive HTTP/2 connection pools, hedged across upstreams that serve the same model
+#
+# Why hedge?
+# - Provider brown-outs show up as a slow first token far more often than as an error:
+#   most requests are fine, a few stall for seconds. Waiting for a timeout puts those
+#   seconds in front of the user; a second request to another upstream once the primary
+#   is slower than its own p95 caps the tail at roughly p95 + the hedge's latency
+# - A healthy upstream is hedged for ~5% of requests (that is what p95 means); the
+#   retry budget caps it when one isn't, so an outage can't double the traffic elsewhere
+# - Whichever upstream sends its first chunk first wins and the other request is
+#   cancelled - over HTTP/2 that resets one stream, the pooled connection stays open
+#
+# Why circuit breakers?
+# - An upstream that keeps failing costs every request a round trip (and a retry);
+#   after breaker_failures in a row it is skipped for breaker_reset seconds, then a
+#   single trial request decides whether it is back
+
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+import httpx
+
+from .metrics import metrics
+from .providers import ChatHistory, DeadlineExceeded, ProviderChunk, time_left
+
+if TYPE_CHECKING:
+    from .config import Settings
+
+logger = logging.getLogger(__name__)
+
+first_token_histogram = metrics.histogram(
+    "provider_first_token_seconds", "Time to the first chunk per upstream (also drives the hedge delay)"
+)
+attempts_counter = metrics.counter(
+    "provider_attempts_total", "Upstream requests by kind (primary/hedge/retry) and outcome (won/lost/failed)"
+)
+budget_counter = metrics.counter(
+    "provider_retry_budget_exhausted_total", "Hedges and retries skipped because the retry budget was spent"
+)
+breaker_gauge = metrics.gauge("provider_breaker_open", "1 while an upstream's circuit breaker is open")
+
+# Overload and server errors may go better on another upstream; a rejected request won't
+RETRYABLE_STATUS = frozenset({408, 409, 429})
+
+MIN_HEDGE_SAMPLES = 20                   # Below this the p95 is noise - hedge after hedge_max_delay
+
+
+class ProviderError(Exception):
+    """An upstream answered with an error status"""
+
+    def __init__(self, upstream: str, status_code: int, detail: str) -> None:
+        super().__init__(f"{upstream} returned {status_code}: {detail}")
+        self.upstream = upstream
+        self.status_code = status_code
+
+
+class UpstreamsUnavailable(Exception):
+    """Every upstream that serves the model has an open circuit breaker"""
+
+
+def retryable(error: BaseException) -> bool:
+    """Failures that are the upstream's fault: they count for its breaker and may be retried elsewhere"""
+    if isinstance(error, ProviderError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+@dataclass(frozen=True)
+class Upstream:
+    """One OpenAI-compatible endpoint and the models it serves (empty = any model)"""
+    name: str
+    base_url: str
+    models: frozenset[str] = frozenset()
+    api_key: str | None = field(default=None, repr=False)
+
+    def serves(self, model: str) -> bool:
+        return not self.models or model in self.models
+
+
+def parse_upstreams(spec: str) -> tuple[Upstream, ...]:
+    """
+    Parse the LLM_UPSTREAMS setting: "name:model[,model...]:base_url" separated by ";"
+    "*" serves any model; the API key is read from <NAME>_API_KEY
+
+    Example:
+        "openai:*:https://api.openai.com/v1;azure:gpt-4o-mini,gpt-4o:https://clever.openai.azure.com/openai/v1"
+    """
+    upstreams = []
+    for part in filter(None, (p.strip() for p in spec.split(";"))):
+        name, models, base_url = part.split(":", 2)
+        name = name.strip()
+        served = frozenset(m.strip() for m in models.split(",") if m.strip() not in ("", "*"))
+        upstreams.append(Upstream(name, base_url.strip(), served, os.getenv(f"{name.upper()}_API_KEY") or None))
+    return tuple(upstreams)
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failures` consecutive failures
+    open -> half-open once reset_timeout has passed: one trial request is let through,
+    its success closes the breaker again, its failure opens it for another reset_timeout
+    """
+
+    def __init__(self, failures: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.consecutive = 0
+        self.opened_at: float | None = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.consecutive = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.consecutive += 1
+        if self._trial or self.consecutive >= self.failures:
+            self.opened_at = time.monotonic()
+        self._trial = False
+
+    def abandon(self) -> None:
+        """The request was cancelled (lost a hedge race) - no verdict, a new trial may go"""
+        self._trial = False
+
+
+class RetryBudget:
+    """
+    Hedges and retries allowed as a share of requests (token bucket)
+
+    Every request deposits `ratio` tokens, every hedge or retry spends one. A floor
+    of min_per_second keeps a quiet worker able to retry at all, and the bucket is
+    capped at max_tokens so an idle hour can't bank a retry storm.
+    """
+
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 1.0, max_tokens: float = 10.0) -> None:
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._refilled_at = time.monotonic()
+
+    def deposit(self) -> None:
+        self._refill()
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self._refilled_at) * self.min_per_second)
+        self._refilled_at = now
+
+
+@dataclass
+class _Attempt:
+    """One upstream request of a race, until its first chunk arrives"""
+    upstream: Upstream
+    kind: str                            # "primary", "hedge" or "retry"
+    stream: AsyncIterator[ProviderChunk]
+    started: float = field(default_factory=time.perf_counter)
+
+
+class PooledProvider:
+    """
+    Streams completions from OpenAI-compatible upstreams, hedged and circuit-broken
+
+    Usage:
+        provider = PooledProvider(parse_upstreams("openai:*:https://api.openai.com/v1;..."))
+        async for chunk in provider.stream("gpt-4o-mini", messages, deadline=time.monotonic() + 30):
+            ...
+        await provider.aclose()          # on shutdown: closes the pooled connections
+
+    The upstreams serving a model are tried in the configured order. The first one
+    gets the request; if it has not sent a chunk after its p95 first-token latency
+    (clamped to hedge_min_delay..hedge_max_delay) the next one gets it too, and an
+    upstream failure moves to the next one at once. Both need a retry budget token.
+    Once a chunk is out the answer is committed to that upstream.
+    """
+
+    def __init__(
+        self,
+        upstreams: Sequence[Upstream],
+        max_tokens: int = 4096,
+        timeout: float = 60.0,
+        connect_timeout: float = 5.0,
+        pool_connections: int = 100,
+        keepalive_expiry: float = 60.0,
+        http2: bool = True,
+        hedge: bool = True,
+        hedge_percentile: float = 95.0,
+        hedge_min_delay: float = 0.05,
+        hedge_max_delay: float = 2.0,
+        retry_budget: RetryBudget | None = None,
+        breaker_failures: int = 5,
+        breaker_reset: float = 30.0,
+    ) -> None:
+        if not upstreams:
+            raise ValueError("PooledProvider needs at least one upstream")
+        self.upstreams = tuple(upstreams)
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.retry_budget = retry_budget or RetryBudget()
+        self.breakers = {u.name: CircuitBreaker(breaker_failures, breaker_reset) for u in self.upstreams}
+        # HTTP/2 needs the h2 package (httpx[http2]); without it the pools still keep HTTP/1.1 connections alive
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("Pooled provider: h2 is not installed, upstream connections use HTTP/1.1")
+            http2 = False
+        limits = httpx.Limits(
+            max_connections=pool_connections,
+            max_keepalive_connections=pool_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._clients = {
+            u.name: httpx.AsyncClient(
+                base_url=u.base_url,
+                http2=http2,
+                limits=limits,
+                headers={"Authorization": f"Bearer {u.api_key}"} if u.api_key else None,
+            )
+            for u in self.upstreams
+        }
+
+    async def aclose(self) -> None:
+        await asyncio.gather(*(client.aclose() for client in self._clients.values()))
+
+    def hedge_delay(self, upstream: Upstream) -> float:
+        """How long the upstream may take to its first chunk before the request is hedged"""
+        if first_token_histogram.count(upstream=upstream.name) < MIN_HEDGE_SAMPLES:
+            return self.hedge_max_delay
+        delay = first_token_histogram.percentile(self.hedge_percentile, upstream=upstream.name)
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, delay or 0.0))
+
+    async def stream(
+        self, model: str, messages: ChatHistory, deadline: float | None = None
+    ) -> AsyncIterator[ProviderChunk]:
+        winner = await self._race(model, messages, deadline)
+        if winner is None:
+            return
+        attempt, first = winner
+        try:
+            yield first
+            async for chunk in attempt.stream:
+                yield chunk
+        except Exception as error:
+            # Mid-answer: the user already has part of the reply, switching upstreams would garble it
+            if retryable(error):
+                self._record_failure(attempt.upstream)
+            raise
+        finally:
+            await _close(attempt.stream)
+
+    async def _race(
+        self, model: str, messages: ChatHistory, deadline: float | None
+    ) -> tuple[_Attempt, ProviderChunk] | None:
+        """First chunk from the fastest upstream (None for an empty completion); the others are cancelled"""
+        queue = deque(u for u in self.upstreams if u.serves(model))
+        if not queue:
+            raise ValueError(f"No upstream serves model '{model}'")
+        self.retry_budget.deposit()
+        pending: dict[asyncio.Task, _Attempt] = {}
+
+        def launch(kind: str) -> bool:
+            if kind != "primary":
+                if not queue:
+                    return False
+                if not self.retry_budget.try_spend():
+                    budget_counter.inc(kind=kind)
+                    return False
+            while queue:
+                upstream = queue.popleft()
+                if self.breakers[upstream.name].allow():
+                    attempt = _Attempt(upstream, kind, self._request(upstream, model, messages, deadline))
+                    pending[asyncio.ensure_future(anext(attempt.stream))] = attempt
+                    return True
+            return False
+
+        if not launch("primary"):
+            raise UpstreamsUnavailable(f"Every upstream for '{model}' has an open circuit breaker")
+        hedging = self.hedge
+        try:
+            while True:
+                timeout = time_left(deadline)
+                if hedging and len(pending) == 1 and queue:
+                    oldest = next(iter(pending.values()))
+                    delay = self.hedge_delay(oldest.upstream) - (time.perf_counter() - oldest.started)
+                    timeout = max(0.0, delay) if timeout is None else min(timeout, max(0.0, delay))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if deadline is not None and time_left(deadline) == 0:
+                        raise DeadlineExceeded(f"Deadline exceeded waiting for '{model}'")
+                    # Out of budget: keep waiting on what is in flight rather than asking every loop
+                    hedging = launch("hedge")
+                    continue
+                failure = None
+                for task in done:
+                    attempt = pending.pop(task)
+                    try:
+                        first = task.result()
+                    except StopAsyncIteration:
+                        first = None
+                    except Exception as error:
+                        attempts_counter.inc(upstream=attempt.upstream.name, kind=attempt.kind, outcome="failed")
+                        if not retryable(error):
+                            # Not the upstream's fault: an error answer shows it is up, anything else
+                            # gives no verdict - either way a half-open breaker must not keep its trial
+                            if isinstance(error, ProviderError):
+                                self._record_success(attempt.upstream)
+                            else:
+                                self.breakers[attempt.upstream.name].abandon()
+                            raise
+                        self._record_failure(attempt.upstream)
+                        failure = error
+                        continue
+                    first_token_histogram.observe(time.perf_counter() - attempt.started, upstream=attempt.upstream.name)
+                    self._record_success(attempt.upstream)
+                    attempts_counter.inc(upstream=attempt.upstream.name, kind=attempt.kind, outcome="won")
+                    return (attempt, first) if first is not None else None
+                if failure is not None and not pending and not launch("retry"):
+                    raise failure
+        finally:
+            await self._cancel(pending)
+
+    async def _cancel(self, pending: dict[asyncio.Task, _Attempt]) -> None:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for attempt in pending.values():
+            await _close(attempt.stream)
+            self.breakers[attempt.upstream.name].abandon()
+            attempts_counter.inc(upstream=attempt.upstream.name, kind=attempt.kind, outcome="lost")
+
+    async def _request(
+        self, upstream: Upstream, model: str, messages: ChatHistory, deadline: float | None
+    ) -> AsyncIterator[ProviderChunk]:
+        """One streamed /chat/completions call, parsed from server-sent events"""
+        remaining = time_left(deadline)
+        timeout = self.timeout if remaining is None else min(self.timeout, remaining)
+        body = {
+            "model": model,
+            "messages": list(messages),
+            "max_tokens": self.max_tokens,
+            "stream": True,
+            # Ask the provider to append a usage chunk so tokens_used is exact
+            "stream_options": {"include_usage": True},
+        }
+        request_timeout = httpx.Timeout(timeout, connect=min(self.connect_timeout, timeout))
+        async with self._clients[upstream.name].stream(
+            "POST", "chat/completions", json=body, timeout=request_timeout
+        ) as response:
+            if response.status_code >= 400:
+                detail = (await response.aread()).decode(errors="replace")[:200]
+                raise ProviderError(upstream.name, response.status_code, detail)
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    return
+                chunk = json.loads(data)
+                choices = chunk.get("choices")
+                text = ((choices[0].get("delta") or {}).get("content") or "") if choices else ""
+                usage = chunk.get("usage")
+                if usage:
+                    yield ProviderChunk(text, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+                elif text:
+                    yield ProviderChunk(text=text)
+
+    def _record_success(self, upstream: Upstream) -> None:
+        self.breakers[upstream.name].record_success()
+        breaker_gauge.set(0, upstream=upstream.name)
+
+    def _record_failure(self, upstream: Upstream) -> None:
+        breaker = self.breakers[upstream.name]
+        breaker.record_failure()
+        if breaker.opened_at is not None:
+            breaker_gauge.set(1, upstream=upstream.name)
+
+
+async def _close(stream: AsyncIterator[ProviderChunk]) -> None:
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception:
+            pass
+
+
+def create_pooled_provider(settings: "Settings", max_tokens: int = 4096) -> PooledProvider:
+    """PooledProvider for LLM_UPSTREAMS and the LLM_HEDGE_* / LLM_BREAKER_* / LLM_RETRY_* settings"""
+    upstreams = parse_upstreams(settings.llm_upstreams)
+    if not upstreams:
+        raise ValueError("LLM_PROVIDER=pooled needs LLM_UPSTREAMS")
+    return PooledProvider(
+        upstreams,
+        max_tokens=max_tokens,
+        pool_connections=settings.llm_pool_connections,
+        keepalive_expiry=settings.llm_keepalive_expiry,
+        hedge=settings.enable_hedging,
+        hedge_percentile=settings.llm_hedge_percentile,
+        hedge_min_delay=settings.llm_hedge_min_delay,
+        hedge_max_delay=settings.llm_hedge_max_delay,
+        retry_budget=RetryBudget(settings.llm_retry_budget),
+        breaker_failures=settings.llm_breaker_failures,
+        breaker_reset=settings.llm_breaker_reset,
+    )
@@ -0,0 +1,152 @@
+# packages/core/providers.py
+# LLM provider adapters behind one small streaming interface
+# LiteLLM talks to real providers, FakeProvider gives deterministic offline streams,
+# PooledProvider (provider_client.py) hedges OpenAI-compatible endpoints over pooled connections
+#
+# Deadlines are absolute time.monotonic() values: every layer
+# sees how much of the request's budget is left, not a fresh timeout of its own
+
+import asyncio
+import time
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Protocol
+
+if TYPE_CHECKING:
+    from .config import Settings
+
+# Chat history in OpenAI/LiteLLM format: [{"role": "user", "content": "..."}]
+ChatHistory = Sequence[dict[str, str]]
+
+
+@dataclass(frozen=True)
+class ProviderChunk:
+    """
+    One piece of a streamed completion
+
+    text: new assistant text (may be empty for the final usage-only chunk)
+    prompt_tokens/completion_tokens: provider-reported usage, only set on the last chunk
+    """
+    text: str = ""
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The request's deadline passed before the provider finished"""
+
+
+def time_left(deadline: float | None) -> float | None:
+    """Seconds until the deadline (0 once it passed), None without one"""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+class LLMProvider(Protocol):
+    """Anything that can stream a chat completion for a model"""
+
+    def stream(
+        self, model: str, messages: ChatHistory, deadline: float | None = None
+    ) -> AsyncIterator[ProviderChunk]: ...
+
+
+class LiteLLMProvider:
+    """
+    Streams completions through LiteLLM (OpenAI, Anthropic, Azure, Ollama...)
+
+    LiteLLM is imported lazily so offline runs with FakeProvider don't pay
+    its (large) import time or need provider API keys.
+    """
+
+    def __init__(self, max_tokens: int = 4096, timeout: float = 60.0) -> None:
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+
+    async def stream(
+        self, model: str, messages: ChatHistory, deadline: float | None = None
+    ) -> AsyncIterator[ProviderChunk]:
+        import litellm
+
+        remaining = time_left(deadline)
+        response = await litellm.acompletion(
+            model=model,
+            messages=list(messages),
+            max_tokens=self.max_tokens,
+            timeout=self.timeout if remaining is None else min(self.timeout, remaining),
+            stream=True,
+            # Ask the provider to append a usage chunk so tokens_used is exact
+            stream_options={"include_usage": True},
+        )
+        async for chunk in response:
+            usage = getattr(chunk, "usage", None)
+            text = ""
+            if chunk.choices:
+                text = chunk.choices[0].delta.content or ""
+            if usage:
+                yield ProviderChunk(
+                    text=text,
+                    prompt_tokens=usage.prompt_tokens,
+                    completion_tokens=usage.completion_tokens,
+                )
+            elif text:
+                yield ProviderChunk(text=text)
+
+
+class FakeProvider:
+    """
+    Local stand-in for a real LLM provider - no network, no API keys
+
+    Replies are looked up by the last user message in `replies`, otherwise the
+    provider echoes it back. Delays simulate provider latency so streaming and
+    time-to-first-token can be observed realistically.
+
+    Example:
+        provider = FakeProvider(replies={"hi": "Hello! How can I help?"}, token_delay=0.01)
+    """
+
+    def __init__(
+        self,
+        replies: dict[str, str] | None = None,
+        first_token_delay: float = 0.0,
+        token_delay: float = 0.0,
+    ) -> None:
+        self.replies = replies or {}
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.calls = 0          # How many completions were requested (useful for cache checks)
+
+    async def stream(
+        self, model: str, messages: ChatHistory, deadline: float | None = None
+    ) -> AsyncIterator[ProviderChunk]:
+        self.calls += 1
+        prompt = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        reply = self.replies.get(prompt, f"[{model}] You said: {prompt}")
+
+        # Split on spaces but keep them, so joined chunks reproduce the reply exactly
+        words = reply.split(" ")
+        tokens = [word + " " for word in words[:-1]] + [words[-1]]
+
+        if self.first_token_delay:
+            await asyncio.sleep(self.first_token_delay)
+        for index, token in enumerate(tokens):
+            if index and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield ProviderChunk(text=token)
+
+        prompt_tokens = sum(len(m["content"].split()) for m in messages)
+        yield ProviderChunk(prompt_tokens=prompt_tokens, completion_tokens=len(tokens))
+
+
+def create_provider(name: str, max_tokens: int = 4096, settings: "Settings | None" = None) -> LLMProvider:
+    """Build the provider configured by LLM_PROVIDER ("litellm", "pooled" or "fake")"""
+    if name == "fake":
+        return FakeProvider(first_token_delay=0.05, token_delay=0.01)
+    if name == "litellm":
+        return LiteLLMProvider(max_tokens=max_tokens)
+    if name == "pooled":
+        from .config import get_settings
+        from .provider_client import create_pooled_provider
+
+        return create_pooled_provider(settings or get_settings(), max_tokens)
+    raise ValueError(f"Unknown LLM provider '{name}' (expected 'litellm', 'pooled' or 'fake')")
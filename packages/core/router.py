@@ -0,0 +1,253 @@
+# packages/core/router.py
+# Smart Router - see docs/core-technologies/smart-router.md
+# Scores each chat request locally (no LLM call, microseconds) and picks the
+# cheapest model tier that can handle it, with fallback to the next tier
+
+import asyncio
+import math
+import re
+from collections.abc import AsyncIterator, Callable, Sequence
+from dataclasses import dataclass
+
+from .enums import ChannelType, ConversationType
+from .metrics import metrics
+from .providers import (
+    ChatHistory,
+    DeadlineExceeded,
+    LLMProvider,
+    ProviderChunk,
+    time_left,
+)
+
+tier_latency_histogram = metrics.histogram(
+    "router_tier_latency_seconds", "Full turn latency per routed tier"
+)
+tier_cost_histogram = metrics.histogram(
+    "router_tier_cost_usd", "Provider cost per turn per routed tier",
+    buckets=(0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0),
+)
+decisions_counter = metrics.counter("router_decisions_total", "Routing decisions per tier")
+fallbacks_counter = metrics.counter("router_fallbacks_total", "Provider failures that moved a turn to the next model")
+
+# USD per 1M tokens (input, output) - used for cost metrics and the replay benchmark
+# Unknown models count as free rather than guessing a price
+MODEL_PRICES: dict[str, tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "claude-3-haiku-20240307": (0.25, 1.25),
+    "claude-3-5-sonnet-20241022": (3.00, 15.00),
+}
+
+# How much each business purpose pushes a request towards a stronger model
+TYPE_WEIGHTS: dict[str, float] = {
+    ConversationType.GENERAL: 0.0,
+    ConversationType.FEEDBACK: 0.0,
+    ConversationType.SUPPORT: 0.1,
+    ConversationType.SALES: 0.15,
+    ConversationType.BILLING: 0.2,
+    ConversationType.TECHNICAL: 0.3,
+}
+
+# Email is long-form and asynchronous: users expect a thorough answer, not a fast one
+CHANNEL_WEIGHTS: dict[str, float] = {
+    ChannelType.WEB: 0.0,
+    ChannelType.MOBILE_APP: 0.0,
+    ChannelType.TELEGRAM: 0.0,
+    ChannelType.WHATSAPP: 0.0,
+    ChannelType.EMAIL: 0.15,
+}
+
+# Words that signal reasoning/diagnosis work vs. small talk and FAQ lookups
+COMPLEX_KEYWORDS = frozenset({
+    "error", "exception", "traceback", "stack", "bug", "crash", "api", "integration",
+    "webhook", "sdk", "configure", "migrate", "migration", "compare", "difference",
+    "why", "explain", "analyze", "debug", "refund", "chargeback", "contract", "legal",
+    "compliance", "gdpr", "security", "architecture", "performance", "timeout",
+})
+SIMPLE_KEYWORDS = frozenset({
+    "hi", "hello", "hey", "thanks", "thank", "ok", "bye", "hours", "open", "price",
+    "pricing", "password", "login", "reset", "address", "phone", "contact", "status",
+})
+
+_WORD = re.compile(r"[a-z0-9_]+")
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    """One routing tier: requests scoring up to max_score go to these models (in order)"""
+    name: str
+    max_score: float
+    models: tuple[str, ...]
+
+
+DEFAULT_TIERS: tuple[ModelTier, ...] = (
+    ModelTier("simple", 0.35, ("gpt-4o-mini",)),
+    ModelTier("medium", 0.7, ("claude-3-haiku-20240307",)),
+    ModelTier("complex", 1.0, ("gpt-4o",)),
+)
+
+
+def parse_tiers(spec: str) -> tuple[ModelTier, ...]:
+    """
+    Parse the ROUTER_TIERS setting: "name:max_score:model[,model...]" separated by ";"
+
+    Example:
+        "simple:0.35:gpt-4o-mini;medium:0.7:claude-3-haiku-20240307;complex:1.0:gpt-4o"
+    """
+    tiers = []
+    for part in filter(None, (p.strip() for p in spec.split(";"))):
+        name, max_score, models = part.split(":", 2)
+        tiers.append(ModelTier(name.strip(), float(max_score), tuple(m.strip() for m in models.split(","))))
+    return tuple(tiers)
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    """
+    Result of routing one request
+
+    candidates: the tier's models followed by every stronger tier's models -
+    the order in which the pipeline falls back when a provider fails
+    """
+    tier: str
+    score: float
+    candidates: tuple[str, ...]
+
+    @property
+    def model(self) -> str:
+        return self.candidates[0]
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 characters per token for English - close enough for routing, zero cost"""
+    return max(1, len(text) // 4)
+
+
+def complexity_score(
+    text: str,
+    conversation_type: ConversationType | str,
+    channel: ChannelType | str,
+) -> float:
+    """
+    Score a request from 0 (trivial) to 1 (hard) with cheap local features:
+    - token length (log-scaled: 10 -> 0.1, 100 -> 0.25, 1000+ -> 0.4)
+    - ConversationType and ChannelType weights
+    - complex/simple keyword hits
+    """
+    tokens = estimate_tokens(text)
+    score = min(0.4, 0.1 * math.log10(max(tokens, 1)) * 1.25)
+    score += TYPE_WEIGHTS.get(conversation_type, 0.1)
+    score += CHANNEL_WEIGHTS.get(channel, 0.0)
+
+    words = set(_WORD.findall(text.lower()))
+    complex_hits = len(words & COMPLEX_KEYWORDS)
+    simple_hits = len(words & SIMPLE_KEYWORDS)
+    score += min(0.45, 0.15 * complex_hits)
+    score -= min(0.2, 0.1 * simple_hits)
+    # Code blocks and multi-part questions need a stronger model
+    if "```" in text or text.count("?") > 2:
+        score += 0.15
+    return max(0.0, min(1.0, score))
+
+
+def cost_usd(model: str, prompt_tokens: int | None, completion_tokens: int | None) -> float:
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return ((prompt_tokens or 0) * input_price + (completion_tokens or 0) * output_price) / 1_000_000
+
+
+class SmartRouter:
+    """
+    Maps a complexity score to a configurable model tier
+
+    Example:
+        router = SmartRouter()
+        decision = router.route("How do I reset my password?", ConversationType.SUPPORT, ChannelType.WEB)
+        decision.tier   # "simple"
+        decision.model  # "gpt-4o-mini"
+    """
+
+    def __init__(self, tiers: Sequence[ModelTier] = DEFAULT_TIERS) -> None:
+        if not tiers:
+            raise ValueError("SmartRouter needs at least one model tier")
+        self.tiers = tuple(sorted(tiers, key=lambda tier: tier.max_score))
+        # Fallback chains are precomputed once - route() only does a score and a scan
+        self._chains = {
+            tier.name: tuple(
+                dict.fromkeys(model for later in self.tiers[index:] for model in later.models)
+            )
+            for index, tier in enumerate(self.tiers)
+        }
+
+    def route(
+        self,
+        text: str,
+        conversation_type: ConversationType | str,
+        channel: ChannelType | str,
+    ) -> RouteDecision:
+        score = complexity_score(text, conversation_type, channel)
+        tier = next((t for t in self.tiers if score <= t.max_score), self.tiers[-1])
+        decisions_counter.inc(tier=tier.name)
+        return RouteDecision(tier.name, score, self._chains[tier.name])
+
+    def record(
+        self,
+        decision: RouteDecision,
+        model: str,
+        duration: float,
+        prompt_tokens: int | None,
+        completion_tokens: int | None,
+    ) -> None:
+        """Per-tier latency and cost of a finished turn (model = the one that actually answered)"""
+        tier_latency_histogram.observe(duration, tier=decision.tier)
+        tier_cost_histogram.observe(cost_usd(model, prompt_tokens, completion_tokens), tier=decision.tier)
+
+
+async def stream_with_fallback(
+    provider: LLMProvider,
+    models: Sequence[str],
+    messages: ChatHistory,
+    first_token_timeout: float,
+    on_model: Callable[[str], None] | None = None,
+    deadline: float | None = None,
+) -> AsyncIterator[ProviderChunk]:
+    """
+    Stream from the first model that starts answering in time
+
+    A model is abandoned if it raises or doesn't produce its first chunk
+    within first_token_timeout. Once a chunk has been sent to the user we
+    are committed to that model - switching mid-answer would garble the reply.
+    Nothing is tried once the request's deadline has passed.
+    """
+    for index, model in enumerate(models):
+        stream = provider.stream(model, messages, deadline=deadline)
+        remaining = time_left(deadline)
+        try:
+            first = await asyncio.wait_for(
+                anext(stream), first_token_timeout if remaining is None else min(first_token_timeout, remaining)
+            )
+        except StopAsyncIteration:
+            return
+        except Exception as error:  # Includes the first-token TimeoutError
+            await _close(stream)
+            if time_left(deadline) == 0:
+                raise DeadlineExceeded(f"Deadline exceeded waiting for '{model}'") from error
+            if index == len(models) - 1:
+                raise
+            fallbacks_counter.inc(model=model)
+            continue
+        if on_model is not None:
+            on_model(model)
+        yield first
+        async for chunk in stream:
+            yield chunk
+        return
+
+
+async def _close(stream: AsyncIterator[ProviderChunk]) -> None:
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception:
+            pass
@@ -0,0 +1,195 @@
+# packages/core/search.py
+# Message search for support agents: ranked, paginated, highlighted
+#
+# Text mode uses messages.content_tsv (generated tsvector + GIN, migration 3e8a1f5c7b20);
+# fuzzy mode the pg_trgm index on content. Both are bounded by a created_at window, so
+# only the monthly partitions inside it are searched, and by tenant_id (plus RLS).
+#
+# Why rank only the newest MAX_CANDIDATES matches?
+# - Ranking reads the tsvector of every row it scores; a word found in most messages
+#   ("refund") would score millions of rows per request. Rare terms have fewer
+#   matches than that, so their ranking is exact; common ones rank the recent ones
+# - ix_messages_tenant_created lets Postgres walk newest-first and stop early when
+#   the term is common, and the GIN index serves it when the term is rare
+#
+# Why highlight in one query?
+# - ts_headline re-parses the whole message, the most expensive step by far; the
+#   page is cut in a subquery first, so it runs for `limit` rows, not every match
+
+import html
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import cast, func, literal, select, text
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .enums import MessageType, SearchMode
+from .models import Message, naive_utc, utc_now
+
+SEARCH_CONFIG = "english"                # Must match the content_tsv expression in the migration
+MAX_LIMIT = 50
+MAX_CANDIDATES = 1000                    # Newest matches that get ranked
+MAX_OFFSET = MAX_CANDIDATES - MAX_LIMIT  # Deeper pages: narrow the window or the query instead
+MAX_QUERY_LENGTH = 256
+DEFAULT_WINDOW = timedelta(days=365)
+
+# Sentinels instead of HTML tags: the content is escaped after Postgres marks the
+# matches, so a message containing "<script>" can't reach the agent's browser as markup
+_START, _STOP = "\x02", "\x03"
+HEADLINE_OPTIONS = f"StartSel={_START}, StopSel={_STOP}, MaxWords=30, MinWords=12, MaxFragments=2, FragmentDelimiter= … "
+
+_trigram_installed: bool | None = None
+
+
+class FuzzySearchUnavailable(Exception):
+    """Fuzzy mode needs the pg_trgm extension, which this database doesn't have"""
+
+
+@dataclass(frozen=True)
+class SearchQuery:
+    """One validated search request"""
+    text: str
+    mode: SearchMode
+    since: datetime
+    until: datetime
+    conversation_id: int | None = None
+    message_type: MessageType | None = None
+    limit: int = 20
+    offset: int = 0
+
+    @classmethod
+    def resolve(
+        cls,
+        text: str,
+        mode: SearchMode = SearchMode.TEXT,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        conversation_id: int | None = None,
+        message_type: MessageType | None = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> "SearchQuery":
+        """Fill in the default window (last DEFAULT_WINDOW) and reject what can't be served fast"""
+        text = text.strip()
+        if not text:
+            raise ValueError("q must not be empty")
+        if len(text) > MAX_QUERY_LENGTH:
+            raise ValueError(f"q is limited to {MAX_QUERY_LENGTH} characters")
+        if not 1 <= limit <= MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+        if not 0 <= offset <= MAX_OFFSET:
+            raise ValueError(f"offset must be between 0 and {MAX_OFFSET}")
+        # Naive UTC like the database - aware bounds are converted, not just stripped of their offset
+        until = naive_utc(until) if until else utc_now()
+        since = naive_utc(since) if since else until - DEFAULT_WINDOW
+        if since >= until:
+            raise ValueError("since must be before until")
+        return cls(text, mode, since, until, conversation_id, message_type, limit, offset)
+
+
+class MessageSearch:
+    """
+    Search API over Message.content
+
+    Usage:
+        search = MessageSearch(session)
+        page = await search.search(tenant_id, SearchQuery.resolve("refund not received"))
+
+    Text mode ranks with ts_rank_cd (cover density: query words close together
+    score higher), fuzzy mode with word_similarity. Ties go to the newest message.
+    Only the newest MAX_CANDIDATES matches in the window are ranked.
+    """
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def search(self, tenant_id: int, query: SearchQuery) -> dict[str, Any]:
+        tsquery = func.websearch_to_tsquery(cast(SEARCH_CONFIG, REGCONFIG), query.text)
+        if query.mode == SearchMode.FUZZY:
+            await self._require_trigram()
+            # word_similarity: best match of the query against any span of the message,
+            # so a short query isn't penalized for a long message
+            matches = literal(query.text).op("<%")(Message.content)
+        else:
+            matches = Message.content_tsv.op("@@")(tsquery)
+
+        candidates = (
+            select(Message.id, Message.conversation_id, Message.message_type, Message.created_at, Message.content)
+            .where(Message.tenant_id == tenant_id)
+            .where(Message.created_at >= query.since, Message.created_at < query.until)
+            .where(matches)
+        )
+        if query.conversation_id is not None:
+            candidates = candidates.where(Message.conversation_id == query.conversation_id)
+        if query.message_type is not None:
+            candidates = candidates.where(Message.message_type == query.message_type)
+        if query.mode == SearchMode.TEXT:
+            candidates = candidates.add_columns(Message.content_tsv)
+        candidates = candidates.order_by(Message.created_at.desc()).limit(MAX_CANDIDATES).subquery()
+
+        if query.mode == SearchMode.FUZZY:
+            rank = func.word_similarity(query.text, candidates.c.content)
+        else:
+            rank = func.ts_rank_cd(candidates.c.content_tsv, tsquery, 32)  # 32: rank / (rank + 1), in 0..1
+        rank = rank.label("rank")
+        # One extra row tells whether another page exists, without a COUNT over all matches
+        page = (
+            select(
+                candidates.c.id,
+                candidates.c.conversation_id,
+                candidates.c.message_type,
+                candidates.c.created_at,
+                candidates.c.content,
+                rank,
+            )
+            .order_by(rank.desc(), candidates.c.created_at.desc(), candidates.c.id.desc())
+            .limit(query.limit + 1)
+            .offset(query.offset)
+            .subquery()
+        )
+        # Which plan is fast depends on how common the terms are; a generic plan (cached
+        # after five runs of the prepared statement) can't know, so always plan afresh
+        await self.session.execute(text("SET LOCAL plan_cache_mode = force_custom_plan"))
+        rows = (await self.session.execute(
+            select(
+                page.c.id,
+                page.c.conversation_id,
+                page.c.message_type,
+                page.c.created_at,
+                page.c.rank,
+                func.ts_headline(cast(SEARCH_CONFIG, REGCONFIG), page.c.content, tsquery, HEADLINE_OPTIONS),
+            ).order_by(page.c.rank.desc(), page.c.created_at.desc(), page.c.id.desc())
+        )).all()
+
+        return {
+            "items": [
+                {
+                    "message_id": message_id,
+                    "conversation_id": conversation_id,
+                    "message_type": message_type,
+                    "created_at": created_at,
+                    "rank": round(float(rank), 4),
+                    "highlight": _highlight(headline),
+                }
+                for message_id, conversation_id, message_type, created_at, rank, headline in rows[:query.limit]
+            ],
+            "limit": query.limit,
+            "offset": query.offset,
+            "has_more": len(rows) > query.limit,
+        }
+
+    async def _require_trigram(self) -> None:
+        global _trigram_installed
+        if _trigram_installed is None:
+            _trigram_installed = bool(await self.session.scalar(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            ))
+        if not _trigram_installed:
+            raise FuzzySearchUnavailable("Fuzzy search needs the pg_trgm extension")
+
+
+def _highlight(headline: str) -> str:
+    """HTML-escaped fragment with the matched words wrapped in <mark>"""
+    return html.escape(headline).replace(_START, "<mark>").replace(_STOP, "</mark>")
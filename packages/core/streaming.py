@@ -0,0 +1,51 @@
+# packages/core/streaming.py
+# Wire formats for streamed chat events
+# SSE for browsers (EventSource), NDJSON over chunked transfer for everything else
+
+import json
+from collections.abc import AsyncIterator
+
+from .chat import ChatEvent
+
+SSE_MEDIA_TYPE = "text/event-stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Headers that stop proxies (nginx, CDNs) from buffering the stream -
+# a buffered stream is no better than a blocking response for the user
+STREAMING_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def dump_event(event: ChatEvent) -> str:
+    """JSON text of one event - compact separators and raw unicode keep every token frame small"""
+    return json.dumps(event, separators=(",", ":"), ensure_ascii=False)
+
+
+async def encode_sse(events: AsyncIterator[ChatEvent]) -> AsyncIterator[bytes]:
+    """
+    Server-Sent Events framing:
+        event: token
+        data: {"type":"token","text":"Hello"}
+    """
+    async for event in events:
+        yield f"event: {event['type']}\ndata: {dump_event(event)}\n\n".encode()
+
+
+async def encode_ndjson(events: AsyncIterator[ChatEvent]) -> AsyncIterator[bytes]:
+    """One JSON object per line - the fallback for clients without EventSource"""
+    async for event in events:
+        yield (dump_event(event) + "\n").encode()
+
+
+def pick_media_type(accept: str | None, requested: str | None = None) -> str:
+    """
+    Choose the stream format: explicit ?format= wins, then the Accept header,
+    SSE by default
+    """
+    if requested:
+        return NDJSON_MEDIA_TYPE if requested == "ndjson" else SSE_MEDIA_TYPE
+    if accept and NDJSON_MEDIA_TYPE in accept:
+        return NDJSON_MEDIA_TYPE
+    return SSE_MEDIA_TYPE
@@ -0,0 +1,224 @@
+# packages/core/tenants.py
+# Tenant resolution: X-Tenant-ID (numeric id or slug) -> TenantContext, cached per worker
+#
+# Every request resolves its tenant and checks is_active before any RLS-scoped
+# query runs. Uncached that is a Postgres round trip on the hottest path; cached
+# it is a dict lookup.
+#
+# Freshness:
+# - A trigger on tenants sends NOTIFY tenant_changed on INSERT/UPDATE/DELETE
+#   (migration 9d3b6f2a8c51). Every worker LISTENs and evicts the tenant right away
+# - Entries still expire after TENANT_CACHE_TTL, which bounds staleness if a
+#   notification is lost; the listener clears the whole cache on (re)connect
+# - Unknown ids/slugs are cached too, for a shorter time (negative caching), so a
+#   client sending a bad header can't turn every request into a query
+
+import asyncio
+import json
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from packages.caching.lru import ByteLRUCache
+
+from .config import get_settings
+from .database import get_session_factory
+from .metrics import metrics
+from .models import Tenant
+
+logger = logging.getLogger(__name__)
+
+TENANT_CHANNEL = "tenant_changed"
+MAX_SLUG_LENGTH = 50                     # tenants.slug is VARCHAR(50) - longer keys can't exist
+MAX_TENANT_ID = 2**31 - 1                # tenants.id is INTEGER - asyncpg refuses larger numbers
+
+lookups_counter = metrics.counter(
+    "tenant_cache_lookups_total", "Tenant resolutions by result (hit, negative_hit, miss)"
+)
+hit_ratio_gauge = metrics.gauge("tenant_cache_hit_ratio", "Share of tenant resolutions served from the cache")
+invalidations_counter = metrics.counter("tenant_cache_invalidations_total", "Tenant cache evictions by source")
+load_histogram = metrics.histogram("tenant_load_seconds", "Tenant lookups that went to the database")
+
+
+@dataclass(frozen=True, slots=True)
+class TenantContext:
+    """What a request needs to know about its tenant - immutable, shared between requests"""
+    id: int
+    slug: str
+    name: str
+    is_active: bool
+
+
+# A 1-tuple, so a cached "no such tenant" (None,) differs from a cache miss (None)
+Entry = tuple[TenantContext | None]
+
+
+def _entry_size(entry: Entry) -> int:
+    tenant = entry[0]
+    return 64 if tenant is None else 128 + len(tenant.slug) + len(tenant.name)
+
+
+def _is_id(key: str) -> bool:
+    return key.isascii() and key.isdigit()
+
+
+def _cache_key(key: str) -> str:
+    return f"id:{int(key)}" if _is_id(key) else f"slug:{key}"
+
+
+class TenantResolver:
+    """
+    TTL + LRU cache of tenants in front of the tenants table
+
+    Usage:
+        tenant = await resolver.resolve(request.headers["X-Tenant-ID"])   # None = unknown
+        asyncio.create_task(resolver.listen(dsn))                          # push invalidation
+
+    A tenant is cached under both its id and its slug. Concurrent misses for the
+    same key share one query, and a load that raced with an invalidation is
+    returned but not cached.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        ttl: float = 60.0,
+        negative_ttl: float = 5.0,
+        max_bytes: int = 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._cache: ByteLRUCache[Entry] = ByteLRUCache(max_bytes, sizeof=_entry_size, clock=clock)
+        self._loading: dict[str, asyncio.Task[TenantContext | None]] = {}
+        self._generation = 0                 # Bumped by every invalidation
+        self._lookups = 0
+        self._hits = 0
+
+    async def resolve(self, key: str) -> TenantContext | None:
+        """Tenant for an id ("42") or slug ("acme"); None when no such tenant exists"""
+        if not key or len(key) > MAX_SLUG_LENGTH:
+            return None
+        if _is_id(key) and not 0 < int(key) <= MAX_TENANT_ID:
+            return None
+        cache_key = _cache_key(key)
+        self._lookups += 1
+        entry = self._cache.get(cache_key)
+        if entry is not None:
+            self._hits += 1
+            lookups_counter.inc(result="hit" if entry[0] is not None else "negative_hit")
+            hit_ratio_gauge.set(self._hits / self._lookups)
+            return entry[0]
+        lookups_counter.inc(result="miss")
+        hit_ratio_gauge.set(self._hits / self._lookups)
+
+        # One query per key however many requests miss at once; shielded so a
+        # disconnecting client doesn't cancel the load the others are waiting on
+        loading = self._loading.get(cache_key)
+        if loading is None:
+            loading = self._loading[cache_key] = asyncio.ensure_future(self._load_into_cache(key, cache_key))
+        return await asyncio.shield(loading)
+
+    def invalidate(self, tenant_id: int | None = None, slugs: tuple[str, ...] = (), source: str = "local") -> None:
+        """Forget one tenant (by id and every slug it had or now has)"""
+        self._generation += 1
+        if tenant_id is not None:
+            self._cache.delete(f"id:{tenant_id}")
+        for slug in slugs:
+            self._cache.delete(f"slug:{slug}")
+        invalidations_counter.inc(source=source)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._cache.clear()
+
+    async def listen(self, dsn: str, retry_delay: float = 5.0) -> None:
+        """
+        LISTEN for tenant_changed notifications until cancelled - run as a background task
+
+        Uses its own asyncpg connection, outside the pool: a listening
+        connection is held for the life of the worker. Notifications missed
+        while disconnected can't be replayed, so every (re)connect starts
+        from an empty cache.
+        """
+        import asyncpg
+
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _, closed=closed: closed.set())
+                await connection.add_listener(TENANT_CHANNEL, self._on_notify)
+                self.clear()
+                await closed.wait()
+                logger.warning("Tenant cache: LISTEN connection closed, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Tenant cache: LISTEN failed, relying on TTL until reconnected", exc_info=True)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(retry_delay)
+
+    def _on_notify(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        try:
+            change = json.loads(payload)
+            self.invalidate(int(change["id"]), tuple(change.get("slugs") or ()), source="notify")
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Tenant cache: bad notification payload %r, clearing cache", payload)
+            self.clear()
+
+    def _store(self, cache_key: str, tenant: TenantContext | None) -> None:
+        if tenant is None:
+            self._cache.set(cache_key, (None,), self.negative_ttl)
+            return
+        self._cache.set(f"id:{tenant.id}", (tenant,), self.ttl)
+        self._cache.set(f"slug:{tenant.slug}", (tenant,), self.ttl)
+
+    async def _load_into_cache(self, key: str, cache_key: str) -> TenantContext | None:
+        generation = self._generation
+        try:
+            tenant = await self._load(key)
+        finally:
+            del self._loading[cache_key]
+        if generation == self._generation:
+            self._store(cache_key, tenant)
+        return tenant
+
+    async def _load(self, key: str) -> TenantContext | None:
+        started = time.perf_counter()
+        condition = Tenant.id == int(key) if _is_id(key) else Tenant.slug == key
+        # tenants has no RLS policy (it is the root of tenant isolation), so no tenant context is set
+        async with self.session_factory() as session:
+            row = (
+                await session.execute(select(Tenant.id, Tenant.slug, Tenant.name, Tenant.is_active).where(condition))
+            ).one_or_none()
+        load_histogram.observe(time.perf_counter() - started)
+        return TenantContext(row.id, row.slug, row.name, row.is_active) if row is not None else None
+
+
+@lru_cache(maxsize=1)
+def get_tenant_resolver() -> TenantResolver | None:
+    """Process-wide resolver, or None when DATABASE_URL_APP is not set (header taken as is)"""
+    settings = get_settings()
+    if not settings.database_url_app:
+        return None
+    return TenantResolver(
+        lambda: get_session_factory()(),
+        ttl=settings.tenant_cache_ttl,
+        negative_ttl=settings.tenant_cache_negative_ttl,
+    )
+
+
+def listen_dsn(database_url: str) -> str:
+    """asyncpg takes plain postgresql:// URLs, not SQLAlchemy's postgresql+asyncpg://"""
+    return database_url.replace("postgresql+asyncpg://", "postgresql://")
@@ -0,0 +1,41 @@
+# packages/core/tokens.py
+# Token counting for prompt budgeting
+# tiktoken when it is installed (it comes with litellm), a character estimate otherwise
+#
+# Counts only decide what fits into a context window, they are never billed -
+# billing uses the provider-reported usage (ChatTurn.prompt_tokens/completion_tokens)
+
+from functools import lru_cache
+from typing import Any
+
+# Chat formats wrap every message in a few tokens of role/separator markup
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Without a tokenizer: ~4 characters per token for English text, rounded up
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=64)
+def _encoding(model: str) -> Any | None:
+    """tiktoken encoding for a model (cl100k/o200k fallback for non-OpenAI models), None without tiktoken"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model.rsplit("/", 1)[-1])
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Tokens of one piece of text, as the model's tokenizer (or the estimate) sees it"""
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def message_tokens(content_tokens: int) -> int:
+    """Prompt cost of a chat message whose content has content_tokens tokens"""
+    return content_tokens + MESSAGE_OVERHEAD_TOKENS
@@ -0,0 +1,282 @@
+# packages/core/write_behind.py
+# Write-behind buffer for chat history: Message inserts and Conversation.updated_at
+# bumps are collected in memory and written per tenant in batched statements
+
+import asyncio
+import logging
+import time
+from collections.abc import Callable, Sequence
+from contextlib import AbstractAsyncContextManager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import history_session
+from .metrics import metrics
+from .models import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+flush_histogram = metrics.histogram("write_behind_flush_seconds", "Time to write one tenant batch")
+batch_rows_histogram = metrics.histogram(
+    "write_behind_batch_rows", "Rows (messages + conversation touches) per flushed batch",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+backpressure_histogram = metrics.histogram(
+    "write_behind_backpressure_seconds", "Time enqueue() waited for buffer space"
+)
+pending_gauge = metrics.gauge("write_behind_pending_rows", "Rows buffered or being flushed")
+flush_errors_counter = metrics.counter("write_behind_flush_errors_total", "Failed batch flushes")
+dropped_counter = metrics.counter("write_behind_dropped_rows_total", "Message rows lost in failed flushes")
+
+# 9 columns per row -> 9000 bind parameters, well below the protocol limit of 32767
+MAX_ROWS_PER_INSERT = 1000
+
+# Conversations that fail in a row, with none written, before isolating a batch stops:
+# at that point the database is unreachable rather than one row bad
+ISOLATE_MAX_FAILURES = 3
+
+SessionFactory = Callable[[int], AbstractAsyncContextManager[AsyncSession]]
+
+
+@dataclass
+class _TenantBatch:
+    """Everything buffered for one tenant since its last flush"""
+    messages: list[dict[str, Any]] = field(default_factory=list)
+    touches: dict[int, datetime] = field(default_factory=dict)   # conversation_id -> newest updated_at
+    # Durable callers, each with the conversations its rows belong to
+    waiters: list[tuple[asyncio.Future[None], frozenset[int]]] = field(default_factory=list)
+    rows: int = 0                                                 # Units counted against max_pending
+
+
+class WriteBehindBuffer:
+    """
+    Batches chat history writes instead of one transaction per turn
+
+    Usage:
+        buffer = WriteBehindBuffer()
+        await buffer.enqueue(tenant_id, [user_row, assistant_row], touch=(conversation_id, now))
+        await buffer.enqueue(tenant_id, rows, durable=True)   # returns after the batch commits
+        await buffer.close()                                  # shutdown: flush and stop
+
+    A tenant's batch is flushed when it reaches max_batch rows, or max_delay
+    seconds after the first buffered row, in ONE tenant-scoped transaction:
+    - messages: multi-row INSERT ... VALUES, up to MAX_ROWS_PER_INSERT rows per statement
+    - touches: one bulk UPDATE per batch, repeated bumps of a conversation collapsed
+
+    Durability is chosen per call:
+    - durable=False (fire-and-forget): enqueue() returns once the rows are buffered;
+      a crash before the flush loses them, a failed flush is logged and counted
+    - durable=True: enqueue() returns after the commit and raises if the flush failed
+
+    A failed flush (pool timeout, deadlock, failover) is retried `retries` times
+    with backoff. If it still fails, the batch is written again one conversation
+    per transaction, so a bad row (a constraint violation, a conversation deleted
+    meanwhile) loses only its own conversation's rows; a durable caller gets the
+    error only if one of its conversations was lost.
+
+    Backpressure: once max_pending rows are buffered or in flight, enqueue()
+    waits for flushes to finish instead of growing memory without bound.
+    """
+
+    def __init__(
+        self,
+        session_factory: SessionFactory = history_session,
+        max_batch: int = 500,
+        max_delay: float = 0.05,
+        max_pending: int = 10_000,
+        retries: int = 2,
+    ) -> None:
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.retries = retries
+        self._batches: dict[int, _TenantBatch] = {}
+        self._pending = 0
+        self._space = asyncio.Condition()
+        self._timer: asyncio.TimerHandle | None = None
+        self._inflight: set[asyncio.Task[None]] = set()
+        self._flushing: set[int] = set()
+        self._closed = False
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def enqueue(
+        self,
+        tenant_id: int,
+        messages: Sequence[dict[str, Any]],
+        touch: tuple[int, datetime] | None = None,
+        durable: bool = False,
+    ) -> None:
+        """
+        Buffer Message rows (column -> value dicts) and an optional
+        (conversation_id, updated_at) bump for one tenant
+
+        All rows must carry the same columns - they end up in one VALUES list.
+        """
+        if self._closed:
+            raise RuntimeError("WriteBehindBuffer is closed")
+        rows = len(messages) + (touch is not None)
+        if self._pending + rows > self.max_pending:
+            started = time.perf_counter()
+            async with self._space:
+                # An empty buffer always admits, so an oversized call can't wait forever
+                await self._space.wait_for(
+                    lambda: self._pending == 0 or self._pending + rows <= self.max_pending
+                )
+            backpressure_histogram.observe(time.perf_counter() - started)
+
+        batch = self._batches.setdefault(tenant_id, _TenantBatch())
+        batch.messages.extend(messages)
+        if touch is not None:
+            conversation_id, updated_at = touch
+            previous = batch.touches.get(conversation_id)
+            batch.touches[conversation_id] = updated_at if previous is None else max(previous, updated_at)
+        batch.rows += rows
+        self._pending += rows
+        pending_gauge.set(self._pending)
+
+        waiter: asyncio.Future[None] | None = None
+        if durable:
+            waiter = asyncio.get_running_loop().create_future()
+            conversation_ids = {row["conversation_id"] for row in messages}
+            if touch is not None:
+                conversation_ids.add(touch[0])
+            batch.waiters.append((waiter, frozenset(conversation_ids)))
+
+        if batch.rows >= self.max_batch:
+            self._flush_tenant(tenant_id)
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush_all)
+
+        if waiter is not None:
+            await waiter
+
+    async def drain(self) -> None:
+        """Flush everything buffered and wait for in-flight batches"""
+        self._flush_all()
+        while self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    async def close(self) -> None:
+        """Stop accepting rows and flush what is left (app shutdown)"""
+        self._closed = True
+        await self.drain()
+
+    def _flush_all(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for tenant_id in list(self._batches):
+            self._flush_tenant(tenant_id)
+
+    def _flush_tenant(self, tenant_id: int) -> None:
+        # One flush per tenant at a time: rows arriving meanwhile form the next, bigger
+        # batch, and two transactions never fight over the same conversation rows
+        if tenant_id in self._flushing:
+            return
+        batch = self._batches.pop(tenant_id, None)
+        if batch is None:
+            return
+        self._flushing.add(tenant_id)
+        if not self._batches and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = asyncio.get_running_loop().create_task(self._write(tenant_id, batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _write(self, tenant_id: int, batch: _TenantBatch) -> None:
+        started = time.perf_counter()
+        failed: dict[int, Exception] = {}
+        try:
+            try:
+                for attempt in range(self.retries + 1):
+                    try:
+                        await self._commit(tenant_id, batch)
+                        break
+                    except Exception:
+                        # The transaction rolled back as a whole, so the batch can be sent again as is
+                        if attempt == self.retries:
+                            raise
+                        await asyncio.sleep(0.1 * 2 ** attempt)
+            except Exception:
+                logger.exception("Write-behind flush failed for tenant %s (%d rows)", tenant_id, batch.rows)
+                flush_errors_counter.inc()
+                failed = await self._isolate(tenant_id, batch)
+            else:
+                flush_histogram.observe(time.perf_counter() - started)
+                batch_rows_histogram.observe(batch.rows)
+            for waiter, conversation_ids in batch.waiters:
+                if waiter.done():
+                    continue
+                error = next((failed[id_] for id_ in conversation_ids if id_ in failed), None)
+                if error is None:
+                    waiter.set_result(None)
+                else:
+                    waiter.set_exception(error)
+        finally:
+            self._flushing.discard(tenant_id)
+            # Rows that queued up behind this flush have waited long enough
+            self._flush_tenant(tenant_id)
+            self._pending -= batch.rows
+            pending_gauge.set(self._pending)
+            async with self._space:
+                self._space.notify_all()
+
+    async def _isolate(self, tenant_id: int, batch: _TenantBatch) -> dict[int, Exception]:
+        """
+        Write a failed batch again, one conversation per transaction
+
+        Returns conversation_id -> error for the conversations whose rows were lost.
+        """
+        groups: dict[int, _TenantBatch] = {}
+        for row in batch.messages:
+            groups.setdefault(row["conversation_id"], _TenantBatch()).messages.append(row)
+        for conversation_id, updated_at in batch.touches.items():
+            groups.setdefault(conversation_id, _TenantBatch()).touches[conversation_id] = updated_at
+
+        failed: dict[int, Exception] = {}
+        written = False
+        for conversation_id, group in groups.items():
+            if not written and len(failed) >= ISOLATE_MAX_FAILURES:
+                failed[conversation_id] = next(reversed(failed.values()))
+                continue
+            try:
+                await self._commit(tenant_id, group)
+                written = True
+            except Exception as error:
+                failed[conversation_id] = error
+
+        if failed:
+            lost = sum(len(groups[conversation_id].messages) for conversation_id in failed)
+            logger.error(
+                "Write-behind dropped %d message rows of %d/%d conversations for tenant %s: %r",
+                lost, len(failed), len(groups), tenant_id, next(iter(failed.values())),
+            )
+            dropped_counter.inc(lost)
+        return failed
+
+    async def _commit(self, tenant_id: int, batch: _TenantBatch) -> None:
+        """Write one batch in a single tenant-scoped transaction"""
+        async with self.session_factory(tenant_id) as session:
+            # One multi-row INSERT ... VALUES per chunk: a single statement and round trip
+            # instead of one per row. (COPY is not an option - Postgres refuses COPY FROM
+            # into tables with row-level security for the RLS-restricted app user.)
+            for start in range(0, len(batch.messages), MAX_ROWS_PER_INSERT):
+                chunk = batch.messages[start:start + MAX_ROWS_PER_INSERT]
+                await session.execute(insert(Message.__table__).values(chunk))
+            if batch.touches:
+                # ORM bulk UPDATE by primary key - one executemany for every touched conversation
+                await session.execute(
+                    update(Conversation),
+                    # Sorted, so concurrent transactions lock conversations in the same order
+                    [{"id": conversation_id, "updated_at": updated_at}
+                     for conversation_id, updated_at in sorted(batch.touches.items())],
+                )
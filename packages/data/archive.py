@@ -0,0 +1,608 @@
+# packages/data/archive.py
+# Conversation archiver: idle conversations leave the live tables for compressed
+# archive files (ConversationStatus.ARCHIVED) and can be restored on demand
+#
+#   python -m packages.data.archive run --idle-days 30 --store /var/lib/clever/archive
+#   python -m packages.data.archive run --store s3://clever-archive/prod --format parquet
+#   python -m packages.data.archive restore --conversation-id 1234
+#   python -m packages.data.archive status
+#
+# Runs with the admin connection (DATABASE_URL_SYNC): it works across tenants,
+# so it deliberately is not subject to the app user's RLS policies.
+#
+# Every batch goes through committed checkpoints in archive_batches
+# (WRITING -> WRITTEN -> DONE), so a killed run picks up where it stopped.
+#
+# With REDIS_URL set, the chat apps' cached state of every archived conversation
+# is evicted as well (packages.caching.conversation_state).
+
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+from collections.abc import Iterable, Iterator, Sequence
+from contextlib import AbstractContextManager, contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, BinaryIO, Protocol
+
+import click
+from sqlalchemy import Engine, create_engine, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.types import BigInteger, Boolean, DateTime, Integer
+
+from packages.caching.conversation_state import INVALIDATION_CHANNEL, state_key
+from packages.core.enums import ArchiveBatchState, ConversationStatus
+from packages.core.metrics import metrics
+from packages.core.models import ArchiveBatch, Conversation, Message, Tenant, utc_now
+
+logger = logging.getLogger(__name__)
+
+archived_counter = metrics.counter("archive_rows_total", "Rows moved to (or restored from) the archive")
+throttle_histogram = metrics.histogram("archive_throttle_sleep_seconds", "Time the archiver slept to stay under its row budget")
+
+# ESCALATED stays live - a human agent still owns the conversation
+ARCHIVABLE_STATUSES = (ConversationStatus.ACTIVE, ConversationStatus.PENDING, ConversationStatus.CLOSED)
+
+FORMATS = ("ndjson", "parquet")
+_EXTENSIONS = {"ndjson": "ndjson.zst", "parquet": "parquet"}
+
+CONVERSATION_TABLE = Conversation.__table__
+MESSAGE_TABLE = Message.__table__
+
+
+# --- Storage: where archive files live ---
+
+class ArchiveStore(Protocol):
+    """Blob storage for archive files, addressed by relative key"""
+
+    def writer(self, key: str) -> AbstractContextManager[BinaryIO]: ...
+
+    def reader(self, key: str) -> AbstractContextManager[BinaryIO]: ...
+
+
+class LocalArchiveStore:
+    """Directory on local disk or a mounted volume"""
+
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+
+    @contextmanager
+    def writer(self, key: str) -> Iterator[BinaryIO]:
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(path.name + ".partial")
+        try:
+            with open(partial, "wb") as file:
+                yield file
+            # Atomic rename: a crash never leaves a truncated file under the final name
+            os.replace(partial, path)
+        finally:
+            partial.unlink(missing_ok=True)
+
+    @contextmanager
+    def reader(self, key: str) -> Iterator[BinaryIO]:
+        with open(self.root / key, "rb") as file:
+            yield file
+
+
+class S3ArchiveStore:
+    """
+    S3 (or S3-compatible) bucket - needs boto3 installed
+
+    Files are staged in a spooled temp file: multipart uploads need a seekable source.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "") -> None:
+        try:
+            import boto3
+        except ImportError as error:
+            raise RuntimeError("S3 archive store needs boto3: pip install boto3") from error
+        self.client = boto3.client("s3")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    @contextmanager
+    def writer(self, key: str) -> Iterator[BinaryIO]:
+        with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024) as file:
+            yield file  # type: ignore[misc]
+            file.seek(0)
+            self.client.upload_fileobj(file, self.bucket, self._key(key))
+
+    @contextmanager
+    def reader(self, key: str) -> Iterator[BinaryIO]:
+        with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024) as file:
+            self.client.download_fileobj(self.bucket, self._key(key), file)
+            file.seek(0)
+            yield file  # type: ignore[misc]
+
+
+def create_store(location: str) -> ArchiveStore:
+    """"s3://bucket/prefix" or a local directory path"""
+    if location.startswith("s3://"):
+        bucket, _, prefix = location[len("s3://"):].partition("/")
+        return S3ArchiveStore(bucket, prefix)
+    return LocalArchiveStore(location)
+
+
+# --- Formats: zstd-compressed NDJSON (default) or Parquet ---
+
+def _encode(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _archived_columns(table: Any) -> list[Any]:
+    """Columns an archive carries - generated ones (messages.content_tsv) are rebuilt by Postgres on restore"""
+    return [column for column in table.columns if column.computed is None]
+
+
+def _decode_row(table: Any, row: dict[str, Any]) -> dict[str, Any]:
+    """NDJSON stores datetimes as ISO strings - convert them back by column type"""
+    for column in table.columns:
+        value = row.get(column.key)
+        if isinstance(value, str) and isinstance(column.type, DateTime):
+            row[column.key] = datetime.fromisoformat(value)
+    return row
+
+
+def write_rows(file: BinaryIO, table: Any, rows: Iterable[dict[str, Any]], archive_format: str) -> int:
+    """Stream rows into file, returns the row count"""
+    count = 0
+    if archive_format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = arrow_schema(_archived_columns(table))
+        with pq.ParquetWriter(file, schema, compression="zstd") as parquet:
+            chunk: list[dict[str, Any]] = []
+            for row in rows:
+                chunk.append(row)
+                count += 1
+                if len(chunk) >= 10_000:               # One row group per 10k rows
+                    parquet.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                    chunk = []
+            if chunk or count == 0:
+                parquet.write_table(pa.Table.from_pylist(chunk, schema=schema))
+        return count
+
+    import zstandard
+
+    with zstandard.ZstdCompressor(level=10).stream_writer(file, closefd=False) as compressed:
+        text = io.TextIOWrapper(compressed, encoding="utf-8", write_through=True)
+        for row in rows:
+            text.write(json.dumps({key: _encode(value) for key, value in row.items()}, ensure_ascii=False))
+            text.write("\n")
+            count += 1
+        text.flush()
+        text.detach()
+    return count
+
+
+def read_rows(file: BinaryIO, table: Any, archive_format: str) -> Iterator[dict[str, Any]]:
+    if archive_format == "parquet":
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(file)
+        for batch in parquet.iter_batches(batch_size=10_000):
+            yield from batch.to_pylist()
+        return
+
+    import zstandard
+
+    with zstandard.ZstdDecompressor().stream_reader(file) as decompressed:
+        for line in io.TextIOWrapper(decompressed, encoding="utf-8"):
+            if line.strip():
+                yield _decode_row(table, json.loads(line))
+
+
+def arrow_schema(columns: Iterable[Any]) -> Any:
+    """
+    Explicit schema from SQLAlchemy columns - all-NULL chunks must not change column types
+    Fields are named by column key, so smallint-coded enums (models.CodedEnum) keep their
+    names and are written as their string values
+    """
+    import pyarrow as pa
+
+    fields = []
+    for column in columns:
+        if isinstance(column.type, BigInteger):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int32()
+        elif isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us")
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.key, arrow_type, nullable=column.nullable))
+    return pa.schema(fields)
+
+
+# --- Archiver ---
+
+class Throttle:
+    """Keeps a long-running job under max_rows_per_second (0 = unlimited)"""
+
+    def __init__(self, max_rows_per_second: float) -> None:
+        self.rate = max_rows_per_second
+        self.started = time.monotonic()
+        self.rows = 0
+
+    def consume(self, rows: int) -> None:
+        if self.rate <= 0:
+            return
+        self.rows += rows
+        ahead = self.rows / self.rate - (time.monotonic() - self.started)
+        if ahead > 0:
+            throttle_histogram.observe(ahead)
+            time.sleep(ahead)
+
+
+@dataclass
+class ArchiveStats:
+    batches: int = 0
+    conversations: int = 0
+    messages: int = 0
+    bytes_written: int = 0
+
+
+def batch_keys(batch: ArchiveBatch) -> tuple[str, str]:
+    """(conversations file, messages file) of one batch"""
+    extension = _EXTENSIONS[batch.archive_format]
+    base = f"tenant={batch.tenant_id}/{batch.created_at:%Y/%m}/batch-{batch.id:08d}"
+    return f"{base}.conversations.{extension}", f"{base}.messages.{extension}"
+
+
+class Archiver:
+    """
+    Moves idle conversations to the archive in small, bounded steps
+
+    Per batch (up to batch_size conversations of one tenant):
+    1. WRITING: stream the conversations and their messages into the store
+    2. WRITTEN: file complete - from here on the hot rows may go
+    3. DONE: in transactions of delete_chunk conversations, flip status to
+       ARCHIVED and DELETE their messages. A conversation that got new activity
+       since the file was written is skipped and stays live.
+
+    Short transactions and the row throttle keep locks, WAL and replication lag
+    small while the chat apps keep writing. With a (sync) redis client, the
+    cached conversation state of archived conversations is evicted after each
+    delete transaction, so no chat worker keeps resuming them.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        store: ArchiveStore,
+        archive_format: str = "ndjson",
+        batch_size: int = 500,
+        delete_chunk: int = 50,
+        max_rows_per_second: float = 20_000,
+        redis: Any | None = None,
+    ) -> None:
+        if archive_format not in FORMATS:
+            raise ValueError(f"Unknown archive format '{archive_format}', expected one of {FORMATS}")
+        self.engine = engine
+        self.store = store
+        self.archive_format = archive_format
+        self.batch_size = batch_size
+        self.delete_chunk = delete_chunk
+        self.throttle = Throttle(max_rows_per_second)
+        self.redis = redis
+        self.stats = ArchiveStats()
+
+    def run(self, idle_days: int, tenant_ids: Sequence[int] | None = None, max_batches: int | None = None) -> ArchiveStats:
+        self.resume()
+        idle_before = utc_now() - timedelta(days=idle_days)
+        with self.engine.connect() as connection:
+            tenants = tenant_ids or connection.scalars(select(Tenant.id).order_by(Tenant.id)).all()
+        for tenant_id in tenants:
+            last_id = 0
+            while max_batches is None or self.stats.batches < max_batches:
+                ids = self._idle_conversations(tenant_id, idle_before, last_id)
+                if not ids:
+                    break
+                batch = self._start_batch(tenant_id, ids, idle_before)
+                self._write(batch)
+                self._finish(batch)
+                last_id = ids[-1]
+        return self.stats
+
+    def resume(self) -> None:
+        """Complete batches a previous run left half-way"""
+        with self.engine.connect() as connection:
+            unfinished = connection.execute(
+                select(ArchiveBatch)
+                .where(ArchiveBatch.state.in_([ArchiveBatchState.WRITING, ArchiveBatchState.WRITTEN]))
+                .order_by(ArchiveBatch.id)
+            ).all()
+        for row in unfinished:
+            batch = _batch_from_row(row)
+            logger.info("Resuming archive batch %s (%s)", batch.id, batch.state)
+            if batch.state == ArchiveBatchState.WRITING:
+                self._write(batch)            # Rewritten from scratch under the same keys
+            self._finish(batch)
+
+    def _idle_conversations(self, tenant_id: int, idle_before: datetime, after_id: int) -> list[int]:
+        # tenant_id = ? AND status IN (...) is answered by ix_conversations_tenant_status
+        with self.engine.connect() as connection:
+            return list(connection.scalars(
+                select(Conversation.id)
+                .where(Conversation.tenant_id == tenant_id)
+                .where(Conversation.status.in_(ARCHIVABLE_STATUSES))
+                .where(Conversation.updated_at < idle_before)
+                .where(Conversation.id > after_id)
+                .order_by(Conversation.id)
+                .limit(self.batch_size)
+            ))
+
+    def _start_batch(self, tenant_id: int, ids: list[int], idle_before: datetime) -> ArchiveBatch:
+        with self.engine.begin() as connection:
+            row = connection.execute(
+                ArchiveBatch.__table__.insert()
+                .values(
+                    tenant_id=tenant_id,
+                    state=ArchiveBatchState.WRITING,
+                    object_key="",
+                    archive_format=self.archive_format,
+                    conversation_ids=ids,
+                    idle_before=idle_before,
+                    message_count=0,
+                    bytes_written=0,
+                    created_at=utc_now(),
+                )
+                .returning(*ArchiveBatch.__table__.columns)
+            ).one()
+            batch = _batch_from_row(row)
+            batch.object_key = batch_keys(batch)[1]
+            connection.execute(
+                update(ArchiveBatch).where(ArchiveBatch.id == batch.id).values(object_key=batch.object_key)
+            )
+        return batch
+
+    def _write(self, batch: ArchiveBatch) -> None:
+        conversations_key, messages_key = batch_keys(batch)
+        ids = list(batch.conversation_ids)
+        with self.engine.connect() as connection:
+            conversations = [
+                dict(row._mapping)
+                for row in connection.execute(select(CONVERSATION_TABLE).where(CONVERSATION_TABLE.c.id.in_(ids)))
+            ]
+            with self.store.writer(conversations_key) as file:
+                write_rows(file, CONVERSATION_TABLE, conversations, batch.archive_format)
+
+            # Lower created_at bound prunes monthly partitions older than the oldest conversation
+            oldest = min((c["created_at"] for c in conversations), default=None)
+            query = select(*_archived_columns(MESSAGE_TABLE)).where(MESSAGE_TABLE.c.conversation_id.in_(ids))
+            if oldest is not None:
+                query = query.where(MESSAGE_TABLE.c.created_at >= oldest)
+            # Server-side cursor: memory stays flat however long the conversations are
+            result = connection.execution_options(stream_results=True, yield_per=5000).execute(
+                query.order_by(MESSAGE_TABLE.c.conversation_id, MESSAGE_TABLE.c.created_at, MESSAGE_TABLE.c.id)
+            )
+
+            def messages() -> Iterator[dict[str, Any]]:
+                for partition in result.partitions():
+                    self.throttle.consume(len(partition))
+                    for row in partition:
+                        yield dict(row._mapping)
+
+            with self.store.writer(messages_key) as file:
+                message_count = write_rows(file, MESSAGE_TABLE, messages(), batch.archive_format)
+                bytes_written = file.tell()
+
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(ArchiveBatch)
+                .where(ArchiveBatch.id == batch.id)
+                .values(state=ArchiveBatchState.WRITTEN, message_count=message_count, bytes_written=bytes_written)
+            )
+        batch.state = ArchiveBatchState.WRITTEN
+        archived_counter.inc(message_count, table="messages", direction="out")
+        self.stats.messages += message_count
+        self.stats.bytes_written += bytes_written
+
+    def _finish(self, batch: ArchiveBatch) -> None:
+        ids = list(batch.conversation_ids)
+        archived = 0
+        for start in range(0, len(ids), self.delete_chunk):
+            chunk = ids[start:start + self.delete_chunk]
+            with self.engine.begin() as connection:
+                # Re-check idleness inside the transaction - new activity keeps a conversation live
+                sessions = dict(connection.execute(
+                    update(CONVERSATION_TABLE)
+                    .where(CONVERSATION_TABLE.c.id.in_(chunk))
+                    .where(CONVERSATION_TABLE.c.status.in_(ARCHIVABLE_STATUSES))
+                    .where(CONVERSATION_TABLE.c.updated_at < batch.idle_before)
+                    .values(status=ConversationStatus.ARCHIVED)
+                    .returning(CONVERSATION_TABLE.c.id, CONVERSATION_TABLE.c.session_id)
+                ).all())
+                flipped = list(sessions)
+                deleted = 0
+                if flipped:
+                    deleted = connection.execute(
+                        delete(MESSAGE_TABLE).where(MESSAGE_TABLE.c.conversation_id.in_(flipped))
+                    ).rowcount
+            self._evict_states(batch.tenant_id, set(sessions.values()))
+            archived += len(flipped)
+            self.throttle.consume(deleted + len(chunk))
+
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(ArchiveBatch)
+                .where(ArchiveBatch.id == batch.id)
+                .values(state=ArchiveBatchState.DONE, completed_at=utc_now())
+            )
+        batch.state = ArchiveBatchState.DONE
+        archived_counter.inc(archived, table="conversations", direction="out")
+        self.stats.batches += 1
+        self.stats.conversations += archived
+        logger.info("Archive batch %s: %d conversations archived", batch.id, archived)
+
+    def _evict_states(self, tenant_id: int, session_ids: set[str]) -> None:
+        """Evict the cached state of the sessions, as ConversationStateCache.evict does"""
+        if self.redis is None or not session_ids:
+            return
+        keys = [state_key(tenant_id, session_id) for session_id in sorted(session_ids)]
+        try:
+            self.redis.delete(*keys)
+            for key in keys:
+                # Workers drop their local copy of the key on this message
+                self.redis.publish(INVALIDATION_CHANNEL, f"archiver {key}")
+        except Exception:
+            # The states stay cached until their TTL runs out
+            logger.warning("Archive: evicting %d cached conversation states failed", len(keys), exc_info=True)
+
+    def restore(self, batch_id: int | None = None, conversation_id: int | None = None) -> int:
+        """
+        Copy archived messages back into the live table and reset conversation statuses
+
+        Original ids and timestamps are kept; rows that are already live are
+        skipped (ON CONFLICT DO NOTHING), so restoring twice is harmless.
+        Returns the number of messages inserted.
+        """
+        query = select(ArchiveBatch).where(ArchiveBatch.state == ArchiveBatchState.DONE)
+        if batch_id is not None:
+            query = query.where(ArchiveBatch.id == batch_id)
+        if conversation_id is not None:
+            query = query.where(ArchiveBatch.conversation_ids.any(conversation_id))
+        with self.engine.connect() as connection:
+            batches = [_batch_from_row(row) for row in connection.execute(query.order_by(ArchiveBatch.id.desc()))]
+        if not batches:
+            raise click.ClickException("No archived batch matches")
+        if conversation_id is not None:
+            batches = batches[:1]                    # Latest archive of the conversation wins
+
+        restored = 0
+        for batch in batches:
+            conversations_key, messages_key = batch_keys(batch)
+            with self.store.reader(conversations_key) as file:
+                conversations = [
+                    c for c in read_rows(file, CONVERSATION_TABLE, batch.archive_format)
+                    if conversation_id is None or c["id"] == conversation_id
+                ]
+            with self.store.reader(messages_key) as file:
+                rows = (
+                    m for m in read_rows(file, MESSAGE_TABLE, batch.archive_format)
+                    if conversation_id is None or m["conversation_id"] == conversation_id
+                )
+                for chunk in _chunks(rows, 1000):
+                    with self.engine.begin() as connection:
+                        restored += connection.execute(
+                            pg_insert(MESSAGE_TABLE).values(chunk).on_conflict_do_nothing()
+                        ).rowcount
+                    self.throttle.consume(len(chunk))
+
+            with self.engine.begin() as connection:
+                for conversation in conversations:
+                    connection.execute(
+                        update(CONVERSATION_TABLE)
+                        .where(CONVERSATION_TABLE.c.id == conversation["id"])
+                        .where(CONVERSATION_TABLE.c.status == ConversationStatus.ARCHIVED)
+                        .values(status=conversation["status"], updated_at=conversation["updated_at"])
+                    )
+                if conversation_id is None:
+                    connection.execute(
+                        update(ArchiveBatch).where(ArchiveBatch.id == batch.id).values(state=ArchiveBatchState.RESTORED)
+                    )
+        archived_counter.inc(restored, table="messages", direction="in")
+        return restored
+
+
+def _batch_from_row(row: Any) -> ArchiveBatch:
+    """Detached ArchiveBatch from a Core row - the archiver works without an ORM session"""
+    return ArchiveBatch(**{column.name: row._mapping[column.name] for column in ArchiveBatch.__table__.columns})
+
+
+def _chunks(rows: Iterable[dict[str, Any]], size: int) -> Iterator[list[dict[str, Any]]]:
+    chunk: list[dict[str, Any]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _engine() -> Engine:
+    url = os.getenv("DATABASE_URL_SYNC") or os.getenv("DATABASE_URL", "").replace("postgresql+asyncpg://", "postgresql://")
+    if not url:
+        raise click.UsageError("DATABASE_URL_SYNC is not set")
+    return create_engine(url)
+
+
+def _redis() -> Any | None:
+    url = os.getenv("REDIS_URL")
+    if not url:
+        return None
+    import redis
+
+    return redis.Redis.from_url(url)
+
+
+@click.group()
+def main() -> None:
+    """Move idle conversations to the archive and back"""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+
+@main.command()
+@click.option("--store", "location", envvar="ARCHIVE_STORE", required=True, help="Directory or s3://bucket/prefix")
+@click.option("--format", "archive_format", type=click.Choice(FORMATS), default="ndjson", show_default=True,
+              envvar="ARCHIVE_FORMAT")
+@click.option("--idle-days", default=30, show_default=True, envvar="ARCHIVE_IDLE_DAYS",
+              help="Archive conversations without activity for this long")
+@click.option("--tenant-id", "tenant_ids", type=int, multiple=True, help="Only these tenants (repeatable)")
+@click.option("--batch-size", default=500, show_default=True, help="Conversations per archive file")
+@click.option("--delete-chunk", default=50, show_default=True, help="Conversations per delete transaction")
+@click.option("--max-rows-per-second", default=20_000.0, show_default=True, envvar="ARCHIVE_MAX_ROWS_PER_SECOND",
+              help="Throughput throttle (0 = unlimited)")
+@click.option("--max-batches", type=int, default=None, help="Stop after this many batches")
+def run(
+    location: str, archive_format: str, idle_days: int, tenant_ids: tuple[int, ...],
+    batch_size: int, delete_chunk: int, max_rows_per_second: float, max_batches: int | None,
+) -> None:
+    """Archive idle conversations (resumes unfinished batches first)"""
+    archiver = Archiver(
+        _engine(), create_store(location), archive_format, batch_size, delete_chunk, max_rows_per_second, _redis()
+    )
+    started = time.monotonic()
+    stats = archiver.run(idle_days, tenant_ids or None, max_batches)
+    click.echo(json.dumps({**stats.__dict__, "seconds": round(time.monotonic() - started, 1)}))
+
+
+@main.command()
+@click.option("--store", "location", envvar="ARCHIVE_STORE", required=True, help="Directory or s3://bucket/prefix")
+@click.option("--batch-id", type=int, default=None)
+@click.option("--conversation-id", type=int, default=None)
+@click.option("--max-rows-per-second", default=0.0, show_default=True, help="Throughput throttle (0 = unlimited)")
+def restore(location: str, batch_id: int | None, conversation_id: int | None, max_rows_per_second: float) -> None:
+    """Bring a batch or a single conversation back into the live tables"""
+    if batch_id is None and conversation_id is None:
+        raise click.UsageError("Pass --batch-id or --conversation-id")
+    archiver = Archiver(_engine(), create_store(location), max_rows_per_second=max_rows_per_second)
+    click.echo(f"Restored {archiver.restore(batch_id, conversation_id)} messages")
+
+
+@main.command()
+def status() -> None:
+    """Archive batches per state"""
+    with _engine().connect() as connection:
+        rows = connection.execute(
+            select(ArchiveBatch.state, func.count(), func.sum(ArchiveBatch.message_count), func.sum(ArchiveBatch.bytes_written))
+            .group_by(ArchiveBatch.state)
+        ).all()
+    for state, batches, messages, size in rows:
+        click.echo(f"{state:<10} batches={batches} messages={messages or 0} bytes={size or 0}")
+
+
+if __name__ == "__main__":
+    main()
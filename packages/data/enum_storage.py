@@ -0,0 +1,398 @@
+# packages/data/enum_storage.py
+# Online switch of the enum columns from VARCHAR labels to smallint codes (ENUM_STORAGE=smallint)
+# Run with the admin connection (DDL needs table ownership):
+#
+#   python -m packages.data.enum_storage status
+#   python -m packages.data.enum_storage expand --max-rows-per-second 20000   # = the alembic migration
+#   python -m packages.data.enum_storage contract                             # after the fleet runs smallint
+#   python -m packages.data.enum_storage functions                            # after adding an enum member
+#
+# Expand / contract, so no step needs downtime or a coordinated deploy:
+# 1. expand: a nullable <name>_code smallint next to every enum column, plus a
+#    trigger that keeps the pair in sync whichever one a writer sets - apps on
+#    string storage and apps on smallint storage can run side by side
+# 2. backfill: codes for existing rows in id-range batches, each its own short
+#    transaction; resumable (only rows still without a code are touched)
+# 3. indexes: the enum indexes rebuilt over the code columns with CREATE INDEX
+#    CONCURRENTLY (per partition for messages, then attached to the parent)
+# 4. NOT NULL: CHECK ... NOT VALID, VALIDATE (no write lock), then SET NOT NULL,
+#    which uses the validated check instead of scanning the table again
+# 5. contract (separate command, once every app and job runs ENUM_STORAGE=smallint):
+#    drop the trigger and the string columns, give the code indexes the old names
+#
+# DDL runs with a short lock_timeout and is retried (packages/data/online_ddl.py): an
+# ALTER TABLE queued behind a long query would otherwise block every query behind it.
+
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from enum import Enum
+
+import click
+from sqlalchemy import Connection, create_engine, text
+
+from packages.core.enums import (
+    ENUM_CODES,
+    ChannelType,
+    ConversationStatus,
+    ConversationType,
+    MessageType,
+    UserFeedback,
+    UserRole,
+)
+from packages.core.models import Base
+
+from .archive import Throttle
+from .online_ddl import create_index_online, index_state, is_partitioned, run_ddl
+from .partitions import list_partitions
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class CodedColumn:
+    """One enum column and its smallint twin"""
+    table: str
+    name: str
+    enum_class: type[Enum]
+    nullable: bool = False
+
+    @property
+    def code(self) -> str:
+        return f"{self.name}_code"
+
+    @property
+    def function(self) -> str:
+        """SQL function prefix: ConversationStatus -> conversation_status(_code|_text)"""
+        return re.sub(r"(?<!^)(?=[A-Z])", "_", self.enum_class.__name__).lower()
+
+
+CODED_COLUMNS = (
+    CodedColumn("users", "role", UserRole),
+    CodedColumn("conversations", "conversation_type", ConversationType),
+    CodedColumn("conversations", "channel", ChannelType),
+    CodedColumn("conversations", "status", ConversationStatus),
+    CodedColumn("messages", "message_type", MessageType),
+    CodedColumn("messages", "user_feedback", UserFeedback, nullable=True),
+)
+
+CODED_TABLES = tuple(dict.fromkeys(column.table for column in CODED_COLUMNS))
+
+
+@dataclass(frozen=True)
+class CodedIndex:
+    """An index over enum columns and the code-column index that replaces it"""
+    name: str
+    table: str
+    columns: tuple[str, ...]
+
+    @property
+    def code_name(self) -> str:
+        return f"{self.name}_code"
+
+    @property
+    def code_columns(self) -> tuple[str, ...]:
+        coded = {column.name for column in _table_columns(self.table)}
+        return tuple(f"{name}_code" if name in coded else name for name in self.columns)
+
+
+def _table_columns(table: str) -> list[CodedColumn]:
+    return [column for column in CODED_COLUMNS if column.table == table]
+
+
+def coded_indexes() -> list[CodedIndex]:
+    """The models' indexes that include an enum column (ix_messages_type, ix_conversations_tenant_status, ...)"""
+    indexes = []
+    for table in CODED_TABLES:
+        coded = {column.name for column in _table_columns(table)}
+        for index in sorted(Base.metadata.tables[table].indexes, key=lambda index: index.name):
+            keys = tuple(column.key for column in index.columns)
+            if coded.intersection(keys):
+                indexes.append(CodedIndex(index.name, table, keys))
+    return indexes
+
+
+# --- Catalog ---
+
+def _columns(connection: Connection, table: str) -> dict[str, bool]:
+    """Column name -> NOT NULL"""
+    rows = connection.execute(text("""
+        SELECT attname, attnotnull FROM pg_attribute
+        WHERE attrelid = to_regclass(:table) AND attnum > 0 AND NOT attisdropped
+    """), {"table": table}).all()
+    return dict(rows)
+
+
+def phase(connection: Connection, table: str) -> str:
+    """"string", "expanding", "expanded" or "contracted" - where the table is in the switch"""
+    columns = _columns(connection, table)
+    coded = _table_columns(table)
+    if not any(column.code in columns for column in coded):
+        return "string"
+    if not any(column.name in columns for column in coded):
+        return "contracted"
+    not_null = all(columns.get(column.code) for column in coded if not column.nullable)
+    indexes = all(index_state(connection, index.code_name) == "valid"
+                  for index in coded_indexes() if index.table == table)
+    return "expanded" if not_null and indexes else "expanding"
+
+
+def create_functions(connection: Connection) -> None:
+    """
+    <enum>_code(text) -> smallint and <enum>_text(smallint) -> text from ENUM_CODES
+    IMMUTABLE SQL, inlined by the planner; also handy in ad-hoc queries after the contract
+    """
+    enums = {column.function: column.enum_class for column in CODED_COLUMNS}
+    for function, enum_class in enums.items():
+        codes = ENUM_CODES[enum_class]
+        to_code = " ".join(f"WHEN '{member.value}' THEN {code}" for member, code in codes.items())
+        to_text = " ".join(f"WHEN {code} THEN '{member.value}'" for member, code in codes.items())
+        connection.exec_driver_sql(
+            f"CREATE OR REPLACE FUNCTION {function}_code(text) RETURNS smallint "
+            f"LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$ SELECT CASE $1 {to_code} END::smallint $$"
+        )
+        connection.exec_driver_sql(
+            f"CREATE OR REPLACE FUNCTION {function}_text(smallint) RETURNS text "
+            f"LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$ SELECT CASE $1 {to_text} END $$"
+        )
+
+
+def add_columns(connection: Connection, table: str) -> None:
+    """Nullable code columns plus the sync trigger - metadata only, no table rewrite"""
+    coded = _table_columns(table)
+    # INSERT: string-storage apps set the label, smallint-storage apps the code - fill in the other.
+    # UPDATE: whichever side the statement changed wins
+    sync = "\n".join(f"""
+            IF TG_OP = 'INSERT' THEN
+                IF NEW.{c.code} IS NULL THEN NEW.{c.code} := {c.function}_code(NEW.{c.name});
+                ELSIF NEW.{c.name} IS NULL THEN NEW.{c.name} := {c.function}_text(NEW.{c.code});
+                END IF;
+            ELSIF NEW.{c.name} IS DISTINCT FROM OLD.{c.name} AND NEW.{c.code} IS NOT DISTINCT FROM OLD.{c.code} THEN
+                NEW.{c.code} := {c.function}_code(NEW.{c.name});
+            ELSIF NEW.{c.code} IS DISTINCT FROM OLD.{c.code} AND NEW.{c.name} IS NOT DISTINCT FROM OLD.{c.name} THEN
+                NEW.{c.name} := {c.function}_text(NEW.{c.code});
+            END IF;""" for c in coded)
+    run_ddl(
+        connection,
+        f"ALTER TABLE {table} " + ", ".join(f"ADD COLUMN IF NOT EXISTS {c.code} smallint" for c in coded),
+        f"""CREATE OR REPLACE FUNCTION {table}_sync_enum_codes() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN{sync}
+            RETURN NEW;
+        END $$""",
+        f"CREATE OR REPLACE TRIGGER sync_enum_codes BEFORE INSERT OR UPDATE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION {table}_sync_enum_codes()",
+    )
+
+
+# --- Backfill ---
+
+def backfill(connection: Connection, table: str, batch_size: int = 5000, max_rows_per_second: float = 0) -> int:
+    """
+    Codes for rows written before the trigger, in id-range batches that commit one by one
+    Partitioned tables are walked partition by partition over their own (id, ...) primary keys
+    """
+    coded = _table_columns(table)
+    assignments = ", ".join(f"{c.code} = {c.function}_code({c.name})" for c in coded)
+    # Labels outside ENUM_CODES map to NULL: those rows are left for check_unmapped to report
+    pending = " OR ".join(f"({c.code} IS NULL AND {c.function}_code({c.name}) IS NOT NULL)" for c in coded)
+    targets = [p.name for p in list_partitions(connection, table)] if is_partitioned(connection, table) else [table]
+    throttle = Throttle(max_rows_per_second)
+    total = 0
+    for target in targets:
+        low, high = connection.execute(text(f"SELECT min(id), max(id) FROM {target}")).one()
+        if low is None:
+            continue
+        started = time.monotonic()
+        updated = 0
+        for start in range(low, high + 1, batch_size):
+            # Autocommit: every batch is its own transaction, row locks are held for one batch only
+            rows = connection.execute(
+                text(f"UPDATE {target} SET {assignments} WHERE id >= :start AND id < :end AND ({pending})"),
+                {"start": start, "end": start + batch_size},
+            ).rowcount
+            updated += rows
+            throttle.consume(rows)
+        logger.info("%s: %d rows backfilled in %.1fs", target, updated, time.monotonic() - started)
+        total += updated
+    return total
+
+
+def check_unmapped(connection: Connection, table: str) -> None:
+    """
+    After the backfill only labels outside ENUM_CODES are left without a code - the
+    database never validated enum values, so legacy rows may carry any string
+    """
+    for c in _table_columns(table):
+        rows = connection.execute(text(
+            f"SELECT {c.name}, count(*) FROM {table} WHERE {c.code} IS NULL AND {c.name} IS NOT NULL "
+            f"GROUP BY {c.name} ORDER BY count(*) DESC LIMIT 10"
+        )).all()
+        if rows:
+            found = ", ".join(f"{value!r} ({count} rows)" for value, count in rows)
+            raise RuntimeError(
+                f"{table}.{c.name} has values outside {c.enum_class.__name__}: {found} - update those rows "
+                f"to a member (or add the value to the enum and ENUM_CODES), then rerun expand"
+            )
+
+
+# --- Indexes and NOT NULL ---
+
+def create_indexes(connection: Connection, table: str) -> None:
+    """Code-column twins of the enum indexes, built without blocking writes"""
+    for index in coded_indexes():
+        if index.table == table:
+            create_index_online(connection, index.code_name, table, index.code_columns)
+
+
+def set_not_null(connection: Connection, table: str) -> None:
+    """NOT NULL on the codes of NOT NULL enum columns, validated without blocking writes"""
+    columns = _columns(connection, table)
+    for c in _table_columns(table):
+        if c.nullable or columns.get(c.code):
+            continue
+        check = f"{table}_{c.code}_not_null"
+        run_ddl(
+            connection,
+            f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {check}",
+            f"ALTER TABLE {table} ADD CONSTRAINT {check} CHECK ({c.code} IS NOT NULL) NOT VALID",
+        )
+        # SHARE UPDATE EXCLUSIVE: reads and writes go on while every row is checked
+        connection.exec_driver_sql(f"ALTER TABLE {table} VALIDATE CONSTRAINT {check}")
+        # With a valid CHECK in place SET NOT NULL skips the table scan
+        run_ddl(
+            connection,
+            f"ALTER TABLE {table} ALTER COLUMN {c.code} SET NOT NULL",
+            f"ALTER TABLE {table} DROP CONSTRAINT {check}",
+        )
+
+
+def expand(connection: Connection, batch_size: int = 5000, max_rows_per_second: float = 0) -> None:
+    """
+    Steps 1-4: code columns, sync trigger, backfill, indexes, NOT NULL
+    Idempotent - rerun it to resume after an interruption. Needs an autocommit connection.
+    Raises RuntimeError, before any index is built, if a table has labels outside ENUM_CODES
+    """
+    create_functions(connection)
+    for table in CODED_TABLES:
+        if phase(connection, table) == "contracted":
+            continue
+        add_columns(connection, table)
+        backfill(connection, table, batch_size, max_rows_per_second)
+        check_unmapped(connection, table)
+        create_indexes(connection, table)
+        set_not_null(connection, table)
+        logger.info("%s: %s", table, phase(connection, table))
+
+
+def contract(connection: Connection) -> None:
+    """Step 5: drop the string columns and the trigger, rename the code indexes to the original names"""
+    phases = {table: phase(connection, table) for table in CODED_TABLES}
+    unfinished = [f"{table} ({state})" for table, state in phases.items() if state in ("string", "expanding")]
+    if unfinished:
+        raise RuntimeError(f"Run expand first - not fully expanded: {', '.join(unfinished)}")
+    for table in CODED_TABLES:
+        if phases[table] == "contracted":
+            continue
+        # One short transaction per table; the old indexes go with their columns
+        run_ddl(
+            connection,
+            f"DROP TRIGGER IF EXISTS sync_enum_codes ON {table}",
+            f"DROP FUNCTION IF EXISTS {table}_sync_enum_codes()",
+            f"ALTER TABLE {table} " + ", ".join(f"DROP COLUMN {c.name}" for c in _table_columns(table)),
+            *(f"ALTER INDEX {index.code_name} RENAME TO {index.name}"
+              for index in coded_indexes() if index.table == table),
+        )
+        logger.info("%s: contracted", table)
+
+
+def drop(connection: Connection) -> None:
+    """Undo expand while the string columns still exist (migration downgrade)"""
+    for table in CODED_TABLES:
+        state = phase(connection, table)
+        if state == "contracted":
+            raise RuntimeError(f"{table} is contracted - the string columns are gone, restore them from a backup")
+        if state == "string":
+            continue
+        run_ddl(
+            connection,
+            f"DROP TRIGGER IF EXISTS sync_enum_codes ON {table}",
+            f"DROP FUNCTION IF EXISTS {table}_sync_enum_codes()",
+            # Code indexes go with their columns
+            f"ALTER TABLE {table} " + ", ".join(f"DROP COLUMN IF EXISTS {c.code}" for c in _table_columns(table)),
+        )
+    for function in dict.fromkeys(column.function for column in CODED_COLUMNS):
+        connection.exec_driver_sql(f"DROP FUNCTION IF EXISTS {function}_code(text)")
+        connection.exec_driver_sql(f"DROP FUNCTION IF EXISTS {function}_text(smallint)")
+
+
+# --- CLI ---
+
+def _sync_url() -> str:
+    url = os.getenv("DATABASE_URL_SYNC") or os.getenv("DATABASE_URL", "").replace("postgresql+asyncpg://", "postgresql://")
+    if not url:
+        raise click.UsageError("DATABASE_URL_SYNC is not set")
+    return url
+
+
+def _connect() -> Connection:
+    return create_engine(_sync_url(), isolation_level="AUTOCOMMIT").connect()
+
+
+@click.group()
+def main() -> None:
+    """Switch enum columns between string labels and smallint codes"""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+
+@main.command()
+def status() -> None:
+    """Where each table is: string, expanding, expanded or contracted"""
+    with _connect() as connection:
+        for table in CODED_TABLES:
+            columns = _columns(connection, table)
+            state = phase(connection, table)
+            click.echo(f"{table:<15} {state}")
+            for c in _table_columns(table):
+                code = "missing" if c.code not in columns else "NOT NULL" if columns[c.code] else "nullable"
+                click.echo(f"  {c.name:<20} string={'yes' if c.name in columns else 'dropped':<8} code={code}")
+            for index in coded_indexes():
+                if index.table == table:
+                    name = index.name if state == "contracted" else index.code_name
+                    click.echo(f"  {name:<35} {index_state(connection, name) or 'missing'}")
+
+
+@main.command(name="expand")
+@click.option("--batch-size", default=5000, show_default=True, help="Ids per backfill transaction")
+@click.option("--max-rows-per-second", default=0.0, show_default=True, help="Backfill throttle (0 = unlimited)")
+def expand_command(batch_size: int, max_rows_per_second: float) -> None:
+    """Add, backfill, index and validate the code columns (what the migration runs)"""
+    with _connect() as connection:
+        try:
+            expand(connection, batch_size, max_rows_per_second)
+        except RuntimeError as error:
+            raise click.ClickException(str(error)) from None
+
+
+@main.command(name="contract")
+@click.option("--yes", is_flag=True, help="Every app and job already runs with ENUM_STORAGE=smallint")
+def contract_command(yes: bool) -> None:
+    """Drop the string columns - apps still on ENUM_STORAGE=string fail afterwards"""
+    if not yes:
+        click.confirm("Every app and job runs with ENUM_STORAGE=smallint?", abort=True)
+    with _connect() as connection:
+        try:
+            contract(connection)
+        except RuntimeError as error:
+            raise click.ClickException(str(error)) from None
+
+
+@main.command()
+def functions() -> None:
+    """Recreate the <enum>_code/<enum>_text SQL functions from ENUM_CODES"""
+    with _connect() as connection:
+        create_functions(connection)
+
+
+if __name__ == "__main__":
+    main()
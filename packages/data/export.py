@@ -0,0 +1,358 @@
+# packages/data/export.py
+# Tenant data export: conversations or messages as NDJSON, CSV or Parquet, compressed on the fly
+#
+#   GET /api/v1/exports/messages?format=csv&compression=gzip&since=2025-01-01
+#   python -m packages.data.export messages --tenant-id 42 --output messages.ndjson.gz
+#   python -m packages.data.export messages --tenant-id 42 --cursor 2025-03-01T10:00:00,981 --output part2.ndjson.gz
+#
+# Rows come from a server-side cursor (yield_per) and are encoded and compressed
+# batch by batch, so memory stays flat whether the export has 1k or 50M rows.
+# Every read goes through tenant_session: the RLS app user with the tenant set,
+# plus an explicit tenant_id filter that the indexes serve.
+#
+# Why a new transaction every rows_per_transaction rows?
+# - One transaction for a 50M row export would hold a snapshot (and a pooled
+#   connection) for as long as the slowest client takes to download it, and
+#   vacuum can't clean up behind it. Each chunk continues from the last row
+#   by keyset, so chunks join up without gaps or repeats
+#
+# Resuming: rows are ordered by (created_at, id). After a disconnect, pass
+# cursor=<created_at>,<id> of the last complete row received to get the rest
+# as a new file. `until` defaults to the start of the export, so a resumed
+# export ends at the same row as the original would have.
+
+import asyncio
+import csv
+import io
+import json
+import logging
+import sys
+import time
+import zlib
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+import click
+from sqlalchemy import select, tuple_
+
+from packages.core.database import tenant_session
+from packages.core.metrics import metrics
+from packages.core.models import Conversation, Message, naive_utc, utc_now
+
+from .archive import arrow_schema
+
+logger = logging.getLogger(__name__)
+
+exported_counter = metrics.counter("export_rows_total", "Rows exported by table and format")
+
+FORMATS = ("ndjson", "csv", "parquet")
+COMPRESSIONS = ("gzip", "zstd", "none")
+
+# What a tenant gets back - internal bookkeeping (summaries, token counts, tsvector) stays out
+EXPORT_COLUMNS: dict[str, tuple[Any, tuple[Any, ...]]] = {
+    "conversations": (Conversation, (
+        Conversation.id, Conversation.user_id, Conversation.session_id, Conversation.title,
+        Conversation.conversation_type, Conversation.channel, Conversation.status,
+        Conversation.resolution_time_minutes, Conversation.satisfaction_score,
+        Conversation.created_at, Conversation.updated_at, Conversation.closed_at,
+    )),
+    "messages": (Message, (
+        Message.id, Message.conversation_id, Message.user_id, Message.message_type, Message.content,
+        Message.ai_model, Message.tokens_used, Message.user_feedback, Message.created_at,
+    )),
+}
+
+_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+_COMPRESSED_MEDIA_TYPES = {"gzip": "application/gzip", "zstd": "application/zstd"}
+_SUFFIXES = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+
+
+class ExportFormatUnavailable(Exception):
+    """Parquet export needs pyarrow, which is an optional dependency"""
+
+
+@dataclass(frozen=True)
+class ExportCursor:
+    """Position after the last exported row: (created_at, id)"""
+    created_at: datetime
+    id: int
+
+    @classmethod
+    def parse(cls, value: str) -> "ExportCursor":
+        created_at, separator, row_id = value.rpartition(",")
+        if not separator:
+            raise ValueError("cursor must be '<created_at>,<id>' of the last row received")
+        return cls(naive_utc(datetime.fromisoformat(created_at)), int(row_id))
+
+    def __str__(self) -> str:
+        return f"{self.created_at.isoformat()},{self.id}"
+
+
+@dataclass(frozen=True)
+class ExportRequest:
+    """One validated export"""
+    table: str
+    until: datetime
+    since: datetime | None = None
+    cursor: ExportCursor | None = None
+    format: str = "ndjson"
+    compression: str = "gzip"
+
+    @classmethod
+    def resolve(
+        cls,
+        table: str,
+        format: str = "ndjson",
+        compression: str = "gzip",
+        since: datetime | None = None,
+        until: datetime | None = None,
+        cursor: str | None = None,
+    ) -> "ExportRequest":
+        if table not in EXPORT_COLUMNS:
+            raise ValueError(f"table must be one of {', '.join(EXPORT_COLUMNS)}")
+        if format not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"compression must be one of {', '.join(COMPRESSIONS)}")
+        if format == "parquet":
+            # Parquet compresses its column chunks itself; a second layer only costs CPU
+            compression = "none"
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError as error:
+                raise ExportFormatUnavailable("Parquet export needs pyarrow: pip install pyarrow") from error
+        until = naive_utc(until) if until else utc_now()
+        since = naive_utc(since) if since is not None else None
+        if since is not None and since >= until:
+            raise ValueError("since must be before until")
+        return cls(table, until, since, ExportCursor.parse(cursor) if cursor else None, format, compression)
+
+    @property
+    def filename(self) -> str:
+        return f"{self.table}.{self.format}{_SUFFIXES[self.compression]}"
+
+    @property
+    def media_type(self) -> str:
+        return _COMPRESSED_MEDIA_TYPES.get(self.compression) or _MEDIA_TYPES[self.format]
+
+
+@dataclass
+class ExportProgress:
+    rows: int = 0
+    cursor: ExportCursor | None = None
+    started: float = field(default_factory=time.monotonic)
+
+
+async def export_rows(
+    tenant_id: int,
+    request: ExportRequest,
+    progress: ExportProgress | None = None,
+    yield_per: int = 2000,
+    rows_per_transaction: int = 50_000,
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """Batches of up to yield_per rows in (created_at, id) order"""
+    model, columns = EXPORT_COLUMNS[request.table]
+    progress = progress if progress is not None else ExportProgress()
+    progress.cursor = request.cursor
+    while True:
+        # (tenant_id, created_at) index: a range scan from the cursor, partitions pruned by the window
+        query = select(*columns).where(model.tenant_id == tenant_id, model.created_at < request.until)
+        if request.since is not None:
+            query = query.where(model.created_at >= request.since)
+        if progress.cursor is not None:
+            query = query.where(
+                model.created_at >= progress.cursor.created_at,
+                tuple_(model.created_at, model.id) > tuple_(progress.cursor.created_at, progress.cursor.id),
+            )
+        query = query.order_by(model.created_at, model.id).limit(rows_per_transaction)
+
+        read = 0
+        async with tenant_session(tenant_id) as session:
+            result = await session.stream(query.execution_options(yield_per=yield_per))
+            async for partition in result.partitions():
+                rows = [dict(row._mapping) for row in partition]
+                read += len(rows)
+                progress.rows += len(rows)
+                progress.cursor = ExportCursor(rows[-1]["created_at"], rows[-1]["id"])
+                exported_counter.inc(len(rows), table=request.table, format=request.format)
+                yield rows
+        if read < rows_per_transaction:
+            return
+
+
+# --- Encoding: rows -> NDJSON/CSV/Parquet bytes -> compressed bytes ---
+
+def _json_value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class _Buffer(io.RawIOBase):
+    """Write-only sink that hands back whatever was written since the last drain"""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+class _NoCompression:
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class ExportWriter:
+    """
+    Incremental encoder: begin(), write(rows) per batch, finish()
+
+    Every call returns the bytes ready to send - the compressor keeps only its
+    window, the Parquet writer one row group.
+    """
+
+    def __init__(self, request: ExportRequest, row_group_size: int = 10_000) -> None:
+        self.format = request.format
+        self.columns = [column.key for column in EXPORT_COLUMNS[request.table][1]]
+        self.row_group_size = row_group_size
+        if request.compression == "gzip":
+            self._compressor: Any = zlib.compressobj(6, zlib.DEFLATED, 31)    # wbits 31: gzip container
+        elif request.compression == "zstd":
+            import zstandard
+
+            self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        else:
+            self._compressor = _NoCompression()
+        self._buffer = _Buffer()
+        self._pending: list[dict[str, Any]] = []
+        self._parquet: Any = None
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+
+            self._schema = arrow_schema(EXPORT_COLUMNS[request.table][1])
+            self._parquet = pq.ParquetWriter(self._buffer, self._schema, compression="zstd")
+
+    def begin(self) -> bytes:
+        if self.format == "csv":
+            return self._compressor.compress(self._csv([self.columns]))
+        return b""
+
+    def write(self, rows: Sequence[dict[str, Any]]) -> bytes:
+        if self.format == "ndjson":
+            data = "".join(
+                json.dumps({key: _json_value(value) for key, value in row.items()}, ensure_ascii=False) + "\n"
+                for row in rows
+            ).encode()
+        elif self.format == "csv":
+            data = self._csv([[_json_value(row[column]) for column in self.columns] for row in rows])
+        else:
+            self._pending.extend(rows)
+            if len(self._pending) < self.row_group_size:
+                return b""
+            data = self._row_group()
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        data = b""
+        if self._parquet is not None:
+            if self._pending:
+                data = self._row_group()
+            self._parquet.close()
+            data += self._buffer.drain()
+        return self._compressor.compress(data) + self._compressor.flush()
+
+    def _csv(self, rows: list[list[Any]]) -> bytes:
+        text = io.StringIO()
+        csv.writer(text).writerows(rows)
+        return text.getvalue().encode()
+
+    def _row_group(self) -> bytes:
+        import pyarrow as pa
+
+        self._parquet.write_table(pa.Table.from_pylist(self._pending, schema=self._schema))
+        self._pending = []
+        return self._buffer.drain()
+
+
+async def export_stream(
+    tenant_id: int, request: ExportRequest, progress: ExportProgress | None = None
+) -> AsyncIterator[bytes]:
+    """The export file as a stream of bytes - an error ends it without a trailer, so it never looks complete"""
+    writer = ExportWriter(request)
+    if data := writer.begin():
+        yield data
+    async for rows in export_rows(tenant_id, request, progress):
+        if data := writer.write(rows):
+            yield data
+    yield writer.finish()
+
+
+async def export_to_file(tenant_id: int, request: ExportRequest, file: Any, progress: ExportProgress) -> None:
+    """
+    Write the export to a binary file
+
+    On a database error the file is still closed properly (complete up to
+    progress.cursor) before the error propagates, so the rest can be fetched
+    with --cursor into a second file.
+    """
+    writer = ExportWriter(request)
+    file.write(writer.begin())
+    try:
+        async for rows in export_rows(tenant_id, request, progress):
+            file.write(writer.write(rows))
+    finally:
+        file.write(writer.finish())
+
+
+@click.command()
+@click.argument("table", type=click.Choice(tuple(EXPORT_COLUMNS)))
+@click.option("--tenant-id", type=int, required=True)
+@click.option("--format", "export_format", type=click.Choice(FORMATS), default="ndjson", show_default=True)
+@click.option("--compression", type=click.Choice(COMPRESSIONS), default="gzip", show_default=True)
+@click.option("--since", type=click.DateTime(), default=None, help="created_at lower bound (inclusive)")
+@click.option("--until", type=click.DateTime(), default=None, help="created_at upper bound (exclusive, default now)")
+@click.option("--cursor", default=None, help="Continue after this '<created_at>,<id>'")
+@click.option("--output", type=click.Path(dir_okay=False, allow_dash=True), default="-", show_default=True)
+def main(
+    table: str, tenant_id: int, export_format: str, compression: str,
+    since: datetime | None, until: datetime | None, cursor: str | None, output: str,
+) -> None:
+    """Export a tenant's conversations or messages (reads through RLS with DATABASE_URL_APP)"""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        request = ExportRequest.resolve(table, export_format, compression, since, until, cursor)
+    except (ValueError, ExportFormatUnavailable) as error:
+        raise click.UsageError(str(error)) from error
+    progress = ExportProgress()
+    file = sys.stdout.buffer if output == "-" else open(output, "wb")
+    try:
+        asyncio.run(export_to_file(tenant_id, request, file, progress))
+    except Exception as error:
+        resume = f" - continue with --cursor {progress.cursor} --until {request.until.isoformat()}" if progress.cursor else ""
+        raise click.ClickException(f"Export stopped after {progress.rows} rows ({error}){resume}") from error
+    finally:
+        if file is not sys.stdout.buffer:
+            file.close()
+    seconds = time.monotonic() - progress.started
+    click.echo(json.dumps({"rows": progress.rows, "cursor": str(progress.cursor or ""), "seconds": round(seconds, 1)}), err=True)
+
+
+if __name__ == "__main__":
+    main()
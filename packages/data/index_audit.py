@@ -0,0 +1,573 @@
+# packages/data/index_audit.py
+# Index audit: redundant, unused and missing indexes, and migrations that fix them online
+# Run with the admin connection against the primary (and each replica - scan counts are per server):
+#
+#   python -m packages.data.index_audit report
+#   python -m packages.data.index_audit report --workload '/var/log/clever/workload-*.ndjson' --json
+#   python -m packages.data.index_audit generate --unused --missing -m "Tune indexes"
+#
+# Inputs:
+# - Base.metadata: the indexes the models declare (drift against the database is reported)
+# - pg_index / pg_stat_user_indexes: what exists, its size, scans since the stats reset
+#   (partitioned indexes summed over their partitions)
+# - a recorded workload: NDJSON from DB_WORKLOAD_LOG (packages/core/database.py) and/or
+#   pg_stat_statements when the extension is installed. Every statement gets a generic
+#   EXPLAIN (nothing is executed); sequential scans of large tables become missing-index
+#   suggestions, index scans count as usage weighted by calls
+#
+# Redundant = a btree whose key columns are a leading prefix of another btree on the
+# same table (ix_messages_tenant_id next to ix_messages_tenant_conversation, ix_users_id
+# next to the primary key). Unique and constraint indexes are never redundant unless an
+# identical unique index exists. Every write maintains every index: a redundant one
+# costs insert time and cache memory and serves nothing the wider index doesn't.
+#
+# Generated migrations create and drop CONCURRENTLY outside the migration transaction
+# (packages/data/online_ddl.py), so writes never stall behind them.
+
+import glob
+import json
+import logging
+import os
+import re
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import click
+from sqlalchemy import Connection, create_engine, text
+from sqlalchemy.exc import DBAPIError
+
+from packages.core.models import Base
+
+logger = logging.getLogger(__name__)
+
+# Sequential scans of smaller tables are cheaper than any index - no suggestion below this
+MIN_ROWS_FOR_MISSING = 10_000
+
+# Operators that make a column a good leading (equality) or trailing (range) index key
+_PREDICATE = re.compile(
+    r"\(*(\w+)\)?(?:::[\w ]+?)?\)?\s+(=|= ANY|IS NULL|>=|<=|>|<|~~)\s"
+)
+
+
+@dataclass
+class IndexInfo:
+    """One index as the database has it - partitioned indexes summed over their partitions"""
+    name: str
+    table: str
+    columns: tuple[str, ...]
+    method: str
+    unique: bool
+    primary: bool
+    constraint: bool          # Backs a PRIMARY KEY / UNIQUE / EXCLUDE constraint
+    partial: bool
+    expression: bool
+    valid: bool
+    size_bytes: int
+    scans: int
+    declared: bool = False    # In Base.metadata (primary keys count as declared)
+    workload_calls: int = 0   # Workload statements whose plan uses it, weighted by calls
+
+
+@dataclass
+class Statement:
+    """A workload statement with its totals"""
+    sql: str
+    calls: int
+    total_seconds: float
+
+
+@dataclass
+class MissingIndex:
+    """Columns a sequential scan filtered on, and the workload share it costs"""
+    table: str
+    columns: tuple[str, ...]
+    calls: int = 0
+    total_seconds: float = 0.0
+    example: str = ""
+
+    @property
+    def name(self) -> str:
+        # The models' naming: ix_conversations_tenant_user for (tenant_id, user_id)
+        keys = [column.removesuffix("_id") for column in self.columns]
+        return f"ix_{self.table}_{'_'.join(keys)}"[:63]
+
+
+@dataclass
+class AuditReport:
+    stats_since: str | None
+    indexes: list[IndexInfo]
+    redundant: list[tuple[IndexInfo, IndexInfo]]        # (redundant, covered by)
+    unused: list[IndexInfo]
+    missing: list[MissingIndex]
+    declared_missing: list[str]                          # In the models, not in the database
+    undeclared: list[str]                                # In the database, not in the models
+    statements: int = 0
+    unplannable: list[str] = field(default_factory=list)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "stats_since": self.stats_since,
+            "redundant": [{"index": index.name, "table": index.table, "columns": index.columns,
+                           "size_bytes": index.size_bytes, "scans": index.scans, "covered_by": wider.name}
+                          for index, wider in self.redundant],
+            "unused": [{"index": index.name, "table": index.table, "columns": index.columns,
+                        "size_bytes": index.size_bytes} for index in self.unused],
+            "missing": [{"name": missing.name, **asdict(missing)} for missing in self.missing],
+            "declared_missing": self.declared_missing,
+            "undeclared": self.undeclared,
+            "workload": {"statements": self.statements, "unplannable": len(self.unplannable)},
+            "indexes": [asdict(index) for index in self.indexes],
+        }
+
+
+# --- Catalog ---
+
+_INDEXES_SQL = text("""
+    SELECT i.relname, t.relname, am.amname, x.indisunique, x.indisprimary,
+           EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.oid AND c.contype IN ('p', 'u', 'x')),
+           x.indpred IS NOT NULL, x.indexprs IS NOT NULL, x.indisvalid,
+           ARRAY(SELECT pg_get_indexdef(i.oid, k, true) FROM generate_series(1, x.indnkeyatts) AS k),
+           -- pg_partition_tree() is empty for an index that isn't partitioned: add the index itself
+           (SELECT coalesce(sum(pg_relation_size(tree.relid)), 0)
+              FROM (SELECT i.oid AS relid UNION SELECT relid FROM pg_partition_tree(i.oid)) AS tree),
+           (SELECT coalesce(sum(s.idx_scan), 0)
+              FROM (SELECT i.oid AS relid UNION SELECT relid FROM pg_partition_tree(i.oid)) AS tree
+              JOIN pg_stat_user_indexes s ON s.indexrelid = tree.relid)
+    FROM pg_index x
+    JOIN pg_class i ON i.oid = x.indexrelid
+    JOIN pg_class t ON t.oid = x.indrelid
+    JOIN pg_am am ON am.oid = i.relam
+    WHERE t.relnamespace = 'public'::regnamespace AND t.relkind IN ('r', 'p')
+      AND NOT t.relispartition AND NOT i.relispartition
+    ORDER BY t.relname, i.relname
+""")
+
+
+def load_indexes(connection: Connection) -> list[IndexInfo]:
+    declared = {index.name for table in Base.metadata.tables.values() for index in table.indexes}
+    indexes = []
+    for row in connection.execute(_INDEXES_SQL):
+        info = IndexInfo(row[0], row[1], tuple(row[9]), row[2], row[3], row[4], row[5], row[6], row[7], row[8],
+                         int(row[10]), int(row[11]))
+        info.declared = info.name in declared or info.primary
+        indexes.append(info)
+    return indexes
+
+
+def stats_since(connection: Connection) -> str | None:
+    """Start of the scan-count window (None = since the server started collecting)"""
+    reset = connection.scalar(text("SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()"))
+    return reset.isoformat() if reset else None
+
+
+def _partition_parents(connection: Connection) -> dict[str, str]:
+    """Partition (table or index) name -> top-level parent name"""
+    rows = connection.execute(text("""
+        SELECT root.relname, leaf.relname
+        FROM pg_class root, pg_partition_tree(root.oid) AS tree
+        JOIN pg_class leaf ON leaf.oid = tree.relid
+        WHERE root.relnamespace = 'public'::regnamespace AND root.relkind IN ('p', 'I')
+          AND NOT root.relispartition AND tree.relid <> root.oid
+    """)).all()
+    return {leaf: root for root, leaf in rows}
+
+
+def _table_rows(connection: Connection) -> dict[str, float]:
+    """Estimated rows per top-level table (partitions summed)"""
+    rows = connection.execute(text("""
+        SELECT root.relname, CASE root.relkind WHEN 'r' THEN greatest(root.reltuples, 0) ELSE
+               (SELECT sum(greatest(leaf.reltuples, 0)) FROM pg_partition_tree(root.oid) AS tree
+                JOIN pg_class leaf ON leaf.oid = tree.relid) END
+        FROM pg_class root
+        WHERE root.relnamespace = 'public'::regnamespace AND root.relkind IN ('r', 'p') AND NOT root.relispartition
+    """)).all()
+    return {table: float(count or 0) for table, count in rows}
+
+
+# --- Redundant / unused / drift ---
+
+def _covers(wider: IndexInfo, index: IndexInfo) -> bool:
+    if wider is index or wider.table != index.table or wider.method != "btree" or wider.partial or not wider.valid:
+        return False
+    if wider.columns[:len(index.columns)] != index.columns:
+        return False
+    if index.unique and not (wider.unique and wider.columns == index.columns):
+        return False                      # The narrower index enforces uniqueness
+    if wider.columns == index.columns:
+        # Identical keys: keep the constraint / unique / declared one, else the first by name
+        rank = lambda info: (info.constraint, info.unique, info.declared, info.name < index.name)  # noqa: E731
+        return rank(wider) > rank(index) or (rank(wider) == rank(index) and wider.name < index.name)
+    return True
+
+
+def find_redundant(indexes: list[IndexInfo]) -> list[tuple[IndexInfo, IndexInfo]]:
+    """(index, wider index that makes it redundant) - plain btrees on columns only"""
+    redundant = []
+    for index in indexes:
+        if index.constraint or index.method != "btree" or index.partial or index.expression:
+            continue
+        wider = [other for other in indexes if _covers(other, index)]
+        if wider:
+            # The widest-used candidate is the one that will absorb the scans
+            redundant.append((index, max(wider, key=lambda other: (other.scans, -len(other.columns)))))
+    return redundant
+
+
+def find_unused(indexes: list[IndexInfo], redundant: list[tuple[IndexInfo, IndexInfo]]) -> list[IndexInfo]:
+    """No scans since the stats reset and no workload statement plans with it"""
+    already = {index.name for index, _ in redundant}
+    return [
+        index for index in indexes
+        if not index.scans and not index.workload_calls and not index.unique and not index.constraint
+        and index.valid and index.name not in already
+    ]
+
+
+def drift(indexes: list[IndexInfo]) -> tuple[list[str], list[str]]:
+    existing = {index.name for index in indexes}
+    declared = {index.name for table in Base.metadata.tables.values() for index in table.indexes}
+    undeclared = sorted(index.name for index in indexes if not index.declared and not index.constraint)
+    return sorted(declared - existing), undeclared
+
+
+# --- Workload ---
+
+def load_workload(patterns: tuple[str, ...]) -> list[Statement]:
+    """NDJSON files written by WorkloadRecorder (glob patterns; per-worker files are merged)"""
+    merged: dict[str, Statement] = {}
+    for pattern in patterns:
+        paths = sorted(glob.glob(pattern)) or [pattern]
+        for path in paths:
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    statement = merged.setdefault(entry["sql"], Statement(entry["sql"], 0, 0.0))
+                    statement.calls += int(entry.get("calls", 1))
+                    statement.total_seconds += float(entry.get("total_seconds", 0.0))
+    return list(merged.values())
+
+
+def pg_stat_statements_workload(connection: Connection, top: int) -> list[Statement]:
+    """The most expensive statements of this database, if pg_stat_statements is installed"""
+    installed = connection.scalar(text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements')"))
+    if not installed:
+        return []
+    rows = connection.execute(text("""
+        SELECT query, calls, total_exec_time / 1000 FROM pg_stat_statements
+        WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+        ORDER BY total_exec_time DESC LIMIT :top
+    """), {"top": top}).all()
+    return [Statement(query, int(calls), float(seconds)) for query, calls, seconds in rows]
+
+
+def _plannable(sql: str) -> bool:
+    return sql.lstrip().split(None, 1)[0].upper() in ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT") if sql.strip() else False
+
+
+def explain_generic(connection: Connection, sql: str) -> dict[str, Any]:
+    """
+    Generic plan of a parameterized statement without running it: PREPARE, then EXPLAIN
+    EXECUTE with NULL for every $n under force_generic_plan (so the NULLs don't shape it)
+    """
+    parameters = max((int(number) for number in re.findall(r"\$(\d+)", sql)), default=0)
+    arguments = f"({', '.join(['NULL'] * parameters)})" if parameters else ""
+    try:
+        with connection.begin_nested():
+            connection.exec_driver_sql("SET LOCAL plan_cache_mode = force_generic_plan")
+            connection.exec_driver_sql("SET LOCAL statement_timeout = '5s'")
+            connection.exec_driver_sql(f"PREPARE index_audit_statement AS {sql}")
+            plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) EXECUTE index_audit_statement{arguments}").scalar()
+    finally:
+        # Prepared statements outlive a rolled back savepoint
+        connection.exec_driver_sql("DEALLOCATE ALL")
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+
+
+def _nodes(plan: dict[str, Any]):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from _nodes(child)
+
+
+def _filter_columns(condition: str, columns: set[str]) -> tuple[str, ...]:
+    """Equality columns first (tenant_id leading), then the first range column"""
+    equality: list[str] = []
+    ranges: list[str] = []
+    for column, operator in _PREDICATE.findall(condition):
+        if column not in columns:
+            continue
+        target = ranges if operator in (">=", "<=", ">", "<", "~~") else equality
+        if column not in target:
+            target.append(column)
+    equality.sort(key=lambda column: column != "tenant_id")
+    keys = equality + [column for column in ranges[:1] if column not in equality]
+    return tuple(keys)
+
+
+def analyze_workload(
+    connection: Connection, statements: list[Statement], indexes: list[IndexInfo], min_rows: int = MIN_ROWS_FOR_MISSING
+) -> tuple[list[MissingIndex], list[str]]:
+    """Count index usage into `indexes`; returns (missing-index suggestions, unplannable statements)"""
+    parents = _partition_parents(connection)
+    rows = _table_rows(connection)
+    by_name = {index.name: index for index in indexes}
+    table_columns = {name: {column.name for column in table.columns} for name, table in Base.metadata.tables.items()}
+    missing: dict[tuple[str, tuple[str, ...]], MissingIndex] = {}
+    unplannable = []
+    for statement in statements:
+        if not _plannable(statement.sql):
+            continue
+        try:
+            plan = explain_generic(connection, statement.sql)
+        except DBAPIError as error:
+            unplannable.append(statement.sql)
+            logger.debug("Can't plan %s: %s", statement.sql[:80], error.orig)
+            continue
+        used: set[str] = set()
+        for node in _nodes(plan):
+            if "Index Name" in node:
+                used.add(parents.get(node["Index Name"], node["Index Name"]))
+            if node.get("Node Type") != "Seq Scan" or "Filter" not in node:
+                continue
+            table = parents.get(node["Relation Name"], node["Relation Name"])
+            if rows.get(table, 0) < min_rows or table not in table_columns:
+                continue
+            columns = _filter_columns(node["Filter"], table_columns[table])
+            if not columns or _served(indexes, table, columns):
+                continue
+            suggestion = missing.setdefault((table, columns), MissingIndex(table, columns, example=statement.sql))
+            suggestion.calls += statement.calls
+            suggestion.total_seconds += statement.total_seconds
+        for name in used:
+            if name in by_name:
+                by_name[name].workload_calls += statement.calls
+    ranked = sorted(missing.values(), key=lambda suggestion: suggestion.total_seconds, reverse=True)
+    return ranked, unplannable
+
+
+def _served(indexes: list[IndexInfo], table: str, columns: tuple[str, ...]) -> bool:
+    """An existing btree already leads with these columns - the planner chose the scan on selectivity"""
+    return any(
+        index.table == table and index.method == "btree" and not index.partial
+        and index.columns[:len(columns)] == columns
+        for index in indexes
+    )
+
+
+def audit(connection: Connection, statements: list[Statement], min_rows: int = MIN_ROWS_FOR_MISSING) -> AuditReport:
+    indexes = load_indexes(connection)
+    missing, unplannable = analyze_workload(connection, statements, indexes, min_rows) if statements else ([], [])
+    redundant = find_redundant(indexes)
+    declared_missing, undeclared = drift(indexes)
+    return AuditReport(
+        stats_since=stats_since(connection),
+        indexes=indexes,
+        redundant=redundant,
+        unused=find_unused(indexes, redundant),
+        missing=missing,
+        declared_missing=declared_missing,
+        undeclared=undeclared,
+        statements=len(statements),
+        unplannable=unplannable,
+    )
+
+
+# --- Migration generator ---
+
+MIGRATION_TEMPLATE = '''"""{message}
+
+Revision ID: {revision}
+Revises: {down_revision}
+Create Date: {created}
+
+Generated by `python -m packages.data.index_audit generate`:
+{summary}
+
+Built and dropped CONCURRENTLY outside the migration transaction
+(packages/data/online_ddl.py): writes continue throughout, and a rerun after an
+interruption finishes what is left.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+from packages.data.online_ddl import create_index_online, drop_index_online
+
+
+# revision identifiers, used by Alembic.
+revision: str = "{revision}"
+down_revision: Union[str, Sequence[str], None] = "{down_revision}"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+{upgrade}
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+{downgrade}
+'''
+
+
+def _create_call(name: str, table: str, columns: tuple[str, ...], unique: bool = False, using: str = "btree") -> str:
+    options = (", unique=True" if unique else "") + (f', using="{using}"' if using != "btree" else "")
+    return f'        create_index_online(connection, "{name}", "{table}", {json.dumps(list(columns))}{options})'
+
+
+def render_migration(
+    message: str, revision: str, down_revision: str, drops: list[IndexInfo], creates: list[MissingIndex],
+    reasons: dict[str, str],
+) -> str:
+    upgrade = [f'        drop_index_online(connection, "{index.name}")' for index in drops]
+    upgrade += [_create_call(missing.name, missing.table, missing.columns) for missing in creates]
+    downgrade = [f'        drop_index_online(connection, "{missing.name}")' for missing in reversed(creates)]
+    downgrade += [_create_call(index.name, index.table, index.columns, index.unique, index.method) for index in reversed(drops)]
+    summary = [f"- drop {index.name} ({', '.join(index.columns)}): {reasons[index.name]}" for index in drops]
+    summary += [f"- create {missing.name}: {missing.calls} workload calls scanned {missing.table} sequentially"
+                for missing in creates]
+    return MIGRATION_TEMPLATE.format(
+        message=message, revision=revision, down_revision=down_revision,
+        created=datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"), summary="\n".join(summary),
+        upgrade="\n".join(upgrade), downgrade="\n".join(downgrade),
+    )
+
+
+def _head_revision() -> str:
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    head = ScriptDirectory.from_config(Config("alembic.ini")).get_current_head()
+    if head is None:
+        raise click.ClickException("No alembic head revision found (run from the repository root)")
+    return head
+
+
+# --- CLI ---
+
+def _sync_url() -> str:
+    url = os.getenv("DATABASE_URL_SYNC") or os.getenv("DATABASE_URL", "").replace("postgresql+asyncpg://", "postgresql://")
+    if not url:
+        raise click.UsageError("DATABASE_URL_SYNC is not set")
+    return url
+
+
+def _size(size_bytes: int) -> str:
+    for unit in ("B", "kB", "MB", "GB"):
+        if size_bytes < 1024 or unit == "GB":
+            return f"{size_bytes:.0f} {unit}" if unit == "B" else f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024
+    return ""
+
+
+def _run_audit(workload: tuple[str, ...], pg_stat_statements: int, min_rows: int) -> AuditReport:
+    statements = load_workload(workload) if workload else []
+    with create_engine(_sync_url()).connect() as connection:
+        statements += pg_stat_statements_workload(connection, pg_stat_statements) if pg_stat_statements else []
+        report = audit(connection, statements, min_rows)
+        connection.rollback()
+    return report
+
+
+_workload_options = [
+    click.option("--workload", multiple=True, help="Recorded workload NDJSON (DB_WORKLOAD_LOG), glob patterns allowed"),
+    click.option("--pg-stat-statements", default=200, show_default=True,
+                 help="Also plan the top N statements of pg_stat_statements if installed (0 = skip)"),
+    click.option("--min-rows", default=MIN_ROWS_FOR_MISSING, show_default=True,
+                 help="Smallest table a sequential scan is reported for"),
+]
+
+
+def workload_options(command: Any) -> Any:
+    for option in reversed(_workload_options):
+        command = option(command)
+    return command
+
+
+@click.group()
+def main() -> None:
+    """Audit indexes against the models, scan statistics and a recorded workload"""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    logging.getLogger("alembic").setLevel(logging.WARNING)
+
+
+@main.command()
+@workload_options
+@click.option("--json", "as_json", is_flag=True, help="Machine-readable output")
+def report(workload: tuple[str, ...], pg_stat_statements: int, min_rows: int, as_json: bool) -> None:
+    """Redundant, unused and missing indexes, plus drift between the models and the database"""
+    result = _run_audit(workload, pg_stat_statements, min_rows)
+    if as_json:
+        click.echo(json.dumps(result.as_dict(), indent=2, default=str))
+        return
+    click.echo(f"Scan counts since {result.stats_since or 'the server started'}; "
+               f"{result.statements} workload statements ({len(result.unplannable)} could not be planned)")
+    click.echo("\nRedundant - key columns are a prefix of another index:")
+    for index, wider in result.redundant:
+        click.echo(f"  {index.table}.{index.name} ({', '.join(index.columns)}) {_size(index.size_bytes)}, "
+                   f"{index.scans} scans -> {wider.name} ({', '.join(wider.columns)})")
+    click.echo("\nUnused - no scans since the stats reset, not in any workload plan:")
+    for index in result.unused:
+        click.echo(f"  {index.table}.{index.name} ({', '.join(index.columns)}) {_size(index.size_bytes)}")
+    click.echo("\nMissing - sequential scans of large tables in the workload:")
+    for missing in result.missing:
+        click.echo(f"  {missing.table} ({', '.join(missing.columns)}) {missing.calls} calls, "
+                   f"{missing.total_seconds:.1f}s - {' '.join(missing.example.split())[:100]}")
+    if result.declared_missing or result.undeclared:
+        click.echo("\nDrift:")
+        for name in result.declared_missing:
+            click.echo(f"  {name}: declared in the models, missing in the database")
+        for name in result.undeclared:
+            click.echo(f"  {name}: in the database, not declared in the models")
+
+
+@main.command()
+@workload_options
+@click.option("--redundant/--no-redundant", default=True, show_default=True, help="Drop redundant indexes")
+@click.option("--unused", is_flag=True, help="Also drop unused indexes (check every replica's scans first)")
+@click.option("--missing", is_flag=True, help="Create the suggested missing indexes")
+@click.option("-m", "--message", default="Tune indexes", show_default=True)
+@click.option("--versions-dir", default="migrations/versions", show_default=True, type=click.Path(file_okay=False))
+def generate(
+    workload: tuple[str, ...], pg_stat_statements: int, min_rows: int, redundant: bool, unused: bool, missing: bool,
+    message: str, versions_dir: str,
+) -> None:
+    """Write an alembic migration that applies the audit with CREATE/DROP INDEX CONCURRENTLY"""
+    result = _run_audit(workload, pg_stat_statements, min_rows)
+    reasons: dict[str, str] = {}
+    if redundant:
+        reasons.update({index.name: f"covered by {wider.name}" for index, wider in result.redundant})
+    if unused:
+        reasons.update({index.name: f"no scans since {result.stats_since or 'the server started'}"
+                        for index in result.unused if index.name not in reasons})
+    drops = [index for index in result.indexes if index.name in reasons]
+    creates = result.missing if missing else []
+    if not drops and not creates:
+        click.echo("Nothing to change")
+        return
+    revision = uuid.uuid4().hex[:12]
+    slug = re.sub(r"[^a-z0-9]+", "_", message.lower()).strip("_")[:40]
+    path = Path(versions_dir) / f"{datetime.now():%Y_%m_%d_%H%M}-{revision}_{slug}.py"
+    path.write_text(render_migration(message, revision, _head_revision(), drops, creates, reasons), encoding="utf-8")
+    click.echo(f"Wrote {path}")
+    declared = [index.name for index in drops if index.declared]
+    if declared:
+        click.echo(f"Declared in packages/core/models.py - remove them there too: {', '.join(declared)}")
+    if creates:
+        click.echo("Declare the new indexes in packages/core/models.py: " + ", ".join(m.name for m in creates))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+# packages/data/indexer.py
+# Embedding indexer: new messages -> chunks -> batched embeddings -> vector store (Qdrant)
+# Runs next to the apps (or from cron) with the admin connection:
+#
+#   python -m packages.data.indexer run --follow          # tail new messages until stopped
+#   python -m packages.data.indexer run                   # one pass up to now, then exit
+#   python -m packages.data.indexer backfill --restart    # re-embed history (new model or collection)
+#   python -m packages.data.indexer status
+#
+# Why a separate indexer instead of embedding in the chat request?
+# - One embedding call per message puts a provider round trip on every turn and pays
+#   per-request overhead for a few dozen tokens; here a page of messages becomes
+#   batches of --embed-batch chunks, with --concurrency calls in flight
+# - The checkpoint (indexer_checkpoints) moves only after a page's vectors are
+#   upserted: a killed run re-embeds at most one page and never skips one
+#
+# Ids are assigned at INSERT but become visible at COMMIT, so a slow transaction can
+# commit a lower id after a higher one. Rows younger than --settle-seconds wait for
+# the next read; the write-behind buffer holds rows for milliseconds, not seconds.
+#
+# Vectors are keyed by tenant + normalized chunk text: "Thanks!" or a templated bot
+# answer is one point per tenant, not one per message, and is embedded once.
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any
+
+import click
+import numpy as np
+from sqlalchemy import Engine, create_engine, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from packages.caching.response_cache import normalize_prompt
+from packages.caching.vector_index import NumpyIndex, QdrantIndex, VectorIndex
+from packages.core.config import Settings, get_settings
+from packages.core.embeddings import Embedder, create_embedder
+from packages.core.enums import MessageType
+from packages.core.metrics import metrics
+from packages.core.models import IndexerCheckpoint, Message, utc_now
+
+logger = logging.getLogger(__name__)
+
+messages_counter = metrics.counter("indexer_messages_total", "Messages read by the embedding indexer")
+chunks_counter = metrics.counter("indexer_chunks_total", "Chunks by result (embedded, duplicate, too_short)")
+embed_histogram = metrics.histogram("indexer_embed_seconds", "One embedding call of the indexer")
+
+TAIL = "messages"
+BACKFILL = "backfill"
+BACKENDS = ("qdrant", "numpy")
+
+# Debug, test and system messages are nothing an answer should be grounded on
+INDEXED_TYPES = (MessageType.USER, MessageType.ASSISTANT, MessageType.HUMAN_AGENT)
+
+
+def vector_partition(tenant_id: int) -> str:
+    """Vector store partition of a tenant's messages - the tenant isolation boundary for retrieval"""
+    return f"{tenant_id}:messages"
+
+
+def split_words(text: str, size: int, overlap: int) -> list[str]:
+    """
+    Windows of `size` words, each repeating the last `overlap` words of the one before
+
+    Most chat messages are one window. Words instead of tokens: no tokenizer per
+    chunk, and 200 words stay far below any embedding model's input limit.
+    """
+    words = text.split()
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    step = size - overlap
+    return [" ".join(words[start:start + size]) for start in range(0, len(words) - overlap, step)]
+
+
+@dataclass(frozen=True)
+class Chunk:
+    partition: str
+    key: str                     # Hash of the normalized text: same text, same point
+    text: str
+    payload: dict[str, Any]
+
+
+class RecentKeys:
+    """(partition, key) pairs embedded lately - LRU, so frequent duplicates stay remembered"""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._keys: OrderedDict[tuple[str, str], None] = OrderedDict()
+
+    def __contains__(self, item: tuple[str, str]) -> bool:
+        if item not in self._keys:
+            return False
+        self._keys.move_to_end(item)
+        return True
+
+    def add(self, item: tuple[str, str]) -> None:
+        self._keys[item] = None
+        self._keys.move_to_end(item)
+        while len(self._keys) > self.max_size:
+            self._keys.popitem(last=False)
+
+
+@dataclass
+class IndexStats:
+    pages: int = 0
+    messages: int = 0
+    chunks: int = 0
+    duplicates: int = 0
+    last_message_id: int = 0
+
+
+class Indexer:
+    """
+    Reads messages in id order and keeps the vector store in step
+
+    Per page (up to page_size messages older than settle_seconds):
+    1. Split every message into word windows; drop short and duplicate chunks
+    2. Embed in batches of embed_batch chunks, up to `concurrency` calls at once;
+       each batch is upserted as soon as its vectors arrive
+    3. Commit the checkpoint: the last message id of the page
+
+    The next page is read from Postgres while the current one is embedded.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        index: VectorIndex,
+        embedder: Embedder,
+        page_size: int = 2000,
+        embed_batch: int = 128,
+        concurrency: int = 4,
+        chunk_words: int = 200,
+        chunk_overlap: int = 40,
+        min_chars: int = 20,
+        settle_seconds: float = 30.0,
+        recent_keys: int = 100_000,
+        max_attempts: int = 5,
+        save_checkpoints: bool = True,
+    ) -> None:
+        if not 0 <= chunk_overlap < chunk_words:
+            raise ValueError("chunk_overlap must be smaller than chunk_words")
+        self.engine = engine
+        self.index = index
+        self.embedder = embedder
+        self.page_size = page_size
+        self.embed_batch = embed_batch
+        self.chunk_words = chunk_words
+        self.chunk_overlap = chunk_overlap
+        self.min_chars = min_chars
+        self.settle_seconds = settle_seconds
+        self.max_attempts = max_attempts
+        self.save_checkpoints = save_checkpoints
+        self.recent = RecentKeys(recent_keys)
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def run(
+        self,
+        name: str = TAIL,
+        follow: bool = False,
+        poll_seconds: float = 5.0,
+        stop_at: int | None = None,
+        max_pages: int | None = None,
+    ) -> IndexStats:
+        """Index from the checkpoint `name` on; with follow=True keep polling instead of exiting"""
+        stats = IndexStats()
+        after = stats.last_message_id = await asyncio.to_thread(self.checkpoint, name)
+        page = asyncio.create_task(asyncio.to_thread(self._fetch, after, stop_at))
+        try:
+            while max_pages is None or stats.pages < max_pages:
+                rows = await page
+                if not rows:
+                    if not follow:
+                        break
+                    await asyncio.sleep(poll_seconds)
+                    page = asyncio.create_task(asyncio.to_thread(self._fetch, after, stop_at))
+                    continue
+                after = rows[-1].id
+                page = asyncio.create_task(asyncio.to_thread(self._fetch, after, stop_at))
+                chunks, duplicates = self._chunk(rows)
+                await self._index(chunks)
+                if self.save_checkpoints:
+                    await asyncio.to_thread(self._save_checkpoint, name, after, len(rows))
+                messages_counter.inc(len(rows))
+                stats.pages += 1
+                stats.messages += len(rows)
+                stats.chunks += len(chunks)
+                stats.duplicates += duplicates
+                stats.last_message_id = after
+        finally:
+            page.cancel()
+        return stats
+
+    def checkpoint(self, name: str) -> int:
+        with self.engine.connect() as connection:
+            return connection.scalar(
+                select(IndexerCheckpoint.last_message_id).where(IndexerCheckpoint.name == name)
+            ) or 0
+
+    def reset_checkpoint(self, name: str) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(IndexerCheckpoint)
+                .where(IndexerCheckpoint.name == name)
+                .values(last_message_id=0, indexed_messages=0, updated_at=utc_now())
+            )
+
+    def _save_checkpoint(self, name: str, last_message_id: int, messages: int) -> None:
+        statement = pg_insert(IndexerCheckpoint).values(
+            name=name, last_message_id=last_message_id, indexed_messages=messages, updated_at=utc_now()
+        )
+        with self.engine.begin() as connection:
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=[IndexerCheckpoint.name],
+                set_={
+                    "last_message_id": statement.excluded.last_message_id,
+                    "indexed_messages": IndexerCheckpoint.indexed_messages + messages,
+                    "updated_at": statement.excluded.updated_at,
+                },
+            ))
+
+    def _fetch(self, after_id: int, stop_at: int | None) -> Sequence[Any]:
+        cutoff = utc_now() - timedelta(seconds=self.settle_seconds)
+        query = (
+            select(
+                Message.id, Message.tenant_id, Message.conversation_id,
+                Message.message_type, Message.created_at, Message.content,
+            )
+            .where(Message.id > after_id)
+            .where(Message.message_type.in_(INDEXED_TYPES))
+            .order_by(Message.id)
+            .limit(self.page_size)
+        )
+        if stop_at is not None:
+            query = query.where(Message.id <= stop_at)
+        with self.engine.connect() as connection:
+            rows = connection.execute(query).all()
+        # Cut at the first unsettled row - everything after it waits for the next read too
+        for position, row in enumerate(rows):
+            if row.created_at >= cutoff:
+                return rows[:position]
+        return rows
+
+    def _chunk(self, rows: Sequence[Any]) -> tuple[list[Chunk], int]:
+        """New chunks of a page, plus how many were duplicates"""
+        chunks: dict[tuple[str, str], Chunk] = {}
+        duplicates = 0
+        for row in rows:
+            partition = vector_partition(row.tenant_id)
+            for number, text in enumerate(split_words(row.content, self.chunk_words, self.chunk_overlap)):
+                if len(text) < self.min_chars:
+                    chunks_counter.inc(result="too_short")
+                    continue
+                key = hashlib.sha256(normalize_prompt(text).encode()).hexdigest()[:32]
+                if (partition, key) in chunks or (partition, key) in self.recent:
+                    duplicates += 1
+                    chunks_counter.inc(result="duplicate")
+                    continue
+                chunks[(partition, key)] = Chunk(partition, key, text, {
+                    "tenant_id": row.tenant_id,
+                    "message_id": row.id,
+                    "conversation_id": row.conversation_id,
+                    "message_type": row.message_type,
+                    "created_at": row.created_at.isoformat(),
+                    "chunk": number,
+                    "text": text,
+                })
+        return list(chunks.values()), duplicates
+
+    async def _index(self, chunks: list[Chunk]) -> None:
+        # A failed batch cancels the rest of the page; the checkpoint stays where it was
+        async with asyncio.TaskGroup() as group:
+            for start in range(0, len(chunks), self.embed_batch):
+                group.create_task(self._embed_and_upsert(chunks[start:start + self.embed_batch]))
+
+    async def _embed_and_upsert(self, batch: list[Chunk]) -> None:
+        async with self._slots:
+            vectors = await self._embed([chunk.text for chunk in batch])
+            await self.index.upsert(
+                [chunk.partition for chunk in batch],
+                [chunk.key for chunk in batch],
+                vectors,
+                [chunk.payload for chunk in batch],
+            )
+        for chunk in batch:
+            self.recent.add((chunk.partition, chunk.key))
+        chunks_counter.inc(len(batch), result="embedded")
+
+    async def _embed(self, texts: list[str]) -> np.ndarray:
+        """One embedding call, retried with exponential backoff (rate limits, timeouts)"""
+        for attempt in range(1, self.max_attempts + 1):
+            started = time.perf_counter()
+            try:
+                vectors = await self.embedder.embed(texts)
+            except Exception:
+                if attempt == self.max_attempts:
+                    raise
+                delay = min(30.0, 2.0 ** attempt)
+                logger.warning(
+                    "Indexer: embedding %d chunks failed (attempt %d), retrying in %.0fs",
+                    len(texts), attempt, delay, exc_info=True,
+                )
+                await asyncio.sleep(delay)
+                continue
+            embed_histogram.observe(time.perf_counter() - started)
+            return vectors
+        raise AssertionError("unreachable")
+
+
+def create_vector_store(settings: Settings, backend: str = "qdrant") -> VectorIndex:
+    """The message vector store: the QDRANT_COLLECTION_NAME collection, or an in-memory stand-in"""
+    if backend == "numpy":
+        return NumpyIndex(settings.embedding_dim)
+    return QdrantIndex.from_url(
+        settings.qdrant_url, settings.qdrant_api_key, settings.qdrant_collection_name, settings.embedding_dim
+    )
+
+
+def _engine() -> Engine:
+    url = os.getenv("DATABASE_URL_SYNC") or os.getenv("DATABASE_URL", "").replace("postgresql+asyncpg://", "postgresql://")
+    if not url:
+        raise click.UsageError("DATABASE_URL_SYNC is not set")
+    return create_engine(url)
+
+
+def _indexer(backend: str, page_size: int, embed_batch: int, concurrency: int, settle_seconds: float) -> Indexer:
+    settings = get_settings()
+    # Same embedder choice as the semantic cache: the offline provider never needs API keys
+    model = "hashing" if settings.llm_provider == "fake" else settings.embedding_model
+    return Indexer(
+        _engine(),
+        create_vector_store(settings, backend),
+        create_embedder(model, settings.embedding_dim),
+        page_size=page_size,
+        embed_batch=embed_batch,
+        concurrency=concurrency,
+        settle_seconds=settle_seconds,
+        # The in-memory store is gone when the process exits - moving the checkpoint would skip messages
+        save_checkpoints=backend != "numpy",
+    )
+
+
+def _indexer_options(command: Any) -> Any:
+    options = (
+        click.option("--backend", type=click.Choice(BACKENDS), default="qdrant", show_default=True,
+                     envvar="INDEXER_BACKEND", help="numpy = in-memory stand-in, checkpoints untouched (dry runs)"),
+        click.option("--page-size", default=2000, show_default=True, help="Messages read per query"),
+        click.option("--embed-batch", default=128, show_default=True, envvar="INDEXER_EMBED_BATCH",
+                     help="Chunks per embedding call"),
+        click.option("--concurrency", default=4, show_default=True, envvar="INDEXER_CONCURRENCY",
+                     help="Embedding calls in flight"),
+        click.option("--settle-seconds", default=30.0, show_default=True, envvar="INDEXER_SETTLE_SECONDS",
+                     help="Leave messages this young for the next read"),
+        click.option("--max-pages", type=int, default=None, help="Stop after this many pages"),
+    )
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+
+@click.group()
+def main() -> None:
+    """Embed conversation messages into the vector store"""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+
+@main.command()
+@_indexer_options
+@click.option("--follow", is_flag=True, help="Keep polling for new messages instead of exiting")
+@click.option("--poll-seconds", default=5.0, show_default=True, help="Pause between polls once caught up")
+def run(
+    backend: str, page_size: int, embed_batch: int, concurrency: int, settle_seconds: float,
+    max_pages: int | None, follow: bool, poll_seconds: float,
+) -> None:
+    """Index new messages from the checkpoint on (a first run indexes the whole history)"""
+    indexer = _indexer(backend, page_size, embed_batch, concurrency, settle_seconds)
+    started = time.monotonic()
+    stats = asyncio.run(indexer.run(TAIL, follow, poll_seconds, max_pages=max_pages))
+    click.echo(json.dumps({**stats.__dict__, "seconds": round(time.monotonic() - started, 1)}))
+
+
+@main.command()
+@_indexer_options
+@click.option("--restart", is_flag=True, help="Start over from the first message")
+def backfill(
+    backend: str, page_size: int, embed_batch: int, concurrency: int, settle_seconds: float,
+    max_pages: int | None, restart: bool,
+) -> None:
+    """Re-embed history up to the tail checkpoint, with its own resumable checkpoint"""
+    indexer = _indexer(backend, page_size, embed_batch, concurrency, settle_seconds)
+    if restart and indexer.save_checkpoints:
+        indexer.reset_checkpoint(BACKFILL)
+    # Everything after the tail checkpoint is the tail's job
+    stop_at = indexer.checkpoint(TAIL)
+    if not stop_at:
+        raise click.UsageError("The tail has never run - `run` indexes the whole history by itself")
+    started = time.monotonic()
+    stats = asyncio.run(indexer.run(BACKFILL, stop_at=stop_at, max_pages=max_pages))
+    click.echo(json.dumps({**stats.__dict__, "stop_at": stop_at, "seconds": round(time.monotonic() - started, 1)}))
+
+
+@main.command()
+def status() -> None:
+    """Checkpoints and how far behind the newest message they are"""
+    with _engine().connect() as connection:
+        newest = connection.scalar(select(func.max(Message.id))) or 0
+        rows = connection.execute(select(IndexerCheckpoint).order_by(IndexerCheckpoint.name)).all()
+    for row in rows:
+        click.echo(
+            f"{row.name:<10} through id {row.last_message_id} ({row.indexed_messages} messages, "
+            f"{newest - row.last_message_id} ids behind) updated {row.updated_at}"
+        )
+    if not rows:
+        click.echo(f"never run - {newest} message ids to index")
+
+
+if __name__ == "__main__":
+    main()
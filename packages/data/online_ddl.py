@@ -0,0 +1,140 @@
+# packages/data/online_ddl.py
+# Schema changes on live tables: short lock waits, indexes built and dropped without blocking writes
+# Used by packages/data/enum_storage.py, packages/data/index_audit.py and the migrations they generate
+#
+# Why a lock_timeout on every DDL statement?
+# - ALTER TABLE / DROP INDEX need a lock that conflicts with running queries. Waiting
+#   for it behind one long query makes every later query queue behind the DDL - a
+#   short timeout plus retries turns that outage into a few retried attempts
+#
+# Why not CREATE INDEX CONCURRENTLY everywhere?
+# - It doesn't work on a partitioned table (or DROP INDEX CONCURRENTLY on a
+#   partitioned index): the parent index is created ON ONLY, each partition's index
+#   concurrently and attached, and a partitioned index is dropped with a plain,
+#   lock-timed DROP INDEX (metadata only, the partitions' indexes go with it)
+#
+# All functions need a connection in autocommit mode: CONCURRENTLY refuses to run
+# in a transaction block (alembic: op.get_context().autocommit_block()).
+
+import logging
+import time
+from collections.abc import Sequence
+
+from sqlalchemy import Connection, text
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+LOCK_TIMEOUT = "3s"
+LOCK_ATTEMPTS = 10
+
+
+def run_ddl(connection: Connection, *statements: str) -> None:
+    """Run statements in one transaction under LOCK_TIMEOUT, retrying when the lock isn't granted in time"""
+    for attempt in range(1, LOCK_ATTEMPTS + 1):
+        try:
+            connection.exec_driver_sql("BEGIN")
+            connection.exec_driver_sql(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+            for statement in statements:
+                connection.exec_driver_sql(statement)
+            connection.exec_driver_sql("COMMIT")
+            return
+        except OperationalError as error:
+            connection.exec_driver_sql("ROLLBACK")
+            if getattr(error.orig, "pgcode", None) != "55P03" or attempt == LOCK_ATTEMPTS:
+                raise
+            logger.info("Lock not granted within %s, retrying (%d/%d)", LOCK_TIMEOUT, attempt, LOCK_ATTEMPTS)
+            time.sleep(min(2 ** attempt, 30))
+
+
+def index_state(connection: Connection, name: str) -> str | None:
+    """"valid", "invalid" (failed concurrent build or parent with unattached partitions) or None"""
+    valid = connection.scalar(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    )
+    return None if valid is None else "valid" if valid else "invalid"
+
+
+def is_partitioned(connection: Connection, relation: str) -> bool:
+    """Partitioned table or partitioned index"""
+    return connection.scalar(
+        text("SELECT relkind IN ('p', 'I') FROM pg_class WHERE oid = to_regclass(:relation)"), {"relation": relation}
+    ) or False
+
+
+def leaf_partitions(connection: Connection, table: str) -> list[str]:
+    """Attached partitions of `table` (DEFAULT included)"""
+    return list(connection.scalars(text("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass(:table)
+        ORDER BY child.relname
+    """), {"table": table}))
+
+
+def _create_concurrently(connection: Connection, name: str, table: str, definition: str, unique: bool) -> None:
+    state = index_state(connection, name)
+    if state == "valid":
+        return
+    if state == "invalid":
+        # Left behind by an interrupted CONCURRENTLY build: unusable, rebuild it
+        connection.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    connection.exec_driver_sql(f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY {name} ON {table} {definition}")
+
+
+def _partition_indexes(connection: Connection, partition: str) -> list[str]:
+    return list(connection.scalars(text("""
+        SELECT index.relname FROM pg_index
+        JOIN pg_class index ON index.oid = pg_index.indexrelid
+        WHERE pg_index.indrelid = to_regclass(:partition)
+    """), {"partition": partition}))
+
+
+def _free_child_name(connection: Connection, name: str) -> str:
+    """
+    Postgres' own naming for partition indexes (messages_p2025_03_tenant_id_idx), with a
+    number appended while the name belongs to an index attached elsewhere - an unattached
+    one is left over from an interrupted run and gets reused
+    """
+    candidate, number = name, 0
+    while connection.scalar(
+        text("SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:name))"), {"name": candidate}
+    ):
+        number += 1
+        candidate = f"{name}{number}"
+    return candidate
+
+
+def create_index_online(
+    connection: Connection, name: str, table: str, columns: Sequence[str], unique: bool = False, using: str = "btree"
+) -> None:
+    """
+    CREATE INDEX CONCURRENTLY, per partition for partitioned tables - idempotent
+    A partitioned parent index turns valid with its last attached partition, and
+    partitions created later get it automatically
+    """
+    started = time.monotonic()
+    definition = f"USING {using} ({', '.join(columns)})"
+    if not is_partitioned(connection, table):
+        _create_concurrently(connection, name, table, definition, unique)
+    else:
+        run_ddl(connection, f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON ONLY {table} {definition}")
+        attached = set(leaf_partitions(connection, name))
+        for partition in leaf_partitions(connection, table):
+            if any(index in attached for index in _partition_indexes(connection, partition)):
+                continue
+            child = _free_child_name(connection, f"{partition}_{'_'.join(columns)}_idx")
+            _create_concurrently(connection, child, partition, definition, unique)
+            run_ddl(connection, f"ALTER INDEX {name} ATTACH PARTITION {child}")
+    logger.info("%s: %s built in %.1fs", table, name, time.monotonic() - started)
+
+
+def drop_index_online(connection: Connection, name: str) -> None:
+    """DROP INDEX CONCURRENTLY, or a lock-timed DROP INDEX for a partitioned index - no-op if it's gone"""
+    if index_state(connection, name) is None:
+        return
+    if is_partitioned(connection, name):
+        run_ddl(connection, f"DROP INDEX IF EXISTS {name}")
+    else:
+        connection.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    logger.info("Dropped %s", name)
@@ -0,0 +1,214 @@
+# packages/data/partitions.py
+# Monthly range partitions for the messages table: create ahead, retire by retention policy
+# Run from cron/Kubernetes CronJob with the admin connection (DDL needs table ownership):
+#
+#   python -m packages.data.partitions status
+#   python -m packages.data.partitions maintain --ahead 3 --retention-months 12 --mode detach
+#
+# Why partitions?
+# - Recent-history queries carry a created_at bound, so the planner prunes
+#   old months and only touches the hot partitions and their (small) indexes
+# - Retention is DETACH/DROP of a whole month: no huge DELETE, no vacuum debt, no bloat
+
+import logging
+import os
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+
+import click
+from sqlalchemy import Connection, create_engine, text
+
+logger = logging.getLogger(__name__)
+
+# Tables managed here - all partitioned BY RANGE (created_at), one partition per month
+PARTITIONED_TABLES = ("messages",)
+
+_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def month_start(day: date | datetime) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    """messages + 2025-03 -> messages_p2025_03"""
+    return f"{table}_p{month:%Y_%m}"
+
+
+@dataclass(frozen=True)
+class Partition:
+    """One attached partition; lower/upper are None for the DEFAULT partition"""
+    name: str
+    lower: date | None
+    upper: date | None
+
+    @property
+    def is_default(self) -> bool:
+        return self.lower is None
+
+
+def list_partitions(connection: Connection, table: str) -> list[Partition]:
+    """Attached partitions of `table`, oldest first, DEFAULT last"""
+    rows = connection.execute(text("""
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :table AND parent.relnamespace = 'public'::regnamespace
+    """), {"table": table}).all()
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND.search(bound)
+        if match:
+            lower, upper = (datetime.fromisoformat(value).date() for value in match.groups())
+            partitions.append(Partition(name, lower, upper))
+        else:
+            partitions.append(Partition(name, None, None))
+    return sorted(partitions, key=lambda p: (p.is_default, p.lower or date.max))
+
+
+def create_partition(connection: Connection, table: str, month: date) -> str:
+    """
+    Create the partition for one month (no-op if it exists)
+
+    Indexes come from the parent automatically. Row-level security does NOT:
+    policies apply only when querying through the parent, so each partition gets
+    RLS enabled without policies - direct partition access is denied to the app
+    user instead of silently bypassing tenant isolation.
+    """
+    name = partition_name(table, month)
+    connection.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+    if _rls_enabled(connection, table):
+        connection.execute(text(f'ALTER TABLE "{name}" ENABLE ROW LEVEL SECURITY'))
+    return name
+
+
+def ensure_partitions(connection: Connection, table: str, ahead: int, today: date | None = None) -> list[str]:
+    """
+    Make sure partitions exist from the current month through `ahead` months ahead
+
+    Creating them early keeps DDL (and its brief ACCESS EXCLUSIVE lock on the
+    parent) out of the month boundary, and keeps rows out of the DEFAULT partition.
+    """
+    current = month_start(today or date.today())
+    existing = {p.lower for p in list_partitions(connection, table)}
+    created = []
+    for offset in range(ahead + 1):
+        month = add_months(current, offset)
+        if month not in existing:
+            created.append(create_partition(connection, table, month))
+    return created
+
+
+def expired_partitions(
+    connection: Connection, table: str, retention_months: int, today: date | None = None
+) -> list[Partition]:
+    """Monthly partitions whose every row is older than the retention window"""
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(month_start(today or date.today()), -retention_months)
+    return [
+        p for p in list_partitions(connection, table)
+        if not p.is_default and p.upper is not None and p.upper <= cutoff
+    ]
+
+
+def retire_partition(connection: Connection, table: str, partition: Partition, mode: str) -> None:
+    """
+    mode="detach": the month becomes a standalone table (archive it, then drop it)
+    mode="drop":   detach and drop - the rows are gone
+    """
+    connection.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{partition.name}"'))
+    if mode == "drop":
+        connection.execute(text(f'DROP TABLE "{partition.name}"'))
+    logger.info("Partition %s %s", partition.name, "dropped" if mode == "drop" else "detached")
+
+
+def default_partition_rows(connection: Connection, table: str) -> int:
+    """Rows that fell outside every monthly range - should be 0 when maintenance runs on time"""
+    default = next((p for p in list_partitions(connection, table) if p.is_default), None)
+    if default is None:
+        return 0
+    return connection.scalar(text(f'SELECT count(*) FROM "{default.name}"')) or 0
+
+
+def _rls_enabled(connection: Connection, table: str) -> bool:
+    return bool(connection.scalar(
+        text("SELECT relrowsecurity FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}
+    ))
+
+
+def _sync_url() -> str:
+    url = os.getenv("DATABASE_URL_SYNC") or os.getenv("DATABASE_URL", "").replace("postgresql+asyncpg://", "postgresql://")
+    if not url:
+        raise click.UsageError("DATABASE_URL_SYNC is not set")
+    return url
+
+
+@click.group()
+def main() -> None:
+    """Partition maintenance for time-partitioned tables"""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+
+@main.command()
+def status() -> None:
+    """Show partitions and rows stuck in the DEFAULT partition"""
+    with create_engine(_sync_url()).connect() as connection:
+        for table in PARTITIONED_TABLES:
+            partitions = list_partitions(connection, table)
+            click.echo(f"{table}: {len(partitions)} partitions")
+            for partition in partitions:
+                bounds = "DEFAULT" if partition.is_default else f"{partition.lower} .. {partition.upper}"
+                click.echo(f"  {partition.name:<28} {bounds}")
+            click.echo(f"  rows in DEFAULT: {default_partition_rows(connection, table)}")
+
+
+@main.command()
+@click.option("--ahead", default=3, show_default=True, envvar="PARTITIONS_AHEAD_MONTHS",
+              help="Months of partitions to keep ready in advance")
+@click.option("--retention-months", default=0, show_default=True, envvar="MESSAGES_RETENTION_MONTHS",
+              help="Retire months older than this (0 = keep everything)")
+@click.option("--mode", type=click.Choice(["detach", "drop"]), default="detach", show_default=True,
+              envvar="PARTITION_RETENTION_MODE", help="What happens to expired months")
+@click.option("--dry-run", is_flag=True, help="Print what would change without changing it")
+def maintain(ahead: int, retention_months: int, mode: str, dry_run: bool) -> None:
+    """Create upcoming partitions and retire expired ones"""
+    engine = create_engine(_sync_url())
+    for table in PARTITIONED_TABLES:
+        # One short transaction per step: DDL locks on the parent are held only briefly
+        with engine.begin() as connection:
+            if dry_run:
+                existing = {p.lower for p in list_partitions(connection, table)}
+                current = month_start(date.today())
+                missing = [partition_name(table, add_months(current, i)) for i in range(ahead + 1)
+                           if add_months(current, i) not in existing]
+                click.echo(f"{table}: would create {missing or 'nothing'}")
+            else:
+                for name in ensure_partitions(connection, table, ahead):
+                    click.echo(f"{table}: created {name}")
+        with engine.begin() as connection:
+            expired = expired_partitions(connection, table, retention_months)
+        for partition in expired:
+            if dry_run:
+                click.echo(f"{table}: would {mode} {partition.name}")
+                continue
+            with engine.begin() as connection:
+                retire_partition(connection, table, partition, mode)
+        with engine.connect() as connection:
+            stuck = default_partition_rows(connection, table)
+        if stuck:
+            click.echo(f"{table}: WARNING {stuck} rows in the DEFAULT partition - run maintenance more often", err=True)
+
+
+if __name__ == "__main__":
+    main()
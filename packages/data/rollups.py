@@ -0,0 +1,322 @@
+# packages/data/rollups.py
+# Incremental analytics rollups: hourly and daily aggregates per tenant for the dashboard
+# Run every few minutes from cron/Kubernetes CronJob with the admin connection:
+#
+#   python -m packages.data.rollups refresh
+#   python -m packages.data.rollups refresh --lookback-hours 72   # after a feedback backfill
+#   python -m packages.data.rollups status
+#
+# Why watermarks instead of re-aggregating?
+# - Each run reads only the hours since the last run (plus a short lookback),
+#   so its cost depends on the write rate, not on the size of the history
+# - The messages scan carries a created_at range, so only the newest monthly
+#   partitions are touched
+#
+# Hours are recomputed (DELETE + INSERT ... SELECT), never incremented, so a run
+# is idempotent: a crash or a rerun over the same hours can't double count.
+
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import (
+    Connection,
+    Engine,
+    and_,
+    create_engine,
+    delete,
+    func,
+    literal,
+    select,
+)
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from packages.core.analytics import RESOLUTION_BUCKETS_MINUTES
+from packages.core.enums import RollupGranularity
+from packages.core.metrics import metrics
+from packages.core.models import (
+    Conversation,
+    ConversationRollup,
+    Message,
+    MessageRollup,
+    RollupWatermark,
+    enum_text,
+    utc_now,
+)
+
+logger = logging.getLogger(__name__)
+
+refresh_histogram = metrics.histogram("rollup_refresh_seconds", "Time to recompute one chunk of rollup hours")
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+
+def floor_hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+@dataclass(frozen=True)
+class Rollup(ABC):
+    """One rollup table and how its hours are computed from the raw table"""
+    name: str
+    table: type
+    time_column: object          # Raw column that decides the bucket
+
+    def oldest(self, connection: Connection) -> datetime | None:
+        return connection.scalar(select(func.min(self.time_column)))
+
+    @abstractmethod
+    def compute_hours(self, connection: Connection, start: datetime, end: datetime) -> int:
+        """Recompute the hourly rows of [start, end) from the raw table; returns the rows written"""
+
+    @abstractmethod
+    def compute_days(self, connection: Connection, start: datetime, end: datetime) -> int:
+        """Recompute the daily rows of [start, end) from the hourly rows; returns the rows written"""
+
+
+class MessageRollups(Rollup):
+    """Messages by (ai_model, message_type, user_feedback), bucketed by created_at"""
+
+    def compute_hours(self, connection: Connection, start: datetime, end: datetime) -> int:
+        bucket = func.date_trunc("hour", Message.created_at)
+        model = func.coalesce(Message.ai_model, "")
+        # Rollup tables keep string labels whichever way the raw enum columns are stored
+        feedback = func.coalesce(enum_text(Message.user_feedback), "")
+        source = (
+            select(
+                Message.tenant_id,
+                literal(RollupGranularity.HOUR.value),
+                bucket,
+                model,
+                enum_text(Message.message_type),
+                feedback,
+                func.count(),
+                func.coalesce(func.sum(Message.tokens_used), 0),
+            )
+            # created_at range: only the monthly partitions of this chunk are scanned
+            .where(Message.created_at >= start, Message.created_at < end)
+            .group_by(Message.tenant_id, bucket, model, Message.message_type, feedback)
+        )
+        return _replace(connection, MessageRollup, RollupGranularity.HOUR, start, end, source)
+
+    def compute_days(self, connection: Connection, start: datetime, end: datetime) -> int:
+        bucket = func.date_trunc("day", MessageRollup.bucket_start)
+        source = (
+            select(
+                MessageRollup.tenant_id,
+                literal(RollupGranularity.DAY.value),
+                bucket,
+                MessageRollup.ai_model,
+                MessageRollup.message_type,
+                MessageRollup.user_feedback,
+                func.sum(MessageRollup.message_count),
+                func.sum(MessageRollup.tokens_used),
+            )
+            .where(*_hour_rows(MessageRollup, start, end))
+            .group_by(
+                MessageRollup.tenant_id, bucket, MessageRollup.ai_model,
+                MessageRollup.message_type, MessageRollup.user_feedback,
+            )
+        )
+        return _replace(connection, MessageRollup, RollupGranularity.DAY, start, end, source)
+
+
+class ConversationRollups(Rollup):
+    """Closed conversations per channel, bucketed by closed_at"""
+
+    def compute_hours(self, connection: Connection, start: datetime, end: datetime) -> int:
+        bucket = func.date_trunc("hour", Conversation.closed_at)
+        minutes = Conversation.resolution_time_minutes
+        source = (
+            select(
+                Conversation.tenant_id,
+                literal(RollupGranularity.HOUR.value),
+                bucket,
+                enum_text(Conversation.channel),
+                func.count(),
+                func.count(minutes),
+                func.coalesce(func.sum(minutes), 0),
+                array([func.count().filter(condition) for condition in _histogram_slots(minutes)]),
+                func.count(Conversation.satisfaction_score),
+                func.coalesce(func.sum(Conversation.satisfaction_score), 0),
+            )
+            # Served by ix_conversations_closed_at
+            .where(Conversation.closed_at >= start, Conversation.closed_at < end)
+            .group_by(Conversation.tenant_id, bucket, Conversation.channel)
+        )
+        return _replace(connection, ConversationRollup, RollupGranularity.HOUR, start, end, source)
+
+    def compute_days(self, connection: Connection, start: datetime, end: datetime) -> int:
+        bucket = func.date_trunc("day", ConversationRollup.bucket_start)
+        histogram = ConversationRollup.resolution_histogram
+        source = (
+            select(
+                ConversationRollup.tenant_id,
+                literal(RollupGranularity.DAY.value),
+                bucket,
+                ConversationRollup.channel,
+                func.sum(ConversationRollup.closed_count),
+                func.sum(ConversationRollup.resolution_count),
+                func.sum(ConversationRollup.resolution_minutes_sum),
+                # Slot-by-slot sum of the hourly histograms (Postgres arrays are 1-based)
+                array([
+                    func.sum(histogram[slot]) for slot in range(1, len(RESOLUTION_BUCKETS_MINUTES) + 2)
+                ]),
+                func.sum(ConversationRollup.satisfaction_count),
+                func.sum(ConversationRollup.satisfaction_sum),
+            )
+            .where(*_hour_rows(ConversationRollup, start, end))
+            .group_by(ConversationRollup.tenant_id, bucket, ConversationRollup.channel)
+        )
+        return _replace(connection, ConversationRollup, RollupGranularity.DAY, start, end, source)
+
+
+ROLLUPS = (
+    MessageRollups("messages", MessageRollup, Message.created_at),
+    ConversationRollups("conversations", ConversationRollup, Conversation.closed_at),
+)
+
+
+def _histogram_slots(minutes: object) -> list[object]:
+    """One condition per RESOLUTION_BUCKETS_MINUTES slot: [previous bound, bound), then the overflow"""
+    slots = []
+    lower = None
+    for upper in RESOLUTION_BUCKETS_MINUTES:
+        slots.append(minutes < upper if lower is None else and_(minutes >= lower, minutes < upper))
+        lower = upper
+    slots.append(minutes >= lower)
+    return slots
+
+
+def _hour_rows(table: type, start: datetime, end: datetime) -> tuple[object, ...]:
+    return (
+        table.granularity == RollupGranularity.HOUR,
+        table.bucket_start >= start,
+        table.bucket_start < end,
+    )
+
+
+def _replace(
+    connection: Connection, table: type, granularity: RollupGranularity,
+    start: datetime, end: datetime, source: object,
+) -> int:
+    """Swap the rollup rows of [start, end) for freshly computed ones (same transaction)"""
+    connection.execute(
+        delete(table)
+        .where(table.granularity == granularity)
+        .where(table.bucket_start >= start, table.bucket_start < end)
+    )
+    columns = [column.name for column in table.__table__.columns]
+    return connection.execute(table.__table__.insert().from_select(columns, source)).rowcount
+
+
+def get_watermark(connection: Connection, name: str) -> datetime | None:
+    return connection.scalar(select(RollupWatermark.high_water).where(RollupWatermark.name == name))
+
+
+def set_watermark(connection: Connection, name: str, high_water: datetime) -> None:
+    statement = pg_insert(RollupWatermark).values(name=name, high_water=high_water, updated_at=utc_now())
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[RollupWatermark.name],
+        # The watermark only moves forward, even if a lookback rerun ends earlier
+        set_={
+            "high_water": func.greatest(RollupWatermark.high_water, statement.excluded.high_water),
+            "updated_at": statement.excluded.updated_at,
+        },
+    ))
+
+
+def refresh(
+    engine: Engine,
+    lookback_hours: int = 24,
+    settle_minutes: int = 5,
+    chunk_hours: int = 24,
+    now: datetime | None = None,
+) -> dict[str, dict[str, object]]:
+    """
+    Bring every rollup up to the last complete hour
+
+    - Starts lookback_hours before the watermark: feedback, late closes and
+      write-behind stragglers that landed in already computed hours are picked up
+    - Stops settle_minutes before now, so an hour is computed once its rows are in
+    - One transaction per chunk of chunk_hours, watermark included: an
+      interrupted run continues after the last committed chunk
+    - Daily rows of every day a chunk touches are recomputed from the hourly rows
+    """
+    end = floor_hour((now or utc_now()) - timedelta(minutes=settle_minutes))
+    report: dict[str, dict[str, object]] = {}
+    for rollup in ROLLUPS:
+        with engine.connect() as connection:
+            high_water = get_watermark(connection, rollup.name)
+            oldest = rollup.oldest(connection) if high_water is None else None
+        if high_water is not None:
+            start = high_water - timedelta(hours=lookback_hours)
+        elif oldest is not None:
+            start = floor_hour(oldest)                  # First run: backfill the whole history
+        else:
+            start = end
+        start = min(start, end)
+
+        hours = days = 0
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(chunk_start + timedelta(hours=chunk_hours), end)
+            started = time.perf_counter()
+            with engine.begin() as connection:
+                hours += rollup.compute_hours(connection, chunk_start, chunk_end)
+                days += rollup.compute_days(connection, floor_day(chunk_start), floor_day(chunk_end - HOUR) + DAY)
+                set_watermark(connection, rollup.name, chunk_end)
+            refresh_histogram.observe(time.perf_counter() - started, rollup=rollup.name)
+            chunk_start = chunk_end
+        logger.info("Rollup %s: %s .. %s, %d hourly rows", rollup.name, start, end, hours)
+        report[rollup.name] = {"from": start.isoformat(), "to": end.isoformat(), "hour_rows": hours, "day_rows": days}
+    return report
+
+
+def _sync_url() -> str:
+    url = os.getenv("DATABASE_URL_SYNC") or os.getenv("DATABASE_URL", "").replace("postgresql+asyncpg://", "postgresql://")
+    if not url:
+        raise click.UsageError("DATABASE_URL_SYNC is not set")
+    return url
+
+
+@click.group()
+def main() -> None:
+    """Analytics rollups for the dashboard"""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+
+@main.command("refresh")
+@click.option("--lookback-hours", default=24, show_default=True, envvar="ROLLUP_LOOKBACK_HOURS",
+              help="Hours before the watermark that are recomputed on every run")
+@click.option("--settle-minutes", default=5, show_default=True, help="Leave the newest minutes for the next run")
+@click.option("--chunk-hours", default=24, show_default=True, help="Hours per transaction")
+def refresh_command(lookback_hours: int, settle_minutes: int, chunk_hours: int) -> None:
+    """Recompute rollups from the watermark up to the last complete hour"""
+    started = time.monotonic()
+    report = refresh(create_engine(_sync_url()), lookback_hours, settle_minutes, chunk_hours)
+    click.echo(json.dumps({**report, "seconds": round(time.monotonic() - started, 1)}))
+
+
+@main.command()
+def status() -> None:
+    """Watermark of every rollup"""
+    with create_engine(_sync_url()).connect() as connection:
+        for rollup in ROLLUPS:
+            high_water = get_watermark(connection, rollup.name)
+            click.echo(f"{rollup.name:<15} computed through {high_water or 'never'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+# packages/observability/logs.py
+# Structured (JSON) logs through structlog
+# One JSON object per line on stdout - log shippers parse it without regexes
+
+import logging
+import sys
+
+import structlog
+
+
+def configure_logging(level: str = "INFO") -> None:
+    """
+    JSON logs for structlog loggers, and the same level for stdlib logging
+
+    Filtering happens in the bound logger itself (make_filtering_bound_logger),
+    so a disabled log call returns before any processor or renderer runs.
+    """
+    numeric_level = logging.getLevelName(level.upper())
+    if not isinstance(numeric_level, int):
+        numeric_level = logging.INFO
+    logging.basicConfig(level=numeric_level, stream=sys.stdout, format="%(levelname)s %(name)s: %(message)s")
+    structlog.configure(
+        processors=[
+            structlog.processors.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso", utc=True),
+            structlog.processors.JSONRenderer(),
+        ],
+        wrapper_class=structlog.make_filtering_bound_logger(numeric_level),
+        logger_factory=structlog.PrintLoggerFactory(sys.stdout),
+        cache_logger_on_first_use=True,
+    )
@@ -0,0 +1,123 @@
+# packages/observability/middleware.py
+# ASGI middleware: one server span per request, RED metrics, sampled request logs,
+# and on-demand profiling of requests that ask for it
+#
+# Why plain ASGI instead of Starlette's BaseHTTPMiddleware?
+# - BaseHTTPMiddleware runs the endpoint in a separate task and re-streams the body,
+#   which costs latency on every request and breaks contextvars (the current span)
+# - Wrapping `send` sees the real first byte of a streamed reply, not the end of the handler
+
+import random
+import time
+from collections.abc import Iterable
+from typing import Any
+
+import structlog
+from opentelemetry.trace import SpanKind
+
+from packages.core.metrics import metrics
+
+from .profiling import RequestProfiler
+from .tracing import current_trace_id, tracer
+
+requests_counter = metrics.counter("http_requests_total", "HTTP requests by method, route, status and tenant")
+duration_histogram = metrics.histogram("http_request_duration_seconds", "Request duration by route (whole stream)")
+first_byte_histogram = metrics.histogram("http_time_to_first_byte_seconds", "Time to the first body byte by route")
+
+request_logger = structlog.get_logger("http")
+
+
+class ObservabilityMiddleware:
+    """
+    Instruments every HTTP request of the app
+
+    - Span "METHOD /route/template" (child spans come from the pipeline stages)
+    - RED metrics: http_requests_total{method,route,status,tenant},
+      http_request_duration_seconds{route}, http_time_to_first_byte_seconds{route}
+    - A structured log line for log_sample_rate of requests, and always for
+      5xx responses and requests slower than slow_request_seconds
+    - X-Profile: <token> (+ X-Profile-Mode: sample|cprofile) profiles the
+      request; the response carries X-Profile-Id
+
+    Routes are labelled by their template ("/api/v1/analytics/tokens"), never
+    the raw path, so metric cardinality stays bounded.
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        log_sample_rate: float = 0.01,
+        slow_request_seconds: float = 2.0,
+        profiler: RequestProfiler | None = None,
+        excluded_paths: Iterable[str] = ("/health", "/metrics"),
+    ) -> None:
+        self.app = app
+        self.log_sample_rate = log_sample_rate
+        self.slow_request_seconds = slow_request_seconds
+        self.profiler = profiler
+        self.excluded_paths = frozenset(excluded_paths)
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        method = scope["method"]
+        headers = _headers(scope)
+        profile = None
+        if self.profiler is not None and self.profiler.allowed(headers.get("x-profile")):
+            profile = self.profiler.begin(headers.get("x-profile-mode", "sample"))
+        status = 500
+        first_byte: float | None = None
+
+        async def send_wrapper(message: dict[str, Any]) -> None:
+            nonlocal status, first_byte
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile is not None:
+                    message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]
+            elif message["type"] == "http.response.body" and first_byte is None:
+                first_byte = time.perf_counter() - started
+            await send(message)
+
+        with tracer.start_as_current_span(
+            f"{method} {scope['path']}",
+            kind=SpanKind.SERVER,
+            attributes={"http.request.method": method},
+        ) as span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                duration = time.perf_counter() - started
+                route = getattr(scope.get("route"), "path", "unmatched")
+                # Set by the get_tenant dependency once the tenant is known to exist -
+                # free-form header values must not become metric labels
+                tenant = str(scope.get("state", {}).get("tenant_id", "none"))
+                span.set_attribute("tenant.id", tenant)
+                span.update_name(f"{method} {route}")
+                span.set_attribute("http.route", route)
+                span.set_attribute("http.response.status_code", status)
+                requests_counter.inc(method=method, route=route, status=status, tenant=tenant)
+                duration_histogram.observe(duration, route=route)
+                if first_byte is not None:
+                    first_byte_histogram.observe(first_byte, route=route)
+                profile_id = await self.profiler.end(profile) if profile is not None else None
+                if status >= 500 or duration >= self.slow_request_seconds or random.random() < self.log_sample_rate:
+                    request_logger.info(
+                        "request",
+                        method=method,
+                        route=route,
+                        status=status,
+                        tenant=tenant,
+                        duration_ms=round(duration * 1000, 2),
+                        first_byte_ms=round(first_byte * 1000, 2) if first_byte is not None else None,
+                        trace_id=current_trace_id(),
+                        profile_id=profile_id,
+                    )
+
+
+def _headers(scope: dict[str, Any]) -> dict[str, str]:
+    """The few request headers the middleware reads (ASGI headers are lowercase bytes)"""
+    wanted = (b"x-profile", b"x-profile-mode")
+    return {name.decode(): value.decode("latin-1") for name, value in scope["headers"] if name in wanted}
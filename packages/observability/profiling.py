@@ -0,0 +1,136 @@
+# packages/observability/profiling.py
+# On-demand profiling of single requests, switched on at runtime by a request header
+#
+# Modes:
+#   sample  - statistical stack sampler (py-spy style): a helper thread snapshots the
+#             event loop thread's stack every few milliseconds -> collapsed stacks,
+#             ready for flamegraph.pl / speedscope. Overhead is paid only while it runs
+#   cprofile - deterministic cProfile -> .pstats (exact call counts, higher overhead)
+#
+# Both observe the whole event-loop thread, so other requests running at the same
+# time show up too - profile on a quiet worker or read the stacks accordingly.
+
+import asyncio
+import cProfile
+import hmac
+import os
+import sys
+import threading
+import uuid
+from collections import Counter
+from types import FrameType
+
+from packages.core.metrics import metrics
+
+PROFILE_MODES = ("sample", "cprofile")
+
+profiles_counter = metrics.counter("profiles_total", "Request profiles by mode and result")
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval from a background thread"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005, max_depth: int = 64) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter[str] = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter[str]:
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._collapse(frame)] += 1
+
+    def _collapse(self, frame: FrameType | None) -> str:
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+
+class RequestProfiler:
+    """
+    Profiles requests that carry the right X-Profile token
+
+    Usage (ObservabilityMiddleware does this):
+        session = profiler.begin(mode)      # None = not allowed / busy
+        ...run the request...
+        profile_id = await profiler.end(session)   # -> {directory}/{profile_id}.collapsed|.pstats
+
+    One profile at a time per worker: a second profiled request while one is
+    running is served normally, unprofiled. An empty token disables profiling.
+    """
+
+    def __init__(self, token: str, directory: str, interval: float = 0.005) -> None:
+        self.token = token
+        self.directory = directory
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._busy = False
+
+    def allowed(self, token: str | None) -> bool:
+        # Constant-time comparison: response timing doesn't reveal how much of a guess matched
+        return bool(self.token) and token is not None and hmac.compare_digest(token.encode(), self.token.encode())
+
+    def begin(self, mode: str) -> "ProfileSession | None":
+        if mode not in PROFILE_MODES:
+            return None
+        with self._lock:
+            if self._busy:
+                profiles_counter.inc(mode=mode, result="busy")
+                return None
+            self._busy = True
+        session = ProfileSession(mode, uuid.uuid4().hex[:16])
+        if mode == "cprofile":
+            session.profile = cProfile.Profile()
+            session.profile.enable()
+        else:
+            session.sampler = StackSampler(threading.get_ident(), self.interval)
+            session.sampler.start()
+        return session
+
+    async def end(self, session: "ProfileSession") -> str:
+        """Stop profiling and write the result in a worker thread; returns the profile id"""
+        try:
+            if session.profile is not None:
+                session.profile.disable()
+            stacks = session.sampler.stop() if session.sampler is not None else None
+            # Profiles can be megabytes - the event loop keeps serving while they are written
+            await asyncio.to_thread(self._write, session, stacks)
+            profiles_counter.inc(mode=session.mode, result="written")
+            return session.id
+        finally:
+            with self._lock:
+                self._busy = False
+
+    def _write(self, session: "ProfileSession", stacks: Counter[str] | None) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        if session.profile is not None:
+            session.profile.dump_stats(os.path.join(self.directory, f"{session.id}.pstats"))
+        elif stacks is not None:
+            with open(os.path.join(self.directory, f"{session.id}.collapsed"), "w") as file:
+                for stack, count in stacks.most_common():
+                    file.write(f"{stack} {count}\n")
+
+
+class ProfileSession:
+    __slots__ = ("mode", "id", "profile", "sampler")
+
+    def __init__(self, mode: str, profile_id: str) -> None:
+        self.mode = mode
+        self.id = profile_id
+        self.profile: cProfile.Profile | None = None
+        self.sampler: StackSampler | None = None
@@ -0,0 +1,90 @@
+# packages/observability/tracing.py
+# OpenTelemetry tracing setup and the tracer used by the hot path
+#
+# Code everywhere calls `tracer` from this module; until configure_tracing() runs
+# (or with tracing disabled) the OpenTelemetry API hands out no-op spans, so
+# instrumented code costs a function call and nothing else.
+#
+# Exporters (OTEL_TRACES_EXPORTER):
+#   otlp    - batch export to OTEL_EXPORTER_OTLP_ENDPOINT (needs opentelemetry-exporter-otlp)
+#   console - print finished spans (local debugging)
+#   memory  - keep finished spans in memory (tests, benchmarks)
+#   none    - record nothing
+
+import logging
+from typing import Any
+
+from opentelemetry import trace
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("clever")
+
+_memory_exporter: Any | None = None
+
+
+def configure_tracing(
+    service_name: str,
+    exporter: str = "otlp",
+    sample_ratio: float = 1.0,
+    endpoint: str | None = None,
+) -> Any | None:
+    """
+    Install the global tracer provider; returns the InMemorySpanExporter for exporter="memory"
+
+    Sampling is decided once per trace (parent-based trace-id ratio), so a
+    request is either traced through every stage or not at all. Unsampled
+    spans are non-recording and nearly free - that is what keeps tracing
+    cheap enough to stay on in production.
+    """
+    global _memory_exporter
+    if exporter == "none":
+        return None
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import (
+        BatchSpanProcessor,
+        ConsoleSpanExporter,
+        SimpleSpanProcessor,
+    )
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(sample_ratio)),
+    )
+    if exporter == "memory":
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+            InMemorySpanExporter,
+        )
+
+        _memory_exporter = InMemorySpanExporter()
+        # Synchronous export: a test sees its spans as soon as the request returns
+        provider.add_span_processor(SimpleSpanProcessor(_memory_exporter))
+    elif exporter == "console":
+        provider.add_span_processor(SimpleSpanProcessor(ConsoleSpanExporter()))
+    elif exporter == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
+                OTLPSpanExporter,
+            )
+        except ImportError:
+            logger.warning("Tracing: opentelemetry-exporter-otlp is not installed, spans are not exported")
+            return None
+        # Batched in a background thread - exporting never blocks a request
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+    else:
+        raise ValueError(f"Unknown OTEL_TRACES_EXPORTER '{exporter}' (expected otlp, console, memory or none)")
+    trace.set_tracer_provider(provider)
+    return _memory_exporter
+
+
+def memory_exporter() -> Any | None:
+    """The in-memory exporter installed by configure_tracing(exporter="memory"), if any"""
+    return _memory_exporter
+
+
+def current_trace_id() -> str | None:
+    """Hex trace id of the current span, None when the request isn't sampled"""
+    context = trace.get_current_span().get_span_context()
+    return format(context.trace_id, "032x") if context.is_valid and context.trace_flags.sampled else None
@@ -0,0 +1,181 @@
+# packages/security/admission.py
+# Admission control: keep tail latency on target by holding back low-priority traffic
+# Rate limits protect tenants from each other; this protects the worker from overload
+#
+# Why queue instead of rejecting right away?
+# - Overload is usually a short spike; a tester's request that waits a second
+#   is better than one that has to be retried by hand
+# - The queue is bounded in length and wait time, so it can't hide a real overload
+
+import asyncio
+import math
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from typing import TypeVar
+
+from packages.core.enums import UserRole
+from packages.core.metrics import metrics
+
+from .rate_limit import Throttled
+
+T = TypeVar("T")
+
+# Internal and test traffic yields to customers when the worker is overloaded
+LOW_PRIORITY_ROLES = frozenset({UserRole.DEVELOPER, UserRole.TESTER})
+
+decisions_counter = metrics.counter(
+    "admission_decisions_total", "Admission decisions by priority and result (admitted/queued/shed)"
+)
+in_flight_gauge = metrics.gauge("admission_in_flight", "Admitted requests still streaming")
+queue_gauge = metrics.gauge("admission_queue_depth", "Low-priority requests waiting for admission")
+p95_gauge = metrics.gauge("admission_latency_p95_seconds", "p95 time to first event over the admission window")
+
+
+class Overloaded(Throttled):
+    """Low-priority request shed because the worker is over its latency target"""
+
+    status_code = 503
+
+
+def priority_of(role: UserRole | str) -> str:
+    return "low" if role in LOW_PRIORITY_ROLES else "normal"
+
+
+class AdmissionController:
+    """
+    Sheds or queues low-priority requests while p95 latency is over target
+
+    Latency is the time from admission to the first streamed event, over the
+    last window_seconds, at most max_samples of them (the metrics histograms are count-based, so an idle
+    worker would stay "overloaded" forever on their numbers). Below
+    min_samples there is not enough data to call it overloaded.
+
+    Normal-priority requests are always admitted. Low-priority ones wait in a
+    FIFO queue while overloaded; every finished request lets one of them in,
+    so they trickle through instead of piling on, and all are let in once the
+    p95 is back under target. A full queue or a wait over queue_timeout sheds
+    the request with Overloaded (503 + Retry-After).
+
+    admit() hands out an AdmissionSlot; its release() may be called from every
+    place a request can end - only the first call counts.
+    """
+
+    def __init__(
+        self,
+        target_p95: float,
+        max_queue: int = 100,
+        queue_timeout: float = 10.0,
+        window_seconds: float = 30.0,
+        min_samples: int = 20,
+        max_samples: int = 2048,
+    ) -> None:
+        self.target_p95 = target_p95
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.in_flight = 0
+        self._latencies: deque[tuple[float, float]] = deque(maxlen=max_samples)   # (observed at, seconds)
+        self._waiters: deque[asyncio.Future] = deque()
+
+    def p95(self) -> float | None:
+        horizon = time.monotonic() - self.window_seconds
+        while self._latencies and self._latencies[0][0] < horizon:
+            self._latencies.popleft()
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(latency for _, latency in self._latencies)
+        return ordered[math.ceil(0.95 * len(ordered)) - 1]
+
+    def overloaded(self) -> bool:
+        p95 = self.p95()
+        return p95 is not None and p95 > self.target_p95
+
+    async def admit(self, role: UserRole | str) -> "AdmissionSlot":
+        """Return once the request may run; raises Overloaded if it is shed"""
+        priority = priority_of(role)
+        # With nothing in flight there is nothing to wait for - the latency isn't load
+        if priority == "low" and self.in_flight and (self._waiters or self.overloaded()):
+            await self._wait(priority)
+        else:
+            decisions_counter.inc(priority=priority, result="admitted")
+        self.in_flight += 1
+        in_flight_gauge.set(self.in_flight)
+        return AdmissionSlot(self)
+
+    async def _wait(self, priority: str) -> None:
+        if len(self._waiters) >= self.max_queue:
+            self._shed(priority)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        queue_gauge.set(len(self._waiters))
+        decisions_counter.inc(priority=priority, result="queued")
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except TimeoutError:
+            self._shed(priority)
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            queue_gauge.set(len(self._waiters))
+
+    def _shed(self, priority: str) -> None:
+        decisions_counter.inc(priority=priority, result="shed")
+        raise Overloaded("Server is over its latency target, retry later", self.p95() or self.target_p95)
+
+    def release(self, latency: float | None) -> None:
+        """A request finished; latency = time to its first event (None if it never produced one)"""
+        self.in_flight -= 1
+        in_flight_gauge.set(self.in_flight)
+        if latency is not None:
+            self._latencies.append((time.monotonic(), latency))
+        p95 = self.p95()
+        if p95 is not None:
+            p95_gauge.set(p95)
+        # One queued request per finished one while overloaded, all of them otherwise
+        wake = 1 if p95 is not None and p95 > self.target_p95 else len(self._waiters)
+        while wake and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                wake -= 1
+        queue_gauge.set(len(self._waiters))
+
+
+class AdmissionSlot:
+    """
+    An admitted request's place in the controller
+
+    Usage:
+        slot = await admission.admit(role)
+        try:
+            async for event in slot.guard(events):
+                ...
+        finally:
+            slot.release()     # A guard that never started never releases
+
+    The latency fed back to the controller is the time from admission to the
+    first event guard() streamed (None if there was none).
+    """
+
+    def __init__(self, controller: AdmissionController) -> None:
+        self.controller = controller
+        self.admitted_at = time.perf_counter()
+        self.latency: float | None = None
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.controller.release(self.latency)
+
+    async def guard(self, events: AsyncIterator[T]) -> AsyncIterator[T]:
+        """Stream events of the request, releasing the slot when the stream ends"""
+        try:
+            async for event in events:
+                if self.latency is None:
+                    self.latency = time.perf_counter() - self.admitted_at
+                yield event
+        finally:
+            self.release()
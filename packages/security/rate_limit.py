@@ -0,0 +1,179 @@
+# packages/security/rate_limit.py
+# Per-tenant rate limiting on request count and LLM token budget (GCRA)
+# In-process state for single-worker runs, Redis for limits shared by all workers
+#
+# Why GCRA instead of a counter per minute?
+# - One number per key (the "theoretical arrival time"), no window resets
+#   that let a tenant send two minutes' worth of traffic around the boundary
+# - Burst and steady rate are separate knobs, and Retry-After falls out exactly
+
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from packages.core.enums import UserRole
+from packages.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+decisions_counter = metrics.counter(
+    "rate_limit_decisions_total", "Rate limit checks by kind (requests/tokens) and result (allowed/limited)"
+)
+
+# KEYS[1] = theoretical arrival time (TAT) of the key
+# ARGV = seconds per unit, burst tolerance (seconds), cost (units), check (1 = refuse when over)
+# Returns the seconds to wait ("0" = allowed); a string, because Lua numbers become integers in replies
+GCRA_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + cost * interval
+local retry = new_tat - tolerance - now
+if ARGV[4] == '1' and retry > 0 then return tostring(retry) end
+if cost > 0 then
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000) + 1000)
+end
+return '0'
+"""
+
+
+class Throttled(Exception):
+    """Request refused for now; the client may retry after retry_after seconds"""
+
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        """Retry-After value - whole seconds, at least 1"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class RateLimited(Throttled):
+    """The tenant/role exceeded its request rate or token budget"""
+
+
+@dataclass(frozen=True)
+class Limit:
+    """Steady rate (units per second) plus how many units may arrive at once"""
+    rate: float
+    burst: float
+
+    @classmethod
+    def per_minute(cls, amount: float, burst: float) -> "Limit":
+        return cls(rate=amount / 60, burst=burst)
+
+    @property
+    def interval(self) -> float:
+        """Seconds one unit occupies"""
+        return 1 / self.rate
+
+    @property
+    def tolerance(self) -> float:
+        """How far ahead of real time the key may run"""
+        return self.burst * self.interval
+
+
+class LocalGCRA:
+    """In-process GCRA state - the same algorithm as GCRA_SCRIPT, per worker"""
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        self.max_keys = max_keys
+        self._tat: dict[str, float] = {}
+
+    def update(self, key: str, limit: Limit, cost: float, check: bool) -> float:
+        now = time.monotonic()
+        tat = max(self._tat.get(key, now), now)
+        new_tat = tat + cost * limit.interval
+        retry = new_tat - limit.tolerance - now
+        if check and retry > 0:
+            return retry
+        if cost > 0:
+            if len(self._tat) >= self.max_keys:
+                # Keys whose TAT is in the past carry no state - same as absent
+                self._tat = {k: v for k, v in self._tat.items() if v > now}
+            self._tat[key] = new_tat
+        return 0.0
+
+
+class RateLimiter:
+    """
+    Request and LLM-token limits per (tenant_id, UserRole)
+
+    Requests are checked and counted on arrival. Tokens are only known once the
+    reply is finished, so a chat request is admitted while the budget is not
+    exhausted (check_tokens) and its real usage is charged afterwards
+    (charge_tokens) - a big reply can overdraw the budget, and the next
+    requests wait until it has refilled.
+
+    With Redis all workers share the limits. Refusals are also remembered
+    in-process until their Retry-After, so a tenant hammering the API is
+    turned away without a Redis round trip. Redis errors fall back to
+    per-worker limits - the limiter must never turn a Redis outage into an API outage.
+    """
+
+    def __init__(self, requests: Limit, tokens: Limit, redis: Any | None = None) -> None:
+        self.requests = requests
+        self.tokens = tokens
+        self.redis = redis
+        self._local = LocalGCRA()
+        self._blocked: dict[str, float] = {}
+        self._script = redis.register_script(GCRA_SCRIPT) if redis is not None else None
+
+    async def check_request(self, tenant_id: int, role: UserRole | str) -> None:
+        """Count one request; raises RateLimited when over the request rate"""
+        await self._enforce("requests", tenant_id, role, self.requests, cost=1)
+
+    async def check_tokens(self, tenant_id: int, role: UserRole | str) -> None:
+        """Raises RateLimited while the token budget is overdrawn (nothing is charged)"""
+        await self._enforce("tokens", tenant_id, role, self.tokens, cost=0)
+
+    async def charge_tokens(self, tenant_id: int, role: UserRole | str, tokens: int) -> None:
+        """Charge the tokens a finished reply actually used"""
+        if tokens > 0:
+            await self._update(_key("tokens", tenant_id, role), self.tokens, tokens, check=False)
+
+    async def _enforce(self, kind: str, tenant_id: int, role: UserRole | str, limit: Limit, cost: float) -> None:
+        retry = await self._update(_key(kind, tenant_id, role), limit, cost, check=True)
+        decisions_counter.inc(kind=kind, result="limited" if retry else "allowed")
+        if retry:
+            raise RateLimited(f"Rate limit exceeded ({kind}) for tenant {tenant_id}", retry)
+
+    async def _update(self, key: str, limit: Limit, cost: float, check: bool) -> float:
+        """Seconds until the key may be used again (0 = allowed and counted)"""
+        now = time.monotonic()
+        if check:
+            blocked_until = self._blocked.get(key)
+            if blocked_until is not None:
+                if blocked_until > now:
+                    return blocked_until - now
+                del self._blocked[key]
+        retry = None
+        if self._script is not None:
+            try:
+                retry = float(await self._script(
+                    keys=[key], args=[limit.interval, limit.tolerance, cost, 1 if check else 0]
+                ))
+            except Exception:
+                logger.warning("Rate limiter: Redis failed, using per-worker limits", exc_info=True)
+        if retry is None:
+            retry = self._local.update(key, limit, cost, check)
+        if retry:
+            if len(self._blocked) >= self._local.max_keys:
+                self._blocked = {k: v for k, v in self._blocked.items() if v > now}
+            self._blocked[key] = now + retry
+        return retry
+
+
+def _key(kind: str, tenant_id: int, role: UserRole | str) -> str:
+    """Key layout: rl:{kind}:{tenant_id}:{role}"""
+    return f"rl:{kind}:{tenant_id}:{UserRole(role).value}"
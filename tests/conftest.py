@@ -0,0 +1,10 @@
+# tests/conftest.py
+# Tests run offline: fake LLM provider, no database, no Redis server
+# Set before anything imports packages.core.config - settings are read once per process
+
+import os
+
+os.environ["LLM_PROVIDER"] = "fake"
+os.environ["ENABLE_OPENTELEMETRY"] = "false"
+for name in ("DATABASE_URL_APP", "DATABASE_URL_REPLICAS", "REDIS_URL"):
+    os.environ.pop(name, None)
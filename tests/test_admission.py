@@ -0,0 +1,143 @@
+# tests/test_admission.py
+# Rate limits (GCRA) and admission control: bursts, refills, Retry-After, queueing,
+# shedding, and the chat endpoint freeing its admission slot however a request ends
+
+import asyncio
+import types
+
+import httpx
+import pytest
+from starlette.requests import ClientDisconnect
+
+from packages.core.enums import UserRole
+from packages.security import rate_limit
+from packages.security.admission import AdmissionController, Overloaded
+from packages.security.rate_limit import Limit, LocalGCRA, RateLimited, RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Frozen time.monotonic() of the rate limiter; advance with clock.now += seconds"""
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(rate_limit, "time", types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_gcra_allows_the_burst_then_one_unit_per_interval(clock):
+    gcra, limit = LocalGCRA(), Limit(rate=2, burst=3)          # One unit per 0.5 s
+
+    assert [gcra.update("k", limit, 1, check=True) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert gcra.update("k", limit, 1, check=True) == pytest.approx(0.5)
+    assert gcra.update("other", limit, 1, check=True) == 0.0     # Keys don't share a budget
+
+    clock.now += 0.5
+    assert gcra.update("k", limit, 1, check=True) == 0.0
+    assert gcra.update("k", limit, 1, check=True) == pytest.approx(0.5)
+
+
+def test_gcra_charges_can_overdraw_and_checks_wait_for_the_refill(clock):
+    gcra, limit = LocalGCRA(), Limit.per_minute(60, 10)         # One token per second
+
+    assert gcra.update("tokens", limit, 25, check=False) == 0.0  # A big reply is charged anyway
+    assert gcra.update("tokens", limit, 0, check=True) == pytest.approx(15)
+    clock.now += 15
+    assert gcra.update("tokens", limit, 0, check=True) == 0.0
+
+
+async def test_rate_limited_carries_retry_after(clock):
+    limiter = RateLimiter(requests=Limit(rate=1, burst=1), tokens=Limit(rate=1, burst=1))
+    await limiter.check_request(1, UserRole.USER)
+
+    with pytest.raises(RateLimited) as refused:
+        await limiter.check_request(1, UserRole.USER)
+    assert refused.value.retry_after == pytest.approx(1)
+    assert refused.value.status_code == 429 and refused.value.retry_after_header == "1"
+
+    clock.now += 0.25
+    with pytest.raises(RateLimited) as again:                 # Remembered refusal, counting down
+        await limiter.check_request(1, UserRole.USER)
+    assert again.value.retry_after == pytest.approx(0.75)
+    await limiter.check_request(1, UserRole.ADMIN)
+
+
+async def overloaded_controller(**options) -> tuple[AdmissionController, object]:
+    """A controller over its target, with one normal-priority request still in flight"""
+    admission = AdmissionController(target_p95=0.1, min_samples=1, **options)
+    busy, slow = await admission.admit(UserRole.USER), await admission.admit(UserRole.USER)
+    slow.latency = 1.0
+    slow.release()
+    assert admission.overloaded()
+    return admission, busy
+
+
+async def test_normal_priority_is_admitted_while_overloaded():
+    admission, _ = await overloaded_controller()
+
+    await asyncio.wait_for(admission.admit(UserRole.USER), 0.1)
+    assert admission.in_flight == 2
+
+
+async def test_low_priority_waits_for_a_finished_request():
+    admission, busy = await overloaded_controller()
+
+    waiting = asyncio.create_task(admission.admit(UserRole.TESTER))
+    await asyncio.sleep(0.01)
+    assert not waiting.done()
+
+    busy.release()
+    slot = await asyncio.wait_for(waiting, 0.1)
+    assert admission.in_flight == 1
+    slot.release()
+    slot.release()                                             # Only the first release counts
+    assert admission.in_flight == 0
+
+
+async def test_full_queue_and_queue_timeout_shed_with_retry_after():
+    admission, _ = await overloaded_controller(max_queue=1, queue_timeout=0.05)
+
+    queued = asyncio.create_task(admission.admit(UserRole.DEVELOPER))
+    await asyncio.sleep(0.01)
+    with pytest.raises(Overloaded) as full:
+        await admission.admit(UserRole.TESTER)
+    assert full.value.status_code == 503
+    assert full.value.retry_after == pytest.approx(1.0)       # The current p95
+
+    with pytest.raises(Overloaded):
+        await queued
+    assert admission.in_flight == 1
+
+
+async def test_chat_endpoint_releases_the_slot_when_the_turn_fails_to_start(monkeypatch):
+    from apps.customer_support import main
+
+    def broken_start(*args, **kwargs):
+        raise RuntimeError("pipeline misconfigured")
+
+    monkeypatch.setattr(main, "admission", AdmissionController(target_p95=1.0))
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/api/v1/chat", json={"message": "hi", "session_id": "s-admission"})
+        assert response.status_code == 200 and main.admission.in_flight == 0
+
+        monkeypatch.setattr(main.chat_pipeline, "start", broken_start)
+        with pytest.raises(RuntimeError):
+            await client.post("/api/v1/chat", json={"message": "hi", "session_id": "s-admission"})
+    assert main.admission.in_flight == 0
+
+
+async def test_slot_is_released_when_the_client_leaves_before_the_body():
+    from apps.customer_support.main import AdmittedStreamingResponse
+
+    admission = AdmissionController(target_p95=1.0)
+    slot = await admission.admit(UserRole.USER)
+
+    async def events():
+        yield "never sent"
+
+    async def send(message):
+        raise OSError("connection reset by peer")
+
+    response = AdmittedStreamingResponse(slot.guard(events()), slot=slot)
+    with pytest.raises(ClientDisconnect):
+        await response({"type": "http", "asgi": {"spec_version": "2.4"}}, None, send)
+    assert admission.in_flight == 0
@@ -0,0 +1,43 @@
+# tests/test_context.py
+# Context window arithmetic: which history fits the budget, and how much of the summary
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from packages.core.context import ContextBuilder, HistoryMessage, select_window
+from packages.core.tokens import message_tokens
+
+T0 = datetime(2026, 10, 1, 12, 0)
+
+
+def history(*costs: int) -> list[HistoryMessage]:
+    """Newest first, like the history readers produce them"""
+    return [
+        HistoryMessage(n, T0 - timedelta(minutes=n), "user", f"message {n}", tokens)
+        for n, tokens in enumerate(costs)
+    ]
+
+
+def test_window_keeps_the_newest_messages_that_fit():
+    messages = history(10, 20, 30, 5)
+
+    kept, used, overflow = select_window(messages, 35)
+
+    assert [m.id for m in kept] == [1, 0] and used == 30
+    # Stops at the first one that doesn't fit, even if an older one would
+    assert overflow.id == 2
+    assert select_window(messages, 100) == (list(reversed(messages)), 65, None)
+    assert select_window(messages, -5) == ([], 0, messages[0])
+
+
+def test_summary_is_cut_to_half_the_budget_and_dropped_without_room():
+    builder = ContextBuilder(default_budget=4000)
+    conversation = SimpleNamespace(summary="word " * 200, summary_token_count=200)
+
+    prompt, tokens = builder._summary_prompt(conversation, "gpt-4o-mini", 100)
+    assert tokens == message_tokens(50)
+    assert len(prompt) == 1 and len(prompt[0]["content"]) < len(conversation.summary)
+
+    # The new message alone used up the budget
+    assert builder._summary_prompt(conversation, "gpt-4o-mini", 1) == ([], 0)
+    assert builder._summary_prompt(conversation, "gpt-4o-mini", -300) == ([], 0)
@@ -0,0 +1,188 @@
+# tests/test_conversation_state.py
+# Cached conversation state: encoding, write-through updates, invalidation, concurrent writers
+# Runs against the in-memory stand-in and fakeredis, so both speak the same WATCH/MULTI protocol
+
+import asyncio
+from datetime import datetime, timedelta
+
+import fakeredis
+import pytest
+
+from packages.caching.conversation_state import (
+    CachedMessage,
+    ConversationState,
+    ConversationStateCache,
+    decode_state,
+    encode_state,
+    state_key,
+)
+from packages.caching.redis_client import InMemoryRedis
+from packages.core.enums import (
+    ChannelType,
+    ConversationStatus,
+    ConversationType,
+    MessageType,
+)
+
+T0 = datetime(2026, 10, 1, 12, 0)
+
+
+@pytest.fixture(params=["in-memory", "fakeredis"])
+def redis(request):
+    return InMemoryRedis() if request.param == "in-memory" else fakeredis.FakeAsyncRedis()
+
+
+def message(minute: int, content: str = "hi", message_id: int | None = None) -> CachedMessage:
+    return CachedMessage(message_id, T0 + timedelta(minutes=minute), MessageType.USER, content, 3)
+
+
+def state(conversation_id: int = 7, messages: list[CachedMessage] | None = None, **changes) -> ConversationState:
+    return ConversationState(
+        tenant_id=1,
+        session_id="s-1",
+        id=conversation_id,
+        status=ConversationStatus.ACTIVE,
+        conversation_type=ConversationType.SUPPORT,
+        channel=ChannelType.WEB,
+        created_at=T0,
+        messages=messages if messages is not None else [message(0, message_id=1)],
+        **changes,
+    )
+
+
+class Racing:
+    """Redis client on which another worker writes the key right after this one read it under WATCH"""
+
+    def __init__(self, redis, rival) -> None:
+        self.redis = redis
+        self.rival = rival
+
+    def __getattr__(self, name):
+        return getattr(self.redis, name)
+
+    def pipeline(self, transaction=True):
+        pipe = self.redis.pipeline(transaction=transaction)
+        read = pipe.get
+
+        async def get(key):
+            value = await read(key)
+            await self.rival()
+            return value
+
+        pipe.get = get
+        return pipe
+
+
+def test_state_survives_encoding():
+    original = state(
+        messages=[message(0, "Grüße", 1), message(1, "unflushed")],
+        summary="Customer asked about invoices",
+        summary_token_count=6,
+        summarized_through_at=T0 - timedelta(minutes=5),
+        summarized_through_id=0,
+        truncated=True,
+    )
+
+    assert decode_state(encode_state(original)) == original
+
+
+def test_other_format_versions_are_ignored():
+    import msgpack
+
+    assert decode_state(msgpack.packb([999, "anything"])) is None
+
+
+async def test_put_then_get_is_isolated_per_session(redis):
+    cache = ConversationStateCache(redis)
+    await cache.put(state())
+
+    assert await cache.get(1, "s-1") == state()
+    assert await cache.get(1, "s-2") is None
+    assert await cache.get(2, "s-1") is None
+    # A key that somehow holds another session's state is ignored
+    await redis.set(state_key(2, "s-1"), await redis.get(state_key(1, "s-1")))
+    assert await cache.get(2, "s-1") is None
+
+
+async def test_put_keeps_the_newest_messages(redis):
+    cache = ConversationStateCache(redis, max_messages=3)
+    await cache.put(state(messages=[message(minute) for minute in range(5)]))
+
+    cached = await cache.get(1, "s-1")
+    assert [m.created_at for m in cached.messages] == [T0 + timedelta(minutes=m) for m in (2, 3, 4)]
+    assert cached.truncated
+
+
+async def test_append_writes_the_turn_through(redis):
+    cache = ConversationStateCache(redis)
+    await cache.put(state())
+    await cache.append(1, "s-1", 7, [message(1, "question"), message(2, "answer")])
+
+    assert [m.content for m in (await cache.get(1, "s-1")).messages] == ["hi", "question", "answer"]
+    # Nothing cached yet: nothing to append to
+    await cache.append(1, "s-9", 7, [message(1)])
+    assert await cache.get(1, "s-9") is None
+
+
+async def test_append_evicts_on_another_conversation_or_out_of_order_turns(redis):
+    cache = ConversationStateCache(redis)
+    await cache.put(state())
+    await cache.append(1, "s-1", 8, [message(1)])
+    assert await redis.get(state_key(1, "s-1")) is None
+
+    await cache.put(state(messages=[message(5)]))
+    await cache.append(1, "s-1", 7, [message(4)])       # Older than what is cached: turns overlapped
+    assert await redis.get(state_key(1, "s-1")) is None
+
+
+async def test_status_and_summary_updates(redis):
+    cache = ConversationStateCache(redis)
+    await cache.put(state(messages=[message(0, message_id=1), message(1, message_id=2), message(2)]))
+
+    await cache.summarized(1, "s-1", 7, "summary", 2, T0 + timedelta(minutes=1), 2)
+    cached = await cache.get(1, "s-1")
+    assert cached.summary == "summary" and [m.created_at for m in cached.messages] == [T0 + timedelta(minutes=2)]
+
+    await cache.set_status(1, "s-1", 99, ConversationStatus.CLOSED)      # Another conversation: ignored
+    await cache.set_status(1, "s-1", 7, ConversationStatus.PENDING)
+    assert (await cache.get(1, "s-1")).status == ConversationStatus.PENDING
+    await cache.set_status(1, "s-1", 7, ConversationStatus.CLOSED)
+    assert await redis.get(state_key(1, "s-1")) is None
+
+
+async def test_concurrent_append_evicts_instead_of_losing_a_turn(redis):
+    other_worker = ConversationStateCache(redis)
+    cache = ConversationStateCache(Racing(redis, lambda: other_worker.append(1, "s-1", 7, [message(1, "theirs")])))
+    await cache.put(state())
+
+    await cache.append(1, "s-1", 7, [message(2, "ours")])
+
+    # The other worker's write landed between our read and write: ours must not overwrite it
+    assert await redis.get(state_key(1, "s-1")) is None
+    assert await cache.get(1, "s-1") is None
+
+
+async def test_writes_on_one_worker_drop_local_copies_on_the_others(redis):
+    reader, writer = ConversationStateCache(redis), ConversationStateCache(redis)
+    tasks = [asyncio.create_task(reader.run()), asyncio.create_task(writer.run())]
+    try:
+        for _ in range(100):
+            if reader.stats()["listening"] and writer.stats()["listening"]:
+                break
+            await asyncio.sleep(0.01)
+        await writer.put(state())
+        await reader.get(1, "s-1")
+        assert reader.stats()["local_entries"] == 1
+
+        await writer.append(1, "s-1", 7, [message(1, "new turn")])
+        for _ in range(100):
+            if reader.stats()["local_entries"] == 0:
+                break
+            await asyncio.sleep(0.01)
+
+        assert reader.stats()["local_entries"] == 0
+        assert [m.content for m in (await reader.get(1, "s-1")).messages] == ["hi", "new turn"]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
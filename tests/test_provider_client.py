@@ -0,0 +1,158 @@
+# tests/test_provider_client.py
+# Pooled provider resilience: circuit breakers, the retry budget, and the hedged race
+# between upstreams (httpx.MockTransport stands in for the providers - no network)
+
+import asyncio
+import json
+import time
+import types
+import uuid
+
+import httpx
+import pytest
+
+from packages.core import provider_client
+from packages.core.provider_client import (
+    CircuitBreaker,
+    PooledProvider,
+    ProviderError,
+    RetryBudget,
+    Upstream,
+    budget_counter,
+)
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Frozen time.monotonic() of breakers and budgets; advance with clock.now += seconds"""
+    clock = types.SimpleNamespace(now=1000.0)
+    fake = types.SimpleNamespace(monotonic=lambda: clock.now, perf_counter=time.perf_counter)
+    monkeypatch.setattr(provider_client, "time", fake)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures_and_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failures=2, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_success()                                  # Not in a row
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now += 10
+    assert breaker.state == "half_open"
+    assert breaker.allow() and not breaker.allow()            # A single trial
+    breaker.abandon()                                         # It lost a hedge race: no verdict
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"                            # The trial failed: another reset_timeout
+
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow() and breaker.allow()
+
+
+def test_retry_budget_is_a_share_of_requests_with_a_floor_and_a_cap(clock):
+    budget = RetryBudget(ratio=0.5, min_per_second=0.1, max_tokens=2)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+
+    budget.deposit()
+    budget.deposit()                                          # Two requests earn one retry
+    assert budget.try_spend() and not budget.try_spend()
+
+    clock.now += 10                                           # The floor refills a quiet worker
+    assert budget.try_spend() and not budget.try_spend()
+    clock.now += 3600
+    # Capped, however long it was idle
+    assert budget.try_spend() and budget.try_spend() and not budget.try_spend()
+
+
+class MockUpstream:
+    """An upstream answering after `delay` with the given status, recording cancelled requests"""
+
+    def __init__(self, text: str = "", delay: float = 0.0, status: int = 200) -> None:
+        self.text = text
+        self.delay = delay
+        self.status = status
+        self.requests = 0
+        self.cancelled = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.status >= 400:
+            return httpx.Response(self.status, json={"error": {"message": "mock error"}})
+        chunk = {"choices": [{"delta": {"content": self.text}}]}
+        return httpx.Response(200, content=f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode())
+
+
+def pooled(*mocks: MockUpstream, **options) -> tuple[PooledProvider, list[str]]:
+    """PooledProvider over the mocks, in order; fresh upstream names keep the shared metrics apart"""
+    names = [f"u{n}-{uuid.uuid4().hex[:6]}" for n in range(len(mocks))]
+    upstreams = [Upstream(name, f"http://{name}.test/v1") for name in names]
+    options = {"hedge_max_delay": 0.05, "http2": False, **options}
+    provider = PooledProvider(upstreams, **options)
+    for upstream, mock in zip(upstreams, mocks, strict=True):
+        provider._clients[upstream.name] = httpx.AsyncClient(
+            base_url=upstream.base_url, transport=httpx.MockTransport(mock)
+        )
+    return provider, names
+
+
+async def answer(provider: PooledProvider) -> str:
+    return "".join([chunk.text async for chunk in provider.stream("gpt-4o-mini", MESSAGES)])
+
+
+async def test_slow_primary_is_hedged_and_the_loser_cancelled():
+    slow, fast = MockUpstream("slow", delay=5), MockUpstream("fast")
+    provider, (primary, backup) = pooled(slow, fast)
+
+    assert await asyncio.wait_for(answer(provider), 1) == "fast"
+    assert slow.requests == 1 and slow.cancelled == 1
+    # The loser gets no verdict, the winner a success
+    assert provider.breakers[primary].consecutive == 0 and provider.breakers[primary].allow()
+    assert provider.breakers[backup].state == "closed"
+    await provider.aclose()
+
+
+async def test_no_hedge_once_the_retry_budget_is_spent():
+    slow, fast = MockUpstream("slow", delay=0.2), MockUpstream("fast")
+    provider, (primary, _) = pooled(slow, fast, retry_budget=RetryBudget(ratio=0, min_per_second=0, max_tokens=0))
+    skipped = budget_counter.value(kind="hedge")
+
+    assert await answer(provider) == "slow"
+    assert fast.requests == 0 and slow.cancelled == 0
+    assert budget_counter.value(kind="hedge") == skipped + 1
+    await provider.aclose()
+
+
+async def test_upstream_failure_is_retried_on_the_next_one():
+    failing, backup = MockUpstream(status=503), MockUpstream("backup")
+    provider, (primary, _) = pooled(failing, backup, hedge=False)
+
+    assert await answer(provider) == "backup"
+    assert provider.breakers[primary].consecutive == 1
+    await provider.aclose()
+
+
+async def test_rejected_request_is_not_retried_and_ends_a_breaker_trial(clock):
+    rejecting, backup = MockUpstream(status=400), MockUpstream("backup")
+    provider, (primary, _) = pooled(rejecting, backup, hedge=False, breaker_failures=1, breaker_reset=10)
+    provider.breakers[primary].record_failure()
+    clock.now += 10                                           # Half-open: this request is the trial
+
+    with pytest.raises(ProviderError) as rejected:
+        await answer(provider)
+    assert rejected.value.status_code == 400 and backup.requests == 0
+    # The upstream answered: the breaker closes instead of waiting on a trial forever
+    assert provider.breakers[primary].state == "closed" and provider.breakers[primary].allow()
+    await provider.aclose()
@@ -0,0 +1,201 @@
+# tests/test_replicas.py
+# Replica routing: read-your-writes pins (expiry, shared between workers through Redis),
+# lag taking replicas out of rotation and back, falling back to the primary
+# (fake engines and sessions - no Postgres needed)
+
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from packages.core import database
+from packages.core.database import (
+    Replica,
+    ReplicaRouter,
+    routes_counter,
+    tenant_session,
+)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeEngine:
+    """Answers the lag check queries with `position` (bytes of WAL), or fails with `error`"""
+
+    def __init__(self, position: int | None = 0) -> None:
+        self.position = position
+        self.error: Exception | None = None
+
+    @asynccontextmanager
+    async def connect(self):
+        if self.error is not None:
+            raise self.error
+        yield self
+
+    async def scalar(self, statement):
+        return self.position
+
+    async def dispose(self) -> None:
+        pass
+
+
+class BrokenRedis:
+    async def get(self, key):
+        raise ConnectionError("redis down")
+
+    async def set(self, key, value, ex=None):
+        raise ConnectionError("redis down")
+
+
+def replica(name: str, in_rotation: bool = True) -> Replica:
+    return Replica(name, FakeEngine(), session_factory=None, in_rotation=in_rotation)  # type: ignore[arg-type]
+
+
+def router(*replicas: Replica, clock: Clock | None = None, **options) -> ReplicaRouter:
+    options = {"max_lag": 2.0, "read_your_writes": 5.0, "clock": clock or Clock(), **options}
+    return ReplicaRouter(FakeEngine(), list(replicas), **options)  # type: ignore[arg-type]
+
+
+async def test_reads_rotate_over_the_replicas_in_rotation():
+    first, second, lagging = replica("r1"), replica("r2"), replica("r3", in_rotation=False)
+    routing = router(first, second, lagging)
+
+    assert {(await routing.route(1)).name for _ in range(4)} == {"r1", "r2"}
+
+
+async def test_pin_keeps_the_tenant_on_the_primary_until_it_expires():
+    clock = Clock()
+    routing = router(replica("r1"), clock=clock, read_your_writes=5.0)
+    await routing.pin(7)
+
+    assert await routing.route(7) is None
+    assert (await routing.route(8)).name == "r1"          # Other tenants aren't pinned
+    clock.now += 4.9
+    assert await routing.route(7) is None
+    clock.now += 0.2
+    assert (await routing.route(7)).name == "r1"
+
+    # Never shorter than max_lag: a replica in rotation may be that far behind
+    assert router(replica("r1"), max_lag=3.0, read_your_writes=1.0).pin_seconds == 3.0
+
+
+async def test_pin_of_one_worker_holds_on_the_others_through_redis():
+    redis = fakeredis.FakeAsyncRedis()
+    writer, reader = router(replica("r1"), redis=redis), router(replica("r1"), redis=redis)
+    pinned = routes_counter.value(target="primary", reason="read_your_writes")
+
+    await writer.pin(7)
+    assert await reader.route(7) is None
+    assert routes_counter.value(target="primary", reason="read_your_writes") == pinned + 1
+    assert (await reader.route(8)).name == "r1"
+    assert 0 < await redis.ttl("ryw:7") <= 5                 # Expires with the window
+
+    await redis.delete("ryw:7")
+    assert (await reader.route(7)).name == "r1"
+
+
+async def test_reads_go_to_the_primary_while_redis_pins_are_unknown():
+    routing = router(replica("r1"), redis=BrokenRedis())
+    unknown = routes_counter.value(target="primary", reason="pin_unknown")
+
+    await routing.pin(7)                                      # Logged, the write already committed
+    assert await routing.route(7) is None                     # Pinned locally
+    assert await routing.route(8) is None
+    assert routes_counter.value(target="primary", reason="pin_unknown") == unknown + 1
+
+
+async def test_lagging_replica_leaves_rotation_and_rejoins_once_caught_up():
+    clock = Clock()
+    behind = replica("r1", in_rotation=False)
+    routing = router(behind, clock=clock, max_lag=2.0, check_interval=1.0)
+
+    await routing.check()                                    # Primary and replica both at 0
+    assert behind.in_rotation and behind.lag == 0.0
+
+    # The primary moves on every second, the replica stops replaying
+    for second in range(1, 4):
+        clock.now += 1
+        routing.primary.position = second * 1000
+        await routing.check()
+    assert behind.lag == 3.0 and not behind.in_rotation
+    assert await routing.route(1) is None
+
+    # Caught up to within max_lag: still out, it rejoins at half of it
+    behind.engine.position = 2000
+    clock.now += 1
+    routing.primary.position = 4000
+    await routing.check()
+    assert behind.lag == 2.0 and not behind.in_rotation
+    behind.engine.position = 4000
+    await routing.check()
+    assert behind.lag == 0.0 and behind.in_rotation
+
+    behind.engine.error = OSError("connection refused")
+    await routing.check()
+    assert behind.lag is None and not behind.in_rotation
+
+
+class FakeSession:
+    def __init__(self, target: str) -> None:
+        self.target = target
+        self.info: dict[str, object] = {}
+
+    @asynccontextmanager
+    async def begin(self):
+        yield
+
+    async def connection(self):
+        return self
+
+    async def execute(self, statement, parameters=None):
+        self.info["wrote"] = "INSERT" in str(statement)
+
+
+def factory(target: str, error: Exception | None = None):
+    @asynccontextmanager
+    async def open_session():
+        if error is not None:
+            raise error
+        yield FakeSession(target)
+
+    return open_session
+
+
+@pytest.fixture
+def routed(monkeypatch):
+    """tenant_session over a router whose only replica is in rotation but refuses connections"""
+    down = replica("r1")
+    down.session_factory = factory("r1", OSError("connection refused"))
+    routing = router(down)
+    monkeypatch.setattr(database, "_router", routing)
+    monkeypatch.setattr(database, "get_session_factory", lambda: factory("primary"))
+    monkeypatch.setattr(database, "get_settings", lambda: SimpleNamespace(database_url_replicas="r1"))
+    return routing
+
+
+async def test_read_falls_back_to_the_primary_when_the_replica_checkout_fails(routed):
+    fallback = routes_counter.value(target="primary", reason="fallback")
+
+    async with tenant_session(1, read_only=True) as session:
+        assert session.target == "primary"
+    assert not routed.replicas[0].in_rotation                # Out until the next check
+    assert routes_counter.value(target="primary", reason="fallback") == fallback + 1
+
+
+async def test_only_sessions_that_wrote_and_may_pin_do(routed):
+    async with tenant_session(1) as session:
+        await session.execute("SELECT 1")
+    async with database.history_session(2) as session:
+        await session.execute("INSERT INTO messages")
+    assert routed._pinned == {}
+
+    async with tenant_session(3) as session:
+        await session.execute("INSERT INTO users")
+    assert list(routed._pinned) == [3]
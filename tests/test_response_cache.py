@@ -0,0 +1,162 @@
+# tests/test_response_cache.py
+# L1 exact-match response cache: local LRU tier, shared Redis tier (fakeredis), pipeline integration
+
+import fakeredis
+import pytest
+
+from packages.caching.lru import ByteLRUCache
+from packages.caching.response_cache import (
+    ResponseCache,
+    build_cache_key,
+    normalize_prompt,
+)
+from packages.core.chat import ChatPipeline, ChatRequest
+from packages.core.context import ContextWindow
+from packages.core.enums import ConversationType
+from packages.core.providers import FakeProvider
+
+MODEL = "gpt-4o-mini"
+SUPPORT = ConversationType.SUPPORT
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeAsyncRedis()
+
+
+class StubContext:
+    """ContextBuilder stand-in: session "a" starts fresh, every other session has history"""
+
+    async def build(self, turn):
+        current = {"role": "user", "content": turn.request.message}
+        if turn.request.session_id == "a":
+            return ContextWindow([current], tokens=10, message_tokens=5)
+        history = [{"role": "user", "content": "my router is a Fritzbox"}]
+        return ContextWindow([*history, current], tokens=20, message_tokens=5, conversation_id=7, history=1)
+
+    async def compact(self, turn, window):
+        pass
+
+
+class BrokenRedis:
+    async def get(self, key):
+        raise ConnectionError("redis is down")
+
+    async def set(self, key, value, ex=None):
+        raise ConnectionError("redis is down")
+
+
+def test_prompts_differing_in_case_spacing_and_punctuation_share_a_key():
+    assert normalize_prompt("  How do I RESET my   password?? ") == "how do i reset my password"
+    assert build_cache_key(1, SUPPORT, MODEL, "Reset password!") == build_cache_key(1, SUPPORT, MODEL, "reset password")
+    assert build_cache_key(1, SUPPORT, MODEL, "reset password").startswith("l1:1:support:gpt-4o-mini:")
+
+
+async def test_put_then_get_from_the_local_tier(redis):
+    cache = ResponseCache(redis)
+    await cache.put(1, SUPPORT, MODEL, "How do I reset my password?", "Use the reset link.")
+
+    assert await cache.get(1, SUPPORT, MODEL, "how do i reset my password") == "Use the reset link."
+    assert cache.stats()["hits"] == 1
+    assert await redis.ttl(build_cache_key(1, SUPPORT, MODEL, "how do i reset my password")) > 0
+
+
+async def test_redis_hit_on_another_worker_fills_its_local_tier(redis):
+    writer, reader = ResponseCache(redis), ResponseCache(redis)
+    await writer.put(1, SUPPORT, MODEL, "opening hours", "9 to 5")
+
+    assert len(reader.local) == 0
+    assert await reader.get(1, SUPPORT, MODEL, "Opening hours?") == "9 to 5"
+    assert len(reader.local) == 1
+    await redis.flushall()
+    assert await reader.get(1, SUPPORT, MODEL, "opening hours") == "9 to 5"   # Served locally now
+
+
+async def test_entries_are_isolated_per_tenant_model_and_type(redis):
+    cache = ResponseCache(redis)
+    await cache.put(1, SUPPORT, MODEL, "refund policy", "30 days")
+
+    assert await cache.get(2, SUPPORT, MODEL, "refund policy") is None
+    assert await cache.get(1, SUPPORT, "gpt-4o", "refund policy") is None
+    assert await cache.get(1, ConversationType.SALES, MODEL, "refund policy") is None
+
+
+async def test_tenant_id_inside_the_value_is_checked(redis):
+    cache = ResponseCache(redis)
+    await cache.put(1, SUPPORT, MODEL, "refund policy", "30 days")
+    # A key that somehow holds another tenant's entry is ignored
+    await redis.set(build_cache_key(2, SUPPORT, MODEL, "refund policy"), await redis.get(
+        build_cache_key(1, SUPPORT, MODEL, "refund policy")
+    ))
+
+    assert await ResponseCache(redis).get(2, SUPPORT, MODEL, "refund policy") is None
+
+
+async def test_feedback_conversations_are_never_cached(redis):
+    cache = ResponseCache(redis)
+    await cache.put(1, ConversationType.FEEDBACK, MODEL, "I love it", "Thanks!")
+
+    assert await cache.get(1, ConversationType.FEEDBACK, MODEL, "I love it") is None
+    assert await redis.dbsize() == 0
+
+
+async def test_expired_redis_entry_is_a_miss(redis):
+    cache = ResponseCache(redis, ttls={SUPPORT: 1})
+    await cache.put(1, SUPPORT, MODEL, "status page", "status.example.com")
+    await redis.delete(build_cache_key(1, SUPPORT, MODEL, "status page"))   # As if Redis expired it
+    cache.local.clear()
+
+    assert await cache.get(1, SUPPORT, MODEL, "status page") is None
+    assert cache.stats()["misses"] == 1
+
+
+async def test_redis_outage_degrades_to_local_only():
+    cache = ResponseCache(BrokenRedis())
+    await cache.put(1, SUPPORT, MODEL, "hello", "Hi!")
+
+    assert await cache.get(1, SUPPORT, MODEL, "hello") == "Hi!"
+    assert await cache.get(1, SUPPORT, MODEL, "something else") is None
+
+
+def test_local_tier_is_bounded_by_bytes():
+    lru: ByteLRUCache[bytes] = ByteLRUCache(max_bytes=100)
+    for index in range(10):
+        lru.set(f"k{index}", b"x" * 20, ttl=60)
+
+    assert lru.current_bytes <= 100
+    assert lru.get("k0") is None and lru.get("k9") == b"x" * 20
+    assert lru.evictions > 0
+
+
+async def test_repeated_question_skips_the_provider(redis):
+    provider = FakeProvider(replies={"How do I reset my password?": "Use the reset link."})
+    pipeline = ChatPipeline(provider, MODEL, response_cache=ResponseCache(redis))
+
+    first = pipeline.start(1, ChatRequest(message="How do I reset my password?", session_id="a"))
+    [event async for event in pipeline.stream(first)]
+    await pipeline.persist(first)
+    second = pipeline.start(1, ChatRequest(message="how do i reset my password", session_id="b"))
+    events = [event async for event in pipeline.stream(second)]
+
+    assert provider.calls == 1
+    assert second.cached == "l1"
+    assert "".join(e["text"] for e in events if e["type"] == "token") == "Use the reset link."
+    assert events[-1]["tokens_used"] == 0
+
+
+async def test_turns_with_history_bypass_the_cache(redis):
+    provider = FakeProvider(replies={"How do I reset it?": "Hold the button for 10 seconds."})
+    cache = ResponseCache(redis)
+    pipeline = ChatPipeline(provider, MODEL, response_cache=cache, context=StubContext())
+
+    first = pipeline.start(1, ChatRequest(message="How do I reset it?", session_id="a"))
+    [event async for event in pipeline.stream(first)]
+    await pipeline.persist(first)
+    followup = pipeline.start(1, ChatRequest(message="How do I reset it?", session_id="b"))
+    [event async for event in pipeline.stream(followup)]
+    await pipeline.persist(followup)
+
+    assert provider.calls == 2                 # "it" means something else after the history
+    assert followup.cached is None
+    assert followup.context.history == 1       # Built once, before the lookup
+    assert await redis.dbsize() == 1           # Only the context-free turn was stored
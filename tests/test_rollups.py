@@ -0,0 +1,144 @@
+# tests/test_rollups.py
+# Rollup time arithmetic: hour/day flooring, resolution histogram slots, and the
+# windows refresh() recomputes (fake engine and rollup - no Postgres needed)
+
+from bisect import bisect_right
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import pytest
+from sqlalchemy import Integer, cast, create_engine, literal, select
+
+from packages.core.analytics import RESOLUTION_BUCKETS_MINUTES
+from packages.data import rollups
+from packages.data.rollups import (
+    Rollup,
+    _histogram_slots,
+    floor_day,
+    floor_hour,
+    refresh,
+)
+
+NOW = datetime(2026, 10, 3, 14, 37, 12, 345)
+
+
+class FakeEngine:
+    def connect(self):
+        return nullcontext()
+
+    def begin(self):
+        return nullcontext()
+
+
+@dataclass(frozen=True)
+class RecordingRollup(Rollup):
+    """Records the windows it is asked to compute"""
+    table: type = object
+    time_column: object = None
+    first_row: datetime | None = None
+    hours: list[tuple[datetime, datetime]] = field(default_factory=list)
+    days: list[tuple[datetime, datetime]] = field(default_factory=list)
+
+    def oldest(self, connection):
+        return self.first_row
+
+    def compute_hours(self, connection, start, end):
+        self.hours.append((start, end))
+        return 1
+
+    def compute_days(self, connection, start, end):
+        self.days.append((start, end))
+        return 1
+
+
+@pytest.fixture
+def watermarks(monkeypatch):
+    stored: dict[str, datetime] = {}
+    monkeypatch.setattr(rollups, "get_watermark", lambda connection, name: stored.get(name))
+    monkeypatch.setattr(rollups, "set_watermark", lambda connection, name, high_water: stored.__setitem__(name, high_water))
+    return stored
+
+
+def run(monkeypatch, rollup: RecordingRollup, **options) -> dict:
+    monkeypatch.setattr(rollups, "ROLLUPS", (rollup,))
+    return refresh(FakeEngine(), now=NOW, **options)[rollup.name]
+
+
+def test_floor():
+    assert floor_hour(NOW) == datetime(2026, 10, 3, 14)
+    assert floor_day(NOW) == datetime(2026, 10, 3)
+    assert floor_hour(datetime(2026, 10, 3, 14)) == datetime(2026, 10, 3, 14)
+
+
+def test_rollup_needs_both_computations():
+    class HoursOnly(Rollup):
+        def compute_hours(self, connection, start, end):
+            return 0
+
+    with pytest.raises(TypeError):
+        HoursOnly("partial", object, None)
+
+
+def test_every_resolution_falls_into_exactly_one_histogram_slot():
+    engine = create_engine("sqlite://")
+    samples = [0, 4, 5, 14, 15, 59, 60, 1439, 1440, 10079, 10080, 99_999]
+    with engine.connect() as connection:
+        for minutes in samples:
+            flags = connection.execute(
+                select(*[cast(slot, Integer) for slot in _histogram_slots(literal(minutes))])
+            ).one()
+            expected = [0] * (len(RESOLUTION_BUCKETS_MINUTES) + 1)
+            expected[bisect_right(RESOLUTION_BUCKETS_MINUTES, minutes)] = 1
+            assert list(flags) == expected, minutes
+
+
+def test_refresh_resumes_lookback_hours_before_the_watermark(monkeypatch, watermarks):
+    rollup = RecordingRollup("messages")
+    watermarks["messages"] = datetime(2026, 10, 3, 9)
+
+    report = run(monkeypatch, rollup, lookback_hours=3, settle_minutes=40, chunk_hours=2)
+
+    # 14:37 - 40 minutes settles to 13:00; 09:00 - 3 hours of lookback
+    assert rollup.hours == [
+        (datetime(2026, 10, 3, 6), datetime(2026, 10, 3, 8)),
+        (datetime(2026, 10, 3, 8), datetime(2026, 10, 3, 10)),
+        (datetime(2026, 10, 3, 10), datetime(2026, 10, 3, 12)),
+        (datetime(2026, 10, 3, 12), datetime(2026, 10, 3, 13)),
+    ]
+    assert set(rollup.days) == {(datetime(2026, 10, 3), datetime(2026, 10, 4))}
+    assert watermarks["messages"] == datetime(2026, 10, 3, 13)
+    assert report["hour_rows"] == 4 and report["to"] == "2026-10-03T13:00:00"
+
+
+def test_chunk_ending_at_midnight_recomputes_only_its_own_day(monkeypatch, watermarks):
+    rollup = RecordingRollup("messages")
+    watermarks["messages"] = datetime(2026, 10, 2, 22)
+
+    run(monkeypatch, rollup, lookback_hours=0, settle_minutes=0, chunk_hours=2)
+
+    assert rollup.hours[0] == (datetime(2026, 10, 2, 22), datetime(2026, 10, 3))
+    assert rollup.days[0] == (datetime(2026, 10, 2), datetime(2026, 10, 3))
+    assert rollup.days[1] == (datetime(2026, 10, 3), datetime(2026, 10, 4))
+
+
+def test_first_run_backfills_from_the_oldest_row(monkeypatch, watermarks):
+    rollup = RecordingRollup("conversations", first_row=datetime(2026, 9, 30, 23, 59))
+
+    run(monkeypatch, rollup, chunk_hours=24)
+
+    assert rollup.hours[0] == (datetime(2026, 9, 30, 23), datetime(2026, 10, 1, 23))
+    assert rollup.hours[-1][1] == datetime(2026, 10, 3, 14)
+    assert rollup.days[0] == (datetime(2026, 9, 30), datetime(2026, 10, 2))
+
+
+def test_nothing_to_compute(monkeypatch, watermarks):
+    empty = RecordingRollup("messages")
+    report = run(monkeypatch, empty)
+    assert empty.hours == [] and report["from"] == report["to"] == "2026-10-03T14:00:00"
+
+    # A watermark past the settled end (clock skew, a manual run) computes nothing either
+    ahead = RecordingRollup("messages")
+    watermarks["messages"] = datetime(2026, 10, 4)
+    run(monkeypatch, ahead, lookback_hours=1)
+    assert ahead.hours == [] and watermarks["messages"] == datetime(2026, 10, 4)
@@ -0,0 +1,112 @@
+# tests/test_single_flight.py
+# In-process single-flight: identical concurrent turns share one provider call,
+# late joiners replay, cancellation follows the last listener, errors fan out
+
+import asyncio
+
+import pytest
+
+from packages.caching.single_flight import SingleFlight
+from packages.core.chat import ChatPipeline, ChatRequest
+from packages.core.providers import FakeProvider, ProviderChunk
+
+
+class Upstream:
+    """Provider stream that yields its chunks, stopping before `hold_after` until released"""
+
+    def __init__(self, texts: list[str], hold_after: int | None = None, error: Exception | None = None) -> None:
+        self.texts = texts
+        self.hold_after = hold_after
+        self.error = error
+        self.release = asyncio.Event()
+        self.calls = 0
+        self.cancelled = False
+
+    async def __call__(self, on_model):
+        self.calls += 1
+        try:
+            for index, text in enumerate(self.texts):
+                if index == self.hold_after:
+                    await self.release.wait()
+                yield ProviderChunk(text=text)
+            if self.error is not None:
+                raise self.error
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def collect(subscription) -> list[str]:
+    return [chunk.text async for chunk in subscription]
+
+
+async def test_concurrent_identical_turns_make_one_provider_call():
+    provider = FakeProvider(first_token_delay=0.02, token_delay=0.005)
+    pipeline = ChatPipeline(provider, "gpt-4o-mini", single_flight=SingleFlight())
+    turns = [pipeline.start(1, ChatRequest(message="Where is my order?", session_id=f"s-{n}")) for n in range(5)]
+
+    async def run(turn):
+        return [event async for event in pipeline.stream(turn)]
+
+    results = await asyncio.gather(*(run(turn) for turn in turns))
+
+    assert provider.calls == 1
+    assert len({turn.content for turn in turns}) == 1
+    assert all(events[-1]["type"] == "done" for events in results)
+    # Only the leader is billed
+    assert sorted(turn.cached or "" for turn in turns) == ["", "coalesced", "coalesced", "coalesced", "coalesced"]
+    assert sum(turn.tokens_used or 0 for turn in turns) == turns[0].tokens_used
+
+
+async def test_late_joiner_replays_the_chunks_it_missed():
+    single_flight = SingleFlight()
+    upstream = Upstream(["Hello ", "there ", "again"], hold_after=2)
+    leader = single_flight.join("k", "m", upstream)
+    stream = aiter(leader)
+    assert [(await anext(stream)).text, (await anext(stream)).text] == ["Hello ", "there "]
+
+    follower = single_flight.join("k", "m", upstream)
+    assert follower.flight is leader.flight and not follower.leader
+    upstream.release.set()
+
+    assert await collect(follower) == ["Hello ", "there ", "again"]
+    assert [chunk.text async for chunk in stream] == ["again"]
+    assert upstream.calls == 1 and len(single_flight) == 0
+
+
+async def test_upstream_is_cancelled_only_when_the_last_listener_leaves():
+    single_flight = SingleFlight()
+    upstream = Upstream(["first", "never"], hold_after=1)
+    first, second = single_flight.join("k", "m", upstream), single_flight.join("k", "m", upstream)
+    streams = [aiter(first), aiter(second)]
+    for stream in streams:
+        assert (await anext(stream)).text == "first"
+
+    await streams[0].aclose()             # The leader's client went away
+    await asyncio.sleep(0.01)
+    assert not upstream.cancelled and not first.flight.task.done()
+
+    await streams[1].aclose()
+    with pytest.raises(asyncio.CancelledError):
+        await first.flight.task
+    assert upstream.cancelled and len(single_flight) == 0
+
+
+async def test_provider_error_reaches_every_follower():
+    single_flight = SingleFlight()
+    upstream = Upstream(["partial"], hold_after=0, error=ConnectionError("upstream closed the stream"))
+    subscriptions = [single_flight.join("k", "m", upstream) for _ in range(3)]
+    received: list[list[str]] = [[] for _ in subscriptions]
+
+    async def read(subscription, into):
+        async for chunk in subscription:
+            into.append(chunk.text)
+
+    readers = [asyncio.create_task(read(s, into)) for s, into in zip(subscriptions, received, strict=True)]
+    await asyncio.sleep(0.01)
+    upstream.release.set()
+    results = await asyncio.gather(*readers, return_exceptions=True)
+
+    assert [type(result) for result in results] == [ConnectionError] * 3
+    assert received == [["partial"]] * 3
+    assert upstream.calls == 1
@@ -0,0 +1,139 @@
+# tests/test_streaming.py
+# Chat replies stream token by token: pipeline events, wire formats, the HTTP endpoint
+
+import json
+from collections.abc import AsyncIterator
+
+import httpx
+
+from packages.core.chat import ChatPipeline, ChatRequest
+from packages.core.providers import FakeProvider, ProviderChunk
+from packages.core.streaming import (
+    NDJSON_MEDIA_TYPE,
+    SSE_MEDIA_TYPE,
+    encode_ndjson,
+    encode_sse,
+    pick_media_type,
+)
+
+
+class RecordingStore:
+    def __init__(self) -> None:
+        self.turns = []
+
+    async def save_turn(self, turn) -> None:
+        self.turns.append(turn)
+
+
+class FailingProvider:
+    """Streams two tokens, then the connection to the provider breaks"""
+
+    async def stream(self, model, messages, deadline=None) -> AsyncIterator[ProviderChunk]:
+        yield ProviderChunk(text="Hello ")
+        yield ProviderChunk(text="there")
+        raise ConnectionError("upstream closed the stream")
+
+
+async def collect(events):
+    return [event async for event in events]
+
+
+def start(pipeline: ChatPipeline, message: str = "hi"):
+    return pipeline.start(1, ChatRequest(message=message, session_id="s-1"))
+
+
+async def test_tokens_are_streamed_in_order_then_done():
+    pipeline = ChatPipeline(FakeProvider(replies={"hi": "Hello! How can I help?"}), "gpt-4o-mini")
+    turn = start(pipeline)
+
+    events = await collect(pipeline.stream(turn))
+
+    tokens = [event["text"] for event in events if event["type"] == "token"]
+    assert tokens == ["Hello! ", "How ", "can ", "I ", "help?"]
+    assert [event["type"] for event in events[-1:]] == ["done"]
+    done = events[-1]
+    assert done["model"] == "gpt-4o-mini"
+    assert done["tokens_used"] == 1 + 5        # FakeProvider: prompt words + completion chunks
+    assert done["ttft_ms"] is not None and done["ttft_ms"] <= done["duration_ms"]
+    assert turn.completed and turn.content == "Hello! How can I help?"
+
+
+async def test_first_token_arrives_before_the_reply_is_finished():
+    pipeline = ChatPipeline(FakeProvider(replies={"hi": "one two three four"}, token_delay=0.02), "gpt-4o-mini")
+    turn = start(pipeline)
+
+    events = pipeline.stream(turn)
+    first = await anext(events)
+    assert first == {"type": "token", "text": "one "}
+    assert not turn.completed                  # The rest of the reply is still being generated
+    rest = await collect(events)
+    assert rest[-1]["type"] == "done"
+    assert turn.time_to_first_token < rest[-1]["duration_ms"] / 1000
+
+
+async def test_provider_error_ends_the_stream_in_band_and_skips_persistence():
+    store = RecordingStore()
+    pipeline = ChatPipeline(FailingProvider(), "gpt-4o-mini", store=store)
+    turn = start(pipeline)
+
+    events = await collect(pipeline.stream(turn))
+
+    assert [event["type"] for event in events] == ["token", "token", "error"]
+    assert events[-1]["message"] == "upstream closed the stream"
+    assert not turn.completed
+    await pipeline.persist(turn)
+    assert store.turns == []
+
+
+async def test_completed_turn_is_persisted():
+    store = RecordingStore()
+    pipeline = ChatPipeline(FakeProvider(), "gpt-4o-mini", store=store)
+    turn = start(pipeline, "where is my invoice?")
+
+    await collect(pipeline.stream(turn))
+    await pipeline.persist(turn)
+
+    assert store.turns == [turn]
+    assert turn.content == "[gpt-4o-mini] You said: where is my invoice?"
+
+
+async def test_sse_and_ndjson_framing():
+    async def events():
+        yield {"type": "token", "text": "Grüße"}
+        yield {"type": "done", "model": "m"}
+
+    sse = b"".join(await collect(encode_sse(events())))
+    assert sse == (
+        'event: token\ndata: {"type":"token","text":"Grüße"}\n\n'
+        'event: done\ndata: {"type":"done","model":"m"}\n\n'
+    ).encode()
+
+    ndjson = b"".join(await collect(encode_ndjson(events())))
+    lines = ndjson.decode().splitlines()
+    assert [json.loads(line) for line in lines] == [{"type": "token", "text": "Grüße"}, {"type": "done", "model": "m"}]
+
+
+def test_media_type_negotiation():
+    assert pick_media_type(None) == SSE_MEDIA_TYPE
+    assert pick_media_type("application/x-ndjson") == NDJSON_MEDIA_TYPE
+    assert pick_media_type("text/event-stream", "ndjson") == NDJSON_MEDIA_TYPE
+    assert pick_media_type(NDJSON_MEDIA_TYPE, "sse") == SSE_MEDIA_TYPE
+
+
+async def test_chat_endpoint_streams_ndjson():
+    from apps.customer_support.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async with client.stream(
+            "POST", "/api/v1/chat?format=ndjson", json={"message": "hello there", "session_id": "s-http"}
+        ) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith(NDJSON_MEDIA_TYPE)
+            assert response.headers["x-accel-buffering"] == "no"
+            events = [json.loads(line) async for line in response.aiter_lines() if line]
+
+    assert events[-1]["type"] == "done"
+    text = "".join(event["text"] for event in events if event["type"] == "token")
+    assert text.endswith("You said: hello there")
+    assert len(events) > 2                     # One frame per token, not one blob
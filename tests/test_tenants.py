@@ -0,0 +1,111 @@
+# tests/test_tenants.py
+# Tenant resolution cache: hits by id and slug, negative caching, coalesced misses,
+# invalidation racing a load (fake session factory - no Postgres needed)
+
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from packages.core.tenants import MAX_TENANT_ID, TenantContext, TenantResolver
+
+
+class FakeTenants:
+    """Session factory over a fixed tenants table; queries can be held back with `gate`"""
+
+    def __init__(self, *tenants: TenantContext) -> None:
+        self.tenants = list(tenants)
+        self.queries = 0
+        self.gate: asyncio.Event | None = None
+
+    @asynccontextmanager
+    async def session(self):
+        yield self
+
+    async def execute(self, statement):
+        self.queries += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        [value] = statement.compile().params.values()
+        column = "id" if isinstance(value, int) else "slug"
+        row = next((t for t in self.tenants if getattr(t, column) == value), None)
+        return SimpleNamespace(one_or_none=lambda: row)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+ACME = TenantContext(42, "acme", "Acme Inc", True)
+
+
+@pytest.fixture
+def table():
+    return FakeTenants(ACME)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def resolver(table, clock):
+    return TenantResolver(table.session, ttl=60, negative_ttl=5, clock=clock)
+
+
+async def test_tenant_is_cached_under_its_id_and_slug(resolver, table, clock):
+    assert await resolver.resolve("42") == ACME
+    assert await resolver.resolve("acme") == ACME
+    assert await resolver.resolve("0042") == ACME
+    assert table.queries == 1
+
+    clock.now += 61
+    assert await resolver.resolve("acme") == ACME
+    assert table.queries == 2
+
+
+async def test_unknown_tenant_is_cached_for_the_negative_ttl(resolver, table, clock):
+    assert await resolver.resolve("nope") is None
+    assert await resolver.resolve("nope") is None
+    assert table.queries == 1
+
+    clock.now += 6
+    table.tenants.append(TenantContext(7, "nope", "Created meanwhile", True))
+    assert (await resolver.resolve("nope")).id == 7
+
+
+async def test_ids_out_of_the_integer_range_are_unknown_without_a_query(resolver, table):
+    for key in ("0", str(MAX_TENANT_ID + 1), "9" * 40):
+        assert await resolver.resolve(key) is None
+    assert table.queries == 0
+
+    assert await resolver.resolve(str(MAX_TENANT_ID)) is None
+    assert table.queries == 1
+
+
+async def test_concurrent_misses_share_one_query(resolver, table):
+    table.gate = asyncio.Event()
+    waiting = [asyncio.create_task(resolver.resolve("acme")) for _ in range(10)]
+    await asyncio.sleep(0.01)
+    table.gate.set()
+
+    assert await asyncio.gather(*waiting) == [ACME] * 10
+    assert table.queries == 1
+
+
+async def test_load_racing_an_invalidation_is_returned_but_not_cached(resolver, table):
+    table.gate = asyncio.Event()
+    loading = asyncio.create_task(resolver.resolve("42"))
+    await asyncio.sleep(0.01)
+    resolver.invalidate(42, ("acme",), source="notify")         # The row changed while we read it
+    table.gate.set()
+
+    assert await loading == ACME
+    assert await resolver.resolve("42") == ACME
+    assert table.queries == 2
@@ -0,0 +1,101 @@
+# tests/test_tracing.py
+# Spans of the chat pipeline and the HTTP middleware (in-memory exporter), request profiling
+
+from collections.abc import AsyncIterator
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from opentelemetry.trace import StatusCode
+
+from packages.core.chat import ChatPipeline, ChatRequest
+from packages.core.providers import FakeProvider, ProviderChunk
+from packages.observability.middleware import ObservabilityMiddleware
+from packages.observability.profiling import RequestProfiler
+from packages.observability.tracing import configure_tracing, memory_exporter, tracer
+
+
+@pytest.fixture(scope="session")
+def exporter():
+    # The global tracer provider can be installed once per process
+    return memory_exporter() or configure_tracing("clever-tests", exporter="memory")
+
+
+@pytest.fixture
+def spans(exporter):
+    exporter.clear()
+    return lambda: {span.name: span for span in exporter.get_finished_spans()}
+
+
+class FailingProvider:
+    async def stream(self, model, messages, deadline=None) -> AsyncIterator[ProviderChunk]:
+        yield ProviderChunk(text="Hello ")
+        raise ConnectionError("upstream closed the stream")
+
+
+def app_with(profiler: RequestProfiler | None = None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int) -> dict[str, int]:
+        with tracer.start_as_current_span("load_item"):
+            return {"id": item_id}
+
+    app.add_middleware(ObservabilityMiddleware, profiler=profiler)
+    return app
+
+
+async def test_chat_turn_spans(spans):
+    pipeline = ChatPipeline(FakeProvider(replies={"hi": "Hello there"}), "gpt-4o-mini")
+    turn = pipeline.start(1, ChatRequest(message="hi", session_id="s-1"))
+
+    with tracer.start_as_current_span("request") as parent:
+        [event async for event in pipeline.stream(turn)]
+    finished = spans()
+
+    assert {"request", "chat.cache_lookup", "chat.provider"} <= set(finished)
+    provider = finished["chat.provider"]
+    assert provider.attributes["llm.model"] == "gpt-4o-mini"
+    assert provider.attributes["llm.tokens"] == turn.tokens_used
+    assert [event.name for event in provider.events] == ["first_token"]
+    assert finished["chat.cache_lookup"].attributes["cache.layer"] == "miss"
+    # One trace: the lookup ran under the caller's span
+    assert finished["chat.cache_lookup"].parent.span_id == parent.get_span_context().span_id
+    assert provider.context.trace_id == parent.get_span_context().trace_id
+
+
+async def test_provider_failure_marks_the_span(spans):
+    pipeline = ChatPipeline(FailingProvider(), "gpt-4o-mini")
+    turn = pipeline.start(1, ChatRequest(message="hi", session_id="s-1"))
+
+    [event async for event in pipeline.stream(turn)]
+
+    provider = spans()["chat.provider"]
+    assert provider.status.status_code == StatusCode.ERROR
+    assert [event.name for event in provider.events] == ["first_token", "exception"]
+
+
+async def test_http_server_span_is_named_after_the_route(spans):
+    transport = httpx.ASGITransport(app=app_with())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/items/42")
+    assert response.status_code == 200
+
+    finished = spans()
+    server = finished["GET /items/{item_id}"]
+    assert server.attributes["http.route"] == "/items/{item_id}"
+    assert server.attributes["http.response.status_code"] == 200
+    assert finished["load_item"].context.trace_id == server.context.trace_id
+
+
+async def test_profile_is_written_only_for_the_right_token(tmp_path, spans):
+    profiler = RequestProfiler("s3cret", str(tmp_path))
+    transport = httpx.ASGITransport(app=app_with(profiler))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        denied = await client.get("/items/1", headers={"x-profile": "s3cre"})
+        profiled = await client.get("/items/1", headers={"x-profile": "s3cret", "x-profile-mode": "cprofile"})
+
+    assert "x-profile-id" not in denied.headers
+    profile_id = profiled.headers["x-profile-id"]
+    assert [path.name for path in tmp_path.iterdir()] == [f"{profile_id}.pstats"]
+    assert not profiler.allowed(None) and not RequestProfiler("", str(tmp_path)).allowed("")
@@ -0,0 +1,72 @@
+# tests/test_vector_index.py
+# NumpyIndex as a bounded cache: capacity, LRU order, expiry sweeps, compaction
+
+import time
+
+import numpy as np
+import pytest
+
+from packages.caching.vector_index import NumpyIndex
+
+DIM = 16
+
+
+def vectors(count: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(count, DIM)).astype(np.float32)
+
+
+def fresh(count: int) -> list[dict]:
+    return [{"expires_at": time.time() + 3600} for _ in range(count)]
+
+
+@pytest.mark.parametrize("ivf_threshold", [10**9, 100])
+async def test_capacity_is_enforced_and_survivors_stay_searchable(ivf_threshold):
+    index = NumpyIndex(DIM, ivf_threshold=ivf_threshold, max_vectors=300, expiry_key="expires_at")
+    data = vectors(1000)
+    for start in range(0, 1000, 100):
+        ids = [str(i) for i in range(start, start + 100)]
+        await index.upsert(["a"] * 50 + ["b"] * 50, ids, data[start:start + 100], fresh(100))
+        assert len(index) <= 300
+
+    for partition in index._partitions.values():
+        for key, row in partition.rows.items():
+            expected = data[int(key)] / np.linalg.norm(data[int(key)])
+            assert np.allclose(partition.matrix[row], expected, atol=1e-5)
+        if partition.centroids is not None:
+            assert sorted(row for rows in partition.lists for row in rows) == list(range(partition.size))
+    survivor = next(iter(index._partitions["b"].rows))
+    [[hit]] = await index.search(["b"], data[[int(survivor)]], limit=1)
+    assert hit.id == survivor
+
+
+async def test_recently_found_rows_outlive_older_untouched_ones():
+    index = NumpyIndex(DIM, max_vectors=10)
+    data = vectors(20)
+    await index.upsert(["a"] * 10, [str(i) for i in range(10)], data[:10], fresh(10))
+    await index.search(["a"], data[[0]], limit=1)          # Row 0 becomes the most recently used
+    await index.upsert(["a"] * 5, [str(i) for i in range(10, 15)], data[10:15], fresh(5))
+
+    kept = set(index._partitions["a"].rows)
+    assert "0" in kept and "1" not in kept
+    assert len(index) <= 10
+
+
+async def test_expired_rows_are_swept_and_partitions_shrink():
+    index = NumpyIndex(DIM, max_vectors=10_000, expiry_key="expires_at", sweep_interval=0)
+    data = vectors(600)
+    expired = [{"expires_at": time.time() - 1} for _ in range(599)]
+    await index.upsert(["a"] * 599, [str(i) for i in range(599)], data[:599], expired)
+    await index.upsert(["a"], ["live"], data[599:], fresh(1))
+
+    partition = index._partitions["a"]
+    assert list(partition.rows) == ["live"]
+    assert len(partition.matrix) < 1024                     # Capacity given back, not just rows hidden
+    await index.upsert(["b"], ["x"], data[:1], [{"expires_at": time.time() - 1}])
+    await index.upsert(["c"], ["y"], data[:1], fresh(1))
+    assert "b" not in index._partitions                     # Emptied partitions are dropped
+
+
+async def test_unbounded_index_keeps_everything():
+    index = NumpyIndex(DIM)
+    await index.upsert(["a"] * 100, [str(i) for i in range(100)], vectors(100), [{}] * 100)
+    assert len(index) == 100 and not index._recency
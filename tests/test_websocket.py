@@ -0,0 +1,59 @@
+# tests/test_websocket.py
+# Chat WebSockets: a human agent's message is saved, then reaches every socket of the session
+
+from fastapi.testclient import TestClient
+
+from apps.customer_support import main
+
+
+class RecordingStore:
+    def __init__(self, events: list[str]) -> None:
+        self.events = events
+        self.saved: list[tuple[int, str, str]] = []
+
+    async def save_agent_message(self, tenant_id, session_id, content, model):
+        self.saved.append((tenant_id, session_id, content))
+        self.events.append("saved")
+        return 7 if session_id == "s-agent" else None
+
+
+def test_agent_message_is_saved_then_pushed_to_every_socket_of_the_session(monkeypatch):
+    events: list[str] = []
+    store = RecordingStore(events)
+    push = main.connections.push
+
+    async def recording_push(*args):
+        events.append("pushed")
+        return await push(*args)
+
+    monkeypatch.setattr(main, "turn_store", store)
+    monkeypatch.setattr(main.connections, "push", recording_push)
+    client = TestClient(main.app)
+    agent = {"x-user-role": "support_agent"}
+
+    with (
+        client.websocket_connect("/api/v1/chat/ws?session_id=s-agent") as tab,
+        client.websocket_connect("/api/v1/chat/ws?session_id=s-agent") as app,
+        client.websocket_connect("/api/v1/chat/ws?session_id=s-other") as other,
+    ):
+        # Round trips: every socket is registered before the push
+        for socket in (tab, app, other):
+            socket.send_json({"type": "ping"})
+            assert socket.receive_json()["type"] == "pong"
+
+        response = client.post("/api/v1/sessions/s-agent/messages", json={"message": "Hi, I'm Ann"}, headers=agent)
+        assert response.status_code == 200
+        assert response.json()["local_connections"] == 2 and response.json()["conversation_id"] == 7
+        for socket in (tab, app):
+            assert socket.receive_json() == {"type": "human_agent", "text": "Hi, I'm Ann", "agent": None}
+
+        # No open conversation: nothing saved, nothing pushed
+        missing = client.post("/api/v1/sessions/s-other/messages", json={"message": "Hello?"}, headers=agent)
+        assert missing.status_code == 404
+        other.send_json({"type": "ping"})
+        assert other.receive_json()["type"] == "pong"
+
+    assert events == ["saved", "pushed", "saved"]
+    assert store.saved[0] == (main.settings.default_tenant_id, "s-agent", "Hi, I'm Ann")
+    forbidden = client.post("/api/v1/sessions/s-agent/messages", json={"message": "Hi"})
+    assert forbidden.status_code == 403
@@ -0,0 +1,121 @@
+# tests/test_write_behind.py
+# Write-behind buffer against a fake session factory: statement chunking, per-conversation
+# isolation of a failed batch, durable enqueue
+
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import pytest
+
+from packages.core.enums import MessageType
+from packages.core.write_behind import MAX_ROWS_PER_INSERT, WriteBehindBuffer
+
+T0 = datetime(2026, 10, 1, 12, 0)
+
+
+def row(conversation_id: int, content: str = "hi") -> dict:
+    return {
+        "tenant_id": 1,
+        "conversation_id": conversation_id,
+        "user_id": None,
+        "content": content,
+        "message_type": MessageType.USER,
+        "ai_model": None,
+        "tokens_used": None,
+        "token_count": 1,
+        "created_at": T0,
+    }
+
+
+class FakeDatabase:
+    """Session factory that records committed statements and fails any that touch a bad conversation"""
+
+    def __init__(self, bad: frozenset[int] = frozenset(), gate: asyncio.Event | None = None) -> None:
+        self.bad = bad
+        self.gate = gate
+        self.inserts: list[list[int]] = []          # conversation_id of each row, per committed INSERT
+        self.touched: list[int] = []
+        self.transactions = 0
+
+    @asynccontextmanager
+    async def session(self, tenant_id: int):
+        statements = Session(self)
+        yield statements
+        if self.gate is not None:
+            await self.gate.wait()
+        self.transactions += 1
+        self.inserts.extend(statements.inserts)
+        self.touched.extend(statements.touched)
+
+    @property
+    def rows(self) -> list[int]:
+        return [conversation_id for chunk in self.inserts for conversation_id in chunk]
+
+
+class Session:
+    def __init__(self, database: FakeDatabase) -> None:
+        self.database = database
+        self.inserts: list[list[int]] = []
+        self.touched: list[int] = []
+
+    async def execute(self, statement, params=None):
+        if params is not None:
+            conversation_ids = [p["id"] for p in params]
+            self.touched.extend(conversation_ids)
+        else:
+            compiled = statement.compile().params
+            conversation_ids = [value for key, value in compiled.items() if key.startswith("conversation_id")]
+            self.inserts.append(conversation_ids)
+        if self.database.bad & set(conversation_ids):
+            raise ValueError("insert or update on table violates foreign key constraint")
+
+
+async def test_batch_is_split_into_statements_of_max_rows():
+    database = FakeDatabase()
+    buffer = WriteBehindBuffer(database.session, max_batch=10_000, max_pending=10_000)
+    rows = MAX_ROWS_PER_INSERT * 2 + 5
+
+    await buffer.enqueue(1, [row(7) for _ in range(rows)], touch=(7, T0), durable=True)
+
+    assert database.transactions == 1
+    assert [len(chunk) for chunk in database.inserts] == [MAX_ROWS_PER_INSERT, MAX_ROWS_PER_INSERT, 5]
+    assert database.touched == [7]
+    assert buffer.pending == 0
+
+
+async def test_bad_conversation_is_isolated_without_dropping_the_others():
+    database = FakeDatabase(bad=frozenset({8}))
+    buffer = WriteBehindBuffer(database.session, retries=0)
+
+    good = asyncio.create_task(buffer.enqueue(1, [row(7), row(9)], touch=(7, T0), durable=True))
+    bad = asyncio.create_task(buffer.enqueue(1, [row(8)], touch=(8, T0), durable=True))
+    await buffer.enqueue(1, [row(9, "fire and forget")], touch=(9, T0))
+
+    await good
+    with pytest.raises(ValueError):
+        await bad
+    assert sorted(database.rows) == [7, 9, 9]
+    assert sorted(database.touched) == [7, 9]
+    assert buffer.pending == 0
+
+
+async def test_durable_enqueue_returns_only_after_its_rows_flush():
+    gate = asyncio.Event()
+    database = FakeDatabase(gate=gate)
+    buffer = WriteBehindBuffer(database.session, max_delay=0.01)
+
+    durable = asyncio.create_task(buffer.enqueue(1, [row(7)], durable=True))
+    await asyncio.sleep(0.05)
+    # The flush started but hasn't committed
+    assert not durable.done() and database.rows == []
+
+    gate.set()
+    await asyncio.wait_for(durable, 1)
+    assert database.rows == [7]
+
+    # Fire-and-forget returns while the rows are still buffered
+    await buffer.enqueue(1, [row(7)])
+    assert buffer.pending == 1
+    await buffer.close()
+    assert database.rows == [7, 7] and buffer.pending == 0